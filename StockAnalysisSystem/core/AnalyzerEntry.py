@@ -1,4 +1,8 @@
+import pickle
+import multiprocessing
 from os import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
 
 from .Utility.AnalyzerUtility import *
 from .DataHubEntry import DataHubEntry
@@ -6,15 +10,92 @@ from .Database.DatabaseEntry import DatabaseEntry
 from .Utility.plugin_manager import PluginManager
 
 
+# ------------------------------------------------ Analysis Worker Process ---------------------------------------------
+
+class QueueProgressRate(ProgressRate):
+    """
+    The progress rate in analysis worker process. The progress increment is forwarded to the main process by queue.
+    """
+    def __init__(self, progress_queue):
+        super(QueueProgressRate, self).__init__()
+        self.__progress_queue = progress_queue
+
+    def increase_progress(self, identity: str or [str], inc: int = 1):
+        super(QueueProgressRate, self).increase_progress(identity, inc)
+        try:
+            self.__progress_queue.put((identity, inc))
+        except Exception:
+            pass
+        finally:
+            pass
+
+
+def analysis_worker_init(project_path: str, config):
+    from .StockAnalysisSystem import StockAnalysisSystem
+    sas = StockAnalysisSystem()
+    if not sas.check_initialize(project_path, config, not_load_config=True, enable_service=False):
+        print('Analysis worker initialize fail: ' + str(sas.get_log_errors()))
+
+
+def analysis_worker_entry(securities: [str], methods: [str], time_serial: tuple,
+                          extra: dict, progress_queue) -> ([], [(str, str)]):
+    """
+    Run the analysis of a security shard in worker process.
+    :return: (The AnalysisResult list, The error list of [(error text, traceback)])
+    """
+    from .StockAnalysisSystem import StockAnalysisSystem
+    sas = StockAnalysisSystem()
+    if not sas.is_initialized():
+        return [], [('Analysis worker is not initialized: ' + str(sas.get_log_errors()), '')]
+
+    strategy_entry = sas.get_strategy_entry()
+    strategy_entry.get_plugin_manager().clear_error()
+    progress = QueueProgressRate(progress_queue) if progress_queue is not None else ProgressRate()
+    result = strategy_entry.run_strategy(securities, methods, time_serial,
+                                         process_count=1, progress=progress, **extra)
+
+    # The exception will be pickled to main process. Not all exceptions are picklable.
+    for r in result:
+        if r.exception is not None:
+            try:
+                pickle.dumps(r.exception)
+            except Exception:
+                r.exception = Exception(str(r.exception))
+            finally:
+                pass
+
+    exception, trace = strategy_entry.get_plugin_manager().get_last_error()
+    return result, ([] if exception is None else [(str(exception), trace)])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
 class StrategyEntry:
     def __init__(self, strategy_plugin: PluginManager, data_hub: DataHubEntry, database: DatabaseEntry):
         self.__data_hub = data_hub
         self.__database = database
         self.__strategy_plugin = strategy_plugin
 
+        self.__process_count = 0
+        self.__shard_per_process = 4
+
     def get_plugin_manager(self) -> PluginManager:
         return self.__strategy_plugin
 
+    def set_execute_option(self, process_count: int or str or None = None, shard_per_process: int or str or None = None):
+        """
+        Config the process pool analysis.
+        :param process_count: The worker process count. 0 or 1 means analysis in current process.
+                                Negative value means the cpu count.
+        :param shard_per_process: The securities will be split into process_count * shard_per_process shards.
+                                    Smaller shard balances the load better but has more overhead.
+        """
+        if process_count is not None and str(process_count) != '':
+            process_count = int(process_count)
+            self.__process_count = multiprocessing.cpu_count() if process_count < 0 else process_count
+        if shard_per_process is not None and str(shard_per_process) != '':
+            self.__shard_per_process = max(1, int(shard_per_process))
+
     # ------------------------------------------------- Prob and Info --------------------------------------------------
 
     def strategy_prob(self) -> [dict]:
@@ -52,16 +133,43 @@ class StrategyEntry:
     # ----------------------------------------------- Analysis and Cache -----------------------------------------------
 
     def run_strategy(self, securities: [str], methods: [str],
-                     time_serial: tuple = (years_ago(5), now()), **kwargs) -> list:
-        result = self.get_plugin_manager().execute_module_function(
-            self.get_plugin_manager().all_modules(), 'analysis', {
-                'methods': methods,
-                'securities': securities,
-                'time_serial': time_serial,
-                'data_hub': self.__data_hub,
-                'database': self.__database,
-                **kwargs,
-            }, False)
+                     time_serial: tuple = (years_ago(5), now()), process_count: int = None, **kwargs) -> list:
+        """
+        Run analyzer methods for the securities.
+        :param securities: The securities list
+        :param methods: The analyzer method uuid list
+        :param time_serial: The analysis period
+        :param process_count: The worker process count. None to use the count that specified by set_execute_option().
+                                The securities will be sharded and analysed in worker processes if it's larger than 1.
+        :param kwargs: The extra parameters that passed to analyzer. Includes 'progress' as ProgressRate,
+                        'prefetch' as AnalysisPrefetch that shared in a larger scope, or False to disable prefetch.
+        :return: The AnalysisResult list. The result order is the same whatever the process count is.
+        """
+        if process_count is None:
+            process_count = self.__process_count
+        process_count = min(process_count, len(securities))
+        if process_count > 1:
+            return self.__run_strategy_sharded(securities, methods, time_serial, process_count, **kwargs)
+
+        prefetch = kwargs.pop('prefetch', None)
+        own_prefetch = prefetch is None and self.__data_hub is not None
+        if own_prefetch:
+            prefetch = self.build_prefetch(securities, methods, time_serial)
+
+        try:
+            result = self.get_plugin_manager().execute_module_function(
+                self.get_plugin_manager().all_modules(), 'analysis', {
+                    'methods': methods,
+                    'securities': securities,
+                    'time_serial': time_serial,
+                    'data_hub': self.__data_hub,
+                    'database': self.__database,
+                    'prefetch': prefetch,
+                    **kwargs,
+                }, False)
+        finally:
+            if own_prefetch:
+                prefetch.release()
 
         # Flatten the nest result list
         flat_list = [item for sublist in result for item in sublist]
@@ -74,7 +182,134 @@ class StrategyEntry:
         #     result_table[hash_id] = results
         # return result_table
 
-    def cache_analysis_result(self, uri: str, result_list: list):
+    def data_declaration(self, methods: [str]) -> dict:
+        """
+        Collect the data declaration of methods from plugins.
+        :return: {uri: [readable field]}
+        """
+        declaration = OrderedDict()
+        for module in self.get_plugin_manager().all_modules():
+            if not hasattr(module, 'data_declaration'):
+                continue
+            try:
+                for uri, fields in module.data_declaration(methods).items():
+                    declared = declaration.setdefault(uri, [])
+                    declared.extend([f for f in fields if f not in declared])
+            except Exception as e:
+                print('Collect data declaration fail: ' + str(e))
+                print(traceback.format_exc())
+            finally:
+                pass
+        return declaration
+
+    def build_prefetch(self, securities: [str], methods: [str], time_serial: tuple) -> AnalysisPrefetch:
+        """
+        Build the run scoped prefetch with the data declaration of the methods.
+        The data is loaded at the first access, so building it is cheap.
+        """
+        prefetch = AnalysisPrefetch(self.__data_hub, securities, time_serial)
+        prefetch.declare_all(self.data_declaration(methods))
+        return prefetch
+
+    def __run_strategy_sharded(self, securities: [str], methods: [str],
+                               time_serial: tuple, process_count: int, **kwargs) -> list:
+        from .StockAnalysisSystem import StockAnalysisSystem
+        sas = StockAnalysisSystem()
+
+        progress = kwargs.pop('progress', None)
+        # Each worker prefetches the data of its shard
+        kwargs.pop('prefetch', None)
+        extra = {}
+        for key, value in kwargs.items():
+            try:
+                pickle.dumps(value)
+                extra[key] = value
+            except Exception:
+                print('Warning: Analysis parameter %s is not picklable. Ignore it in worker process.' % key)
+            finally:
+                pass
+
+        shard_count = min(process_count * self.__shard_per_process, len(securities))
+        shard_size = (len(securities) + shard_count - 1) // shard_count
+        shards = [securities[i:i + shard_size] for i in range(0, len(securities), shard_size)]
+
+        if progress is not None:
+            for method in methods:
+                progress.set_progress(method, 0, len(securities))
+
+        shard_results = []
+        errors = []
+        # The manager server process is only for progress reporting
+        manager = multiprocessing.Manager() if progress is not None else None
+        try:
+            progress_queue = manager.Queue() if manager is not None else None
+            with ProcessPoolExecutor(max_workers=process_count,
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=analysis_worker_init,
+                                     initargs=(sas.get_project_path(), sas.get_config())) as executor:
+                futures = [executor.submit(analysis_worker_entry, shard, methods, time_serial, extra, progress_queue)
+                           for shard in shards]
+                pending = futures
+                failed = None
+                while len(pending) > 0 and failed is None:
+                    done, pending = wait(pending, timeout=0.2, return_when=FIRST_EXCEPTION)
+                    self.__drain_progress_queue(progress_queue, progress)
+                    failed = next((future for future in done if future.exception() is not None), None)
+                if failed is not None:
+                    # Cancel the shards that not started. The running ones finish when the executor shuts down.
+                    for future in pending:
+                        future.cancel()
+                    raise failed.exception()
+                for future in futures:
+                    shard_result, shard_errors = future.result()
+                    shard_results.append(shard_result)
+                    errors.extend(shard_errors)
+            self.__drain_progress_queue(progress_queue, progress)
+        finally:
+            if manager is not None:
+                manager.shutdown()
+
+        for error_text, trace in errors:
+            print('Analysis worker error: ' + error_text)
+            print(trace)
+
+        if progress is not None:
+            for method in methods:
+                progress.finish_progress(method)
+
+        return self.merge_shard_results(shard_results)
+
+    @staticmethod
+    def __drain_progress_queue(progress_queue, progress: ProgressRate):
+        if progress_queue is None or progress is None:
+            return
+        while not progress_queue.empty():
+            identity, inc = progress_queue.get()
+            progress.increase_progress(identity, inc)
+
+    @staticmethod
+    def merge_shard_results(shard_results: [[AnalysisResult]]) -> [AnalysisResult]:
+        """
+        Merge the results of the contiguous security shards. In each shard the results are ordered by method
+            then security. So concatenating the shards per method gets the same order as the single process analysis.
+        :param shard_results: The result lists in shard order
+        :return: The merged result list
+        """
+        method_results = OrderedDict()
+        for shard_result in shard_results:
+            for r in shard_result:
+                method_results.setdefault(r.method, []).append(r)
+        return [r for results in method_results.values() for r in results]
+
+    def cache_analysis_result(self, uri: str, result_list: list, replace_securities: [str] = None):
+        """
+        Cache the analysis result.
+        :param uri: The cache uri
+        :param result_list: The AnalysisResult list
+        :param replace_securities: If specified, the old results of these securities (of the analyzers in result_list)
+                                     are replaced and the results of other securities are kept.
+                                     Else the old results of real-time analyzer are all deleted.
+        """
         default_time = now().replace(hour=0, minute=0, second=0, microsecond=0)
         delete_analyzer_cache = []
         analysis_result_packs = []
@@ -85,12 +320,18 @@ class StrategyEntry:
                 r.period = default_time
                 if str_available(r.method) and r.method not in delete_analyzer_cache:
                     delete_analyzer_cache.append(r.method)
+            elif replace_securities is not None and str_available(r.method) and r.method not in delete_analyzer_cache:
+                delete_analyzer_cache.append(r.method)
             p = r.pack()
             p['period'] = text_auto_time(p['period'])
             analysis_result_packs.append(p)
         for analyzer in delete_analyzer_cache:
-            self.__data_hub.get_data_center().delete_local_data(uri, analyzer=analyzer)
-        self.__data_hub.get_data_center().merge_local_data(uri, '', analysis_result_packs)
+            if replace_securities is None:
+                self.__data_hub.get_data_center().delete_local_data(uri, analyzer=analyzer)
+            elif len(replace_securities) > 0:
+                self.__data_hub.get_data_center().delete_local_data(uri, replace_securities, analyzer=analyzer)
+        if len(analysis_result_packs) > 0:
+            self.__data_hub.get_data_center().merge_local_data(uri, '', analysis_result_packs)
 
     def result_from_cache(self, uri: str, analyzer: str or [str] = None, identity: str or [str] = None,
                           time_serial: tuple = None) -> pd.DataFrame:
@@ -108,7 +349,7 @@ class StrategyEntry:
                          enable_calculation: bool = True,
                          enable_from_cache: bool = True, enable_update_cache: bool = True,
                          debug_load_json: bool = False, debug_dump_json: bool = False,
-                         dump_path: str = '') -> [AnalysisResult]:
+                         dump_path: str = '', enable_incremental: bool = True) -> [AnalysisResult]:
         """
         Execute analysis and do extra job specified by param. And dump offline analysis result.
         :param securities: The securities that you want to analysis
@@ -121,6 +362,9 @@ class StrategyEntry:
         :param debug_load_json: If True, data will come from debug json file (not offline analysis result json).
         :param debug_dump_json: If True, data will dump to debug json file (not offline analysis result json).
         :param dump_path: The debug json and offline analysis result json dump directory (not file name).
+        :param enable_incremental: If True (and from cache, calculation are both enabled), for the analyzer that
+                                     declares its data, only the securities whose data updated after the last
+                                     calculation are recalculated. Others come from cache.
         :return: Analysis result list
         """
         clock = Clock()
@@ -141,6 +385,25 @@ class StrategyEntry:
         # Remove microsecond to avoid mongodb query fail.
         # time_serial = [t.replace(microsecond=0)  for t in time_serial]
 
+        # The data is shared by all analyzers in this run
+        prefetch = self.build_prefetch(securities, analyzers, time_serial) \
+            if enable_calculation and self.__data_hub is not None else None
+
+        # The stale securities of all incremental analyzers are found first, so they share one prefetch
+        incremental_plans = OrderedDict()
+        if enable_incremental and enable_from_cache and enable_calculation and not debug_load_json:
+            for analyzer in analyzers:
+                dependencies = self.analyzer_dependencies(analyzer)
+                if len(dependencies) > 0:
+                    incremental_plans[analyzer] = self.__incremental_plan(analyzer, dependencies,
+                                                                          securities, time_serial)
+        recalculate_set = set()
+        for cached, recalculate, plan_time in incremental_plans.values():
+            recalculate_set.update(recalculate)
+        incremental_prefetch = self.build_prefetch([s for s in securities if s in recalculate_set],
+                                                   list(incremental_plans.keys()), time_serial) \
+            if len(recalculate_set) > 0 else None
+
         errors = []
         for analyzer in analyzers:
             result = None
@@ -162,7 +425,17 @@ class StrategyEntry:
                 finally:
                     pass
             else:
-                if enable_from_cache:
+                if analyzer in incremental_plans:
+                    clock.reset()
+                    self.__strategy_plugin.clear_error()
+                    result = self.__incremental_analysis(analyzer, incremental_plans[analyzer], securities,
+                                                         time_serial, progress_rate, enable_update_cache,
+                                                         incremental_prefetch)
+                    errors.append(self.__strategy_plugin.get_last_error())
+                    # The calculated result is already cached
+                    uncached = False
+                    print('Analyzer %s : Incremental analysis, time spending: %ss' % (analyzer, clock.elapsed_s()))
+                elif enable_from_cache:
                     df = self.result_from_cache('Result.Analyzer', analyzer=analyzer,
                                                 identity=securities, time_serial=time_serial)
                     result = analysis_result_dataframe_to_list(df)
@@ -180,10 +453,11 @@ class StrategyEntry:
                     clock.reset()
                     self.__strategy_plugin.clear_error()
                     if progress_rate is not None:
-                        result = self.run_strategy(securities, [analyzer],
-                                                   time_serial=time_serial, progress=progress_rate)
+                        result = self.run_strategy(securities, [analyzer], time_serial=time_serial,
+                                                   progress=progress_rate, prefetch=prefetch)
                     else:
-                        result = self.run_strategy(securities, [analyzer], time_serial=time_serial)
+                        result = self.run_strategy(securities, [analyzer], time_serial=time_serial,
+                                                   prefetch=prefetch)
                     errors.append(self.__strategy_plugin.get_last_error())
                     print('Analyzer %s : Execute analysis, time spending: %ss' % (analyzer, clock.elapsed_s()))
 
@@ -204,6 +478,14 @@ class StrategyEntry:
                         self.cache_analysis_result('Result.Analyzer', result)
                         print('Analyzer %s : Cache result, time spending: %ss' % (analyzer, clock.elapsed_s()))
 
+        if prefetch is not None:
+            print('Analysis prefetch size = %.2f MB' % (float(prefetch.memory_usage()) / 1024 / 1024))
+            prefetch.release()
+        if incremental_prefetch is not None:
+            print('Incremental analysis prefetch size = %.2f MB' %
+                  (float(incremental_prefetch.memory_usage()) / 1024 / 1024))
+            incremental_prefetch.release()
+
         errors = [err for err in errors if err[0] is not None]
         if len(errors) > 0:
             print('----------------------------- Analysis Errors -----------------------------')
@@ -222,6 +504,117 @@ class StrategyEntry:
 
         return total_result
 
+    # -------------------------------------------------- Incremental ---------------------------------------------------
+
+    def analyzer_dependencies(self, analyzer: str) -> [str]:
+        """
+        Get the input uris of an analyzer by its data declaration.
+        :return: The uri list. Empty if the analyzer does not declare its data.
+        """
+        if self.__data_hub is None or self.__data_hub.get_data_center().get_update_table() is None:
+            return []
+        return list(self.data_declaration([analyzer]).keys())
+
+    def stale_securities(self, analyzer: str, dependencies: [str], securities: [str],
+                         time_serial: tuple = None) -> [str]:
+        """
+        Find the securities that the analysis result is out of date: Not calculated with this analysis window,
+            the cached result is replaced by the calculation of another window, or any input data of it updated
+            after the last calculation. The update time comes from UpdateTableEx.
+        The calculation time is stamped per (analyzer, security, window) and per (analyzer, security). The cached
+            result is the one of the window that has the latest calculation time.
+        :param analyzer: The analyzer uuid
+        :param dependencies: The input uris of the analyzer
+        :param securities: The securities list
+        :param time_serial: The analysis window
+        :return: The stale securities list in the securities order
+        """
+        update_table = self.__data_hub.get_data_center().get_update_table()
+        uri_update_time = {uri: update_table.get_last_update_time(uri.split('.')) for uri in dependencies}
+        window = self.__window_tag(time_serial)
+
+        stale = []
+        for s in securities:
+            calc_time = update_table.get_last_update_time(self.__result_tags(analyzer, s, window))
+            latest_calc_time = update_table.get_last_update_time(self.__result_tags(analyzer, s))
+            if calc_time is None or (latest_calc_time is not None and latest_calc_time > calc_time):
+                stale.append(s)
+                continue
+            for uri in dependencies:
+                update_time = update_table.get_last_update_time(uri.split('.') + [s.replace('.', '_')])
+                if update_time is None:
+                    update_time = uri_update_time.get(uri, None)
+                if update_time is not None and update_time > calc_time:
+                    stale.append(s)
+                    break
+        return stale
+
+    def __incremental_plan(self, analyzer: str, dependencies: [str], securities: [str],
+                           time_serial: tuple) -> ([AnalysisResult], [str], datetime.datetime):
+        """
+        Split the securities into the cached ones and the ones that need recalculation.
+        :return: (The cached results, The securities to recalculate in the securities order, The plan time)
+                    The plan time is the calculation time, the data updated after it will be recalculated next time.
+        """
+        plan_time = now()
+        stale = set(self.stale_securities(analyzer, dependencies, securities, time_serial))
+
+        cached = []
+        fresh = [s for s in securities if s not in stale]
+        if len(fresh) > 0:
+            df = self.result_from_cache('Result.Analyzer', analyzer=analyzer, identity=fresh, time_serial=time_serial)
+            cached = analysis_result_dataframe_to_list(df)
+            cached = cached if cached is not None else []
+            # The result may be removed from cache
+            stale = stale.union(set(fresh).difference(set(r.securities for r in cached)))
+
+        return cached, [s for s in securities if s in stale], plan_time
+
+    def __incremental_analysis(self, analyzer: str, plan: ([AnalysisResult], [str], datetime.datetime),
+                               securities: [str], time_serial: tuple, progress_rate: ProgressRate or None,
+                               enable_update_cache: bool, prefetch: AnalysisPrefetch or None) -> [AnalysisResult]:
+        cached, recalculate, calc_time = plan
+
+        calculated = []
+        if len(recalculate) > 0:
+            # The prefetch covers the recalculated securities of all incremental analyzers
+            if progress_rate is not None:
+                calculated = self.run_strategy(recalculate, [analyzer], time_serial=time_serial,
+                                               progress=progress_rate, prefetch=prefetch)
+            else:
+                calculated = self.run_strategy(recalculate, [analyzer], time_serial=time_serial,
+                                               prefetch=prefetch)
+            if enable_update_cache:
+                self.cache_analysis_result('Result.Analyzer', calculated, replace_securities=recalculate)
+                update_table = self.__data_hub.get_data_center().get_update_table()
+                window = self.__window_tag(time_serial)
+                for s in recalculate:
+                    update_table.update_latest_update_time(self.__result_tags(analyzer, s), calc_time)
+                    update_table.update_latest_update_time(self.__result_tags(analyzer, s, window), calc_time)
+                update_table.flush()
+        if progress_rate is not None:
+            progress_rate.finish_progress(analyzer)
+
+        print('Analyzer %s : %d securities from cache, %d securities recalculated' %
+              (analyzer, len(securities) - len(recalculate), len(recalculate)))
+        return sort_results_by_securities(cached + calculated, securities)
+
+    @staticmethod
+    def __result_tags(analyzer: str, securities: str, window: str = None) -> [str]:
+        tags = ['Result', 'Analyzer', analyzer, securities.replace('.', '_')]
+        return tags + [window] if window is not None else tags
+
+    @staticmethod
+    def __window_tag(time_serial: tuple) -> str:
+        # The analysis window in day. The until that reaches today is open-ended: The result of yesterday's
+        #   (since, now) window is still valid today, the data that updated after it is caught by the update time.
+        since, until = (list(time_serial) + [None, None])[:2] if isinstance(time_serial, (list, tuple)) \
+            else (None, None)
+        since, until = text_auto_time(since), text_auto_time(until)
+        since_text = since.strftime('%Y%m%d') if since is not None else 'x'
+        until_text = until.strftime('%Y%m%d') if until is not None and until < today() else 'now'
+        return 'W%s_%s' % (since_text, until_text)
+
     # ------------------------------------------------- Export / Import ------------------------------------------------
 
     @staticmethod
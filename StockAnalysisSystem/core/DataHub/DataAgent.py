@@ -1,3 +1,4 @@
+import re
 import datetime
 import pandas as pd
 
@@ -138,6 +139,7 @@ class DataAgent:
         self.__update_priority = update_priority
         self.__checker = None
         self.__extra = kwargs
+        self.__write_observers = []
 
         self.config_field_checker(kwargs.get('query_declare', None), kwargs.get('result_declare', None))
 
@@ -173,6 +175,31 @@ class DataAgent:
         if query_declare is not None or result_declare is not None:
             self.__checker = ParameterChecker(result_declare, query_declare)
 
+    # ---------------------------------- Write Observer ----------------------------------
+
+    def add_write_observer(self, observer):
+        """
+        The observer will be invoked after data written by merge() or delete().
+        :param observer: Callable with parameters (agent: DataAgent, uri: str, identity: str or [str])
+        :return: None
+        """
+        if observer not in self.__write_observers:
+            self.__write_observers.append(observer)
+
+    def remove_write_observer(self, observer):
+        if observer in self.__write_observers:
+            self.__write_observers.remove(observer)
+
+    def notify_data_written(self, uri: str, identity: str or [str] = None):
+        for observer in self.__write_observers:
+            try:
+                observer(self, uri, identity)
+            except Exception as e:
+                print('Notify data written error: ' + str(e))
+                print(traceback.format_exc())
+            finally:
+                pass
+
     # ----------------------------- Overrideable - Properties -----------------------------
 
     def adapt(self, uri: str) -> bool:
@@ -181,6 +208,8 @@ class DataAgent:
             return uri == adapt
         if isinstance(adapt, (set, list, tuple)):
             return uri in adapt
+        if isinstance(adapt, re.Pattern):
+            return adapt.fullmatch(uri) is not None
         if isinstance(adapt, collections.Callable):
             return adapt(uri)
         return self.__uri.lower() == uri.lower()
@@ -241,18 +270,24 @@ class DataAgent:
         return result
 
     def merge(self, uri: str, identity: str, df: pd.DataFrame) -> bool:
-        nop(identity)
         if not self.adapt(uri):
             return False
-        return self.__depot.upsert(df) if self.__merge_strategy == DataAgent.MERGE_UPSERT else \
-               self.__depot.insert(df)
+        try:
+            return self.__depot.upsert(df) if self.__merge_strategy == DataAgent.MERGE_UPSERT else \
+                   self.__depot.insert(df)
+        finally:
+            # Even if the write fails, the data may be partially written.
+            self.notify_data_written(uri, identity)
 
     def delete(self, uri: str, identity: str or [str], time_serial: tuple, extra: dict, fields: [str]) -> bool:
         conditions = self.pack_conditions(identity, time_serial)
         # TODO: Process and Remove not condition params
         conditions.update(extra)
         depot = self.data_depot_of(uri, identity, time_serial, extra)
-        ret = depot.delete(conditions=conditions, extra=extra, fields=fields)
+        try:
+            ret = depot.delete(conditions=conditions, extra=extra, fields=fields)
+        finally:
+            self.notify_data_written(uri, identity)
         return ret
 
     def data_range(self, uri: str, identity: str = None) -> (datetime.datetime, datetime.datetime):
@@ -1,24 +1,73 @@
 from .DataAgent import *
 from ..UniversalDataDepot.DepotMongoDB import *
+from ..UniversalDataDepot.DepotParquet import DepotParquet
 from ..Database.DatabaseEntry import DatabaseEntry
 
 
+DEPOT_MONGODB = 'mongodb'
+DEPOT_PARQUET = 'parquet'
+
+PARQUET_PARTITION = {
+    'none': DepotParquet.PARTITION_NONE,
+    'identity': DepotParquet.PARTITION_VALUE,
+    'year': DepotParquet.PARTITION_YEAR,
+}
+
+
 def uri_to_table(uri: str) -> str:
     return uri.replace('.', '_')
 
 
-def build_data_agent(database_entry: DatabaseEntry):
+def build_data_agent(database_entry: DatabaseEntry, depot_config: dict = None, depot_path: str = ''):
+    """
+    Build all data agents.
+    :param database_entry: The database entry which provides the mongodb client.
+    :param depot_config: Select the depot for each agent by uri, the default depot is mongodb. The format is like:
+                            {
+                                'TradeData.Stock.Daily': {'depot': 'parquet', 'partition': 'identity'},
+                                'Metrics.Stock.Daily': {'depot': 'parquet', 'partition': 'year'},
+                                'Finance.Audit': {'depot': 'mongodb', 'batch_size': 5000, 'writer_threads': 4},
+                            }
+                         The partition can be 'none', 'identity' (the first primary key) or 'year' (the second).
+                         The batch_size and writer_threads are the bulk write options of mongodb depot.
+    :param depot_path: The root path of the file based depot.
+    :return: The list of DataAgent
+    """
     mongodb_client = database_entry.get_mongo_db_client()
+    depot_config = depot_config if isinstance(depot_config, dict) else {}
+
+    def build_depot(uri: str, database: str, primary_keys: str or [str]) -> DepotInterface:
+        config = depot_config.get(uri, {})
+        depot_type = config.get('depot', DEPOT_MONGODB) if isinstance(config, dict) else DEPOT_MONGODB
+
+        if depot_type == DEPOT_PARQUET:
+            keys = [primary_keys] if isinstance(primary_keys, str) else list(primary_keys)
+            partition = PARQUET_PARTITION.get(config.get('partition', 'identity'), DepotParquet.PARTITION_VALUE)
+            if partition == DepotParquet.PARTITION_YEAR:
+                partition_field = keys[1] if len(keys) > 1 else None
+            else:
+                partition_field = keys[0] if len(keys) > 0 else None
+            return DepotParquet(primary_keys=primary_keys,
+                                root_path=os.path.join(depot_path, database),
+                                data_table=uri_to_table(uri),
+                                partition_field=partition_field,
+                                partition_mode=partition)
+        if depot_type != DEPOT_MONGODB:
+            print('Warning: Unknown depot type %s for %s, use mongodb instead.' % (depot_type, uri))
+        return DepotMongoDB(primary_keys=primary_keys,
+                            client=mongodb_client,
+                            database=database,
+                            data_table=uri_to_table(uri),
+                            batch_size=int(config.get('batch_size', DepotMongoDB.DEFAULT_BATCH_SIZE)),
+                            writer_threads=int(config.get('writer_threads', 1)))
 
     return [
         # -------------------------- Market Data --------------------------
 
         DataAgent(
             uri='Market.SecuritiesInfo',
-            depot=DepotMongoDB(primary_keys='stock_identity',
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Market.SecuritiesInfo')),
+            depot=build_depot(uri='Market.SecuritiesInfo', database='StockAnalysisSystem',
+                              primary_keys='stock_identity'),
             identity_field='stock_identity',
             datetime_field=None,
             data_duration=DATA_DURATION_NONE,
@@ -27,10 +76,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Market.IndexInfo',
-            depot=DepotMongoDB(primary_keys='index_identity',
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Market.IndexInfo')),
+            depot=build_depot(uri='Market.IndexInfo', database='StockAnalysisSystem',
+                              primary_keys='index_identity'),
             identity_field='index_identity',
             datetime_field=None,
             data_duration=DATA_DURATION_NONE,
@@ -39,10 +86,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Market.TradeCalender',
-            depot=DepotMongoDB(primary_keys=['exchange', 'trade_date'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Market.TradeCalender')),
+            depot=build_depot(uri='Market.TradeCalender', database='StockAnalysisSystem',
+                              primary_keys=['exchange', 'trade_date']),
             identity_field='exchange',
             datetime_field='trade_date',
             data_duration=DATA_DURATION_DAILY,
@@ -52,10 +97,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Market.Enquiries',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'enquiry_date'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Market.Enquiries')),
+            depot=build_depot(uri='Market.Enquiries', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'enquiry_date']),
             identity_field='stock_identity',
             datetime_field='enquiry_date',
             data_duration=DATA_DURATION_FLOW,
@@ -75,10 +118,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Market.NamingHistory',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'naming_date'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Market.NamingHistory')),
+            depot=build_depot(uri='Market.NamingHistory', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'naming_date']),
             identity_field='stock_identity',
             datetime_field='naming_date',
             data_duration=DATA_DURATION_FLOW,
@@ -87,10 +128,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Market.SecuritiesTags',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'concept_name'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Market.SecuritiesTags')),
+            depot=build_depot(uri='Market.SecuritiesTags', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'concept_name']),
             identity_field='stock_identity',
             datetime_field=None,
             data_duration=DATA_DURATION_NONE,
@@ -101,10 +140,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Finance.Audit',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'period'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Finance.Audit')),
+            depot=build_depot(uri='Finance.Audit', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'period']),
             identity_field='stock_identity',
             datetime_field='period',
             data_duration=DATA_DURATION_QUARTER,
@@ -113,10 +150,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Finance.BalanceSheet',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'period'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Finance.BalanceSheet')),
+            depot=build_depot(uri='Finance.BalanceSheet', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'period']),
             identity_field='stock_identity',
             datetime_field='period',
             data_duration=DATA_DURATION_QUARTER,
@@ -125,10 +160,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Finance.IncomeStatement',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'period'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Finance.IncomeStatement')),
+            depot=build_depot(uri='Finance.IncomeStatement', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'period']),
             identity_field='stock_identity',
             datetime_field='period',
             data_duration=DATA_DURATION_QUARTER,
@@ -137,10 +170,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Finance.CashFlowStatement',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'period'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Finance.CashFlowStatement')),
+            depot=build_depot(uri='Finance.CashFlowStatement', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'period']),
             identity_field='stock_identity',
             datetime_field='period',
             data_duration=DATA_DURATION_QUARTER,
@@ -149,10 +180,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Finance.BusinessComposition',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'period', 'classification'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Finance.BusinessComposition')),
+            depot=build_depot(uri='Finance.BusinessComposition', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'period', 'classification']),
             identity_field='stock_identity',
             datetime_field='period',
             data_duration=DATA_DURATION_QUARTER,
@@ -163,10 +192,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Stockholder.Count',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'period'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Stockholder.Count')),
+            depot=build_depot(uri='Stockholder.Count', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'period']),
             identity_field='stock_identity',
             datetime_field='period',
             data_duration=DATA_DURATION_QUARTER,
@@ -175,10 +202,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Stockholder.Statistics',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'period'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Stockholder.Statistics')),
+            depot=build_depot(uri='Stockholder.Statistics', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'period']),
             identity_field='stock_identity',
             datetime_field='period',
             data_duration=DATA_DURATION_QUARTER,
@@ -187,10 +212,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Stockholder.PledgeStatus',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'due_date'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Stockholder.PledgeStatus')),
+            depot=build_depot(uri='Stockholder.PledgeStatus', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'due_date']),
             identity_field='stock_identity',
             datetime_field='due_date',
             data_duration=DATA_DURATION_FLOW,
@@ -199,10 +222,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Stockholder.PledgeHistory',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'due_date', 'pledge_amount'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Stockholder.PledgeHistory')),
+            depot=build_depot(uri='Stockholder.PledgeHistory', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'due_date', 'pledge_amount']),
             identity_field='stock_identity',
             datetime_field='due_date',
             data_duration=DATA_DURATION_FLOW,
@@ -211,10 +232,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Stockholder.ReductionIncrease',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'ann_date', 'stock_holder', 'in_de'],    # in_de follows ts.
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Stockholder.ReductionIncrease')),
+            depot=build_depot(uri='Stockholder.ReductionIncrease', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'ann_date', 'stock_holder', 'in_de']),    # in_de follows ts.
             identity_field='stock_identity',
             datetime_field='ann_date',
             data_duration=DATA_DURATION_FLOW,
@@ -223,10 +242,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Stockholder.Repurchase',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'ann_date'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Stockholder.Repurchase')),
+            depot=build_depot(uri='Stockholder.Repurchase', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'ann_date']),
             identity_field='stock_identity',
             datetime_field='ann_date',
             data_duration=DATA_DURATION_FLOW,
@@ -238,10 +255,8 @@ def build_data_agent(database_entry: DatabaseEntry):
             uri='Stockholder.StockUnlock',
             # Note: The ann_date field of tushare may be empty.
             # So we use float_date as primary key, which is renamed unlock_date
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'unlock_date', 'holder_name'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Stockholder.StockUnlock')),
+            depot=build_depot(uri='Stockholder.StockUnlock', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'unlock_date', 'holder_name']),
                 identity_field='stock_identity',
                 datetime_field='unlock_date',
                 data_duration=DATA_DURATION_FLOW,
@@ -253,10 +268,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='TradeData.Stock.Daily',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'trade_date'],
-                               client=mongodb_client,
-                               database='StockDaily',
-                               data_table=uri_to_table('TradeData.Stock.Daily')),
+            depot=build_depot(uri='TradeData.Stock.Daily', database='StockDaily',
+                              primary_keys=['stock_identity', 'trade_date']),
             identity_field='stock_identity',
             datetime_field='trade_date',
             data_duration=DATA_DURATION_DAILY,
@@ -265,10 +278,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='TradeData.Index.Daily',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'trade_date'],
-                               client=mongodb_client,
-                               database='StockDaily',
-                               data_table=uri_to_table('TradeData.Index.Daily')),
+            depot=build_depot(uri='TradeData.Index.Daily', database='StockDaily',
+                              primary_keys=['stock_identity', 'trade_date']),
             identity_field='stock_identity',
             datetime_field='trade_date',
             data_duration=DATA_DURATION_DAILY,
@@ -279,10 +290,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Metrics.Stock.Daily',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'trade_date'],
-                               client=mongodb_client,
-                               database='StockDaily',
-                               data_table=uri_to_table('Metrics.Stock.Daily')),
+            depot=build_depot(uri='Metrics.Stock.Daily', database='StockDaily',
+                              primary_keys=['stock_identity', 'trade_date']),
             identity_field='stock_identity',
             datetime_field='trade_date',
             data_duration=DATA_DURATION_DAILY,
@@ -293,10 +302,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Factor.Finance',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'period'],
-                               client=mongodb_client,
-                               database='StockAnalysisSystem',
-                               data_table=uri_to_table('Factor.Finance')),
+            depot=build_depot(uri='Factor.Finance', database='StockAnalysisSystem',
+                              primary_keys=['stock_identity', 'period']),
             identity_field='stock_identity',
             datetime_field='period',
             data_duration=DATA_DURATION_QUARTER,
@@ -307,10 +314,8 @@ def build_data_agent(database_entry: DatabaseEntry):
 
         DataAgent(
             uri='Result.Analyzer',
-            depot=DepotMongoDB(primary_keys=['stock_identity', 'period', 'analyzer'],
-                               client=mongodb_client,
-                               database='SasCache',
-                               data_table=uri_to_table('Result.Analyzer')),
+            depot=build_depot(uri='Result.Analyzer', database='SasCache',
+                              primary_keys=['stock_identity', 'period', 'analyzer']),
             identity_field='stock_identity',
             datetime_field='period',
             data_duration=DATA_DURATION_QUARTER,
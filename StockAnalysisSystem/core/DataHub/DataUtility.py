@@ -2,8 +2,10 @@ import collections
 from concurrent.futures.thread import ThreadPoolExecutor
 
 from ..Utility.common import *
+from ..Utility.df_utility import join_on_keys
 from ..Utility.time_utility import *
 from .UniversalDataCenter import UniversalDataCenter
+from .PersistencePipeline import PersistencePipeline
 
 
 A_SHARE_MARKET = collections.OrderedDict([
@@ -134,6 +136,12 @@ class DataUtility:
         self.__trade_calendar_cache = collections.OrderedDict()             # [(datetime.date, bool)]
         self.__trade_calendar_ready = False
 
+        self.__fetch_workers = 1
+        self.__patch_queue_size = 20
+        self.__persistence_workers = 1
+        self.__coalesce_limit = 50
+        self.__persistence_pipeline = None
+
     # ------------------------------- General -------------------------------
 
     def get_support_exchange(self) -> dict:
@@ -212,63 +220,72 @@ class DataUtility:
         progress.reset()
         progress.set_progress(uri, 0, progress_count)
 
-        last_future = None
-        thread_pool = ThreadPoolExecutor(max_workers=1)
-
         update_counter = [
             0,      # patch count
             0       # persistence count
         ]
         error_identities = []
+        abort_flag = [False]
+        counter_lock = threading.Condition()
 
-        for identity in update_list:
-            while (update_counter[0] - update_counter[1] > 20) and not quit_flag[0]:
-                time.sleep(0.5)
-                continue
-            if quit_flag[0]:
-                break
-
-            print('------------------------------------------------------------------------------------')
-
-            if time_serial is None:
-                # Auto calculate securities update time range
-                if identity is not None:
-                    # Optimise: Update not earlier than listing date.
-                    listing_date = self.get_securities_listing_date(identity, default_since())
-
-                    if full_update:
-                        # Full volume update
-                        since, until = listing_date, now()
-                    else:
-                        # Increment update
-                        since, until = self.__data_center.calc_update_range(uri, identity)
-                        since = max(listing_date, since)
-                    time_serial = (since, until)
-
-            patch = self.__data_center.build_local_data_patch(uri, identity, time_serial, force=full_update)
-            update_counter[0] += 1
-
-            if not patch[0]:
-                error_identities.append(identity)
-                if len(error_identities) / len(update_list) > 0.10 or len(error_identities) > 5:
-                    print('Update gets %s errors. Quit update.' % len(error_identities))
-                    return False
-                continue
-            print('Patch count: %s' % update_counter[0])
-
-            last_future = thread_pool.submit(self.__execute_persistence, uri,
-                                             identity, patch, update_counter, progress)
+        # The fetched patches are put into the bounded queues of persistence pipeline.
+        # Fetch workers block when persistence falls behind.
+        pipeline = self.__get_persistence_pipeline()
+
+        def on_persisted(_patch: tuple, _result: bool):
+            _identity = _patch[1][1]
+            if _identity is not None:
+                progress.set_progress([uri, _identity], 1, 1)
+            progress.increase_progress(uri)
+            with counter_lock:
+                update_counter[1] += 1
+                print('Persistence count: %s' % update_counter[1])
+                counter_lock.notify_all()
+
+        def fetch_patch(_identity: str or None):
+            if quit_flag[0] or abort_flag[0]:
+                return
+            try:
+                _time_serial = self.__calc_update_time_serial(uri, _identity, time_serial, full_update)
+                patch = self.__data_center.build_local_data_patch(uri, _identity, _time_serial, force=full_update)
+            except Exception as e:
+                print('Fetch patch error: ' + str(e))
+                print(traceback.format_exc())
+                patch = (False, None, None)
+            finally:
+                pass
+
+            with counter_lock:
+                update_counter[0] += 1
+                if not patch[0]:
+                    error_identities.append(_identity)
+                    if len(error_identities) / len(update_list) > 0.10 or len(error_identities) > 5:
+                        abort_flag[0] = True
+                    return
+                print('Patch count: %s' % update_counter[0])
+            pipeline.submit(patch, on_persisted)
+
+        print('------------------------------------------------------------------------------------')
+        with ThreadPoolExecutor(max_workers=self.__fetch_workers) as fetch_pool:
+            for future in [fetch_pool.submit(fetch_patch, identity) for identity in update_list]:
+                future.result()
+
+        print('Waiting for persistence task finish...')
+        with counter_lock:
+            while update_counter[1] < update_counter[0] - len(error_identities):
+                counter_lock.wait()
+
+        if abort_flag[0]:
+            print('Update gets %s errors. Quit update.' % len(error_identities))
+            return False
 
         if quit_flag[0]:
             print('Quit flag set. Quit update.')
             return False
 
-        if last_future is not None:
-            print('Waiting for persistence task finish...')
-            last_future.result()
-
-        # Update uri last update time when all update list updated.
+        # Update uri last update time when all update list updated. Then write back the update records.
         self.__data_center.get_update_table().update_latest_update_time(uri.split('.'))
+        self.__data_center.get_update_table().flush()
 
         # since, until = agent.data_range(uri, identity) if agent is not None else (None, None)
 
@@ -293,22 +310,49 @@ class DataUtility:
 
         return True
 
-    def __execute_persistence(self, uri: str, identity: str, patch: tuple,
-                              update_counter: [int, int], progress: ProgressRate) -> bool:
-        try:
-            if patch is not None:
-                self.__data_center.apply_local_data_patch(patch)
-            if identity is not None:
-                progress.set_progress([uri, identity], 1, 1)
-            progress.increase_progress(uri)
-        except Exception as e:
-            print('Persistence error: ' + str(e))
-            print(traceback.format_exc())
-            return False
-        finally:
-            update_counter[1] += 1
-            print('Persistence count: %s' % update_counter[1])
-        return True
+    def set_update_option(self, fetch_workers: int = None, patch_queue_size: int = None,
+                          persistence_workers: int = None, coalesce_limit: int = None):
+        """
+        Tune the auto update.
+        :param fetch_workers: The thread count that fetches data from collector plugin in parallel.
+                              The quota of each tushare interface is limited by CollectorUtility globally.
+        :param patch_queue_size: The max count of patches that waiting for persistence of each writer.
+        :param persistence_workers: The writer count. The patches of the same uri are always written by one writer.
+        :param coalesce_limit: The max count of queued patches that coalesced into one bulk write.
+        """
+        if fetch_workers is not None:
+            self.__fetch_workers = max(1, int(fetch_workers))
+        if patch_queue_size is not None:
+            self.__patch_queue_size = max(1, int(patch_queue_size))
+        if persistence_workers is not None:
+            self.__persistence_workers = max(1, int(persistence_workers))
+        if coalesce_limit is not None:
+            self.__coalesce_limit = max(1, int(coalesce_limit))
+        with self.__lock:
+            pipeline, self.__persistence_pipeline = self.__persistence_pipeline, None
+        if pipeline is not None:
+            pipeline.stop()
+
+    def __get_persistence_pipeline(self) -> PersistencePipeline:
+        with self.__lock:
+            if self.__persistence_pipeline is None:
+                self.__persistence_pipeline = PersistencePipeline(
+                    self.__data_center, self.__persistence_workers, self.__patch_queue_size, self.__coalesce_limit)
+            return self.__persistence_pipeline
+
+    def __calc_update_time_serial(self, uri: str, identity: str or None, time_serial: any, full_update: bool) -> any:
+        if time_serial is not None or identity is None:
+            return time_serial
+        # Optimise: Update not earlier than listing date.
+        listing_date = self.get_securities_listing_date(identity, default_since())
+        if full_update:
+            # Full volume update
+            since, until = listing_date, now()
+        else:
+            # Increment update
+            since, until = self.__data_center.calc_update_range(uri, identity)
+            since = max(listing_date, since)
+        return since, until
 
     def is_trading_day(self, _date: None or datetime.datetime or datetime.date, exchange: str = 'SSE') -> bool:
         self.__check_refresh_trade_calendar_cache()
@@ -431,24 +475,31 @@ class DataUtility:
 
     # --------------------------------------- Query ---------------------------------------
 
-    def auto_query(self, identity: str or [str], time_serial: tuple, fields: [str],
-                   join_on: [str] = None) -> pd.DataFrame or [pd.DataFrame]:
-        group = self.__data_center.readable_to_uri(fields)
+    def plan_query(self, fields: [str], join_on: [str] = None) -> {str: [str]}:
+        """
+        Resolve the uris that own the readable fields. Each uri only queries its own fields and the join keys,
+            so the depot only reads the columns that are needed.
+        :param fields: The readable fields
+        :param join_on: The join keys which every uri should provide
+        :return: {uri: [readable field]}. The unknown fields are ignored with warning.
+        """
+        group = self.__data_center.readable_to_uri(list(dict.fromkeys(fields)))
         if 'None' in group.keys():
             print('Warning: Unknown fields in auto_query() : ' + str(group['None']))
             del group['None']
-        result = None
-        for uri, fields in group.items():
-            if join_on is not None:
-                fields.extend(join_on)
-                fields = list(set(fields))
-            df = self.__data_center.query(uri, identity, time_serial, fields=fields, readable=True)
-            if join_on is not None:
-                result = df if result is None else pd.merge(result, df, how='left', on=join_on)
-            else:
-                result = [] if result is None else result
-                result.append(df)
-        return result
+        if join_on is not None:
+            for uri in group.keys():
+                group[uri] = list(dict.fromkeys(group[uri] + list(join_on)))
+        return group
+
+    def auto_query(self, identity: str or [str], time_serial: tuple, fields: [str],
+                   join_on: [str] = None) -> pd.DataFrame or [pd.DataFrame]:
+        group = self.plan_query(fields, join_on)
+        frames = [self.__data_center.query(uri, identity, time_serial, fields=uri_fields, readable=True)
+                  for uri, uri_fields in group.items()]
+        if join_on is None:
+            return frames if len(frames) > 0 else None
+        return join_on_keys(frames, join_on, how='left')
 
     def query_daily_trade_data(self, identity: str, time_serial: tuple = (default_since(), now()),
                                _open: bool = True, _close: bool = True, high: bool = True, low: bool = True,
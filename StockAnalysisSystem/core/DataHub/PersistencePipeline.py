@@ -0,0 +1,136 @@
+import queue
+import zlib
+import threading
+import traceback
+
+from .UniversalDataCenter import UniversalDataCenter
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                  PersistencePipeline
+# ----------------------------------------------------------------------------------------------------------------------
+
+class PersistencePipeline:
+    """
+    Persist the update patches by multiple writers.
+    The patches are partitioned by uri, so the patches of the same uri are always written by the same writer in order.
+    Each writer has a bounded queue. The submit() blocks when the queue is full, which slows down the fetching.
+    The queued patches of a writer are taken at once and coalesced into bulk writes by UniversalDataCenter.
+    """
+
+    def __init__(self, data_center: UniversalDataCenter,
+                 writer_count: int = 1, queue_size: int = 20, coalesce_limit: int = 50):
+        self.__data_center = data_center
+        self.__writer_count = max(1, writer_count)
+        self.__queue_size = max(1, queue_size)
+        self.__coalesce_limit = max(1, coalesce_limit)
+
+        self.__lock = threading.Lock()
+        self.__queues = []
+        self.__threads = []
+
+        # The count of submit() that has selected a queue but not finished putting.
+        self.__submitting = 0
+        self.__submit_done = threading.Condition(self.__lock)
+
+    def writer_count(self) -> int:
+        return self.__writer_count
+
+    def start(self):
+        with self.__lock:
+            self.__start_writers()
+
+    def stop(self):
+        """
+        Stop all writers after the queued patches persisted.
+        """
+        with self.__lock:
+            queues, threads = self.__queues, self.__threads
+            self.__queues, self.__threads = [], []
+            # The patches that are being submitted to these queues should be queued before the quit flag.
+            # The writers are still running, so the blocked put() will finish.
+            while self.__submitting > 0:
+                self.__submit_done.wait()
+        for patch_queue in queues:
+            patch_queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def submit(self, patch: tuple, callback=None):
+        """
+        Put the patch into the writer queue of its uri. Block if the queue is full.
+        :param patch: The patch that built by UniversalDataCenter.build_local_data_patch()
+        :param callback: Function as callback(patch, result: bool). Invoked in the writer thread after persistence.
+        """
+        try:
+            uri = patch[1][0]
+        except Exception:
+            uri = ''
+        finally:
+            pass
+        # Select the queue with the lock that start() and stop() take. Put without the lock, because it may block.
+        with self.__lock:
+            self.__start_writers()
+            patch_queue = self.__queues[zlib.crc32(str(uri).encode('utf-8')) % len(self.__queues)]
+            self.__submitting += 1
+        try:
+            patch_queue.put((patch, callback))
+        finally:
+            with self.__lock:
+                self.__submitting -= 1
+                self.__submit_done.notify_all()
+
+    # --------------------------------------------------------------------------------------
+
+    def __start_writers(self):
+        # Should be called with lock
+        if len(self.__threads) > 0:
+            return
+        for index in range(self.__writer_count):
+            patch_queue = queue.Queue(maxsize=self.__queue_size)
+            thread = threading.Thread(target=self.__writer_entry, args=(patch_queue,),
+                                      name='PersistenceWriter%d' % index, daemon=True)
+            self.__queues.append(patch_queue)
+            self.__threads.append(thread)
+            thread.start()
+
+    def __writer_entry(self, patch_queue: queue.Queue):
+        quit_flag = False
+        while not quit_flag:
+            item = patch_queue.get()
+            if item is None:
+                break
+            items = [item]
+            # Take all the queued patches for coalescing
+            while len(items) < self.__coalesce_limit:
+                try:
+                    item = patch_queue.get_nowait()
+                except queue.Empty:
+                    break
+                finally:
+                    pass
+                if item is None:
+                    quit_flag = True
+                    break
+                items.append(item)
+            self.__persist(items)
+
+    def __persist(self, items: [tuple]):
+        try:
+            results = self.__data_center.apply_local_data_patches([patch for patch, _ in items])
+        except Exception as e:
+            print('Persistence error: ' + str(e))
+            print(traceback.format_exc())
+            results = [False] * len(items)
+        finally:
+            pass
+        for (patch, callback), result in zip(items, results):
+            if callback is None:
+                continue
+            try:
+                callback(patch, result)
+            except Exception as e:
+                print('Persistence callback error: ' + str(e))
+                print(traceback.format_exc())
+            finally:
+                pass
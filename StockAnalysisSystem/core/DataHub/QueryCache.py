@@ -0,0 +1,213 @@
+import time
+import threading
+import collections
+import pandas as pd
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                   QueryResultCache
+# ----------------------------------------------------------------------------------------------------------------------
+
+class QueryResultCache:
+    """
+    A bounded LRU cache for the query result of UniversalDataCenter.
+    The entries are grouped by the base uri of data agent. A write to the uri invalidates the whole group.
+    Each group has a generation number. The result that queried before the invalidation will not be put into cache.
+    The invalidation only comes from the writes of this process. So each entry expires after entry_ttl seconds,
+        the writes of other process (which share the same database) will be seen with at most entry_ttl delay.
+    """
+
+    DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+    DEFAULT_ENTRY_LIMIT = 1024
+    DEFAULT_ENTRY_TTL = 60
+
+    def __init__(self, memory_limit: int = DEFAULT_MEMORY_LIMIT, entry_limit: int = DEFAULT_ENTRY_LIMIT,
+                 entry_ttl: float or None = DEFAULT_ENTRY_TTL):
+        self.__lock = threading.Lock()
+        self.__memory_limit = memory_limit
+        self.__entry_limit = entry_limit
+        self.__entry_ttl = entry_ttl
+
+        self.__memory_usage = 0
+        self.__cache = collections.OrderedDict()        # key: (group, DataFrame, memory, expire time)
+        self.__group_keys = {}                          # group: set(key)
+        self.__group_generation = {}                    # group: int
+
+        self.__hit = 0
+        self.__miss = 0
+        self.__eviction = 0
+        self.__invalidation = 0
+        self.__expiration = 0
+
+    # ------------------------------------------------ Config ------------------------------------------------
+
+    def enabled(self) -> bool:
+        return self.__memory_limit > 0 and self.__entry_limit > 0
+
+    def set_limit(self, memory_limit: int = None, entry_limit: int = None):
+        with self.__lock:
+            if memory_limit is not None:
+                self.__memory_limit = max(0, int(memory_limit))
+            if entry_limit is not None:
+                self.__entry_limit = max(0, int(entry_limit))
+            self.__check_evict()
+
+    def set_entry_ttl(self, entry_ttl: float or None):
+        """
+        Set the seconds that an entry keeps valid. None or 0 to never expire, only if this process writes the data.
+            The entries that already in cache keep their expire time.
+        """
+        with self.__lock:
+            self.__entry_ttl = entry_ttl
+
+    # ----------------------------------------------- Operation -----------------------------------------------
+
+    def get(self, key: tuple) -> pd.DataFrame or None:
+        """
+        Get the cached result by key. The returned DataFrame is a copy so the caller can modify it freely.
+        :param key: The key that built by make_key()
+        :return: A copy of cached DataFrame. None if not cached.
+        """
+        if key is None:
+            return None
+        with self.__lock:
+            entry = self.__cache.get(key, None)
+            if entry is not None and entry[3] is not None and time.monotonic() >= entry[3]:
+                self.__remove_entry(key)
+                self.__expiration += 1
+                entry = None
+            if entry is None:
+                self.__miss += 1
+                return None
+            self.__cache.move_to_end(key)
+            self.__hit += 1
+            df = entry[1]
+        return df.copy()
+
+    def put(self, group: str, key: tuple, df: pd.DataFrame, generation: int = None) -> bool:
+        """
+        Put the query result into cache.
+        :param group: The group of this entry. Use the base uri of data agent.
+        :param key: The key that built by make_key()
+        :param df: The query result. It will be copied.
+        :param generation: The group generation which gets before query. If it's changed, the result is out of date.
+        :return: True if cached else False
+        """
+        if key is None or not isinstance(df, pd.DataFrame) or not self.enabled():
+            return False
+        memory = QueryResultCache.dataframe_memory(df)
+        if memory > self.__memory_limit:
+            return False
+        df = df.copy()
+        with self.__lock:
+            if generation is not None and generation != self.__group_generation.get(group, 0):
+                return False
+            self.__remove_entry(key)
+            expire_time = time.monotonic() + self.__entry_ttl \
+                if self.__entry_ttl is not None and self.__entry_ttl > 0 else None
+            self.__cache[key] = (group, df, memory, expire_time)
+            self.__group_keys.setdefault(group, set()).add(key)
+            self.__memory_usage += memory
+            self.__check_evict()
+        return True
+
+    def generation(self, group: str) -> int:
+        with self.__lock:
+            return self.__group_generation.get(group, 0)
+
+    def invalidate(self, group: str):
+        with self.__lock:
+            self.__group_generation[group] = self.__group_generation.get(group, 0) + 1
+            keys = self.__group_keys.pop(group, set())
+            for key in keys:
+                self.__remove_entry(key)
+            self.__invalidation += len(keys)
+
+    def clear(self):
+        with self.__lock:
+            for group in self.__group_keys.keys():
+                self.__group_generation[group] = self.__group_generation.get(group, 0) + 1
+            self.__invalidation += len(self.__cache)
+            self.__cache.clear()
+            self.__group_keys.clear()
+            self.__memory_usage = 0
+
+    def statistics(self) -> dict:
+        with self.__lock:
+            total = self.__hit + self.__miss
+            return {
+                'hit': self.__hit,
+                'miss': self.__miss,
+                'hit_rate': (self.__hit / total) if total > 0 else 0.0,
+                'eviction': self.__eviction,
+                'invalidation': self.__invalidation,
+                'expiration': self.__expiration,
+                'entry_count': len(self.__cache),
+                'entry_limit': self.__entry_limit,
+                'memory_usage': self.__memory_usage,
+                'memory_limit': self.__memory_limit,
+                'entry_ttl': self.__entry_ttl,
+            }
+
+    def reset_statistics(self):
+        with self.__lock:
+            self.__hit = 0
+            self.__miss = 0
+            self.__eviction = 0
+            self.__invalidation = 0
+            self.__expiration = 0
+
+    # ----------------------------------------------- Assistance -----------------------------------------------
+
+    @staticmethod
+    def make_key(uri: str, identity: str or [str], time_serial: tuple, extra: dict) -> tuple or None:
+        """
+        Build a hashable key from the query parameters.
+        :return: The key tuple. None if the parameters cannot be hashed, which means do not cache.
+        """
+        try:
+            key = (uri,
+                   QueryResultCache.__hashable(identity),
+                   QueryResultCache.__hashable(time_serial),
+                   QueryResultCache.__hashable(extra if extra is not None else {}))
+            hash(key)
+            return key
+        except Exception:
+            return None
+        finally:
+            pass
+
+    @staticmethod
+    def dataframe_memory(df: pd.DataFrame) -> int:
+        try:
+            return int(df.memory_usage(index=True, deep=True).sum())
+        except Exception:
+            return 0
+        finally:
+            pass
+
+    @staticmethod
+    def __hashable(value: any) -> any:
+        if isinstance(value, dict):
+            return tuple(sorted((k, QueryResultCache.__hashable(v)) for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(QueryResultCache.__hashable(v) for v in value)
+        if isinstance(value, set):
+            return tuple(sorted(QueryResultCache.__hashable(v) for v in value))
+        return value
+
+    def __remove_entry(self, key: tuple):
+        entry = self.__cache.pop(key, None)
+        if entry is not None:
+            group, _, memory, _ = entry
+            self.__memory_usage -= memory
+            keys = self.__group_keys.get(group, None)
+            if keys is not None:
+                keys.discard(key)
+
+    def __check_evict(self):
+        while len(self.__cache) > 0 and \
+                (len(self.__cache) > self.__entry_limit or self.__memory_usage > self.__memory_limit):
+            key = next(iter(self.__cache))
+            self.__remove_entry(key)
+            self.__eviction += 1
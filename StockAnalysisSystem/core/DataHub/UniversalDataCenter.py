@@ -1,4 +1,6 @@
+import re
 from .DataAgent import *
+from .QueryCache import QueryResultCache
 from ..Utility.common import *
 from ..Utility.df_utility import *
 from ..Utility.time_utility import *
@@ -13,6 +15,12 @@ from ..Utility.plugin_manager import PluginManager
 # ----------------------------------------------------------------------------------------------------------------------
 
 class UniversalDataCenter:
+    # The uri routing result is cached. The cache is cleared if it's too large (for the uri that has no agent).
+    ROUTE_CACHE_LIMIT = 4096
+
+    # The max identity count of a depot query in query_batch(). A larger list is split into chunks.
+    BATCH_IDENTITY_LIMIT = 1000
+
     def __init__(self, database_entry: DatabaseEntry, collector_plugin: PluginManager):
         self.__database_entry = database_entry
         self.__plugin_manager = collector_plugin
@@ -22,9 +30,23 @@ class UniversalDataCenter:
 
         self.__last_error = ''
         self.__data_agent = []
+
+        # The uri routing table that built by register_data_agent()
+        #   uri: (register order, agent). The case sensitive and the case insensitive (lower) one.
+        #   [(register order, agent, matcher)]: The agent that adapts uri by regex or function.
+        #   uri: agent or None. The routing result.
+        self.__exact_route = {}
+        self.__lower_route = {}
+        self.__fallback_route = []
+        self.__route_cache = {}
+
+        # The field declaration table, it's rebuilt if collector plugins changed.
         self.__field_uri_dict = {}
         self.__field_readable_dict = {}
         self.__readable_field_dict = {}
+        self.__field_declaration_revision = None
+
+        self.__query_cache = QueryResultCache()
 
     def get_plugin_manager(self) -> PluginManager:
         return self.__plugin_manager
@@ -39,10 +61,14 @@ class UniversalDataCenter:
         return self.__data_agent
 
     def get_data_agent(self, uri: str) -> DataAgent or None:
-        for agent in self.__data_agent:
-            if agent.adapt(uri):
-                return agent
-        return None
+        route_cache = self.__route_cache
+        if uri in route_cache:
+            return route_cache[uri]
+        agent = self.__route_data_agent(uri)
+        if len(route_cache) >= UniversalDataCenter.ROUTE_CACHE_LIMIT:
+            route_cache.clear()
+        route_cache[uri] = agent
+        return agent
 
     def get_last_error(self) -> str:
         return self.__last_error
@@ -59,12 +85,99 @@ class UniversalDataCenter:
     def register_data_agent(self, agent: DataAgent):
         if agent not in self.__data_agent:
             self.__data_agent.append(agent)
+            agent.add_write_observer(self.__on_agent_data_written)
+            self.__add_agent_route(len(self.__data_agent) - 1, agent)
+
+    # ---------------------------------------------------- Routing -----------------------------------------------------
+
+    def __add_agent_route(self, order: int, agent: DataAgent):
+        """
+        Add the agent to the routing table by its adapt declaration. The same as DataAgent.adapt():
+            None                : The base uri, case insensitive.
+            str / list of str   : The exact uri, case sensitive.
+            Regex / Callable    : Checked one by one if the exact uri does not route to an earlier agent.
+        The agent that overrides adapt() is always checked by adapt().
+        """
+        adapt = agent.extra_param('adapt')
+        if type(agent).adapt is not DataAgent.adapt:
+            self.__fallback_route.append((order, agent, agent.adapt))
+        elif adapt is None:
+            self.__lower_route.setdefault(agent.base_uri().lower(), (order, agent))
+        elif isinstance(adapt, str):
+            self.__exact_route.setdefault(adapt, (order, agent))
+        elif isinstance(adapt, (set, list, tuple)):
+            for uri in adapt:
+                self.__exact_route.setdefault(uri, (order, agent))
+        elif isinstance(adapt, re.Pattern):
+            self.__fallback_route.append((order, agent, lambda uri, _adapt=adapt: _adapt.fullmatch(uri) is not None))
+        elif callable(adapt):
+            self.__fallback_route.append((order, agent, adapt))
+        self.__route_cache = {}
+
+    def __route_data_agent(self, uri: str) -> DataAgent or None:
+        if not isinstance(uri, str):
+            return None
+        routes = [route for route in (self.__exact_route.get(uri), self.__lower_route.get(uri.lower()))
+                  if route is not None]
+        order, agent = min(routes, key=lambda route: route[0]) if len(routes) > 0 else (len(self.__data_agent), None)
+        # The agent that registered earlier has higher priority
+        for fallback_order, fallback_agent, matcher in self.__fallback_route:
+            if fallback_order >= order:
+                break
+            try:
+                if matcher(uri):
+                    return fallback_agent
+            except Exception as e:
+                print('Route data agent error: ' + str(e))
+            finally:
+                pass
+        return agent
+
+    # -------------------------------------------------- Query Cache ---------------------------------------------------
+
+    def get_query_cache(self) -> QueryResultCache:
+        return self.__query_cache
+
+    def config_query_cache(self, memory_limit: int = None, entry_limit: int = None, entry_ttl: float = None):
+        """
+        Config the query result cache. Set any limit to 0 will disable the cache.
+        :param memory_limit: The max memory (in bytes) that cache can use. None to keep current setting.
+        :param entry_limit: The max entry count of cache. None to keep current setting.
+        :param entry_ttl: The seconds that a cached result keeps valid. 0 to never expire. None to keep current setting.
+        :return: None
+        """
+        self.__query_cache.set_limit(memory_limit, entry_limit)
+        if entry_ttl is not None:
+            self.__query_cache.set_entry_ttl(entry_ttl)
+        if not self.__query_cache.enabled():
+            self.__query_cache.clear()
+
+    def query_cache_statistics(self) -> dict:
+        return self.__query_cache.statistics()
+
+    def __on_agent_data_written(self, agent: DataAgent, uri: str, identity: str or [str]):
+        nop(uri, identity)
+        self.__query_cache.invalidate(agent.base_uri())
 
     # ------------------------------------------------ Data Management -------------------------------------------------
 
     def query(self, uri: str, identity: str or [str] = None,
               time_serial: tuple = None, **extra) -> pd.DataFrame or None:
+        agent = self.get_data_agent(uri) if self.__query_cache.enabled() else None
+        if agent is None:
+            return self.query_from_local(uri, identity, time_serial, **extra)
+
+        cache_key = QueryResultCache.make_key(uri, identity, time_serial, extra)
+        result = self.__query_cache.get(cache_key)
+        if result is not None:
+            return result
+
+        # Get generation before query. If the uri is written during query, the result will not be cached.
+        generation = self.__query_cache.generation(agent.base_uri())
         result = self.query_from_local(uri, identity, time_serial, **extra)
+        if result is not None:
+            self.__query_cache.put(agent.base_uri(), cache_key, result, generation)
+
         # TODO: It's not a good way. Some problem need to be resolved.
         # 1.The field not exists at all
         # 2.Query multiple fields, some of them not persist on local
@@ -72,6 +185,59 @@ class UniversalDataCenter:
         #     result = self.query_from_plugin(uri, identity, time_serial, **extra)
         return result
 
+    def query_batch(self, uri: str or [str], identity: [str] = None, time_serial: tuple = None,
+                    group_by: str = '', **extra) -> pd.DataFrame or dict or None:
+        """
+        Query the data of multiple securities (and multiple uris) with one depot query per uri,
+            instead of one query per security. The identity list is queried in chunks of BATCH_IDENTITY_LIMIT.
+        :param uri: The uri or the uri list
+        :param identity: The identity list. None or '' for all.
+        :param time_serial: The same as query()
+        :param group_by: '' - The result of an uri is a DataFrame.
+                         'identity' - The result of an uri is a dict of identity: DataFrame.
+                                      The identity that has no data is not in the dict.
+        :param extra: The same as query()
+        :return: The result of uri if uri is str, else the dict of uri: result. The result is None if query fail.
+        """
+        if not isinstance(uri, (list, tuple, set)):
+            return self.__query_batch_uri(uri, identity, time_serial, group_by, extra)
+        return {u: self.__query_batch_uri(u, identity, time_serial, group_by, extra) for u in uri}
+
+    def __query_batch_uri(self, uri: str, identity: [str], time_serial: tuple,
+                          group_by: str, extra: dict) -> pd.DataFrame or dict or None:
+        extra = extra.copy()
+        group_column = None
+        if group_by == 'identity':
+            agent = self.get_data_agent(uri)
+            group_column = agent.identity_field() if agent is not None else None
+            if not str_available(group_column):
+                self.log_error('Cannot group by identity for : ' + uri)
+                return None
+            if extra.get('fields', None) is not None:
+                if extra.get('readable', False):
+                    group_column = self.field_map_readable([group_column])[group_column]
+                if group_column not in extra['fields']:
+                    extra['fields'] = list(extra['fields']) + [group_column]
+
+        if isinstance(identity, (list, tuple, set)):
+            identity = list(dict.fromkeys(identity))
+            limit = UniversalDataCenter.BATCH_IDENTITY_LIMIT
+            frames = [self.query(uri, identity[i:i + limit], time_serial, **extra)
+                      for i in range(0, len(identity), limit)]
+            frames = [df for df in frames if df is not None]
+            if len(frames) == 0:
+                result = None if len(identity) > 0 else pd.DataFrame()
+            else:
+                result = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        else:
+            result = self.query(uri, identity, time_serial, **extra)
+
+        if group_column is None or result is None:
+            return result
+        if group_column not in result.columns:
+            return {}
+        return {k: df.reset_index(drop=True) for k, df in result.groupby(group_column, sort=False)}
+
     def query_from_local(self, uri: str, identity: str or [str] = None,
                          time_serial: tuple = None, **extra) -> pd.DataFrame or None:
         extra_param = extra.copy() if extra is not None else {}
@@ -250,6 +416,76 @@ class UniversalDataCenter:
 
         # ----------------------- Update Table ----------------------
 
+        return self.__update_patch_range(uri, identity, since, until)
+
+    def apply_local_data_patches(self, patches: [tuple]) -> [bool]:
+        """
+        Merge and persistence the patches. The successive patches of the same uri are coalesced into one bulk write.
+        The patches of the same identity will not be coalesced, so the write order of each record is kept.
+        :param patches: The list of patch that built by build_local_data_patch()
+        :return: The list of result of each patch
+        """
+        results = [False] * len(patches)
+        for group in self.__group_coalesce_patches(patches):
+            if len(group) == 1:
+                index = group[0]
+                results[index] = self.apply_local_data_patch(patches[index])
+                continue
+
+            params_list = [patches[index][1] for index in group]
+            uri, table = params_list[0][0], params_list[0][4]
+            identities = [params[1] for params in params_list]
+            try:
+                clock = Clock()
+                df = pd.concat([patches[index][2] for index in group], axis=0, ignore_index=True, sort=False)
+                ret = table.merge(uri, identities, df)
+                if ret:
+                    print('%s: [%s identities] - Coalesced persistence finished, time spending: %sms' %
+                          (uri, len(identities), clock.elapsed_ms()))
+                else:
+                    print('%s: [%s identities] - Coalesced persistence fail' % (uri, len(identities)))
+            except Exception as e:
+                print(e)
+                print(traceback.format_exc())
+                ret = False
+            finally:
+                pass
+            if not ret:
+                continue
+            for index, params in zip(group, params_list):
+                _uri, identity, since, until, _ = params
+                results[index] = self.__update_patch_range(uri, identity, since, until)
+        return results
+
+    def __group_coalesce_patches(self, patches: [tuple]) -> [[int]]:
+        groups = []
+        group, group_key, group_identities = [], None, set()
+        for index, patch in enumerate(patches):
+            try:
+                ret, params, result = patch
+                coalescable = ret and isinstance(result, pd.DataFrame) and len(result) > 0
+                key = (params[0], id(params[4])) if coalescable else None
+                identity = params[1] if coalescable else None
+                identity = tuple(identity) if isinstance(identity, list) else identity
+            except Exception:
+                key, identity = None, None
+            finally:
+                pass
+            if key is None or key != group_key or identity in group_identities:
+                if len(group) > 0:
+                    groups.append(group)
+                group, group_key, group_identities = [], key, set()
+            group.append(index)
+            group_identities.add(identity)
+            if key is None:
+                # Not coalescable patch, process it alone.
+                groups.append(group)
+                group, group_key, group_identities = [], None, set()
+        if len(group) > 0:
+            groups.append(group)
+        return groups
+
+    def __update_patch_range(self, uri: str, identity: str, since: datetime.datetime, until: datetime.datetime) -> bool:
         try:
             # Cache the update range in Update Table
 
@@ -411,16 +647,25 @@ class UniversalDataCenter:
         return {r: self.__readable_field_dict.get(r, r) for r in readable}
 
     def __check_cache_fields_declaration(self):
-        if len(self.__field_readable_dict) > 0 and len(self.__readable_field_dict) > 0:
+        revision = self.get_plugin_manager().revision()
+        if self.__field_declaration_revision == revision:
             return
-        field_probs = self.get_plugin_manager().execute_module_function(
-            self.get_plugin_manager().all_modules(), 'fields', {}, False)
+        field_uri_dict = {}
+        field_readable_dict = {}
+        readable_field_dict = {}
+        # The fields declarations are kept in the plugin index, the plugins are not imported for them.
+        field_probs = self.get_plugin_manager().get_declarations('fields')
         for field_prob in field_probs:
             for uri, field_declare in field_prob.items():
                 for field, readable in field_declare.items():
-                    self.__field_uri_dict[field] = uri
-                    self.__field_readable_dict[field] = readable
-                    self.__readable_field_dict[readable] = field
+                    field_uri_dict[field] = uri
+                    field_readable_dict[field] = readable
+                    readable_field_dict[readable] = field
+        # Replace the tables at last, the readers in other threads always see a complete table.
+        self.__field_uri_dict = field_uri_dict
+        self.__field_readable_dict = field_readable_dict
+        self.__readable_field_dict = readable_field_dict
+        self.__field_declaration_revision = revision
 
 
 
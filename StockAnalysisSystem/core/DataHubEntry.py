@@ -21,6 +21,14 @@ class DataHubEntry:
         self.__data_center = UniversalDataCenter(database_entry, collector_plugin)
         self.__data_utility = DataUtility(self.__data_center)
 
+        cache_config = config.get('QUERY_CACHE', None)
+        if isinstance(cache_config, dict):
+            self.config_query_cache(cache_config)
+
+        update_config = config.get('DATA_UPDATE', None)
+        if isinstance(update_config, dict):
+            self.config_data_update(update_config)
+
         self.__data_agents = []
         self.build_data_agent()
 
@@ -41,8 +49,37 @@ class DataHubEntry:
 
     # ------------------------------------------------------------------------------------------------------------------
 
+    def config_query_cache(self, cache_config: dict):
+        try:
+            memory_limit_mb = cache_config.get('memory_limit_mb', None)
+            entry_limit = cache_config.get('entry_limit', None)
+            entry_ttl_sec = cache_config.get('entry_ttl_sec', None)
+            self.__data_center.config_query_cache(
+                int(float(memory_limit_mb) * 1024 * 1024) if memory_limit_mb is not None else None,
+                int(entry_limit) if entry_limit is not None else None,
+                float(entry_ttl_sec) if entry_ttl_sec is not None else None)
+        except Exception as e:
+            print('Config query cache fail: ' + str(e))
+        finally:
+            pass
+
+    def config_data_update(self, update_config: dict):
+        try:
+            self.__data_utility.set_update_option(update_config.get('fetch_workers', None),
+                                                  update_config.get('patch_queue_size', None),
+                                                  update_config.get('persistence_workers', None),
+                                                  update_config.get('coalesce_limit', None))
+        except Exception as e:
+            print('Config data update fail: ' + str(e))
+        finally:
+            pass
+
     def build_data_agent(self):
-        self.__data_agents = build_data_agent(self.__database_entry)
+        depot_config = self.__config.get('DATA_DEPOT', {})
+        depot_path = self.__config.get('DATA_DEPOT_PATH', '')
+        if not str_available(depot_path):
+            depot_path = os.path.join(StockAnalysisSystem().get_project_path(), 'Data', 'Depot')
+        self.__data_agents = build_data_agent(self.__database_entry, depot_config, depot_path)
         for agent in self.__data_agents:
             self.get_data_center().register_data_agent(agent)
 
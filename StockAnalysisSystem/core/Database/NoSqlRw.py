@@ -142,6 +142,33 @@ class ItkvTable:
             # self.__client.close()
         return ret
 
+    def bulk_update(self, updates: [(str, dict)], ordered: bool = False) -> dict or None:
+        """ Update records by update operators (like $min, $max, $set) in one round trip. Insert if not exists.
+        Args:
+            updates     : list of (identity, update), the update is the update document of mongodb
+            ordered     : Whether the updates are applied in order
+        Return value:
+            The result of API returns, None if fail
+        Raises:
+            None
+        """
+        collection = self.__get_collection()
+        if collection is None or len(updates) == 0:
+            return None
+        operations = []
+        for identity, update in updates:
+            spec, _ = self.__gen_upsert_spec_and_document(identity, None, {})
+            operations.append(UpdateOne(spec, update, upsert=True))
+        try:
+            ret = collection.bulk_write(operations, ordered=ordered)
+        except Exception as e:
+            ret = None
+            print('ItkvTable.bulk_update() fail: ')
+            print(e)
+        finally:
+            pass
+        return ret
+
     # ----------------------------------------------- Single Operations ------------------------------------------------
 
     def upsert(self, identity: str, time: datetime or str, data: dict, extra_spec: dict = None) -> dict or None:
@@ -1,3 +1,6 @@
+import time
+import atexit
+import threading
 import traceback
 from pymongo import MongoClient
 
@@ -6,36 +9,61 @@ from ..Utility.time_utility import *
 
 
 class UpdateTableEx:
-    def __init__(self, client: MongoClient, database: str = 'StockAnalysisSystem', table: str = 'UpdateTable'):
+    """
+    The update records are loaded at the first access and served from memory.
+    The updates are written back in bulk (write-behind) when flush() is called, when the count of dirty records
+        reaches the threshold, and at exit.
+    The since, until and last_update are written by $min, $max and $max. So flushing the same records repeatedly or
+        by multiple process will not make the range go backward. If the process crashes before flushing, the update
+        range of the data is lost but the data is already persisted, which only leads to fetching it again.
+    The memory records are applied by the same min/max rule. They are loaded once and kept by default.
+        If other process also writes the table, set record_ttl to re-read the records after record_ttl seconds,
+        then the updates of other process will be seen with at most record_ttl delay. The pending updates, including
+        the ones that are being flushed, are kept over the re-read.
+    """
+
+    DEFAULT_FLUSH_THRESHOLD = 1000
+
+    def __init__(self, client: MongoClient, database: str = 'StockAnalysisSystem', table: str = 'UpdateTable',
+                 flush_threshold: int = DEFAULT_FLUSH_THRESHOLD, record_ttl: float or None = None):
         self.__table = ItkvTable(client, database, table, 'tags', 'last_update')
+        self.__flush_threshold = flush_threshold
+        self.__record_ttl = record_ttl
+
+        self.__lock = threading.RLock()
+        self.__records = None           # tags: {field: value}
+        self.__loaded_time = 0.0        # The monotonic time of the last records loading
+        self.__dirty = {}               # tags: {field: value}
+        self.__flushing = {}            # tags: {field: value}, the dirty records that are being written
+        self.__flush_lock = threading.Lock()
+        self.__failed_count = 0         # The dirty count of last failed flush. Avoid retrying on each update.
+
+        atexit.register(self.flush)
 
     # ------------------------------------ Gets ------------------------------------
 
     def get_since(self, tags: [str]):
-        record = self.__table.query(self.__normalize_tags(tags), keys=['since'])
-        return record[0].get('since') if record is not None and len(record) > 0 else None
+        return self.__get_field(tags, 'since')
 
     def get_until(self, tags: [str]):
-        record = self.__table.query(self.__normalize_tags(tags), keys=['until'])
-        return record[0].get('until') if record is not None and len(record) > 0 else None
+        return self.__get_field(tags, 'until')
 
     def get_since_until(self, tags: [str]):
-        record = self.__table.query(self.__normalize_tags(tags), keys=['since', 'until'])
-        return record[0].get('since') if record is not None and len(record) > 0 else None, \
-               record[0].get('until') if record is not None and len(record) > 0 else None
+        return self.__get_field(tags, 'since'), self.__get_field(tags, 'until')
 
     def get_last_update_time(self, tags: [str]):
-        record = self.__table.query(self.__normalize_tags(tags), keys=['last_update'])
-        return record[0].get('last_update') if record is not None and len(record) > 0 else None
+        return self.__get_field(tags, 'last_update')
 
     def get_all_time(self, tags: [str]):
-        record = self.__table.query(self.__normalize_tags(tags), keys=['since', 'until', 'last_update'])
-        return record[0].get('since') if record is not None and len(record) > 0 else None, \
-               record[0].get('until') if record is not None and len(record) > 0 else None, \
-               record[0].get('last_update') if record is not None and len(record) > 0 else None
+        return self.__get_field(tags, 'since'), \
+               self.__get_field(tags, 'until'), \
+               self.__get_field(tags, 'last_update')
 
     def get_update_record(self, tags: [str]):
-        return self.__table.query(self.__normalize_tags(tags))
+        normalized_tags = self.__normalize_tags(tags)
+        with self.__lock:
+            record = self.__load_records().get(normalized_tags, None)
+            return [] if record is None else [dict(record, tags=normalized_tags)]
 
     # ----------------------------------- Updates -----------------------------------
 
@@ -46,7 +74,7 @@ class UpdateTableEx:
         old_since = self.get_since(tags)
         if old_since is None or since < old_since:
             # print('Update since: ' + str(tags) + ' -> ' + str(since))
-            self.__table.upsert(self.__normalize_tags(tags), None, data={'since': since})
+            self.__set_field(tags, 'since', since)
         return True
 
     def update_until(self, tags: [str], until: datetime or str) -> bool:
@@ -56,7 +84,7 @@ class UpdateTableEx:
         old_until = self.get_until(tags)
         if old_until is None or until > old_until:
             # print('Update until: ' + str(tags) + ' -> ' + str(until))
-            self.__table.upsert(self.__normalize_tags(tags), None, data={'until': until})
+            self.__set_field(tags, 'until', until)
         return True
 
     def update_update_range(self, tags: [str], since: datetime or str, until: datetime or str) -> bool:
@@ -64,21 +92,137 @@ class UpdateTableEx:
         ret2 = self.update_until(tags, until)
         return ret1 and ret2
 
-    def update_latest_update_time(self, tags: [str]) -> bool:
+    def update_latest_update_time(self, tags: [str], update_time: datetime = None) -> bool:
         # print('Update latest update time: ' + str(tags) + ' -> ' + str(now()))
-        self.__table.upsert(self.__normalize_tags(tags), None, data={'last_update': now()})
+        self.__set_field(tags, 'last_update', now() if update_time is None else update_time)
         return True
 
     def delete_update_record(self, tags: [str]) -> bool:
-        self.__table.delete(self.__normalize_tags(tags))
+        normalized_tags = self.__normalize_tags(tags)
+        with self.__lock:
+            self.__load_records().pop(normalized_tags, None)
+            self.__dirty.pop(normalized_tags, None)
+            self.__table.delete(normalized_tags)
         return True
 
     def clear_update_records(self) -> bool:
-        self.__table.drop()
+        with self.__lock:
+            self.__records = {}
+            self.__dirty.clear()
+            self.__table.drop()
+        return True
+
+    # ----------------------------------- Persistence -----------------------------------
+
+    def flush(self) -> bool:
+        """
+        Write all the dirty records to database in one round trip.
+        :return: True if successful or nothing to flush. If fails, the dirty records are kept for next flush.
+        """
+        with self.__flush_lock:
+            return self.__flush()
+
+    def __flush(self) -> bool:
+        with self.__lock:
+            dirty, self.__dirty = self.__dirty, {}
+            # Keep them for the records re-read until they are written
+            self.__flushing = dirty
+        if len(dirty) == 0:
+            return True
+
+        updates = []
+        for tags, fields in dirty.items():
+            update = {}
+            for field, value in fields.items():
+                operator = '$min' if field == 'since' else '$max'
+                update.setdefault(operator, {})[field] = value
+            updates.append((tags, update))
+
+        ret = self.__table.bulk_update(updates)
+        if ret is None:
+            print('UpdateTableEx: Flush %s records fail. Keep them for next flush.' % len(dirty))
+            with self.__lock:
+                for tags, fields in dirty.items():
+                    for field, value in fields.items():
+                        self.__mark_dirty(tags, field, value)
+                self.__flushing = {}
+                self.__failed_count = len(self.__dirty)
+            return False
+        with self.__lock:
+            self.__flushing = {}
+            self.__failed_count = 0
         return True
 
+    def reload(self):
+        """
+        Flush the dirty records and drop the memory records. They will be loaded again at the next access.
+        Call it if the update table is modified by other process.
+        """
+        self.flush()
+        with self.__lock:
+            self.__records = None
+
     # ------------------------------------------------------------------------------------------------------------------
 
+    def __load_records(self) -> dict:
+        if self.__records is None or self.__records_expired():
+            records = None
+            try:
+                records = {}
+                for record in self.__table.query():
+                    tags = record.get('tags', None)
+                    if tags is None:
+                        continue
+                    records[tags] = {k: v for k, v in record.items() if k in ['since', 'until', 'last_update']}
+            except Exception as e:
+                records = None
+                print('UpdateTableEx: Load records fail: ' + str(e))
+                print(traceback.format_exc())
+            finally:
+                pass
+            if records is not None:
+                # The pending updates are not in database yet
+                for pending in [self.__flushing, self.__dirty]:
+                    for tags, fields in pending.items():
+                        for field, value in fields.items():
+                            self.__apply_field(records.setdefault(tags, {}), field, value)
+                self.__records = records
+            elif self.__records is None:
+                self.__records = {}
+            self.__loaded_time = time.monotonic()
+        return self.__records
+
+    def __records_expired(self) -> bool:
+        return self.__record_ttl is not None and self.__record_ttl > 0 and \
+            time.monotonic() - self.__loaded_time >= self.__record_ttl
+
+    def __get_field(self, tags: [str], field: str):
+        with self.__lock:
+            record = self.__load_records().get(self.__normalize_tags(tags), None)
+            return record.get(field, None) if record is not None else None
+
+    def __set_field(self, tags: [str], field: str, value: datetime):
+        normalized_tags = self.__normalize_tags(tags)
+        with self.__lock:
+            if not self.__apply_field(self.__load_records().setdefault(normalized_tags, {}), field, value):
+                return
+            self.__mark_dirty(normalized_tags, field, value)
+            need_flush = len(self.__dirty) >= self.__failed_count + self.__flush_threshold
+        if need_flush:
+            self.flush()
+
+    def __mark_dirty(self, tags: str, field: str, value: datetime):
+        self.__apply_field(self.__dirty.setdefault(tags, {}), field, value)
+
+    @staticmethod
+    def __apply_field(fields: dict, field: str, value: datetime) -> bool:
+        # The same rule as flush: $min for since and $max for the others. Return True if the value is applied.
+        old_value = fields.get(field, None)
+        if old_value is None or (value < old_value if field == 'since' else value > old_value):
+            fields[field] = value
+            return True
+        return False
+
     def __normalize_tags(self, tags: [str]) -> str:
         return ('.'.join(tags)).replace(' ', '') if isinstance(tags, (list, tuple)) else str(tags).strip()
 
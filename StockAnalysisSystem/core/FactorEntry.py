@@ -21,6 +21,10 @@ def wrap_list(val: any):
 class FactorCenter:
     FACTOR_PROB_LENGTH = 7
 
+    # The factors are materialized in this uri. Keyed by stock_identity and period.
+    MATERIALIZE_URI = 'Factor.Finance'
+    MATERIALIZE_CHUNK = 100
+
     def __init__(self, data_hub, database: DatabaseEntry, factor_plugin: PluginManager):
         self.__data_hub_entry = data_hub
         self.__database_entry = database
@@ -48,11 +52,26 @@ class FactorCenter:
 
     def query(self, stock_identity: str, factor_name: str or [str],
               time_serial: tuple, mapping: dict, extra: dict) -> pd.DataFrame or None:
+        """
+        Query factors. The materialized factors are read from Factor.Finance directly.
+        If the factor is not materialized, or the source data of the security updated after materialization,
+            or the mapping is specified, the factor is calculated from the source data.
+        :param extra: Specify 'materialized': False to calculate all factors from the source data.
+        """
         # if self.__data_hub_entry is None:
         #     return None
         if not isinstance(factor_name, (list, tuple)):
             factor_name = [factor_name]
+        extra = extra if extra is not None else {}
+
+        if (mapping is None or len(mapping) == 0) and extra.get('materialized', True):
+            df = self.__query_materialized(stock_identity, factor_name, time_serial, extra)
+            if df is not None:
+                return df
+        return self.__calculate(stock_identity, factor_name, time_serial, mapping, extra)
 
+    def __calculate(self, stock_identity: str or [str], factor_name: [str],
+                    time_serial: tuple, mapping: dict, extra: dict) -> pd.DataFrame:
         df = pd.DataFrame()
         fields_dependency, factor_dependency = self.calculate_factor_dependency(factor_name)
 
@@ -76,6 +95,187 @@ class FactorCenter:
             df = result[0] if len(df) == 0 else pd.merge(df, result[0], how='left', on=['stock_identity', 'period'])
         return df
 
+    # ------------------------------------------------- Materialize --------------------------------------------------
+
+    def materialize(self, securities: [str] = None, force: bool = False, progress: ProgressRate = None) -> int:
+        """
+        Calculate all factors and persist them to Factor.Finance. Then the factor query is just a lookup.
+        Only the securities whose source data updated after the last materialization are calculated,
+            and only the periods since the last materialized period of the security are re-calculated.
+        If there's new factor that has not been materialized, all periods of all securities are re-calculated.
+        :param securities: The securities to materialize. None for all stocks.
+        :param force: If True, re-calculate all periods of all securities.
+        :param progress: The progress rate, None if you don't need the progress updating.
+        :return: The count of calculated securities
+        """
+        data_center = self.__data_hub_entry.get_data_center()
+        update_table = data_center.get_update_table()
+        if update_table is None:
+            print('FactorCenter: No update table, cannot materialize factors.')
+            return 0
+        if securities is None:
+            securities = self.__data_hub_entry.get_data_utility().get_stock_identities()
+        elif not isinstance(securities, (list, tuple)):
+            securities = [securities]
+
+        factors = self.get_all_factors()
+        source_uris = self.factor_source_uris(factors)
+        full = force or len(self.unmaterialized_factors(factors)) > 0
+        if full or self.__source_extended(source_uris):
+            # The market wide update does not record the update time of each security.
+            # So all securities are re-calculated since the last materialized period.
+            stale = list(securities)
+        else:
+            stale = self.stale_securities(securities, source_uris)
+
+        # Group the securities by the recalculate start period, so each group can be queried at once.
+        groups = {}
+        for s in stale:
+            since = None if full else update_table.get_until(self.__security_tags(s))
+            groups.setdefault(since, []).append(s)
+
+        clock = Clock()
+        calc_time = now()
+        if progress is not None:
+            progress.set_progress(self.MATERIALIZE_URI, 0, len(stale))
+
+        count = 0
+        for since, group in groups.items():
+            for index in range(0, len(group), self.MATERIALIZE_CHUNK):
+                chunk = group[index:index + self.MATERIALIZE_CHUNK]
+                df = self.__calculate(chunk, factors, (since, None) if since is not None else None, {}, {})
+                self.__persist_materialized(chunk, factors, df, calc_time)
+                count += len(chunk)
+                if progress is not None:
+                    progress.set_progress(self.MATERIALIZE_URI, count, len(stale))
+
+        for factor in factors:
+            update_table.update_latest_update_time(self.__factor_tags(factor), calc_time)
+        for uri in source_uris:
+            update_table.update_until(self.__source_tags(uri), update_table.get_until(uri.split('.')))
+        update_table.update_latest_update_time(self.MATERIALIZE_URI.split('.'), calc_time)
+        update_table.flush()
+
+        if progress is not None:
+            progress.finish_progress(self.MATERIALIZE_URI)
+        print('FactorCenter: %d of %d securities materialized, time spending: %sms' %
+              (count, len(securities), clock.elapsed_ms()))
+        return count
+
+    def unmaterialized_factors(self, factors: [str] = None) -> [str]:
+        update_table = self.__data_hub_entry.get_data_center().get_update_table()
+        factors = self.get_all_factors() if factors is None else factors
+        if update_table is None:
+            return list(factors)
+        return [f for f in factors if update_table.get_last_update_time(self.__factor_tags(f)) is None]
+
+    def factor_source_uris(self, factors: [str]) -> [str]:
+        """
+        Get the uris of the source data that the factors depend on.
+        """
+        fields_dependency, _ = self.calculate_factor_dependency(factors)
+        group = self.__data_hub_entry.get_data_center().readable_to_uri(fields_dependency)
+        return [uri for uri in group.keys() if uri != 'None']
+
+    def stale_securities(self, securities: [str], source_uris: [str]) -> [str]:
+        """
+        Find the securities that are not materialized or the source data updated after the last materialization.
+        """
+        update_table = self.__data_hub_entry.get_data_center().get_update_table()
+        uri_update_time = {uri: update_table.get_last_update_time(uri.split('.')) for uri in source_uris}
+
+        stale = []
+        for s in securities:
+            materialize_time = update_table.get_last_update_time(self.__security_tags(s))
+            if materialize_time is None:
+                stale.append(s)
+                continue
+            for uri in source_uris:
+                update_time = update_table.get_last_update_time(uri.split('.') + [s.replace('.', '_')])
+                if update_time is None:
+                    update_time = uri_update_time.get(uri, None)
+                if update_time is not None and update_time > materialize_time:
+                    stale.append(s)
+                    break
+        return stale
+
+    def __persist_materialized(self, securities: [str], factors: [str], df: pd.DataFrame, calc_time: datetime.datetime):
+        data_center = self.__data_hub_entry.get_data_center()
+        update_table = data_center.get_update_table()
+        if df is not None and not df.empty:
+            df = df.reindex(columns=['stock_identity', 'period'] + factors)
+            df = df.dropna(subset=['stock_identity', 'period'])
+            data_center.merge_local_data(self.MATERIALIZE_URI, securities, df)
+            until = df.groupby('stock_identity')['period'].max().to_dict()
+            since, until_all = df['period'].min(), df['period'].max()
+            update_table.update_update_range(self.MATERIALIZE_URI.split('.'), since, until_all)
+        else:
+            until = {}
+        for s in securities:
+            tags = self.__security_tags(s)
+            update_table.update_latest_update_time(tags, calc_time)
+            if s in until:
+                update_table.update_until(tags, to_py_datetime(until[s]))
+
+    def __query_materialized(self, stock_identity: str or [str], factor_name: [str],
+                             time_serial: tuple, extra: dict) -> pd.DataFrame or None:
+        if self.__data_hub_entry is None or stock_identity is None:
+            return None
+        data_center = self.__data_hub_entry.get_data_center()
+        if data_center.get_update_table() is None:
+            return None
+        if any(f not in self.__factor_depends.keys() for f in factor_name) or \
+                len(self.unmaterialized_factors(factor_name)) > 0:
+            return None
+
+        source_uris = self.factor_source_uris(factor_name)
+        if self.__source_extended(source_uris):
+            return None
+
+        securities = wrap_list(stock_identity)
+        stale = self.stale_securities(securities, source_uris)
+        stale_set = set(stale)
+        fresh = [s for s in securities if s not in stale_set]
+
+        frames = []
+        if len(fresh) > 0:
+            df = data_center.query(self.MATERIALIZE_URI, fresh if len(fresh) > 1 else fresh[0], time_serial,
+                                   fields=factor_name + ['stock_identity', 'period'])
+            if df is not None and not df.empty:
+                frames.append(df)
+        if len(stale) > 0:
+            df = self.__calculate(stale if len(stale) > 1 else stale[0], factor_name, time_serial, {}, extra)
+            if df is not None and not df.empty:
+                frames.append(df.reindex(columns=factor_name + ['stock_identity', 'period']))
+        if len(frames) == 0:
+            return pd.DataFrame(columns=factor_name + ['stock_identity', 'period'])
+
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        df = df.reindex(columns=factor_name + ['stock_identity', 'period'])
+        return df.sort_values('period', ascending=False, kind='stable').reset_index(drop=True)
+
+    def __source_extended(self, source_uris: [str]) -> bool:
+        """
+        Check whether the source data extended after the last materialization.
+        """
+        update_table = self.__data_hub_entry.get_data_center().get_update_table()
+        for uri in source_uris:
+            until = update_table.get_until(uri.split('.'))
+            materialized_until = update_table.get_until(self.__source_tags(uri))
+            if until is not None and (materialized_until is None or until > materialized_until):
+                return True
+        return False
+
+    def __security_tags(self, security: str) -> [str]:
+        return self.MATERIALIZE_URI.split('.') + [security.replace('.', '_')]
+
+    def __factor_tags(self, factor: str) -> [str]:
+        # The factor name may include the characters that not suitable in tags, so use the uuid.
+        return self.MATERIALIZE_URI.split('.') + ['Factor', self.__factor_index.get(factor, factor)]
+
+    def __source_tags(self, uri: str) -> [str]:
+        return self.MATERIALIZE_URI.split('.') + ['Source'] + uri.split('.')
+
     def reload_plugin(self):
         self.get_plugin_manager().refresh()
         self.__plugin_probs = self.get_plugin_manager().execute_module_function(
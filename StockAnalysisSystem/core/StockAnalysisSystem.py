@@ -87,7 +87,17 @@ class StockAnalysisSystem(metaclass=ThreadSafeSingleton):
     def is_initialized(self) -> bool:
         return self.__inited
 
-    def check_initialize(self, project_path: str = '', config=None, not_load_config: bool = False) -> bool:
+    def check_initialize(self, project_path: str = '', config=None,
+                         not_load_config: bool = False, enable_service: bool = True) -> bool:
+        """
+        Initialize the system. It only executes once.
+        :param project_path: The project path.
+        :param config: The Config object. If None, a new Config will be created.
+        :param not_load_config: If True, do not load config from the config.json of project path.
+        :param enable_service: If False, the sub services and the task queue will not start.
+                                 For the worker process that only does calculation.
+        :return: True if success
+        """
         if self.__inited:
             return True
 
@@ -205,6 +215,15 @@ class StockAnalysisSystem(metaclass=ThreadSafeSingleton):
         self.__data_hub_entry = DataHubEntry(self.__database_entry, collector_plugin, self.__config)
         self.__strategy_entry = StrategyEntry(strategy_plugin, self.__data_hub_entry, self.__database_entry)
 
+        analysis_config = self.__config.get('ANALYSIS', None)
+        if isinstance(analysis_config, dict):
+            self.__strategy_entry.set_execute_option(analysis_config.get('process_count', None),
+                                                     analysis_config.get('shard_per_process', None))
+
+        task_queue_config = self.__config.get('TASK_QUEUE', None)
+        if isinstance(task_queue_config, dict) and str(task_queue_config.get('worker_count', '')) != '':
+            self.__task_queue.set_worker_count(int(task_queue_config.get('worker_count')))
+
         from .FactorEntry import FactorCenter
         self.__factor_center = FactorCenter(self.__data_hub_entry, self.__database_entry, factor_plugin)
         self.__factor_center.reload_plugin()
@@ -216,10 +235,11 @@ class StockAnalysisSystem(metaclass=ThreadSafeSingleton):
         # self.__extension_manager = ExtensionManager(self, extension_plugin)
         # self.__extension_manager.init()
 
-        import StockAnalysisSystem.core.api as sasApi
-        from .SubServiceManager import SubServiceManager
-        self.__sub_service_manager = SubServiceManager(sasApi, sub_service_plugin)
-        self.__sub_service_manager.init()
+        if enable_service:
+            import StockAnalysisSystem.core.api as sasApi
+            from .SubServiceManager import SubServiceManager
+            self.__sub_service_manager = SubServiceManager(sasApi, sub_service_plugin)
+            self.__sub_service_manager.init()
 
         print('Stock Analysis System Initialization Done, Time spending: ' + str(clock.elapsed_ms()) + ' ms')
         self.__inited = True
@@ -242,15 +262,18 @@ class StockAnalysisSystem(metaclass=ThreadSafeSingleton):
         #    Or the components that depends on sasApi but gets not inited flag.
         # ------------------------------------------------------------------------------------
 
-        self.__task_queue.start()
-        self.__sub_service_manager.startup()
-        self.__sub_service_manager.run_service()
+        if enable_service:
+            self.__task_queue.start()
+            self.__sub_service_manager.startup()
+            self.__sub_service_manager.run_service()
 
         return True
 
     def finalize(self):
         self.__task_queue.quit()
         self.__task_queue.join(5)
+        if self.__database_entry is not None and self.__database_entry.get_update_table() is not None:
+            self.__database_entry.get_update_table().flush()
 
     # -------------------------------------------- Entry --------------------------------------------
 
@@ -35,6 +35,9 @@ class SubServiceContext:
 
 
 class SubServiceManager:
+    # The interval (in seconds) of invoking the polling services
+    POLLING_INTERVAL = 0.05
+
     class SubServiceThreadWrapper(Thread):
         def __init__(self, extension: PluginWrapper):
             super(SubServiceManager.SubServiceThreadWrapper, self).__init__()
@@ -141,7 +144,8 @@ class SubServiceManager:
         return self.init_services() and self.startup_service() and self.activate_services()
 
     def teardown(self):
-        self.__quit = False
+        self.__quit = True
+        self.__event_queue.wake()
         if self.__service_thread is not None:
             self.__log('SebServiceManager Teardown, joining service thread...')
             self.__service_thread.join()
@@ -196,7 +200,9 @@ class SubServiceManager:
     def run_forever(self):
         while not self.__quit:
             self.poll_service()
-            time.sleep(0.05)
+            # Wake up by event immediately. If no polling service, it sleeps until event comes.
+            self.__event_queue.wait_event(SubServiceManager.POLLING_INTERVAL
+                                          if len(self.__period_service) > 0 else None)
 
     def poll_service(self):
         with self.__lock:
@@ -3,8 +3,13 @@ from .Interface import IMarket, IBroker, Position, Order, ISizer
 
 
 class Broker(IBroker, IMarket.Observer):
-    def __init__(self, market: IMarket):
+    def __init__(self, market: IMarket, quiet: bool = False):
+        """
+        :param market: The market
+        :param quiet: If True, the order and deal are not printed. Use trade_statistics() for the result.
+        """
         self.__market = market
+        self.__quiet = quiet
 
         self.__commission_min = 5.0
         self.__commission_pct = 0.0001
@@ -15,6 +20,12 @@ class Broker(IBroker, IMarket.Observer):
         self.__finished_order = []
         self.__position = Position()
 
+        # The statistics of trade
+        self.__counters = {}
+        self.__initial_value = None
+        self.__daily_value = []
+        self.reset_statistics()
+
         super(Broker, self).__init__()
 
     def market(self) -> IMarket:
@@ -79,12 +90,65 @@ class Broker(IBroker, IMarket.Observer):
             self.__pending_order.append(order)
         else:
             self.__debug('Drop:', str(order))
+            self.__counters['rejected_count'] += 1
             order.update_status(Order.STATUS_REJECTED)
             self.__finished_order.append(order)
 
     def get_pending_orders(self) -> [Order]:
         return self.__pending_order
 
+    # -------------------------------------- Statistics --------------------------------------
+
+    def set_quiet(self, quiet: bool):
+        self.__quiet = quiet
+
+    def is_quiet(self) -> bool:
+        return self.__quiet
+
+    def reset_statistics(self):
+        self.__counters = {
+            'deal_count': 0,
+            'buy_count': 0,
+            'sell_count': 0,
+            'rejected_count': 0,
+            'expired_count': 0,
+            'turnover': 0.0,
+            'commission': 0.0,
+        }
+        self.__initial_value = None
+        self.__daily_value = []
+
+    def get_daily_value(self) -> [float]:
+        """
+        Get the total position value at the end of each trading day.
+        """
+        return self.__daily_value
+
+    def trade_statistics(self) -> dict:
+        """
+        Get the trade statistics: The counters, the profit and loss, and the max drawdown of daily position value.
+        """
+        initial_value = self.__initial_value if self.__initial_value is not None else \
+            self.__position.total_position(self.market())
+        final_value = self.__daily_value[-1] if len(self.__daily_value) > 0 else initial_value
+
+        max_drawdown = 0.0
+        peak_value = initial_value
+        for value in self.__daily_value:
+            peak_value = max(peak_value, value)
+            if peak_value > 0:
+                max_drawdown = max(max_drawdown, (peak_value - value) / peak_value)
+
+        statistics = {
+            'initial_value': initial_value,
+            'final_value': final_value,
+            'pnl': final_value - initial_value,
+            'return_pct': (final_value - initial_value) / initial_value * 100 if initial_value else 0.0,
+            'max_drawdown_pct': max_drawdown * 100,
+        }
+        statistics.update(self.__counters)
+        return statistics
+
     # ----------------------------------- Exchange Setting -----------------------------------
 
     # ------------------- commission -------------------
@@ -112,6 +176,7 @@ class Broker(IBroker, IMarket.Observer):
         return 1
 
     def on_prepare_trading(self, securities: [], *args, **kwargs):
+        self.__initial_value = self.__position.total_position(self.market())
         for security in securities:
             self.market().watch_security(security, self)
 
@@ -151,6 +216,10 @@ class Broker(IBroker, IMarket.Observer):
             if matchable:
                 result = self.__execute_order_trade(order, at_price)
             self.__complete_order(order, Order.STATUS_COMPLETED if result else Order.STATUS_EXPIRED)
+            if not result:
+                self.__counters['expired_count'] += 1
+
+        self.__daily_value.append(self.__position.total_position(self.market()))
 
         # # Clear all orders after the end of a day
         # assert len(self.__pending_order) == 0
@@ -167,8 +236,13 @@ class Broker(IBroker, IMarket.Observer):
         if result:
             commission = self.calc_commission(price * order.amount)
             self.__position.cash_out(commission, 'commission')
+            self.__counters['deal_count'] += 1
+            self.__counters['buy_count' if order.is_buy_order() else 'sell_count'] += 1
+            self.__counters['turnover'] += price * order.amount
+            self.__counters['commission'] += commission
             self.__debug('Deal:', str(order))
-            print(self.__position.statistics(self.market()))
+            if not self.__quiet:
+                print(self.__position.statistics(self.market()))
             order.update_status(Order.STATUS_COMPLETED)
         return result
 
@@ -228,9 +302,9 @@ class Broker(IBroker, IMarket.Observer):
 
     # ---------------------------------------------------------------------------------
 
-    @staticmethod
-    def __debug(*args):
-        print(' '.join(args))
+    def __debug(self, *args):
+        if not self.__quiet:
+            print(' '.join(args))
 
 
 
@@ -1,6 +1,8 @@
 import datetime
 import threading
+import numpy as np
 import pandas as pd
+from collections.abc import Mapping
 from .Interface import IMarket
 from ..Utility.df_utility import *
 from ..Utility.time_utility import *
@@ -72,7 +74,7 @@ class MarketBase(IMarket):
             observer.on_after_trading(sub_price_history, *args, **kwargs)
 
     def __get_sub_data_for_observer(self, observer: IMarket.Observer, full_data: dict) -> dict:
-        if not isinstance(full_data, dict):
+        if not isinstance(full_data, Mapping):
             return {}
         # Why not give him all
         return full_data
@@ -81,11 +83,228 @@ class MarketBase(IMarket):
         # return sub_data
 
 
+# ----------------------------------------------- class BackTestingData ------------------------------------------------
+
+class BackTestingData:
+    """
+    The daily data of all securities for back testing.
+    Each column of all securities is concatenated into one contiguous numpy array, and the column of a security is
+        a slice of it. The security that has no such column is filled with missing value (NaN, NaT or None) in the
+        concatenated array, but the column is still absent in its history.
+    The row count of each security until each day of the trading day axis is pre-calculated. So the history of
+        a security until a day is a zero-copy slice, and the latest values of all securities on a day can be taken
+        at once.
+    """
+
+    def __init__(self, axis: pd.Index, daily_data: dict):
+        """
+        :param axis: The trading day axis
+        :param daily_data: The dict of security: DataFrame that indexed by trading day
+        """
+        frames = {security: df if df.index.is_monotonic_increasing else df.sort_index(kind='stable')
+                  for security, df in daily_data.items() if df is not None}
+
+        columns = {}
+        absent = {}
+        column_names = []
+        for df in frames.values():
+            column_names.extend([c for c in df.columns if c not in column_names])
+        for column in column_names:
+            dtype = next(df[column].dtype for df in frames.values() if column in df.columns)
+            columns[column] = np.concatenate([df[column].to_numpy() if column in df.columns else
+                                              BackTestingData.__missing_values(dtype, len(df))
+                                              for df in frames.values()])
+            absent_securities = [security for security, df in frames.items() if column not in df.columns]
+            if len(absent_securities) > 0:
+                absent[column] = absent_securities
+        index = np.concatenate([np.asarray(df.index) for df in frames.values()]) if len(frames) > 0 else np.array([])
+
+        axis_values = np.asarray(axis)
+        counts = np.zeros((len(frames), len(axis)), dtype=np.int64)
+        for i, df in enumerate(frames.values()):
+            # The row count of security (row) until trading day (column)
+            counts[i] = np.searchsorted(np.asarray(df.index), axis_values, side='right')
+
+        self.__setup(axis, list(frames.keys()), np.array([len(df) for df in frames.values()], dtype=np.int64),
+                     index, columns, absent, counts, frames)
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        """
+        Build from the arrays that exported by arrays(). The arrays are used directly without copy,
+            so they can be in shared memory. The DataFrame of a security is built only when it's accessed.
+        """
+        data = cls.__new__(cls)
+        data.__setup(pd.Index(arrays['axis']), list(arrays['securities']), arrays['lengths'],
+                     arrays['index'], arrays['columns'], arrays.get('absent', {}), arrays['counts'], {})
+        return data
+
+    def arrays(self) -> dict:
+        """
+        Export the data as numpy arrays. The securities are list and the columns are dict of column: array.
+            All the columns are exported. The absent is dict of column: [security] that has no such column.
+        """
+        return {
+            'axis': np.asarray(self.__axis),
+            'securities': self.securities(),
+            'lengths': self.__lengths,
+            'index': self.__index,
+            'columns': self.__columns,
+            'absent': self.__absent,
+            'counts': self.__counts,
+        }
+
+    @staticmethod
+    def __missing_values(dtype: np.dtype, length: int) -> np.ndarray:
+        if dtype.kind in 'mM':
+            return np.full(length, 'NaT', dtype=dtype)
+        if dtype.kind in 'biufc':
+            # The int and bool column will be float after concatenated with NaN
+            return np.full(length, np.nan, dtype=dtype if dtype.kind in 'fc' else np.float64)
+        return np.full(length, None, dtype=object)
+
+    def __setup(self, axis: pd.Index, securities: [str], lengths: np.ndarray,
+                index: np.ndarray, columns: dict, absent: dict, counts: np.ndarray, frames: dict):
+        self.__axis = axis
+        self.__lengths = lengths
+        self.__index = index
+        self.__columns = columns
+        self.__absent = absent
+        self.__counts = counts
+        self.__frames = frames
+        # The start offset of each security in the concatenated column
+        self.__offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64) \
+            if len(lengths) > 0 else np.array([], dtype=np.int64)
+
+        absent_sets = {column: set(absent_securities) for column, absent_securities in absent.items()}
+
+        self.__arrays = {}
+        self.__security_index = {}
+        for i, security in enumerate(securities):
+            self.__security_index[security] = i
+            start, end = self.__offsets[i], self.__offsets[i] + lengths[i]
+            df = frames.get(security, None)
+            if df is not None:
+                # Keep the dtype of the loaded DataFrame if the concatenated column is upcast by the missing values
+                self.__arrays[security] = {
+                    column: df[column].to_numpy() if column in absent_sets and columns[column].dtype != df[column].dtype
+                    else columns[column][start:end] for column in df.columns}
+            else:
+                self.__arrays[security] = {column: array[start:end] for column, array in columns.items()
+                                           if security not in absent_sets.get(column, ())}
+
+    def axis(self) -> pd.Index:
+        return self.__axis
+
+    def securities(self) -> [str]:
+        return list(self.__security_index.keys())
+
+    def has_security(self, security: str) -> bool:
+        return security in self.__security_index
+
+    def count(self, security: str, day: int) -> int:
+        """
+        Get the row count of security until the day
+        :param day: The index of trading day axis
+        """
+        index = self.__security_index.get(security, None)
+        return 0 if index is None or day is None else int(self.__counts[index, day])
+
+    def window(self, security: str, day: int, column: str, length: int = None) -> np.ndarray:
+        """
+        Get the history of a column until the day as a read-only numpy array view.
+        :param length: The max length of the history. None for all.
+        """
+        array = self.__arrays.get(security, {}).get(column, None)
+        if array is None:
+            return np.array([])
+        end = self.count(security, day)
+        start = 0 if length is None else max(0, end - length)
+        view = array[start:end]
+        view.flags.writeable = False
+        return view
+
+    def frame(self, security: str, day: int) -> pd.DataFrame or None:
+        """
+        Get the history until the day as DataFrame. It's a slice of the loaded DataFrame.
+        """
+        df = self.__frames.get(security, None)
+        if df is None and security in self.__security_index:
+            i = self.__security_index[security]
+            start = self.__offsets[i]
+            df = pd.DataFrame(self.__arrays[security], index=pd.Index(self.__index[start:start + self.__lengths[i]]))
+            self.__frames[security] = df
+        return None if df is None else df.iloc[:self.count(security, day)]
+
+    def row(self, security: str, day: int, offset: int = -1) -> dict:
+        """
+        Get the row of the history until the day by offset. Same as history.iloc[offset].to_dict()
+        """
+        arrays = self.__arrays.get(security, None)
+        count = self.count(security, day)
+        if arrays is None or count == 0:
+            return {}
+        position = count + offset if offset < 0 else offset
+        if position < 0 or position >= count:
+            raise IndexError('offset %d is out of bounds of history length %d' % (offset, count))
+        return {column: array[position].item() if isinstance(array[position], np.generic) else array[position]
+                for column, array in arrays.items()}
+
+    def latest(self, day: int, column: str) -> (np.ndarray, np.ndarray):
+        """
+        Get the latest value of a column until the day of all securities.
+        :return: (The bool mask of securities that have data until the day, the values of them)
+        """
+        counts = self.__counts[:, day] if len(self.__counts) > 0 else np.array([], dtype=np.int64)
+        mask = counts > 0
+        return mask, self.__columns[column][self.__offsets[mask] + counts[mask] - 1]
+
+    def value(self, security: str, day: int, column: str, default: any = None) -> any:
+        """
+        Get the latest value of a column until the day.
+        """
+        array = self.__arrays.get(security, {}).get(column, None)
+        count = self.count(security, day)
+        return default if array is None or count == 0 else array[count - 1]
+
+
+class DailyHistory(Mapping):
+    """
+    The history of each security until a trading day. It's passed to observers as the price history dict.
+        The DataFrame of a security is built only when it's accessed. Use window() for the numpy array directly.
+    """
+
+    def __init__(self, data: BackTestingData, day: int):
+        self.__data = data
+        self.__day = day
+
+    def day(self) -> int:
+        return self.__day
+
+    def trade_date(self) -> any:
+        return self.__data.axis()[self.__day]
+
+    def window(self, security: str, column: str, length: int = None) -> np.ndarray:
+        return self.__data.window(security, self.__day, column, length)
+
+    def __getitem__(self, security: str) -> pd.DataFrame:
+        if not self.__data.has_security(security):
+            raise KeyError(security)
+        return self.__data.frame(security, self.__day)
+
+    def __iter__(self):
+        return iter(self.__data.securities())
+
+    def __len__(self) -> int:
+        return len(self.__data.securities())
+
+
 # ---------------------------------------------- class MarketBackTesting -----------------------------------------------
 
 class MarketBackTesting(MarketBase, threading.Thread):
-    def __init__(self, data_hub, since: datetime.datetime, until: datetime.datetime):
+    def __init__(self, data_hub, since: datetime.datetime, until: datetime.datetime, quiet: bool = False):
         self.__data_hub = data_hub
+        self.__quiet = quiet
 
         self.__since = since
         self.__until = until
@@ -94,31 +313,47 @@ class MarketBackTesting(MarketBase, threading.Thread):
         self.__serial_data_cache = {}
         self.__cached_securities = []
 
-        # Current price
-        self.__price_table = {}
+        # The aligned daily data and the index of current trading day
+        self.__back_testing_data = None
+        self.__cursor = None
+        # The trading day of today limit
+        self.__limit_cursor = None
         # The daily
         self.__daily_table = {}
-        # Today limit table
-        self.__price_limit = {}
 
         super(MarketBackTesting, self).__init__()
 
     # ----------------------------- Interface of MarketBase -----------------------------
     def get_price(self, security: str) -> float:
-        return self.__price_table.get(security, 0.0)
+        if self.__back_testing_data is None:
+            return 0.0
+        return self.__back_testing_data.value(security, self.__cursor, 'close', 0.0)
 
     def get_daily(self, security: str, offset: int = -1) -> dict:
-        daily_data = self.__daily_table.get(security, None)
-        if daily_data is None or daily_data.empty:
+        if self.__back_testing_data is None:
             return {}
-        select_daily_data = daily_data.iloc[offset]
-        return select_daily_data.to_dict()
+        return self.__back_testing_data.row(security, self.__cursor, offset)
 
     def get_handicap(self, security: str) -> pd.DataFrame:
         return None
 
     def get_day_limit(self, security: str) -> (float, float):
-        return self.__price_limit.get(security, (0.0, 0.0))
+        if self.__back_testing_data is None or self.__back_testing_data.count(security, self.__limit_cursor) == 0:
+            return 0.0, 0.0
+        return self.__back_testing_data.value(security, self.__limit_cursor, 'lower_limit'), \
+            self.__back_testing_data.value(security, self.__limit_cursor, 'upper_limit')
+
+    def set_quiet(self, quiet: bool):
+        self.__quiet = quiet
+
+    def get_window(self, security: str, column: str, length: int = None) -> np.ndarray:
+        """
+        Get the history of a column until current trading day as a read-only numpy array view.
+        :param length: The max length of the history. None for all.
+        """
+        if self.__back_testing_data is None:
+            return np.array([])
+        return self.__back_testing_data.window(security, self.__cursor, column, length)
 
     def watch_security(self, security: str, observer: IMarket.Observer):
         if security not in self.__cached_securities:
@@ -140,31 +375,43 @@ class MarketBackTesting(MarketBase, threading.Thread):
         if len(self.__cached_securities) == 0:
             print('No data for back testing.')
             return
-        baseline = self.__cached_securities[0]
-        baseline_daily = self.__daily_data_cache.get(baseline)
-
-        self.__daily_table.clear()
-        for index in list(baseline_daily.index):        # baseline_daily.index.values.tolist():
-            if len(self.__daily_table) == 0:
-                self.__daily_table = self.__build_daily_test_data(index)
+        if self.__back_testing_data is None:
+            self.__build_back_testing_data()
+        self.__reset_cursor()
+        axis = self.__back_testing_data.axis()
+
+        for day in range(len(axis)):
+            if day == 0:
+                self.__advance_cursor(day)
+                continue
+            if self.__quiet:
+                self.__back_testing_day(day)
                 continue
-            print('| ' + str(index) + '------------------------------------------')
-            self.back_testing_daily(index)
+            print('| ' + str(axis[day]) + '------------------------------------------')
+            self.__back_testing_day(day)
 
             print('> Day end')
-            for security in self.__daily_table.keys():
-                daily_data = self.__daily_table.get(security)
-                if not daily_data.empty:
-                    select_daily_data = daily_data.iloc[-1]
-                    print('%s: [%.2f, %.2f]' % (security, select_daily_data['low'], select_daily_data['high']))
+            mask, lows = self.__back_testing_data.latest(day, 'low')
+            _, highs = self.__back_testing_data.latest(day, 'high')
+            securities = np.array(self.__back_testing_data.securities(), dtype=object)[mask]
+            if len(securities) > 0:
+                print('\n'.join('%s: [%.2f, %.2f]' % item for item in zip(securities, lows, highs)))
 
     def back_testing_daily(self, limit: any):
+        if self.__back_testing_data is None:
+            self.__build_back_testing_data()
+        day = int(self.__back_testing_data.axis().searchsorted(limit, side='right')) - 1
+        if day < 0:
+            return
+        self.__back_testing_day(day)
+
+    def __back_testing_day(self, day: int):
         self.update_day_price_limit()
 
         self.trigger_before_trading(self.__daily_table)
 
-        self.back_testing_serial(limit)
-        self.__daily_table = self.__build_daily_test_data(limit)
+        self.back_testing_serial(self.__back_testing_data.axis()[day])
+        self.__advance_cursor(day)
 
         self.trigger_after_trading(self.__daily_table)
 
@@ -179,15 +426,38 @@ class MarketBackTesting(MarketBase, threading.Thread):
         # if len(back_testing_serial_data) > 0:
         #     self.trigger_trading(back_testing_serial_data)
 
-    def __build_daily_test_data(self, limit: any) -> dict:
-        back_testing_data = {}
-        for security in self.__daily_data_cache:
-            df = self.__daily_data_cache[security]
-            df = df[df.index <= limit]
-            back_testing_data[security] = df
-            if not df.empty:
-                self.__price_table[security] = df.iloc[-1]['close']
-        return back_testing_data
+    def set_back_testing_data(self, data: BackTestingData):
+        """
+        Use the prepared back testing data instead of loading. The trading day axis of the data is used.
+        """
+        self.__back_testing_data = data
+        self.__daily_data_cache.clear()
+        self.__serial_data_cache.clear()
+        self.__cached_securities = data.securities()
+        self.__reset_cursor()
+
+    def get_back_testing_data(self) -> BackTestingData or None:
+        """
+        Get the back testing data that built from the loaded data. None if no data loaded.
+        """
+        if self.__back_testing_data is None and len(self.__cached_securities) > 0:
+            self.__build_back_testing_data()
+        return self.__back_testing_data
+
+    def __build_back_testing_data(self):
+        baseline = self.__cached_securities[0]
+        baseline_daily = self.__daily_data_cache.get(baseline)
+        self.__back_testing_data = BackTestingData(baseline_daily.index, self.__daily_data_cache)
+        self.__reset_cursor()
+
+    def __reset_cursor(self):
+        self.__cursor = None
+        self.__limit_cursor = None
+        self.__daily_table = {}
+
+    def __advance_cursor(self, day: int):
+        self.__cursor = day
+        self.__daily_table = DailyHistory(self.__back_testing_data, day)
 
     def __build_serial_test_data(self, limit: any) -> dict:
         limit = to_py_datetime(limit)
@@ -208,16 +478,13 @@ class MarketBackTesting(MarketBase, threading.Thread):
                 back_testing_serial_data[security] = df_sliced
         return back_testing_serial_data
 
+    BACK_TESTING_DAILY_FIELDS = ['trade_date', 'open', 'close', 'high', 'low', 'vol']
+
     def load_back_testing_data(self, security: str, baseline: bool = False):
         daily_data = self.__data_hub.get_data_center().query(
             'TradeData.Stock.Daily', security, (self.__since, self.__until),
-            fields=['trade_date', 'open', 'close', 'high', 'low', 'vol'])
-        if daily_data is not None and not daily_data.empty:
-            daily_data = daily_data.set_index('trade_date', drop=True)
-            daily_data['volume'] = daily_data['vol']
-            del daily_data['vol']
-        else:
-            daily_data = None
+            fields=MarketBackTesting.BACK_TESTING_DAILY_FIELDS)
+        daily_data = self.__prepare_daily_data(daily_data)
 
         # TODO: Serial Data
         serial_data = None
@@ -226,6 +493,39 @@ class MarketBackTesting(MarketBase, threading.Thread):
 
         return self.add_back_testing_data(security, daily_data, serial_data, baseline)
 
+    def load_back_testing_data_batch(self, securities: [str], baseline: str = None) -> [str]:
+        """
+        Load the back testing data of securities by one data center query instead of one query per security.
+        :param securities: The security list. The securities are added in this order.
+        :param baseline: The baseline security, it should be in the securities.
+        :return: The securities that loaded successfully.
+        """
+        daily_data_dict = self.__data_hub.get_data_center().query_batch(
+            'TradeData.Stock.Daily', list(securities), (self.__since, self.__until),
+            group_by='identity', fields=MarketBackTesting.BACK_TESTING_DAILY_FIELDS)
+        if daily_data_dict is None:
+            daily_data_dict = {}
+
+        loaded = []
+        for security in securities:
+            daily_data = daily_data_dict.get(security, None)
+            if daily_data is not None:
+                daily_data = daily_data[[c for c in daily_data.columns
+                                         if c in MarketBackTesting.BACK_TESTING_DAILY_FIELDS]]
+            daily_data = self.__prepare_daily_data(daily_data)
+            if self.add_back_testing_data(security, daily_data, None, security == baseline):
+                loaded.append(security)
+        return loaded
+
+    @staticmethod
+    def __prepare_daily_data(daily_data: pd.DataFrame or None) -> pd.DataFrame or None:
+        if daily_data is None or daily_data.empty:
+            return None
+        daily_data = daily_data.set_index('trade_date', drop=True)
+        daily_data['volume'] = daily_data['vol']
+        del daily_data['vol']
+        return daily_data
+
     def add_back_testing_data(self, security: str, daily_data: pd.DataFrame or None,
                               serial_data: pd.DataFrame or None, baseline=False) -> bool:
         if not self.check_back_testing_data(daily_data, serial_data):
@@ -241,6 +541,13 @@ class MarketBackTesting(MarketBase, threading.Thread):
             self.__cached_securities.insert(0, security)
         if security not in self.__daily_data_cache.keys():
             self.__daily_data_cache[security] = daily_data
+            if self.__back_testing_data is not None:
+                # Added during back testing, rebuild and keep the current trading day
+                cursor, limit_cursor = self.__cursor, self.__limit_cursor
+                self.__build_back_testing_data()
+                self.__limit_cursor = limit_cursor
+                if cursor is not None:
+                    self.__advance_cursor(cursor)
         if security not in self.__serial_data_cache.keys():
             self.__serial_data_cache[security] = serial_data
         return True
@@ -254,13 +561,8 @@ class MarketBackTesting(MarketBase, threading.Thread):
             return True
 
     def update_day_price_limit(self):
-        self.__price_limit.clear()
-        for s in self.__daily_table:
-            daily_data = self.__daily_table.get(s, None)
-            if daily_data is None or len(daily_data) == 0:
-                continue
-            last_daily_data = daily_data.iloc[-1]
-            self.__price_limit[s] = (last_daily_data['lower_limit'], last_daily_data['upper_limit'])
+        # The limit comes from the latest daily data before today's data is revealed
+        self.__limit_cursor = self.__cursor
 
     @staticmethod
     def check_back_testing_data(daily_data: pd.DataFrame or None, serial_data: pd.DataFrame or None):
@@ -0,0 +1,241 @@
+import io
+import datetime
+import itertools
+import traceback
+import contextlib
+import multiprocessing
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+from .Broker import Broker
+from .Market import BackTestingData, MarketBackTesting
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                    Shared Arrays
+# ----------------------------------------------------------------------------------------------------------------------
+
+def share_array(array: np.ndarray) -> (tuple, shared_memory.SharedMemory or None):
+    """
+    Copy the numeric array into a new shared memory block.
+    :return: (The spec that can be passed to other process, The SharedMemory or None if the array is not shareable)
+                The spec is ('shm', name, dtype, shape) or ('raw', array) for the object array.
+    """
+    array = np.asarray(array)
+    if array.dtype.kind not in 'biufcmM' or array.nbytes == 0:
+        return ('raw', array), None
+    shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    shared[...] = array
+    return ('shm', shm.name, array.dtype.str, array.shape), shm
+
+
+def attach_array(spec: tuple) -> (np.ndarray, shared_memory.SharedMemory or None):
+    """
+    Attach the array that shared by share_array(). The array is read-only.
+    :return: (The array, The SharedMemory that should be kept alive with the array)
+    """
+    if spec[0] == 'raw':
+        return spec[1], None
+    _, name, dtype, shape = spec
+    # The spawned worker shares the resource tracker of creator process, the block is unlinked by the creator.
+    shm = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    array.flags.writeable = False
+    return array, shm
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                    Sweep Worker
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The back testing data and the shared memory of the worker process
+sweep_worker_context = {}
+
+
+def sweep_worker_init(spec: dict):
+    """
+    Attach the shared back testing data in worker process.
+    :param spec: The spec that built by ParameterSweep. The arrays are share_array() spec.
+    """
+    blocks = []
+    arrays = {}
+    for key in ('axis', 'lengths', 'index', 'counts'):
+        arrays[key], shm = attach_array(spec[key])
+        blocks.append(shm)
+    arrays['columns'] = {}
+    for column, column_spec in spec['columns'].items():
+        arrays['columns'][column], shm = attach_array(column_spec)
+        blocks.append(shm)
+    arrays['securities'] = spec['securities']
+    arrays['absent'] = spec['absent']
+
+    sweep_worker_context['blocks'] = [shm for shm in blocks if shm is not None]
+    sweep_worker_context['data'] = BackTestingData.from_arrays(arrays)
+    sweep_worker_context['strategy_class'] = spec['strategy_class']
+    sweep_worker_context['quiet'] = spec['quiet']
+
+
+def sweep_worker_entry(task: (str, dict)) -> dict:
+    """
+    Run the back testing of a security with a parameter set in worker process.
+    :param task: (security, parameters)
+    :return: The dict of security, parameters and the trade statistics of Broker
+    """
+    return run_sweep_task(sweep_worker_context['data'], sweep_worker_context['strategy_class'],
+                          task[0], task[1], sweep_worker_context['quiet'])
+
+
+def run_sweep_task(data: BackTestingData, strategy_class, security: str, parameters: dict, quiet: bool) -> dict:
+    result = {'security': security}
+    result.update(parameters)
+
+    market = MarketBackTesting(None, None, None, quiet=quiet)
+    market.set_back_testing_data(data)
+    broker = Broker(market, quiet=quiet)
+    market.watch_security(security, broker)
+
+    try:
+        # The output of strategy is dropped in quiet mode
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            strategy = strategy_class(market, broker, security, **parameters)
+            market.watch_security(security, strategy)
+            market.back_testing_entry()
+        result.update(broker.trade_statistics())
+        result['error'] = ''
+    except Exception as e:
+        print('Sweep task error: %s %s - %s' % (security, str(parameters), str(e)))
+        print(traceback.format_exc())
+        result['error'] = str(e)
+    finally:
+        pass
+    return result
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                   ParameterSweep
+# ----------------------------------------------------------------------------------------------------------------------
+
+class ParameterSweep:
+    """
+    Back test a trade strategy with each parameter combination on each security of the universe.
+    The price data is loaded once and shared to the worker processes by shared memory without copy.
+    The result is a DataFrame that each row is the Broker statistics of a (security, parameters) back testing.
+    """
+
+    def __init__(self, strategy_class, param_grid: dict, securities: [str],
+                 baseline: str = None, process_count: int = None, quiet: bool = True):
+        """
+        :param strategy_class: The Trader class that constructed as strategy_class(market, broker, security, **params)
+        :param param_grid: The dict of parameter name: list of values. The sweep runs on the cartesian product.
+        :param securities: The security universe
+        :param baseline: The security that provides the trading day axis. The first security if None.
+        :param process_count: The worker process count. Runs in current process if it's 0 or 1.
+                                Use the cpu count if None.
+        :param quiet: If True, the output of market, broker and strategy are dropped.
+        """
+        self.__strategy_class = strategy_class
+        self.__param_grid = param_grid
+        self.__securities = list(securities)
+        self.__baseline = baseline if baseline is not None else \
+            (self.__securities[0] if len(self.__securities) > 0 else None)
+        self.__process_count = process_count
+        self.__quiet = quiet
+        self.__back_testing_data = None
+
+    def parameter_sets(self) -> [dict]:
+        names = list(self.__param_grid.keys())
+        return [dict(zip(names, values)) for values in itertools.product(*[self.__param_grid[n] for n in names])]
+
+    def get_back_testing_data(self) -> BackTestingData or None:
+        return self.__back_testing_data
+
+    # ------------------------------------------- Data -------------------------------------------
+
+    def load_back_testing_data(self, data_hub, since: datetime.datetime, until: datetime.datetime) -> bool:
+        market = MarketBackTesting(data_hub, since, until, quiet=True)
+        market.load_back_testing_data_batch(self.__data_securities(), self.__baseline)
+        return self.__set_data(market.get_back_testing_data())
+
+    def set_daily_data(self, daily_data: {str: pd.DataFrame}) -> bool:
+        """
+        Use the prepared daily data instead of loading from data hub.
+        :param daily_data: The dict of security: DataFrame that indexed by trade date
+        """
+        market = MarketBackTesting(None, None, None, quiet=True)
+        for security in self.__data_securities():
+            if security in daily_data.keys():
+                market.add_back_testing_data(security, daily_data[security], None, security == self.__baseline)
+        return self.__set_data(market.get_back_testing_data())
+
+    def __data_securities(self) -> [str]:
+        if self.__baseline is None or self.__baseline in self.__securities:
+            return self.__securities
+        return [self.__baseline] + self.__securities
+
+    def __set_data(self, data: BackTestingData or None) -> bool:
+        self.__back_testing_data = data
+        if data is None:
+            print('No data for parameter sweep.')
+            return False
+        missing = [security for security in self.__securities if not data.has_security(security)]
+        if len(missing) > 0:
+            print('Parameter sweep - No data for: ' + str(missing))
+        return True
+
+    # -------------------------------------------- Run --------------------------------------------
+
+    def run(self) -> pd.DataFrame:
+        if self.__back_testing_data is None:
+            print('Parameter sweep - Data not loaded.')
+            return pd.DataFrame()
+        tasks = [(security, parameters) for parameters in self.parameter_sets() for security in self.__securities
+                 if self.__back_testing_data.has_security(security)]
+
+        process_count = self.__process_count if self.__process_count is not None else multiprocessing.cpu_count()
+        process_count = min(process_count, len(tasks))
+        if process_count <= 1:
+            results = [run_sweep_task(self.__back_testing_data, self.__strategy_class,
+                                      security, parameters, self.__quiet) for security, parameters in tasks]
+        else:
+            results = self.__run_parallel(tasks, process_count)
+        return pd.DataFrame(results)
+
+    def __run_parallel(self, tasks: [(str, dict)], process_count: int) -> [dict]:
+        blocks = []
+        try:
+            arrays = self.__back_testing_data.arrays()
+            spec = {
+                'securities': arrays['securities'],
+                'absent': arrays['absent'],
+                'columns': {},
+                'strategy_class': self.__strategy_class,
+                'quiet': self.__quiet,
+            }
+            for key in ('axis', 'lengths', 'index', 'counts'):
+                spec[key], shm = share_array(arrays[key])
+                blocks.append(shm)
+            for column, array in arrays['columns'].items():
+                spec['columns'][column], shm = share_array(array)
+                blocks.append(shm)
+
+            chunk_size = max(1, len(tasks) // (process_count * 4))
+            with ProcessPoolExecutor(max_workers=process_count,
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=sweep_worker_init,
+                                     initargs=(spec,)) as executor:
+                results = list(executor.map(sweep_worker_entry, tasks, chunksize=chunk_size))
+        finally:
+            for shm in blocks:
+                if shm is None:
+                    continue
+                try:
+                    shm.close()
+                    shm.unlink()
+                except Exception:
+                    pass
+                finally:
+                    pass
+        return results
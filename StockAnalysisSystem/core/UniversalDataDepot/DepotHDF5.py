@@ -1,4 +1,7 @@
 import os
+import atexit
+import threading
+import traceback
 
 import h5py
 import numpy as np
@@ -6,267 +9,566 @@ import pandas as pd
 from .DepotInterface import DepotInterface
 
 
-def pad_with(vector, pad_width, iaxis, kwargs):
-    pad_value = kwargs.get('padder', '')
-    vector[:pad_width[0]] = pad_value
-    vector[-pad_width[1]:] = pad_value
-    return vector
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                     HDF5FilePool
+# ----------------------------------------------------------------------------------------------------------------------
+
+class HDF5FilePool:
+    """
+    Keep the hdf5 files open. Open and close a hdf5 file is expensive, and h5py does not allow the same file
+        being opened twice in different modes. So all depots share the file handle and the lock of the same path.
+    """
+    __lock = threading.Lock()
+    __files = {}            # abs path: (h5py.File, threading.RLock)
+
+    @staticmethod
+    def acquire(file_path: str) -> (h5py.File, threading.RLock):
+        file_path = os.path.abspath(file_path)
+        with HDF5FilePool.__lock:
+            entry = HDF5FilePool.__files.get(file_path, None)
+            if entry is None or not entry[0].id.valid:
+                dir_path = os.path.dirname(file_path)
+                if dir_path != '' and not os.path.isdir(dir_path):
+                    os.makedirs(dir_path, exist_ok=True)
+                lock = entry[1] if entry is not None else threading.RLock()
+                entry = (h5py.File(file_path, 'a'), lock)
+                HDF5FilePool.__files[file_path] = entry
+            return entry
+
+    @staticmethod
+    def release(file_path: str):
+        file_path = os.path.abspath(file_path)
+        with HDF5FilePool.__lock:
+            entry = HDF5FilePool.__files.pop(file_path, None)
+        if entry is not None:
+            with entry[1]:
+                HDF5FilePool.__close_file(entry[0])
+
+    @staticmethod
+    def release_all():
+        with HDF5FilePool.__lock:
+            entries = list(HDF5FilePool.__files.values())
+            HDF5FilePool.__files.clear()
+        for f, lock in entries:
+            with lock:
+                HDF5FilePool.__close_file(f)
+
+    @staticmethod
+    def __close_file(f: h5py.File):
+        try:
+            if f.id.valid:
+                f.flush()
+                f.close()
+        except Exception as e:
+            print('Close hdf5 file fail: ' + str(e))
+        finally:
+            pass
+
+
+atexit.register(HDF5FilePool.release_all)
 
 
 # ----------------------------------------------------------------------------------------------------------------------
-#                                                      DepotMongoDB
+#                                                      DepotHDF5
 # ----------------------------------------------------------------------------------------------------------------------
 
+# File layout:
+#   /base                   - The compacted data, sorted by primary keys. One dataset for each column.
+#       __index_values      - The distinct values of the first primary key, sorted.
+#       __index_offsets     - The row offset of each index value in base. len(offsets) = len(values) + 1
+#   /delta/<sequence>       - The appended patches. One dataset for each column.
+#
+# Upsert only appends a delta group, so the cost is O(patch size). Query reads the matching row slices of base
+# by the key index, and filters the deltas. Then merges them by primary keys - the later one wins, and the NaN
+# value does not overwrite the exists value (same as $set of mongodb). When the count of deltas reaches the
+# threshold, all deltas will be merged into base (compaction).
+
 class DepotHDF5(DepotInterface):
-    def __init__(self, primary_keys: [str], file_path: str, compress: bool = False):
+    GROUP_BASE = 'base'
+    GROUP_DELTA = 'delta'
+    INDEX_VALUES = '__index_values'
+    INDEX_OFFSETS = '__index_offsets'
+
+    KIND_STR = 'str'
+    KIND_NUMBER = 'number'
+    KIND_DATETIME = 'datetime'
+
+    # The infer_dtype() results of object column that can be stored as number
+    NUMBER_INFERRED_TYPES = ['integer', 'floating', 'mixed-integer-float', 'decimal', 'boolean']
+
+    # The placeholder of None in string dataset. HDF5 string can not be null.
+    NULL_STR = '\x1f'
+
+    def __init__(self, primary_keys: [str], file_path: str, compress: bool = False, compact_threshold: int = 32):
         super(DepotHDF5, self).__init__(primary_keys)
         self.__file_path = file_path
         self.__compress = compress
-
-        if len(primary_keys) > 2:
-            self.log('Warning: DepotHDF5 only support 2 primary keys.')
+        self.__compact_threshold = compact_threshold
 
     # ------------------------------- Basic Operation -------------------------------
 
     def query(self, *args, conditions: dict = None, fields: [str] or None = None, **kwargs) -> pd.DataFrame or None:
+        full_conditions = self.__valid_conditions(self.full_conditions(*args, conditions=conditions))
         try:
-            f = h5py.File(self.file_path(), 'r')
+            with self.__open() as f:
+                result = self.__query_merged(f, full_conditions, fields)
         except Exception as e:
-            self.log('Open file %s for read fail.' % self.file_path())
+            self.log('Query hdf5 file %s fail: %s' % (self.file_path(), str(e)))
+            print(traceback.format_exc())
             return None
         finally:
             pass
-
-        full_conditions = self.full_conditions(*args, conditions=conditions)
-        result = self.__query_dispatch(f, full_conditions, 0)
-
         return result
 
     def insert(self, dataset: pd.DataFrame or dict or any) -> bool:
-        pass
+        # The record with the same primary keys will be merged. Same as upsert.
+        return self.upsert(dataset)
 
     def upsert(self, dataset: pd.DataFrame or dict or any) -> bool:
         if not self.check_primary_keys(dataset):
             return False
+        if isinstance(dataset, dict):
+            dataset = pd.DataFrame([dataset])
+        elif isinstance(dataset, (list, tuple)):
+            dataset = pd.DataFrame(list(dataset))
         if not isinstance(dataset, pd.DataFrame):
             self.log('DepotHDF5.upsert() only supports DataFrame')
             return False
+        if dataset.empty:
+            return True
+        if '_id' in dataset.columns:
+            dataset = dataset.drop(columns=['_id'])
+        if len(self.primary_keys()) > 0:
+            dataset = dataset.dropna(subset=self.primary_keys())
+
         try:
-            f = h5py.File(self.file_path(), 'a')
+            with self.__open() as f:
+                delta_group = f.require_group(DepotHDF5.GROUP_DELTA)
+                sequence = delta_group.attrs.get('sequence', 0) + 1
+                delta_group.attrs['sequence'] = sequence
+                self.__write_group(delta_group.create_group('%010d' % sequence), dataset, self.__exists_kinds(f))
+                if len(delta_group.keys()) >= self.__compact_threshold:
+                    self.__compact(f)
+                f.flush()
         except Exception as e:
-            self.log('Open file % for append fail, create instead.' % self.file_path())
-            f = h5py.File(self.file_path(), 'w')
+            self.log('Upsert hdf5 file %s fail: %s' % (self.file_path(), str(e)))
+            print(traceback.format_exc())
+            return False
         finally:
             pass
-        self.__write_dispatch(f, dataset, 0)
         return True
 
     def delete(self, *args, conditions: dict = None, fields: [str] or None = None,
                delete_all: bool = False, **kwargs) -> bool:
-        pass
+        full_conditions = self.__valid_conditions(self.full_conditions(*args, conditions=conditions))
+        if len(full_conditions) == 0 and not delete_all:
+            self.log('Warning: No condition for delete. '
+                     'If you want to delete all documents. '
+                     'Please specify delete_all=True')
+            return False
+        try:
+            with self.__open() as f:
+                df = self.__query_merged(f, {}, None)
+                if df is not None and not df.empty:
+                    mask = self.__condition_mask(df, full_conditions)
+                    if fields is None:
+                        df = df[~mask]
+                    else:
+                        for field in fields:
+                            if field in df.columns and field not in self.primary_keys():
+                                df.loc[mask, field] = np.nan
+                self.__rewrite_base(f, df)
+                f.flush()
+        except Exception as e:
+            self.log('Delete from hdf5 file %s fail: %s' % (self.file_path(), str(e)))
+            print(traceback.format_exc())
+            return False
+        finally:
+            pass
+        return True
 
-    def drop(self):
+    def drop(self) -> bool:
         try:
+            HDF5FilePool.release(self.file_path())
             if os.path.exists(self.file_path()):
                 os.remove(self.file_path())
+            return True
         except Exception as e:
             self.log('Drop file %s fail.' % self.file_path())
+            return False
         finally:
             pass
 
+    def raw(self) -> any:
+        return self.file_path()
+
     # ----------------------------- Advanced Operation ------------------------------
 
     def range_of(self, field, *args, conditions: dict = None, **kwargs) -> (any, any):
-        primary_keys = self.primary_keys()
-        full_conditions = self.full_conditions(*args, conditions=conditions)
-
-        if len(primary_keys) >= 2 and primary_keys[0] not in full_conditions.keys():
-            self.log('Error: To get hdf5 depot data range. You should specify the level-1 group: ' + primary_keys[0])
-            return (None, None)
+        df = self.query(*args, conditions=conditions, fields=[field])
+        if df is None or field not in df.columns:
+            return None, None
+        series = df[field].dropna()
+        if series.empty:
+            return None, None
+        min_val, max_val = series.min(), series.max()
+        if isinstance(min_val, pd.Timestamp):
+            min_val, max_val = min_val.to_pydatetime(), max_val.to_pydatetime()
+        elif isinstance(min_val, np.generic):
+            min_val, max_val = min_val.item(), max_val.item()
+        return min_val, max_val
 
+    def record_count(self) -> int:
         try:
-            f = h5py.File(self.file_path(), 'r')
-        except Exception as e:
-            self.log('Open file %s for read fail.' % self.file_path())
-            return None
+            with self.__open() as f:
+                if DepotHDF5.GROUP_DELTA not in f or len(f[DepotHDF5.GROUP_DELTA].keys()) == 0:
+                    return self.__group_length(f[DepotHDF5.GROUP_BASE]) if DepotHDF5.GROUP_BASE in f else 0
         finally:
             pass
-
-    def record_count(self) -> int:
-        pass
+        df = self.query(fields=self.primary_keys())
+        return 0 if df is None else len(df)
 
     def distinct_value_of_field(self, field: str) -> [str]:
-        pass
+        df = self.query(fields=[field])
+        if df is None or field not in df.columns:
+            return []
+        return df[field].dropna().unique().tolist()
 
     def all_fields(self) -> [str]:
-        pass
+        fields = []
+        with self.__open() as f:
+            for group in self.__all_data_groups(f):
+                fields.extend([k for k in self.__group_columns(group) if k not in fields])
+        return fields
 
     def remove_field(self, key: str) -> bool:
-        pass
+        if key in self.primary_keys():
+            self.log('Warning: Cannot remove primary key: ' + key)
+            return False
+        with self.__open() as f:
+            for group in self.__all_data_groups(f):
+                if key in group:
+                    del group[key]
+            f.flush()
+        return True
 
     def rename_field(self, field_old: str, field_new: str) -> bool:
-        pass
+        if field_old in self.primary_keys():
+            self.log('Warning: Cannot rename primary key: ' + field_old)
+            return False
+        with self.__open() as f:
+            for group in self.__all_data_groups(f):
+                if field_old in group and field_new not in group:
+                    group.move(field_old, field_new)
+            f.flush()
+        return True
 
     # ----------------------------------------------------------------------------------
 
     def file_path(self) -> str:
         return self.__file_path
 
-    def __write_dispatch(self, current_group: h5py.Group, df: pd.DataFrame, group_level: int):
-        # Currently only the first primary key will be the group
-        if group_level == 0 and len(self.primary_keys()) > 1:
-            self.__write_process_group(current_group, df, group_level)
-        else:
-            self.__write_process_dataset(current_group, df, group_level)
+    def compact(self) -> bool:
+        """
+        Merge all the deltas into base. It's done automatically when the count of deltas reaches the threshold.
+        :return: True if successful else False
+        """
+        try:
+            with self.__open() as f:
+                self.__compact(f)
+                f.flush()
+            return True
+        except Exception as e:
+            self.log('Compact hdf5 file %s fail: %s' % (self.file_path(), str(e)))
+            print(traceback.format_exc())
+            return False
+        finally:
+            pass
 
-    def __write_process_group(self, current_group: h5py.Group, df: pd.DataFrame, group_level: int):
-        primary_keys = self.primary_keys()
-        group_field = primary_keys[group_level]
-        df_group = df.groupby(group_field)
-        for g, d in df_group:
-            next_group = current_group[g] if g in current_group.keys() else current_group.create_group(g)
-            self.__write_dispatch(next_group, d.drop(group_field, axis=1), group_level + 1)
+    # ---------------------------------------------- File ----------------------------------------------
 
-    def __write_process_dataset(self, current_group: h5py.Group, df: pd.DataFrame, dataset_level: int):
-        primary_keys = self.primary_keys()
-        primary_key_fields = primary_keys[dataset_level:]
+    def __open(self):
+        depot = self
 
-        # Make every column in the same length
-        padding_dataset, max_len = self.__check_fill_dataset_group_alignment(current_group)
+        class _FileContext:
+            def __enter__(self):
+                self.__file, self.__lock = HDF5FilePool.acquire(depot.file_path())
+                self.__lock.acquire()
+                return self.__file
 
-        if len(primary_key_fields) == 0 or max_len == 0:
-            # Just insert
-            insert_df = df
-        else:
-            update_df = df.dropna(subset=primary_key_fields)
-            exists_df = self.__dataset_group_to_dataframe(current_group)
-            upsert_df = pd.concat([exists_df, update_df], axis=0)
-            upsert_df = upsert_df.drop_duplicates(primary_key_fields, keep='last')
-
-            # upsert_df = exists_df.reindex(columns=update_df.columns | exists_df.columns)
-            # upsert_df.update(update_df)
-            # upsert_df = exists_df.merge(update_df, on=primary_key_fields, how='outer', indicator=True)
-            # Remove all old data and re-insert
-            self.__delete_all_dataset_in_group(current_group)
-            max_len = 0
-            insert_df = upsert_df
-
-        for column in insert_df.columns:
-            s = insert_df[column]
-            np_arr = s.to_numpy()
-            if column not in current_group.keys():
-                # https://stackoverflow.com/a/40312924/12929244
-                if np_arr.dtype.kind == 'O':
-                    if max_len > 0:
-                        np_arr = np.pad(np_arr, (max_len, 0), pad_with)
-                    string_dt = h5py.special_dtype(vlen=str)
-                    current_group.create_dataset(column, data=np_arr, dtype=string_dt,
-                                                 maxshape=(None,), chunks=True)
-                else:
-                    if max_len > 0:
-                        np_arr = np.pad(np_arr, (max_len, 0))
-                    current_group.create_dataset(column, data=np_arr,
-                                                 maxshape=(None,), chunks=True)
-                print('Create dataset %s, length = %s' % (column, np_arr.shape[0]))
-            else:
-                append_len = np_arr.shape[0]
-                exists_len = current_group[column].shape[0]
-                current_group[column].resize((exists_len + append_len, ))
-                current_group[column][-append_len:] = np_arr
-                print('Append dataset %s, length %s -> %s' % (column, exists_len, (exists_len + append_len)))
-
-    def __query_dispatch(self, current_group: h5py.Group, conditions: dict, pk_level: int) -> pd.DataFrame:
-        # Currently only the first primary key will be the group
-        if pk_level == 0 and len(self.primary_keys()) > 1:
-            return self.__query_process_group(current_group, conditions, pk_level)
-        else:
-            return self.__query_process_dataset(current_group, conditions)
-
-    def __query_process_group(self, current_group: h5py.Group, conditions: dict, pk_level: int) -> pd.DataFrame:
-        pk = self.primary_keys()[pk_level]
-        if pk in conditions:
-            cond = conditions[pk]
-            if isinstance(cond, list):
-                select_groups = [k for k in current_group.keys() if k in cond]
-            elif isinstance(cond, tuple):
-                select_groups = [k for k in current_group.keys() if self.judge_range_condition(k, cond)]
-            elif isinstance(cond, str):
-                select_groups = [pk] if pk in current_group.keys() else []
-            else:
-                select_groups = []
-                self.log('Warning: HDF5 Depot not support condition: ' + str(cond))
-        else:
-            select_groups = current_group.keys()
+            def __exit__(self, exc_type, exc_val, exc_tb):
+                self.__lock.release()
+        return _FileContext()
+
+    # ---------------------------------------------- Query ----------------------------------------------
 
-        result = None
-        for key in select_groups:
-            df = self.__query_dispatch(current_group[key], conditions, pk_level + 1)
-            if df is None or df.empty:
+    def __query_merged(self, f: h5py.File, conditions: dict, fields: [str] or None) -> pd.DataFrame:
+        primary_keys = self.primary_keys()
+        read_fields = None if fields is None else \
+            list(dict.fromkeys(list(fields) + primary_keys + list(conditions.keys())))
+
+        delta_dfs = []
+        if DepotHDF5.GROUP_DELTA in f:
+            delta_group = f[DepotHDF5.GROUP_DELTA]
+            for name in sorted(delta_group.keys()):
+                df = self.__read_group(delta_group[name], None, read_fields)
+                if df is not None and not df.empty:
+                    delta_dfs.append(df)
+        has_delta = len(delta_dfs) > 0
+
+        dfs = []
+        if DepotHDF5.GROUP_BASE in f:
+            # A delta can be a partial record which changes the non-key field. If the base is also filtered by
+            #   non-key conditions, the record of that delta will miss the fields of base.
+            # So only filter the base by primary keys, and the filter of all conditions is applied after merge.
+            base_conditions = {k: v for k, v in conditions.items() if k in primary_keys} \
+                if has_delta and len(primary_keys) > 0 else conditions
+            df = self.__query_base(f[DepotHDF5.GROUP_BASE], base_conditions, read_fields)
+            if df is not None and not df.empty:
+                dfs.append(df)
+        dfs.extend(delta_dfs)
+
+        if len(dfs) == 0:
+            return pd.DataFrame(columns=fields if fields is not None else [])
+        df = dfs[0] if len(dfs) == 1 else pd.concat(dfs, axis=0, ignore_index=True, sort=False)
+
+        if has_delta:
+            if len(primary_keys) > 0:
+                # Keep the last not null value of each field - The same as $set of mongodb.
+                df = df.groupby(primary_keys, sort=True, as_index=False, dropna=True).last()
+            df = df[self.__condition_mask(df, conditions)]
+        if fields is not None:
+            df = df.reindex(columns=[f for f in fields if f in df.columns])
+        return df.reset_index(drop=True)
+
+    def __query_base(self, base: h5py.Group, conditions: dict, fields: [str] or None) -> pd.DataFrame or None:
+        slices = self.__select_base_slices(base, conditions)
+        dfs = []
+        for start, end in slices:
+            if end <= start:
                 continue
+            df = self.__read_group(base, slice(start, end), fields)
+            if df is not None and not df.empty:
+                dfs.append(df)
+        if len(dfs) == 0:
+            return None
+        df = dfs[0] if len(dfs) == 1 else pd.concat(dfs, axis=0, ignore_index=True, sort=False)
+        return df[self.__condition_mask(df, conditions)]
 
-            # Assign the column of group
-            df[pk] = key
+    def __select_base_slices(self, base: h5py.Group, conditions: dict) -> [(int, int)]:
+        length = self.__group_length(base)
+        primary_keys = self.primary_keys()
+        if len(primary_keys) == 0 or DepotHDF5.INDEX_VALUES not in base:
+            return [(0, length)]
 
-            if result is None:
-                result = df
+        first_key = primary_keys[0]
+        cond = conditions.get(first_key, None)
+        if cond is None:
+            slices = [(0, length)]
+        else:
+            kind = base[first_key].attrs.get('kind', DepotHDF5.KIND_NUMBER)
+            index_values = self.__read_dataset(base[DepotHDF5.INDEX_VALUES], slice(None), kind)
+            offsets = base[DepotHDF5.INDEX_OFFSETS][()]
+            if isinstance(cond, tuple):
+                lower, upper = self.__range_index(index_values, cond, kind)
+                slices = [(offsets[lower], offsets[upper])] if lower < upper else []
             else:
-                result = pd.concat([result, df], axis=0)
-
-        return result
-
-    def __query_process_dataset(self, current_group: h5py.Group, conditions: dict) -> pd.DataFrame:
-        result = self.__dataset_group_to_dataframe(current_group)
-        if result is None or result.empty:
-            return result
-        for k in conditions.keys():
-            if k not in result.columns:
-                self.log('Warning: Field %s not in result.' % k)
-                continue
-            cond = conditions[k]
-            if isinstance(cond, list):
-                result = result[result[k] in cond]
-            elif isinstance(cond, tuple):
-                def cond_wrapper(field: str, range_cond: tuple):
-                    return lambda x: self.judge_range_condition(x[field], range_cond)
-                result = result[result.apply(cond_wrapper(k, cond), axis=1, reduce=True)]
-            elif isinstance(cond, str):
-                result = result[result[k] == cond]
+                values = cond if isinstance(cond, (list, set)) else [cond]
+                slices = []
+                for value in values:
+                    value = self.__to_storage_scalar(value, kind)
+                    pos = np.searchsorted(index_values, value, side='left')
+                    if pos < len(index_values) and index_values[pos] == value:
+                        slices.append((offsets[pos], offsets[pos + 1]))
+                slices.sort()
+
+        # If the first key is equal condition, the second key is sorted in each slice. Narrow by it.
+        if len(primary_keys) > 1 and primary_keys[1] in conditions and \
+                cond is not None and not isinstance(cond, tuple):
+            second_key = primary_keys[1]
+            second_cond = conditions[second_key]
+            if isinstance(second_cond, tuple):
+                kind = base[second_key].attrs.get('kind', DepotHDF5.KIND_NUMBER)
+                narrowed = []
+                for start, end in slices:
+                    values = self.__read_dataset(base[second_key], slice(start, end), kind)
+                    lower, upper = self.__range_index(values, second_cond, kind)
+                    if lower < upper:
+                        narrowed.append((start + lower, start + upper))
+                slices = narrowed
+        return slices
+
+    def __range_index(self, sorted_values: np.ndarray, cond: tuple, kind: str) -> (int, int):
+        lower, upper = 0, len(sorted_values)
+        if len(cond) >= 1 and cond[0] is not None:
+            lower = np.searchsorted(sorted_values, self.__to_storage_scalar(cond[0], kind), side='left')
+        if len(cond) >= 2 and cond[1] is not None:
+            upper = np.searchsorted(sorted_values, self.__to_storage_scalar(cond[1], kind), side='right')
+        return int(lower), int(upper)
+
+    def __condition_mask(self, df: pd.DataFrame, conditions: dict) -> pd.Series:
+        mask = pd.Series(True, index=df.index)
+        for k, cond in conditions.items():
+            if k not in df.columns:
+                return pd.Series(False, index=df.index)
+            if isinstance(cond, tuple):
+                if len(cond) >= 1 and cond[0] is not None:
+                    mask &= df[k] >= cond[0]
+                if len(cond) >= 2 and cond[1] is not None:
+                    mask &= df[k] <= cond[1]
+            elif isinstance(cond, (list, set)):
+                mask &= df[k].isin(list(cond))
             else:
-                self.log('Warning: HDF5 Depot not support condition: ' + str(cond))
-        return result
-
-    def __dataset_group_to_dataframe(self, group: h5py.Group) -> pd.DataFrame:
-        padding_dataset, max_len = self.__check_fill_dataset_group_alignment(group)
-        if len(padding_dataset) != 0:
-            self.log('Warning: Padding data to fields of h5py group: ' + str(padding_dataset))
-
-        df = pd.DataFrame()
-        for column in group.keys():
-            np_arr = group[column]
-            df[column] = np_arr
-        return df
-
-    def __delete_all_dataset_in_group(self, group: h5py.Group):
-        keys = group.keys()
-        for k in keys:
-            del group[k]
-
-    def __check_fill_dataset_group_alignment(self, group: h5py.Group) -> ([str], int):
-        max_len = 0
-        padding_dataset = []
-        for key in group.keys():
-            dataset: h5py.Dataset = group[key]
-            max_len = max(max_len, dataset.shape[0])
-        for key in group.keys():
-            dataset: h5py.Dataset = group[key]
-            ds_len = dataset.shape[0]
-            if ds_len < max_len:
-                padding_dataset.append(key)
-                dataset.resize((max_len, ))
-        return padding_dataset, max_len
-
-
-
-
-
-
+                mask &= df[k] == cond
+        return mask
+
+    # ---------------------------------------------- Write ----------------------------------------------
+
+    def __compact(self, f: h5py.File):
+        if DepotHDF5.GROUP_DELTA not in f or len(f[DepotHDF5.GROUP_DELTA].keys()) == 0:
+            return
+        df = self.__query_merged(f, {}, None)
+        self.__rewrite_base(f, df)
+
+    def __rewrite_base(self, f: h5py.File, df: pd.DataFrame or None):
+        kinds = self.__exists_kinds(f)
+        temp_name = DepotHDF5.GROUP_BASE + '_compacting'
+        if temp_name in f:
+            del f[temp_name]
+        if df is not None and not df.empty:
+            primary_keys = self.primary_keys()
+            if len(primary_keys) > 0:
+                df = df.sort_values(primary_keys, kind='mergesort').reset_index(drop=True)
+            base = f.create_group(temp_name)
+            self.__write_group(base, df, kinds)
+            if len(primary_keys) > 0:
+                self.__write_index(base, df[primary_keys[0]])
+        # Replace the base, then remove all deltas.
+        if DepotHDF5.GROUP_BASE in f:
+            del f[DepotHDF5.GROUP_BASE]
+        if temp_name in f:
+            f.move(temp_name, DepotHDF5.GROUP_BASE)
+        if DepotHDF5.GROUP_DELTA in f:
+            del f[DepotHDF5.GROUP_DELTA]
+
+    def __write_index(self, base: h5py.Group, key_series: pd.Series):
+        kind = base[key_series.name].attrs.get('kind', DepotHDF5.KIND_NUMBER)
+        key_values = self.__to_storage_array(key_series, kind)
+        # The key is sorted, so the distinct values are the boundary of changes.
+        changes = np.flatnonzero(key_values[1:] != key_values[:-1]) + 1
+        starts = np.concatenate([[0], changes])
+        offsets = np.concatenate([starts, [len(key_values)]]).astype(np.int64)
+        self.__create_dataset(base, DepotHDF5.INDEX_VALUES, key_values[starts], kind)
+        base.create_dataset(DepotHDF5.INDEX_OFFSETS, data=offsets)
+
+    def __write_group(self, group: h5py.Group, df: pd.DataFrame, kinds: dict):
+        for column in df.columns:
+            series = df[column]
+            kind = self.__column_kind(series, kinds.get(str(column), None))
+            self.__create_dataset(group, str(column), self.__to_storage_array(series, kind), kind)
+        group.attrs['rows'] = len(df)
+
+    def __create_dataset(self, group: h5py.Group, name: str, data: np.ndarray, kind: str):
+        compression = 'gzip' if self.__compress else None
+        if kind == DepotHDF5.KIND_STR:
+            dataset = group.create_dataset(name, data=data.astype(object), dtype=h5py.string_dtype(),
+                                           maxshape=(None,), chunks=True, compression=compression)
+        else:
+            dataset = group.create_dataset(name, data=data, maxshape=(None,), chunks=True, compression=compression)
+        dataset.attrs['kind'] = kind
+
+    # ---------------------------------------------- Read ----------------------------------------------
+
+    def __read_group(self, group: h5py.Group, rows: slice or None, fields: [str] or None) -> pd.DataFrame:
+        rows = slice(None) if rows is None else rows
+        columns = self.__group_columns(group)
+        if fields is not None:
+            columns = [c for c in columns if c in fields]
+        data = {}
+        for column in columns:
+            dataset = group[column]
+            data[column] = self.__read_dataset(dataset, rows, dataset.attrs.get('kind', DepotHDF5.KIND_NUMBER))
+        return pd.DataFrame(data)
+
+    def __read_dataset(self, dataset: h5py.Dataset, rows: slice, kind: str) -> np.ndarray:
+        if kind == DepotHDF5.KIND_STR:
+            values = dataset.asstr()[rows]
+            values = np.asarray(values, dtype=object)
+            values[values == DepotHDF5.NULL_STR] = None
+            return values
+        if kind == DepotHDF5.KIND_DATETIME:
+            return dataset[rows].astype('datetime64[ns]')
+        return dataset[rows]
+
+    # ---------------------------------------------- Type ----------------------------------------------
+
+    def __column_kind(self, series: pd.Series, exists_kind: str or None) -> str:
+        """
+        Get the storage kind of column. Keep the kind of the exists datasets if the data can be stored as it.
+        :param series: The column data
+        :param exists_kind: The kind of this column in the exists base or delta. None if it's a new column.
+        """
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return DepotHDF5.KIND_DATETIME
+        if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype):
+            return DepotHDF5.KIND_STR if exists_kind == DepotHDF5.KIND_STR else DepotHDF5.KIND_NUMBER
+        not_null = series.dropna()
+        if len(not_null) == 0:
+            return exists_kind if exists_kind is not None else DepotHDF5.KIND_STR
+        if all(isinstance(v, (pd.Timestamp, np.datetime64)) or
+               hasattr(v, 'timetuple') for v in not_null.iloc[:100]):
+            return DepotHDF5.KIND_DATETIME
+        # The object column of numbers and None
+        if exists_kind != DepotHDF5.KIND_STR and \
+                pd.api.types.infer_dtype(not_null, skipna=True) in DepotHDF5.NUMBER_INFERRED_TYPES:
+            return DepotHDF5.KIND_NUMBER
+        return DepotHDF5.KIND_STR
+
+    def __to_storage_array(self, series: pd.Series, kind: str) -> np.ndarray:
+        if kind == DepotHDF5.KIND_DATETIME:
+            values = pd.to_datetime(series).to_numpy(dtype='datetime64[ns]')
+            return values.astype(np.int64)
+        if kind == DepotHDF5.KIND_STR:
+            return np.array([DepotHDF5.NULL_STR if v is None or (isinstance(v, float) and np.isnan(v))
+                             else str(v) for v in series], dtype=object)
+        if series.dtype.kind == 'O':
+            # None is stored as NaN
+            return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64)
+        return series.to_numpy()
+
+    def __to_storage_scalar(self, value: any, kind: str) -> any:
+        if kind == DepotHDF5.KIND_DATETIME:
+            return np.datetime64(pd.Timestamp(value), 'ns')
+        if kind == DepotHDF5.KIND_STR:
+            return str(value)
+        return value
+
+    # ---------------------------------------------- Assistance ----------------------------------------------
+
+    def __all_data_groups(self, f: h5py.File) -> [h5py.Group]:
+        groups = []
+        if DepotHDF5.GROUP_BASE in f:
+            groups.append(f[DepotHDF5.GROUP_BASE])
+        if DepotHDF5.GROUP_DELTA in f:
+            delta_group = f[DepotHDF5.GROUP_DELTA]
+            groups.extend([delta_group[name] for name in sorted(delta_group.keys())])
+        return groups
+
+    def __exists_kinds(self, f: h5py.File) -> dict:
+        kinds = {}
+        for group in self.__all_data_groups(f):
+            for column in self.__group_columns(group):
+                kinds.setdefault(column, group[column].attrs.get('kind', DepotHDF5.KIND_NUMBER))
+        return kinds
+
+    @staticmethod
+    def __group_columns(group: h5py.Group) -> [str]:
+        return [k for k in group.keys() if not k.startswith('__')]
+
+    @staticmethod
+    def __group_length(group: h5py.Group) -> int:
+        return int(group.attrs.get('rows', 0))
+
+    @staticmethod
+    def __valid_conditions(conditions: dict) -> dict:
+        return {k: v for k, v in conditions.items() if v is not None}
@@ -55,6 +55,20 @@ class DepotInterface:
         """
         pass
 
+    def query_chunks(self, *args, conditions: dict = None, fields: [str] or None = None,
+                     chunk_size: int = 100000, **kwargs):
+        """
+        Same as query() but yields the result as DataFrame chunks. For the large table that do not fit in memory.
+        The default implementation slices the result of query(). Depot should override it if it supports streaming.
+        :param chunk_size: The max row count of each chunk
+        :return: Generator of DataFrame
+        """
+        df = self.query(*args, conditions=conditions, fields=fields, **kwargs)
+        if df is None:
+            return
+        for start in range(0, len(df), max(1, chunk_size)):
+            yield df.iloc[start:start + chunk_size]
+
     def insert(self, dataset: pd.DataFrame or dict or any) -> bool:
         pass
 
@@ -79,6 +93,9 @@ class DepotInterface:
     def record_count(self) -> int:
         pass
 
+    def length(self) -> int:
+        return self.record_count()
+
     def distinct_value_of_field(self, field: str) -> [str]:
         pass
 
@@ -1,10 +1,13 @@
 import time
+import datetime
 import traceback
 
 import numpy as np
 import pandas as pd
 from bson import Code
 from pymongo import MongoClient, ASCENDING, UpdateOne, InsertOne       # UpdateMany, DeleteOne, DeleteMany
+from pymongo.errors import BulkWriteError
+from concurrent.futures import ThreadPoolExecutor
 from .DepotInterface import DepotInterface
 
 
@@ -13,16 +16,37 @@ from .DepotInterface import DepotInterface
 # ----------------------------------------------------------------------------------------------------------------------
 
 class DepotMongoDB(DepotInterface):
-    def __init__(self, primary_keys: [str], client: MongoClient, database: str, data_table: str):
+    DEFAULT_BATCH_SIZE = 1000
+    DEFAULT_READ_BATCH_SIZE = 10000
+    # If the distinct value count of a string key exceeds this, skip the empty range checking.
+    MAX_RANGE_CHECK_IN = 10000
+
+    def __init__(self, primary_keys: [str], client: MongoClient, database: str, data_table: str,
+                 batch_size: int = DEFAULT_BATCH_SIZE, writer_threads: int = 1):
         super(DepotMongoDB, self).__init__(primary_keys)
 
         self.__client = client
         self.__database = database
         self.__data_table = data_table
 
+        self.__batch_size = max(1, batch_size)
+        self.__writer_threads = max(1, writer_threads)
+        self.__read_batch_size = DepotMongoDB.DEFAULT_READ_BATCH_SIZE
+
         self.__connection_count = 0
         self.__connection_threshold = 100
 
+    def set_write_option(self, batch_size: int = None, writer_threads: int = None):
+        """
+        Tune the bulk write.
+        :param batch_size: The document count of each bulk write.
+        :param writer_threads: The thread count that writes batches to collection in parallel.
+        """
+        if batch_size is not None:
+            self.__batch_size = max(1, batch_size)
+        if writer_threads is not None:
+            self.__writer_threads = max(1, writer_threads)
+
     # ------------------------------- Basic Operation -------------------------------
 
     def query(self, *args, conditions: dict = None, fields: [str] or None = None, **kwargs) -> pd.DataFrame or None:
@@ -33,11 +57,30 @@ class DepotMongoDB(DepotInterface):
         spec = self.__gen_find_spec(*args, conditions=conditions)
         select_fields = None if fields is None else {f: 1 for f in fields}
 
-        result = collection.find(spec, select_fields)
-        df = pd.DataFrame(list(result))
+        cursor = collection.find(spec, select_fields, batch_size=self.__read_batch_size)
+        df = self.__decode_cursor(cursor, fields)
 
         return df
 
+    def query_chunks(self, *args, conditions: dict = None, fields: [str] or None = None,
+                     chunk_size: int = 100000, **kwargs):
+        collection = self.__get_collection()
+        if collection is None:
+            return
+
+        spec = self.__gen_find_spec(*args, conditions=conditions)
+        select_fields = None if fields is None else {f: 1 for f in fields}
+
+        cursor = collection.find(spec, select_fields, batch_size=min(chunk_size, self.__read_batch_size))
+        try:
+            while True:
+                df = self.__decode_cursor(cursor, fields, max(1, chunk_size))
+                if df.empty:
+                    break
+                yield df
+        finally:
+            cursor.close()
+
     def insert(self, dataset: pd.DataFrame or dict or any) -> bool:
         return self.__xsert(dataset, 0)
 
@@ -177,65 +220,163 @@ class DepotMongoDB(DepotInterface):
     def __xsert(self, dataset: pd.DataFrame or dict or any, operation: int) -> bool:
         # 0: Insert
         # 1: Upsert
+        # 2: Insert, upsert the duplicate records
 
         ret, data_dict = self.__process_xsert_prarm(dataset)
         if not ret:
             return False
+        if len(data_dict) == 0:
+            return True
 
         collection = self.__get_collection()
         if collection is None:
             return False
 
-        bulk_operations = []
-        for document in data_dict:
-            # Consider "array like" value
-            clean_doc = {k: v for k, v in document.items() if not (pd.notnull(v) is False)}
-            if operation == 0:
-                bulk_operations.append(InsertOne({'$set': clean_doc}))
-            elif operation == 1:
-                spec = self.__gen_upsert_spec(document)
-                bulk_operations.append(UpdateOne(spec, {'$set': clean_doc}, upsert=True))
-            else:
-                assert False
-            # Max 1000 operations
-            try:
-                if len(bulk_operations) >= 1000:
-                    collection.bulk_write(bulk_operations)
-                    bulk_operations.clear()
-            except Exception as e:
-                print('Error update: ' + str(e))
-                print(traceback.format_exc())
-            finally:
-                pass
+        # The records with the same primary keys must be written in order. So the batches should not be parallel.
+        ordered = isinstance(dataset, pd.DataFrame) and len(self.primary_keys()) > 0 and \
+            set(self.primary_keys()).issubset(dataset.columns) and \
+            bool(dataset.duplicated(subset=self.primary_keys()).any())
+
+        # If there's no exists record in the key range of dataset, upsert is the same as insert.
+        if operation == 1 and not ordered and self.__target_range_empty(collection, dataset):
+            operation = 2
+
+        batches = [data_dict[i:i + self.__batch_size] for i in range(0, len(data_dict), self.__batch_size)]
+        if ordered:
+            results = [self.__write_batch(collection, batch, operation, True) for batch in batches]
+        elif self.__writer_threads > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=self.__writer_threads) as executor:
+                results = list(executor.map(lambda batch: self.__write_batch(collection, batch, operation), batches))
+        else:
+            results = [self.__write_batch(collection, batch, operation) for batch in batches]
+        return all(results)
+
+    def __write_batch(self, collection, documents: [dict], operation: int, ordered: bool = False) -> bool:
         try:
-            if len(bulk_operations) > 0:
-                collection.bulk_write(bulk_operations)
-                bulk_operations.clear()
+            if operation in (0, 2):
+                collection.insert_many(documents, ordered=ordered)
+            else:
+                bulk_operations = [UpdateOne(self.__gen_upsert_spec(document), {'$set': document}, upsert=True)
+                                   for document in documents]
+                collection.bulk_write(bulk_operations, ordered=ordered)
+            return True
+        except BulkWriteError as e:
+            # The records may be inserted by others after the range checking. Upsert them instead.
+            if operation == 2 and self.__only_duplicate_key_error(e):
+                failed = [documents[error['index']] for error in e.details.get('writeErrors', [])]
+                for document in failed:
+                    document.pop('_id', None)
+                return self.__write_batch(collection, failed, 1, ordered)
+            print('Error bulk write: ' + str(e))
+            print(traceback.format_exc())
+            return False
         except Exception as e:
-            print('Error bulk update: ' + str(e))
+            print('Error bulk write: ' + str(e))
             print(traceback.format_exc())
+            return False
+        finally:
             pass
+
+    def __target_range_empty(self, collection, dataset: pd.DataFrame or any) -> bool:
+        if not isinstance(dataset, pd.DataFrame) or len(self.primary_keys()) == 0:
+            return False
+        spec = {}
+        for primary_key in self.primary_keys():
+            if primary_key not in dataset.columns:
+                return False
+            values = dataset[primary_key].dropna()
+            if values.empty:
+                return False
+            if pd.api.types.is_datetime64_any_dtype(values.dtype) or pd.api.types.is_numeric_dtype(values.dtype):
+                spec[primary_key] = {'$gte': self.__to_native(values.min()), '$lte': self.__to_native(values.max())}
+            else:
+                unique_values = values.unique()
+                if len(unique_values) > DepotMongoDB.MAX_RANGE_CHECK_IN:
+                    return False
+                spec[primary_key] = {'$in': [self.__to_native(v) for v in unique_values]}
+        try:
+            return collection.find_one(spec, {'_id': 1}) is None
+        except Exception as e:
+            print('Check target range fail: ' + str(e))
+            return False
         finally:
             pass
-        return True
+
+    @staticmethod
+    def __decode_cursor(cursor, fields: [str] or None, max_rows: int = 0) -> pd.DataFrame:
+        """
+        Decode the documents into column lists directly. The documents will not be kept after decoding.
+        :param cursor: The mongodb cursor
+        :param fields: The projection fields. They are the leading columns and always exist in the result.
+        :param max_rows: Stop after decoding this count of documents. 0 means decode all.
+        :return: DataFrame. The datetime and number columns are typed.
+        """
+        columns = {}
+        if fields is not None:
+            for field in fields:
+                columns[field] = []
+        # The columns that missing in some documents
+        backfilled = set()
+        rows = 0
+        for document in cursor:
+            for k, v in document.items():
+                column = columns.get(k, None)
+                if column is None:
+                    column = columns[k] = []
+                if len(column) < rows:
+                    # Missing in the previous documents
+                    column.extend([None] * (rows - len(column)))
+                    backfilled.add(k)
+                column.append(v)
+            rows += 1
+            if 0 < max_rows <= rows:
+                break
+        if rows == 0:
+            return pd.DataFrame(columns=list(columns.keys()))
+        for k, column in columns.items():
+            if len(column) < rows:
+                column.extend([None] * (rows - len(column)))
+                backfilled.add(k)
+        return pd.DataFrame({k: DepotMongoDB.__typed_column(v, k in backfilled) for k, v in columns.items()})
+
+    @staticmethod
+    def __typed_column(values: list, backfilled: bool = False) -> np.ndarray or list:
+        # Only type the column that all values are the same type. Otherwise pd.to_datetime() will take
+        #   the number as timestamp. Let DataFrame infer the mixed column, which keeps it as object.
+        sample = next((v for v in values if v is not None), None)
+        if sample is None and backfilled:
+            # Same as pd.DataFrame(list of dict): The column of missing values is NaN
+            return np.full(len(values), np.nan)
+        try:
+            if isinstance(sample, datetime.datetime):
+                if all(v is None or isinstance(v, datetime.datetime) for v in values):
+                    return pd.to_datetime(values).to_numpy()
+            elif isinstance(sample, float):
+                if all(v is None or type(v) in (float, int) for v in values):
+                    return np.array([np.nan if v is None else v for v in values], dtype=float)
+        except Exception:
+            # The mixed type column. Let DataFrame infer it.
+            pass
+        finally:
+            pass
+        return values
 
     def __process_xsert_prarm(self, dataset: pd.DataFrame or dict or any) -> (bool, [dict]):
         if not self.check_primary_keys(dataset):
             return False, None
         if isinstance(dataset, pd.DataFrame):
-            # s1 = time.time()
-            # data_dict = dataset.T.apply(lambda x: x.dropna().to_dict()).tolist()
-            # print('Method1 - Timespending: %sms' % int((time.time() - s1) * 1000))
-            #
-            # s2 = time.time()
             data_dict = dataset.to_dict('records')
-            # print('Method2 - Timespending: %sms' % int((time.time() - s2) * 1000))
-            # data_dict = _data.T.to_dict().values()
-            # print('Convert DataFrame size(%d) time spending: %s' % (len(_data), clock.elapsed_s()))
+            # Remove the NaN values column by column. Only the null cells will be touched.
+            null_mask = dataset.isna().to_numpy()
+            for column_index in np.flatnonzero(null_mask.any(axis=0)):
+                column = dataset.columns[column_index]
+                for row_index in np.flatnonzero(null_mask[:, column_index]):
+                    del data_dict[row_index][column]
         elif isinstance(dataset, dict):
-            data_dict = [dataset]
+            # Consider "array like" value
+            data_dict = [{k: v for k, v in dataset.items() if not (pd.notnull(v) is False)}]
         elif isinstance(dataset, (list, tuple)):
-            data_dict = dataset
+            data_dict = [{k: v for k, v in document.items() if not (pd.notnull(v) is False)} for document in dataset]
         else:
             return False, None
         return True, data_dict
@@ -273,6 +414,19 @@ class DepotMongoDB(DepotInterface):
                 del document[primary_key]
         return spec
 
+    @staticmethod
+    def __to_native(value: any) -> any:
+        if isinstance(value, pd.Timestamp):
+            return value.to_pydatetime()
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    @staticmethod
+    def __only_duplicate_key_error(e: BulkWriteError) -> bool:
+        errors = e.details.get('writeErrors', [])
+        return len(errors) > 0 and all(error.get('code') == 11000 for error in errors)
+
     @staticmethod
     def __collection_exists(db, collection_name: str) -> bool:
         return collection_name in db.list_collection_names()
@@ -0,0 +1,540 @@
+import os
+import re
+import zlib
+import shutil
+import datetime
+import threading
+import traceback
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from .DepotInterface import DepotInterface
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                    PartitionLock
+# ----------------------------------------------------------------------------------------------------------------------
+
+class PartitionLock:
+    """
+    Guard the read-modify-write of a partition file. The thread lock is shared by all depots in this process,
+        and the lock file (<partition file>.lock) guards the partition against the writers in other processes.
+    """
+
+    LOCK_SUFFIX = '.lock'
+
+    __thread_locks = {}
+    __thread_locks_lock = threading.Lock()
+
+    def __init__(self, file_path: str):
+        self.__file_path = os.path.abspath(file_path)
+        self.__lock_file = None
+        with PartitionLock.__thread_locks_lock:
+            if self.__file_path not in PartitionLock.__thread_locks:
+                PartitionLock.__thread_locks[self.__file_path] = threading.Lock()
+            self.__thread_lock = PartitionLock.__thread_locks[self.__file_path]
+
+    def __enter__(self):
+        self.__thread_lock.acquire()
+        try:
+            os.makedirs(os.path.dirname(self.__file_path), exist_ok=True)
+            self.__lock_file = open(self.__file_path + PartitionLock.LOCK_SUFFIX, 'a+b')
+            self.__acquire_file_lock()
+        except Exception:
+            self.__release_file_lock()
+            self.__thread_lock.release()
+            raise
+        finally:
+            pass
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.__release_file_lock()
+        finally:
+            self.__thread_lock.release()
+        return False
+
+    def __acquire_file_lock(self):
+        if fcntl is not None:
+            fcntl.flock(self.__lock_file.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            self.__lock_file.seek(0)
+            while True:
+                try:
+                    # LK_LOCK retries for 10 seconds then raises OSError
+                    msvcrt.locking(self.__lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+                finally:
+                    pass
+
+    def __release_file_lock(self):
+        if self.__lock_file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.__lock_file.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                self.__lock_file.seek(0)
+                msvcrt.locking(self.__lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        except Exception:
+            pass
+        finally:
+            self.__lock_file.close()
+            self.__lock_file = None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                     DepotParquet
+# ----------------------------------------------------------------------------------------------------------------------
+
+class DepotParquet(DepotInterface):
+    """
+    A service-free depot which stores data as columnar parquet files. Each partition is a single parquet file.
+        PARTITION_NONE: All data in one file.
+        PARTITION_VALUE: Partitioned by the value of partition field. e.g. stock_identity
+        PARTITION_YEAR: Partitioned by the year of partition field, which should be datetime. e.g. trade_date
+    The query conditions of partition field are used to select the partition files. All conditions are also
+        pushed down to parquet reader as filters. The files are read with memory map.
+    The rows that partition value is null (or the date cannot be parsed) are kept in the NULL_PARTITION file.
+    The partition value that is not safe as file name is escaped and suffixed with its hash, so the different values
+        never share a file.
+    """
+
+    PARTITION_NONE = 0
+    PARTITION_VALUE = 1
+    PARTITION_YEAR = 2
+
+    FILE_SUFFIX = '.parquet'
+    SINGLE_PARTITION = '_all'
+    NULL_PARTITION = '_null'
+
+    def __init__(self, primary_keys: [str], root_path: str, data_table: str,
+                 partition_field: str = None, partition_mode: int = PARTITION_VALUE, compression: str = 'snappy'):
+        super(DepotParquet, self).__init__(primary_keys)
+        self.__root_path = root_path
+        self.__data_table = data_table
+        self.__compression = compression
+
+        if partition_field is None or partition_mode == DepotParquet.PARTITION_NONE:
+            self.__partition_field = None
+            self.__partition_mode = DepotParquet.PARTITION_NONE
+        else:
+            self.__partition_field = partition_field
+            self.__partition_mode = partition_mode
+
+    # ------------------------------- Basic Operation -------------------------------
+
+    def query(self, *args, conditions: dict = None, fields: [str] or None = None, **kwargs) -> pd.DataFrame or None:
+        full_conditions = self.full_conditions(*args, conditions=conditions)
+        table = self.__read_table(full_conditions, fields)
+        if table is None:
+            return pd.DataFrame()
+        return table.to_pandas()
+
+    def insert(self, dataset: pd.DataFrame or dict or any) -> bool:
+        return self.__xsert(dataset, False)
+
+    def upsert(self, dataset: pd.DataFrame or dict or any) -> bool:
+        return self.__xsert(dataset, True)
+
+    def delete(self, *args, conditions: dict = None, fields: [str] or None = None,
+               delete_all: bool = False, **kwargs) -> bool:
+        full_conditions = self.full_conditions(*args, conditions=conditions)
+        full_conditions = {k: v for k, v in full_conditions.items() if v is not None}
+        if len(full_conditions) == 0 and not delete_all:
+            self.log('Warning: No condition for delete. '
+                     'If you want to delete all documents. '
+                     'Please specify delete_all=True')
+            return False
+
+        for partition in self.__select_partitions(full_conditions):
+            with self.__partition_lock(partition):
+                df = self.__read_partition_dataframe(partition)
+                if df is None or df.empty:
+                    continue
+                mask = self.__condition_mask(df, full_conditions)
+                if fields is None:
+                    df = df[~mask]
+                else:
+                    for field in fields:
+                        if field in df.columns and field not in self.primary_keys():
+                            df.loc[mask, field] = None
+                if not self.__write_partition_dataframe(partition, df):
+                    return False
+        return True
+
+    def drop(self) -> bool:
+        try:
+            if os.path.isdir(self.table_path()):
+                shutil.rmtree(self.table_path())
+            return True
+        except Exception as e:
+            self.log('Drop depot %s fail: %s' % (self.table_path(), str(e)))
+            return False
+        finally:
+            pass
+
+    def raw(self) -> any:
+        return self.table_path()
+
+    # ----------------------------- Advanced Operation ------------------------------
+
+    def range_of(self, field, *args, conditions: dict = None, **kwargs) -> (any, any):
+        full_conditions = self.full_conditions(*args, conditions=conditions)
+        table = self.__read_table(full_conditions, [field])
+        if table is None or field not in table.column_names or table.num_rows == 0:
+            return None, None
+        try:
+            min_max = pc.min_max(table.column(field)).as_py()
+            return min_max.get('min'), min_max.get('max')
+        except Exception:
+            # Some types are not supported by pyarrow compute. Use pandas instead.
+            series = table.column(field).to_pandas().dropna()
+            return (None, None) if series.empty else (series.min(), series.max())
+        finally:
+            pass
+
+    def record_count(self) -> int:
+        count = 0
+        for partition in self.__all_partitions():
+            try:
+                count += pq.ParquetFile(self.__partition_file(partition)).metadata.num_rows
+            except Exception as e:
+                self.log('Read metadata of %s fail: %s' % (partition, str(e)))
+            finally:
+                pass
+        return count
+
+    def distinct_value_of_field(self, field: str) -> [str]:
+        if field == self.__partition_field and self.__partition_mode == DepotParquet.PARTITION_VALUE:
+            values = []
+            for partition in self.__all_partitions():
+                table = self.__read_partition_table(partition, [field], None)
+                if table is not None and table.num_rows > 0:
+                    values.append(table.column(field)[0].as_py())
+            return values
+        table = self.__read_table({}, [field])
+        if table is None or field not in table.column_names:
+            return []
+        return [v for v in pc.unique(table.column(field)).to_pylist() if v is not None]
+
+    def all_fields(self) -> [str]:
+        fields = []
+        for partition in self.__all_partitions():
+            try:
+                schema = pq.read_schema(self.__partition_file(partition))
+                fields.extend([name for name in schema.names if name not in fields])
+            except Exception as e:
+                self.log('Read schema of %s fail: %s' % (partition, str(e)))
+            finally:
+                pass
+        return fields
+
+    def remove_field(self, key: str) -> bool:
+        if key in self.primary_keys():
+            self.log('Warning: Cannot remove primary key: ' + key)
+            return False
+        for partition in self.__all_partitions():
+            with self.__partition_lock(partition):
+                table = self.__read_partition_table(partition, None, None)
+                if table is not None and key in table.column_names:
+                    table = table.drop([key])
+                    if not self.__write_partition_table(partition, table):
+                        return False
+        return True
+
+    def rename_field(self, field_old: str, field_new: str) -> bool:
+        if field_old in self.primary_keys():
+            self.log('Warning: Cannot rename primary key: ' + field_old)
+            return False
+        for partition in self.__all_partitions():
+            with self.__partition_lock(partition):
+                table = self.__read_partition_table(partition, None, None)
+                if table is not None and field_old in table.column_names:
+                    names = [field_new if name == field_old else name for name in table.column_names]
+                    if not self.__write_partition_table(partition, table.rename_columns(names)):
+                        return False
+        return True
+
+    # ----------------------------------------------------------------------------------
+
+    def table_path(self) -> str:
+        return os.path.join(self.__root_path, self.__data_table)
+
+    # ----------------------------------------- Write -----------------------------------------
+
+    def __xsert(self, dataset: pd.DataFrame or dict or any, upsert: bool) -> bool:
+        if not self.check_primary_keys(dataset):
+            return False
+        if isinstance(dataset, dict):
+            dataset = pd.DataFrame([dataset])
+        elif isinstance(dataset, (list, tuple)):
+            dataset = pd.DataFrame(list(dataset))
+        if not isinstance(dataset, pd.DataFrame):
+            self.log('DepotParquet only supports DataFrame, dict or list of dict.')
+            return False
+        if dataset.empty:
+            return True
+        if '_id' in dataset.columns:
+            dataset = dataset.drop(columns=['_id'])
+
+        if self.__partition_mode != DepotParquet.PARTITION_NONE and \
+                self.__partition_field not in dataset.columns:
+            self.log('Error: Partition field %s not in dataset.' % self.__partition_field)
+            return False
+
+        for partition, patch in self.__split_partition(dataset):
+            # Hold the partition lock during read-merge-rewrite. Otherwise the concurrent writers lose rows.
+            with self.__partition_lock(partition):
+                exists = self.__read_partition_dataframe(partition)
+                if exists is None or exists.empty:
+                    merged = patch.drop_duplicates(self.primary_keys(), keep='last') \
+                        if upsert and len(self.primary_keys()) > 0 else patch
+                elif upsert and len(self.primary_keys()) > 0:
+                    merged = self.__upsert_dataframe(exists, patch)
+                else:
+                    merged = pd.concat([exists, patch], axis=0, ignore_index=True, sort=False)
+                if not self.__write_partition_dataframe(partition, merged):
+                    return False
+        return True
+
+    def __upsert_dataframe(self, exists: pd.DataFrame, patch: pd.DataFrame) -> pd.DataFrame:
+        # Same as the $set of mongodb: The NaN field in patch will not overwrite the exists value.
+        primary_keys = self.primary_keys()
+        # The null primary key is a key too, the same as mongodb upsert with {key: None}.
+        patch = patch.drop_duplicates(primary_keys, keep='last')
+        exists_indexed = exists.set_index(primary_keys)
+        patch_indexed = patch.set_index(primary_keys)
+        merged = patch_indexed.combine_first(exists_indexed)
+        columns = list(exists.columns) + [c for c in patch.columns if c not in exists.columns]
+        return merged.reset_index()[columns]
+
+    def __split_partition(self, df: pd.DataFrame) -> [(str, pd.DataFrame)]:
+        if self.__partition_mode == DepotParquet.PARTITION_NONE:
+            return [(DepotParquet.SINGLE_PARTITION, df)]
+        if self.__partition_mode == DepotParquet.PARTITION_YEAR:
+            keys = pd.to_datetime(df[self.__partition_field], errors='coerce').dt.year
+        else:
+            keys = df[self.__partition_field]
+        null_count = int(keys.isna().sum())
+        if null_count > 0:
+            self.log('Warning: %d rows have no valid %s, put into partition %s.' %
+                     (null_count, self.__partition_field, DepotParquet.NULL_PARTITION))
+
+        partitions = OrderedDict()
+        for key, group in df.groupby(keys, sort=True, dropna=False):
+            partition = DepotParquet.NULL_PARTITION if pd.isna(key) else self.__partition_name(key)
+            partitions.setdefault(partition, []).append((key, group))
+        result = []
+        for partition, groups in partitions.items():
+            if len(groups) > 1:
+                # It should not happen with the hash suffix. The rows are still right because the queries are
+                #   filtered by the conditions, but the partition file is shared.
+                self.log('Warning: Partition values %s share the file %s.' % (str([g[0] for g in groups]), partition))
+            result.append((partition, pd.concat([g[1] for g in groups]) if len(groups) > 1 else groups[0][1]))
+        return result
+
+    def __write_partition_dataframe(self, partition: str, df: pd.DataFrame) -> bool:
+        try:
+            table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        except Exception as e:
+            # Mixed type object column. Convert it to string.
+            self.log('Convert DataFrame to arrow table fail, try convert mixed columns to str: ' + str(e))
+            df = df.copy()
+            for column in df.columns:
+                if df[column].dtype.kind == 'O':
+                    df[column] = df[column].apply(lambda x: x if x is None or isinstance(x, str) else str(x))
+            table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        return self.__write_partition_table(partition, table)
+
+    def __write_partition_table(self, partition: str, table: pa.Table) -> bool:
+        file_path = self.__partition_file(partition)
+        try:
+            os.makedirs(self.table_path(), exist_ok=True)
+            if table.num_rows == 0:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                return True
+            # Write to temporary file then replace. The reader will not see a partial written file.
+            temp_path = file_path + '.writing'
+            pq.write_table(table, temp_path, compression=self.__compression)
+            os.replace(temp_path, file_path)
+            return True
+        except Exception as e:
+            self.log('Write partition %s fail: %s' % (file_path, str(e)))
+            print(traceback.format_exc())
+            return False
+        finally:
+            pass
+
+    # ----------------------------------------- Read -----------------------------------------
+
+    def __read_table(self, conditions: dict, fields: [str] or None) -> pa.Table or None:
+        conditions = {k: v for k, v in conditions.items() if v is not None}
+        tables = []
+        for partition in self.__select_partitions(conditions):
+            table = self.__read_partition_table(partition, fields, conditions)
+            if table is not None and table.num_rows > 0:
+                tables.append(table)
+        if len(tables) == 0:
+            return None
+        if len(tables) == 1:
+            return tables[0]
+        try:
+            return pa.concat_tables(tables, promote_options='permissive')
+        except Exception:
+            # Schema conflict between partitions. Fallback to pandas concat.
+            df = pd.concat([t.to_pandas() for t in tables], axis=0, ignore_index=True, sort=False)
+            return pa.Table.from_pandas(df, preserve_index=False)
+        finally:
+            pass
+
+    def __read_partition_table(self, partition: str, fields: [str] or None,
+                               conditions: dict or None) -> pa.Table or None:
+        file_path = self.__partition_file(partition)
+        if not os.path.exists(file_path):
+            return None
+        try:
+            schema_names = pq.read_schema(file_path).names
+            if conditions is not None and any(k not in schema_names for k in conditions.keys()):
+                # Same as mongodb: The condition of a not exists field matches nothing.
+                return None
+            filters = self.__build_filters(conditions)
+            if fields is not None:
+                columns = [f for f in fields if f in schema_names]
+                # The filter fields should be read, remove them later.
+                read_columns = columns + [k for k in (conditions or {}).keys() if k not in columns]
+            else:
+                columns = None
+                read_columns = None
+            table = pq.read_table(file_path, columns=read_columns, filters=filters if filters else None,
+                                  memory_map=True)
+            if columns is not None and read_columns != columns:
+                table = table.select(columns)
+            return table
+        except Exception as e:
+            self.log('Read partition %s fail: %s' % (file_path, str(e)))
+            print(traceback.format_exc())
+            return None
+        finally:
+            pass
+
+    def __read_partition_dataframe(self, partition: str) -> pd.DataFrame or None:
+        table = self.__read_partition_table(partition, None, None)
+        return table.to_pandas() if table is not None else None
+
+    def __build_filters(self, conditions: dict or None) -> list or None:
+        if conditions is None or len(conditions) == 0:
+            return None
+        filters = []
+        for k, v in conditions.items():
+            if v is None:
+                continue
+            if isinstance(v, tuple):
+                if len(v) >= 1 and v[0] is not None:
+                    filters.append((k, '>=', self.__normalize_value(v[0])))
+                if len(v) >= 2 and v[1] is not None:
+                    filters.append((k, '<=', self.__normalize_value(v[1])))
+            elif isinstance(v, (list, set)):
+                filters.append((k, 'in', [self.__normalize_value(i) for i in v]))
+            else:
+                filters.append((k, '==', self.__normalize_value(v)))
+        return filters
+
+    def __condition_mask(self, df: pd.DataFrame, conditions: dict) -> pd.Series:
+        mask = pd.Series(True, index=df.index)
+        for k, v in conditions.items():
+            if k not in df.columns:
+                return pd.Series(False, index=df.index)
+            if isinstance(v, tuple):
+                if len(v) >= 1 and v[0] is not None:
+                    mask &= df[k] >= v[0]
+                if len(v) >= 2 and v[1] is not None:
+                    mask &= df[k] <= v[1]
+            elif isinstance(v, (list, set)):
+                mask &= df[k].isin(list(v))
+            else:
+                mask &= df[k] == v
+        return mask
+
+    # --------------------------------------- Partition ---------------------------------------
+
+    def __all_partitions(self) -> [str]:
+        if not os.path.isdir(self.table_path()):
+            return []
+        return sorted([os.path.splitext(f)[0] for f in os.listdir(self.table_path())
+                       if f.endswith(DepotParquet.FILE_SUFFIX)])
+
+    def __select_partitions(self, conditions: dict) -> [str]:
+        all_partitions = self.__all_partitions()
+        if self.__partition_mode == DepotParquet.PARTITION_NONE:
+            return all_partitions
+        cond = conditions.get(self.__partition_field, None)
+        if cond is None:
+            return all_partitions
+
+        if self.__partition_mode == DepotParquet.PARTITION_YEAR:
+            if isinstance(cond, tuple):
+                lower = pd.to_datetime(cond[0]).year if len(cond) >= 1 and cond[0] is not None else None
+                upper = pd.to_datetime(cond[1]).year if len(cond) >= 2 and cond[1] is not None else None
+                return [p for p in all_partitions if p.isdigit() and
+                        (lower is None or int(p) >= lower) and (upper is None or int(p) <= upper)]
+            elif isinstance(cond, (list, set)):
+                selected = set(self.__partition_name(pd.to_datetime(c).year) for c in cond)
+            else:
+                selected = {self.__partition_name(pd.to_datetime(cond).year)}
+        else:
+            if isinstance(cond, tuple):
+                # Range of partition value. The file name can only compare as str.
+                if all(c is None or isinstance(c, str) for c in cond[:2]):
+                    lower = self.__partition_name(cond[0]) if len(cond) >= 1 and cond[0] is not None else None
+                    upper = self.__partition_name(cond[1]) if len(cond) >= 2 and cond[1] is not None else None
+                    return [p for p in all_partitions if
+                            (lower is None or p >= lower) and (upper is None or p <= upper)]
+                return all_partitions
+            elif isinstance(cond, (list, set)):
+                selected = set(self.__partition_name(c) for c in cond)
+            else:
+                selected = {self.__partition_name(cond)}
+        return [p for p in all_partitions if p in selected]
+
+    def __partition_file(self, partition: str) -> str:
+        return os.path.join(self.table_path(), partition + DepotParquet.FILE_SUFFIX)
+
+    def __partition_lock(self, partition: str) -> PartitionLock:
+        return PartitionLock(self.__partition_file(partition))
+
+    @staticmethod
+    def __partition_name(value: any) -> str:
+        if isinstance(value, (np.integer, np.floating)):
+            value = value.item()
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        # Keep the file name safe across platforms. The escaped name is suffixed with the hash of value.
+        text = str(value)
+        name = re.sub(r'[\\/:*?"<>|\s]', '_', text)
+        if name != text or name in [DepotParquet.SINGLE_PARTITION, DepotParquet.NULL_PARTITION]:
+            name += '~%08x' % zlib.crc32(text.encode('utf-8'))
+        return name
+
+    @staticmethod
+    def __normalize_value(value: any) -> any:
+        if isinstance(value, datetime.datetime):
+            return pd.Timestamp(value)
+        return value
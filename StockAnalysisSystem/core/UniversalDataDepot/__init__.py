@@ -1,3 +1,4 @@
 from .DepotHDF5 import DepotHDF5
 from .DepotMongoDB import DepotMongoDB
+from .DepotParquet import DepotParquet
 from .DepotInterface import DepotInterface
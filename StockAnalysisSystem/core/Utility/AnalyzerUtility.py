@@ -7,6 +7,7 @@ import pandas as pd
 from .common import *
 from .df_utility import *
 from .time_utility import *
+from .digit_utility import *
 
 
 def methods_from_prob(prob: dict) -> []:
@@ -159,6 +160,52 @@ def analysis_results_from_json(fp) -> [AnalysisResult]:
         return json.load(fp, object_hook=_json_analysis_result_hook)
 
 
+def iter_analysis_result_dicts_from_json(fp, chunk_size: int = 1024 * 1024):
+    """
+    Parse the json that dumped by analysis_results_to_json() item by item without loading the whole file.
+    :param fp: The text file object
+    :param chunk_size: The read size of each time
+    :return: Generator of the packed AnalysisResult dict. Use AnalysisResult.unpack() to convert it.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                return
+            chunk = fp.read(chunk_size)
+            eof = (chunk == '')
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        if not started:
+            if buffer[pos] != '[':
+                raise ValueError('Analysis result json should be a list.')
+            started = True
+            pos += 1
+            continue
+        if buffer[pos] == ']':
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # The item is incomplete, read more
+            chunk = fp.read(chunk_size)
+            eof = (chunk == '')
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        finally:
+            pass
+        yield item
+
+
 # -------------------- Analysis Result List --> Group/Select --------------------
 
 def analysis_result_list_to_analyzer_security_table(
@@ -299,6 +346,128 @@ class AnalysisContext:
         self.extra = {}
         self.logger = None
         self.progress = None
+        self.prefetch = None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+class AnalysisPrefetch:
+    """
+    The run scoped data that shared by all the analyzers in a strategy run.
+    The analyzers declare the uri and (readable) fields they need. Each uri is loaded by one bulk query of all the
+        securities of this run at the first access, so the same data is never queried twice by different analyzers.
+    The analyzers get per securities views. Modifying a view never changes the shared data.
+    Only the declared fields of the run securities are kept, and all data is released when the run finishes.
+    The uri in WHOLE_TABLE_URIS (like Market.SecuritiesInfo) is loaded as the whole table. Declaring it makes it an
+        input of the analyzer (for incremental analysis), and it's not a part of the annual report data.
+    """
+
+    WHOLE_TABLE_URIS = ['Market.SecuritiesInfo']
+
+    def __init__(self, data_hub, securities: [str], time_serial: tuple):
+        self.__data_hub = data_hub
+        self.__securities = list(securities)
+        self.__time_serial = time_serial
+
+        self.__lock = threading.Lock()
+        self.__declaration = OrderedDict()
+        # uri: DataFrame. None if load fail.
+        self.__data = {}
+        # uri: {stock_identity: row positions}
+        self.__indices = {}
+
+    def declare(self, uri: str, fields: [str]):
+        with self.__lock:
+            declared = self.__declaration.setdefault(uri, [])
+            declared.extend([f for f in fields if f not in declared])
+
+    def declare_all(self, declaration: dict):
+        """
+        :param declaration: {uri: [readable field]}
+        """
+        for uri, fields in declaration.items():
+            self.declare(uri, fields)
+
+    def declaration(self) -> dict:
+        return self.__declaration
+
+    def covers(self, uri: str, securities: str or [str], time_serial: tuple, fields: [str]) -> bool:
+        """
+        Check whether the prefetch data can serve this query. If not, the analyzer should query by itself.
+        """
+        if uri not in self.__declaration or time_serial != self.__time_serial:
+            return False
+        if not set(fields).issubset(set(self.__declaration[uri] + ['stock_identity', 'period'])):
+            return False
+        if isinstance(securities, str):
+            securities = [securities]
+        return set(securities).issubset(set(self.__securities))
+
+    def frame(self, uri: str) -> pd.DataFrame or None:
+        """
+        Get the whole data of declared uri. Do not modify it.
+        """
+        with self.__lock:
+            if uri not in self.__data:
+                self.__data[uri] = self.__load(uri)
+            return self.__data[uri]
+
+    def table(self, uri: str) -> pd.DataFrame or None:
+        """
+        Get the whole table that without identity and time_serial condition, like Market.SecuritiesInfo.
+        Do not modify it.
+        """
+        with self.__lock:
+            if uri not in self.__data:
+                self.__data[uri] = self.__data_hub.get_data_center().query(uri)
+            return self.__data[uri]
+
+    def view(self, uri: str, securities: str or [str], fields: [str] = None) -> pd.DataFrame:
+        """
+        Get the data of securities from a declared uri or a loaded table.
+        :param uri: The uri
+        :param securities: The securities or securities list
+        :param fields: The fields of the view. None for all fields.
+        :return: The DataFrame of this securities. Empty DataFrame if no data.
+        """
+        df = self.frame(uri) if uri in self.__declaration else self.table(uri)
+        if df is None or len(df) == 0:
+            return pd.DataFrame(columns=fields if fields is not None else [])
+        indices = self.__securities_indices(uri, df)
+        if isinstance(securities, str):
+            securities = [securities]
+        positions = [indices[s] for s in securities if s in indices]
+        positions = np.concatenate(positions) if len(positions) > 0 else np.array([], dtype=int)
+        df_view = df.take(positions)
+        return df_view[[f for f in fields if f in df_view.columns]] if fields is not None else df_view
+
+    def memory_usage(self) -> int:
+        return sum(df.memory_usage(deep=True).sum() for df in list(self.__data.values()) if df is not None)
+
+    def release(self):
+        with self.__lock:
+            self.__data.clear()
+            self.__indices.clear()
+
+    # ------------------------------------------------------------------------------
+
+    def __load(self, uri: str) -> pd.DataFrame or None:
+        fields = self.__declaration.get(uri, [])
+        data_center = self.__data_hub.get_data_center()
+        if uri in AnalysisPrefetch.WHOLE_TABLE_URIS:
+            return data_center.query(uri)
+        if not data_center.check_readable_name(fields):
+            return None
+        fields_stripped = list(set(fields + ['stock_identity', 'period']))
+        df = data_center.query(uri, self.__securities, self.__time_serial, fields=fields_stripped, readable=True)
+        return df.reset_index(drop=True) if df is not None else None
+
+    def __securities_indices(self, uri: str, df: pd.DataFrame) -> dict:
+        with self.__lock:
+            if uri not in self.__indices:
+                self.__indices[uri] = df.groupby('stock_identity', sort=False).indices \
+                    if 'stock_identity' in df.columns else {}
+            return self.__indices[uri]
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -325,18 +494,53 @@ class AnalysisContext:
 # ----------------------------------------------------------------------------------------------------------------------
 
 def standard_dispatch_analysis(methods: [str], securities: [str], time_serial: tuple,
-                               data_hub, database, extra: dict, method_list: list) -> [(str, [])] or None:
+                               data_hub, database, extra: dict, method_list: list,
+                               batch_method_list: list = None) -> [(str, [])] or None:
+    """
+    Dispatch analysis to the method entries.
+    :param methods: The method uuids that will be executed
+    :param securities: The securities list
+    :param time_serial: The analysis period
+    :param data_hub: DataHubEntry
+    :param database: DatabaseEntry
+    :param extra: The extra parameters. Specify 'batch_analysis': False to disable batch analysis.
+    :param method_list: The METHOD_LIST of plugin: [(uuid, name, detail, function_entry)]
+    :param batch_method_list: The BATCH_METHOD_LIST of plugin: [(uuid, data_declaration, batch_entry)]
+                                The batch entry is preferred if the method has it. See batch_dispatch_analysis().
+    :return: The AnalysisResult list
+    """
     context = AnalysisContext()
     if isinstance(extra, dict):
         context.extra = extra
         context.sas = extra.get('sas', None)
         context.logger = extra.get('logger', print)
         context.progress = extra.get('progress', ProgressRate())
+        context.prefetch = extra.get('prefetch', None) or None
+    else:
+        extra = {}
+        context.progress = ProgressRate()
+
+    batch_table = {}
+    if batch_method_list is not None and extra.get('batch_analysis', True):
+        batch_table = {_uuid: (declaration, batch_entry) for _uuid, declaration, batch_entry in batch_method_list}
 
     result_list = []
     for query_method in methods:
         sub_list = []
         context.cache.clear()
+
+        if query_method in batch_table:
+            declaration, batch_entry = batch_table[query_method]
+            context.progress.set_progress(query_method, 0, len(securities))
+            sub_list = batch_dispatch_analysis(query_method, declaration, batch_entry, securities, time_serial,
+                                               data_hub, database, context, extra)
+            if sub_list is not None:
+                result_list.extend(sub_list)
+                context.progress.set_progress(query_method, len(securities), len(securities))
+                continue
+            # Fallback to the per securities analysis
+            sub_list = []
+
         for _uuid, _, _, function_entry in method_list:
             if _uuid != query_method:
                 continue
@@ -377,6 +581,231 @@ def standard_dispatch_analysis(methods: [str], securities: [str], time_serial: t
     return result_list if len(result_list) > 0 else None
 
 
+# --------------------------------------------------- Batch Analysis ---------------------------------------------------
+
+"""
+The batch analysis contract. A plugin can provide a BATCH_METHOD_LIST besides METHOD_LIST:
+    BATCH_METHOD_LIST = [(uuid, data_declaration, batch_entry), ...]
+
+data_declaration: {uri: [readable field]} - The annual report data that the batch entry needs.
+    The data of all securities are queried once for each uri, only the annual reports are kept,
+    the na is filled with 0.0 for each uri, then the data are left merged by (stock_identity, period) in uri order.
+    The securities that lack data in any uri are excluded (and get the 'No data' result),
+    which is the same as query_readable_annual_report_pattern().
+    None if the data is not annual report shaped. The batch entry gets None as df and queries the data itself,
+    see batch_query_by_securities().
+
+batch_entry(securities, df, time_serial, data_hub, database, context, **kwargs) -> pd.DataFrame
+    securities: All the securities that request for analysis.
+    df: The whole market data that sorted by stock_identity, then period descending. None if no data_declaration.
+    Returns a DataFrame with BATCH_RESULT_COLUMNS (the 'weight' is optional). 'period' can be NaT.
+    The securities that not in the result will get the 'No data' result.
+"""
+
+BATCH_RESULT_COLUMNS = ['stock_identity', 'period', 'score', 'reason', 'brief', 'weight']
+
+
+def batch_dispatch_analysis(method: str, declaration: dict, batch_entry, securities: [str], time_serial: tuple,
+                            data_hub, database, context: AnalysisContext, extra: dict) -> [AnalysisResult] or None:
+    """
+    Execute a batch entry and convert the result frame to AnalysisResult list.
+    The result order is the same as the per securities analysis: by securities order, then by result frame order.
+    :return: The AnalysisResult list. None if batch analysis fails.
+    """
+    try:
+        df = query_readable_annual_report_batch(data_hub, declaration, securities, time_serial, context) \
+            if declaration is not None else None
+        df_result = batch_entry(securities, df, time_serial, data_hub, database, context, **extra)
+        results = analysis_result_frame_to_list(df_result, securities, method)
+    except Exception as e:
+        print('Execute batch analyzer [' + method + '] got exception. Fallback to per securities analysis.')
+        print(e)
+        print(traceback.format_exc())
+        results = None
+    finally:
+        pass
+    if results is None:
+        return None
+
+    # Same as per securities analysis: The securities that has no data gets the 'No data' result,
+    #   unless the batch entry gives result for it (e.g. not applied for its industry).
+    has_data = set(df['stock_identity']) if df is not None else set()
+    no_data = set(securities).difference(has_data).difference(set(r.securities for r in results))
+    if len(no_data) > 0:
+        for r in results_of_no_data(securities, no_data, time_serial):
+            r.method = method
+            results.append(r)
+        results = sort_results_by_securities(results, securities)
+    return results
+
+
+def query_readable_annual_report_batch(data_hub, declaration: dict, securities: [str],
+                                       time_serial: tuple, context: AnalysisContext = None) -> pd.DataFrame:
+    """
+    The batch version of batch_query_readable_annual_report_pattern(). Query once for each uri for all securities.
+    :param data_hub: The instance of DataHubEntry
+    :param declaration: {uri: [readable field]}
+    :param securities: The securities list
+    :param time_serial: The data range user queries
+    :param context: The AnalysisContext. The data comes from its prefetch if available.
+    :return: The merged annual report DataFrame. Empty DataFrame if no data.
+    """
+    frames = []
+    for uri, fields in declaration.items():
+        if uri in AnalysisPrefetch.WHOLE_TABLE_URIS:
+            # Not annual report. The batch entry gets it by query_securities_info().
+            continue
+        if not data_hub.get_data_center().check_readable_name(fields):
+            raise ValueError('Unknown readable name detect: ' + str(fields))
+        fields_stripped = list(set(list(fields) + ['stock_identity', 'period']))
+        df_uri = query_readable_data(data_hub, uri, securities, time_serial, fields_stripped, context)
+        if df_uri is None or len(df_uri) == 0:
+            return pd.DataFrame(columns=['stock_identity', 'period'] + list(fields))
+        frames.append(df_uri[df_uri['period'].dt.month == 12].fillna(0.0))
+    if len(frames) == 0:
+        return pd.DataFrame(columns=['stock_identity', 'period'])
+
+    # The securities should have data in all uris
+    df = frames[0]
+    for df_uri in frames[1:]:
+        df = df[df['stock_identity'].isin(df_uri['stock_identity'].unique())]
+    df = join_on_keys([df] + frames[1:], ['stock_identity', 'period'], how='left')
+    df = df.sort_values(['stock_identity', 'period'], ascending=[True, False], kind='mergesort')
+    return df.reset_index(drop=True)
+
+
+def analysis_result_frame_to_list(df: pd.DataFrame, securities: [str], method: str) -> [AnalysisResult]:
+    if df is None or len(df) == 0:
+        return []
+    df = df[df['stock_identity'].isin(securities)]
+
+    weights = df['weight'].tolist() if 'weight' in df.columns else [AnalysisResult.WEIGHT_NORMAL] * len(df)
+    periods = [None if pd.isnull(period) else period for period in df['period'].tolist()]
+    scores = [None if score is None or (isinstance(score, float) and np.isnan(score)) else score
+              for score in df['score'].astype(object).tolist()]
+
+    results = []
+    for identity, period, score, reason, brief, weight in \
+            zip(df['stock_identity'].tolist(), periods, scores, df['reason'].tolist(), df['brief'].tolist(), weights):
+        r = AnalysisResult(identity, period, score, reason, brief, weight)
+        r.method = method
+        results.append(r)
+    return sort_results_by_securities(results, securities)
+
+
+def results_of_no_data(securities: [str], no_data: set, time_serial: tuple) -> [AnalysisResult]:
+    return [AnalysisResult(s, None, AnalysisResult.SCORE_NOT_APPLIED, 'No data, skipped' + str(time_serial))
+            for s in securities if s in no_data]
+
+
+def sort_results_by_securities(results: [AnalysisResult], securities: [str]) -> [AnalysisResult]:
+    order = {s: index for index, s in enumerate(securities)}
+    # Python sort is stable so the result order of each securities keeps
+    return sorted(results, key=lambda r: order.get(r.securities, len(order)))
+
+
+def batch_result_frame(df: pd.DataFrame, score: pd.Series, reason: pd.Series, brief: pd.Series,
+                       weight: int = AnalysisResult.WEIGHT_NORMAL) -> pd.DataFrame:
+    """
+    Build the batch result frame with the stock_identity and period of df.
+    """
+    return pd.DataFrame({
+        'stock_identity': df['stock_identity'].values,
+        'period': df['period'].values,
+        'score': score.values,
+        'reason': reason.values,
+        'brief': brief.values,
+        'weight': weight,
+    })
+
+
+def batch_result_frame_of(results: [AnalysisResult]) -> pd.DataFrame:
+    """
+    Build the batch result frame from AnalysisResult list. For the batch entry that reuses the per securities logic.
+    """
+    return pd.DataFrame({
+        'stock_identity': [r.securities for r in results],
+        'period': [r.period for r in results],
+        'score': pd.Series([r.score for r in results], dtype=object),
+        'reason': [r.reason for r in results],
+        'brief': [r.brief for r in results],
+        'weight': [r.weight for r in results],
+    }, columns=BATCH_RESULT_COLUMNS)
+
+
+def batch_query_by_securities(data_hub, uri: str, securities: [str],
+                              time_serial: tuple, **extra) -> {str: pd.DataFrame}:
+    """
+    Query uri once for all securities and split the result by stock_identity.
+    The columns that a securities has no value are dropped, which is the same as querying it alone.
+    :return: {securities: DataFrame}. The securities that has no data is not in the dict.
+    """
+    df = data_hub.get_data_center().query(uri, securities, time_serial, **extra)
+    if df is None or len(df) == 0 or 'stock_identity' not in df.columns:
+        return {}
+    return {identity: df_group.dropna(axis=1, how='all').reset_index(drop=True)
+            for identity, df_group in df.groupby('stock_identity', sort=False)}
+
+
+def batch_industry_not_applied(securities: [str], industries: [str], df: pd.DataFrame,
+                               data_hub, context: AnalysisContext) -> (pd.DataFrame, pd.DataFrame):
+    """
+    The batch version of check_industry_in().
+    :return: (The df without the securities in industries, The not applied result frame of these securities)
+    """
+    df_info = query_securities_info(data_hub, context)
+
+    if df_info is None or len(df_info) == 0 or 'industry' not in df_info.columns:
+        excluded = []
+    else:
+        df_info = df_info.drop_duplicates('stock_identity')
+        industry = df_info.set_index('stock_identity')['industry']
+        industry = industry.reindex(securities)
+        excluded = industry[industry.isin(industries)].index.tolist()
+
+    text = '不适用于此行业'
+    df_not_applied = pd.DataFrame({
+        'stock_identity': excluded,
+        'period': pd.NaT,
+        'score': None,
+        'reason': text,
+        'brief': text,
+        'weight': AnalysisResult.WEIGHT_NORMAL,
+    })
+    return df[~df['stock_identity'].isin(excluded)], df_not_applied
+
+
+def batch_format_year(period: pd.Series) -> pd.Series:
+    return period.dt.year.astype(str)
+
+
+def batch_format_pct(value: pd.Series, precision: int = 2) -> pd.Series:
+    return value.map(lambda v: format_pct(v, precision))
+
+
+def batch_format_w(value: pd.Series, precision: int = 2) -> pd.Series:
+    return value.map(lambda v: format_w(v, precision))
+
+
+def batch_join_text(parts: [pd.Series], sep: str, default: str = '') -> pd.Series:
+    """
+    Join the text series per row with sep, the empty text is ignored.
+    :param parts: The list of str Series, empty str for nothing.
+    :param sep: The separator
+    :param default: The text if all parts are empty
+    :return: The joined Series
+    """
+    joined = None
+    for part in parts:
+        if joined is None:
+            joined = part.copy()
+        else:
+            joined = joined.where(part == '', joined.where(joined == '', joined + sep) + part)
+    if joined is None:
+        return pd.Series([], dtype=object)
+    return joined.where(joined != '', default)
+
+
 # --------------------------------------------------- Analyzer Helper --------------------------------------------------
 
 # def check_append_report_when_data_missing(df: pd.DataFrame, securities: str,
@@ -425,35 +854,38 @@ def batch_query_readable_annual_report_pattern(
         data_hub, securities: str, time_serial: tuple,
         fields_balance_sheet: [str] = None,
         fields_income_statement: [str] = None,
-        fields_cash_flow_statement: [str] = None) -> (pd.DataFrame, AnalysisResult):
+        fields_cash_flow_statement: [str] = None,
+        context: AnalysisContext = None) -> (pd.DataFrame, AnalysisResult):
 
-    df = None
+    frames = []
     if fields_balance_sheet is not None and len(fields_balance_sheet) > 0:
         df_balance, result = query_readable_annual_report_pattern(
-            data_hub, 'Finance.BalanceSheet', securities, time_serial, fields_balance_sheet)
+            data_hub, 'Finance.BalanceSheet', securities, time_serial, fields_balance_sheet, context)
         if result is not None:
-            return df, result
-        df = df_balance
+            return join_on_keys(frames, ['stock_identity', 'period'], how='left'), result
+        frames.append(df_balance)
 
     if fields_income_statement is not None and len(fields_income_statement) > 0:
         df_income, result = query_readable_annual_report_pattern(
-            data_hub, 'Finance.IncomeStatement', securities, time_serial, fields_income_statement)
+            data_hub, 'Finance.IncomeStatement', securities, time_serial, fields_income_statement, context)
         if result is not None:
-            return df, result
-        df = df_income if df is None else (pd.merge(df, df_income, how='left', on=['stock_identity', 'period']))
+            return join_on_keys(frames, ['stock_identity', 'period'], how='left'), result
+        frames.append(df_income)
 
     if fields_cash_flow_statement is not None and len(fields_cash_flow_statement) > 0:
         df_cash, result = query_readable_annual_report_pattern(
-            data_hub, 'Finance.CashFlowStatement', securities, time_serial, fields_cash_flow_statement)
+            data_hub, 'Finance.CashFlowStatement', securities, time_serial, fields_cash_flow_statement, context)
         if result is not None:
-            return df, result
-        df = df_cash if df is None else (pd.merge(df, df_cash, how='left', on=['stock_identity', 'period']))
+            return join_on_keys(frames, ['stock_identity', 'period'], how='left'), result
+        frames.append(df_cash)
+
+    df = join_on_keys(frames, ['stock_identity', 'period'], how='left')
     df = df.sort_values('period')
     return df, None
 
 
 def query_readable_annual_report_pattern(data_hub, uri: str, securities: str, time_serial: tuple,
-                                         fields: [str]) -> (pd.DataFrame, AnalysisResult):
+                                         fields: [str], context: AnalysisContext = None) -> (pd.DataFrame, AnalysisResult):
     """
     The pattern of query readable annual report. It will do the following things:
     1. Check readable names are all known
@@ -466,13 +898,14 @@ def query_readable_annual_report_pattern(data_hub, uri: str, securities: str, ti
     :param securities: The securities user queries
     :param time_serial: The data range user queries
     :param fields: The readable fields user queries
+    :param context: The AnalysisContext. The data comes from its prefetch if available.
     :return: (Query Result if successful, else None, Analysis Result if fail else None)
     """
     if not data_hub.get_data_center().check_readable_name(fields):
         return None, AnalysisResult(securities, None, AnalysisResult.SCORE_NOT_APPLIED, 'Unknown readable name detect.')
 
     fields_stripped = list(set(fields + ['stock_identity', 'period']))
-    df = data_hub.get_data_center().query(uri, securities, time_serial, fields=fields_stripped, readable=True)
+    df = query_readable_data(data_hub, uri, securities, time_serial, fields_stripped, context)
     if df is None or len(df) == 0:
         return None, AnalysisResult(securities, None, AnalysisResult.SCORE_NOT_APPLIED,
                                     'No data, skipped' + str(time_serial))
@@ -489,20 +922,62 @@ def query_readable_annual_report_pattern(data_hub, uri: str, securities: str, ti
     return df, None
 
 
-def check_industry_in(securities: str, industries: [str], data_hub,
-                      database, context: AnalysisContext) -> bool:
-    nop(database)
+def query_readable_data(data_hub, uri: str, securities: str or [str], time_serial: tuple,
+                        fields: [str], context: AnalysisContext = None) -> pd.DataFrame or None:
+    """
+    Query readable data from the prefetch of context if it covers the query, else from data center.
+    """
+    prefetch = context.prefetch if context is not None else None
+    if prefetch is not None and prefetch.covers(uri, securities, time_serial, fields):
+        df = prefetch.view(uri, securities, fields)
+        if df is not None:
+            return df
+    return data_hub.get_data_center().query(uri, securities, time_serial, fields=fields, readable=True)
 
+
+def query_securities_info(data_hub, context: AnalysisContext) -> pd.DataFrame or None:
+    """
+    Get the whole Market.SecuritiesInfo. It's shared in the run if context has prefetch, else in the method.
+    """
+    if context.prefetch is not None:
+        return context.prefetch.table('Market.SecuritiesInfo')
     if context.cache.get('securities_info', None) is None:
         context.cache['securities_info'] = data_hub.get_data_center().query('Market.SecuritiesInfo')
-    df_info = context.cache.get('securities_info', None)
+    return context.cache.get('securities_info', None)
 
-    df_slice = df_info[df_info['stock_identity'] == securities]
+
+def query_securities_info_slice(securities: str, data_hub, context: AnalysisContext) -> pd.DataFrame or None:
+    if context.prefetch is not None:
+        return context.prefetch.view('Market.SecuritiesInfo', securities)
+    df_info = query_securities_info(data_hub, context)
+    return df_info[df_info['stock_identity'] == securities] if df_info is not None else None
+
+
+def check_industry_in(securities: str, industries: [str], data_hub,
+                      database, context: AnalysisContext) -> bool:
+    nop(database)
+
+    df_slice = query_securities_info_slice(securities, data_hub, context)
     industry = get_dataframe_slice_item(df_slice, 'industry', 0, '')
 
     return industry in industries
 
 
+def standard_data_declaration(methods: [str], data_declaration: dict) -> dict:
+    """
+    Collect the data declaration of methods for AnalysisPrefetch.
+    :param methods: The method uuids
+    :param data_declaration: The DATA_DECLARATION of plugin: {uuid: {uri: [readable field]}}
+    :return: {uri: [readable field]}
+    """
+    declaration = OrderedDict()
+    for method in methods:
+        for uri, fields in data_declaration.get(method, {}).items():
+            declared = declaration.setdefault(uri, [])
+            declared.extend([f for f in fields if f not in declared])
+    return declaration
+
+
 # ---------------------------------------------------- Parse Result ----------------------------------------------------
 
 """
@@ -0,0 +1,110 @@
+import json
+import struct
+import pandas as pd
+
+from .JsonSerializer import META_PREFIX, serialize_obj, deserialize_obj
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+finally:
+    pass
+
+"""
+The binary wire format for the data that includes DataFrame. It requires pyarrow. JSON is the fallback.
+
+    MAGIC | header length (uint32) | header | [frame length (uint64) | frame] * n
+
+    header: The JSON serialized data (by JsonSerializer) that DataFrame is replaced by {'#class:ArrowFrame': n}
+    frame:  The DataFrame in Arrow IPC stream format. The column types are kept without converting to str.
+
+The DataFrame that Arrow does not support (like the column of dict) falls back to the JSON records in header.
+As the JSON serializer, the index of DataFrame is not kept.
+"""
+
+MAGIC = b'SASB\x01'
+FRAME_CLASS = 'ArrowFrame'
+
+BINARY_CONTENT_TYPE = 'application/vnd.sas.arrow'
+JSON_CONTENT_TYPE = 'application/json'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def binary_supported() -> bool:
+    return pa is not None
+
+
+def accept_binary(accept: str) -> bool:
+    """
+    Check whether the Accept header of request includes the binary format.
+    """
+    return binary_supported() and isinstance(accept, str) and BINARY_CONTENT_TYPE in accept
+
+
+def is_binary(data: bytes) -> bool:
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:len(MAGIC)]) == MAGIC
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def encode_frame(df: pd.DataFrame) -> bytes or None:
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    except Exception:
+        return None
+    finally:
+        pass
+
+
+def decode_frame(data: memoryview) -> pd.DataFrame:
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all().to_pandas()
+
+
+def serialize_binary(o: any) -> bytes:
+    frames = []
+
+    def serialize_binary_obj(py_object: any):
+        if isinstance(py_object, pd.DataFrame):
+            frame = encode_frame(py_object)
+            if frame is not None:
+                frames.append(frame)
+                return {META_PREFIX + FRAME_CLASS: len(frames) - 1}
+        return serialize_obj(py_object)
+
+    header = json.dumps(o, default=serialize_binary_obj).encode('utf-8')
+    parts = [MAGIC, struct.pack('<I', len(header)), header]
+    for frame in frames:
+        parts.append(struct.pack('<Q', len(frame)))
+        parts.append(frame)
+    return b''.join(parts)
+
+
+def deserialize_binary(data: bytes) -> any:
+    view = memoryview(data)
+    offset = len(MAGIC)
+    header_length = struct.unpack_from('<I', view, offset)[0]
+    offset += 4
+    header = bytes(view[offset:offset + header_length])
+    offset += header_length
+
+    frames = []
+    while offset < len(view):
+        frame_length = struct.unpack_from('<Q', view, offset)[0]
+        offset += 8
+        frames.append(view[offset:offset + frame_length])
+        offset += frame_length
+
+    frame_key = META_PREFIX + FRAME_CLASS
+
+    def deserialize_binary_obj(json_object: dict):
+        if len(json_object) == 1 and frame_key in json_object.keys():
+            return decode_frame(frames[json_object[frame_key]])
+        return deserialize_obj(json_object)
+
+    return json.loads(header, object_hook=deserialize_binary_obj)
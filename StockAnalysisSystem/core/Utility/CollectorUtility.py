@@ -18,36 +18,39 @@ from .time_utility import *
 #        ......
 #    }
 #
+# The limiters are thread safe and shared by all collectors. So the different interfaces can be fetched in parallel
+# while the quota of each interface is respected globally.
+#
 
 DEFAULT_TS_DELAYER_TABLE = {
-    'daily_basic':          DelayerMinuteLimit(500),          # 500
-    'fina_mainbz':          DelayerMinuteLimit(60),          # 60
+    'daily_basic':          TokenBucketMinuteLimit(500),          # 500
+    'fina_mainbz':          TokenBucketMinuteLimit(60),          # 60
 
-    'fina_audit':           DelayerMinuteLimit(50),          # 50
-    'balancesheet':         DelayerMinuteLimit(50),          # 50
-    'income':               DelayerMinuteLimit(50),          # 50
-    'cashflow':             DelayerMinuteLimit(50),          # 50
+    'fina_audit':           TokenBucketMinuteLimit(50),          # 50
+    'balancesheet':         TokenBucketMinuteLimit(50),          # 50
+    'income':               TokenBucketMinuteLimit(50),          # 50
+    'cashflow':             TokenBucketMinuteLimit(50),          # 50
 
-    'index_daily':          DelayerMinuteLimit(500),          # 500
-    'daily_index':          DelayerMinuteLimit(500),          # 500
+    'index_daily':          TokenBucketMinuteLimit(500),          # 500
+    'daily_index':          TokenBucketMinuteLimit(500),          # 500
 
-    'concept_detail':       DelayerMinuteLimit(100),          # 100
-    'namechange':           DelayerMinuteLimit(100),          # 100
+    'concept_detail':       TokenBucketMinuteLimit(100),          # 100
+    'namechange':           TokenBucketMinuteLimit(100),          # 100
 
-    'pledge_stat':          DelayerMinuteLimit(1200),          # 1200
-    'pledge_detail':        DelayerMinuteLimit(1200),          # 1200
+    'pledge_stat':          TokenBucketMinuteLimit(1200),          # 1200
+    'pledge_detail':        TokenBucketMinuteLimit(1200),          # 1200
 
 
-    'stk_holdernumber':     DelayerMinuteLimit(10),          # 10
-    'top10_holders':        DelayerMinuteLimit(10),          # 10
-    'top10_floatholders':   DelayerMinuteLimit(10),          # 10
-    'stk_holdertrade':      DelayerMinuteLimit(300),        # 300
+    'stk_holdernumber':     TokenBucketMinuteLimit(10),          # 10
+    'top10_holders':        TokenBucketMinuteLimit(10),          # 10
+    'top10_floatholders':   TokenBucketMinuteLimit(10),          # 10
+    'stk_holdertrade':      TokenBucketMinuteLimit(300),        # 300
 
-    'daily':                DelayerMinuteLimit(1200),          # 1200
-    'adj_factor':           DelayerMinuteLimit(1200),          # 1200
+    'daily':                TokenBucketMinuteLimit(1200),          # 1200
+    'adj_factor':           TokenBucketMinuteLimit(1200),          # 1200
 
-    'repurchase':           DelayerMinuteLimit(20),          # 20
-    'share_float':          DelayerMinuteLimit(20),          # 20
+    'repurchase':           TokenBucketMinuteLimit(20),          # 20
+    'share_float':          TokenBucketMinuteLimit(20),          # 20
 }
 
 
@@ -58,7 +61,7 @@ def set_delay_table(table: dict):
     global delayer_table
     try:
         for k, v in table.items():
-            delayer_table[k] = DelayerMinuteLimit(int(v))
+            delayer_table[k] = TokenBucketMinuteLimit(int(v))
     except Exception as e:
         delayer_table = DEFAULT_TS_DELAYER_TABLE
         print('Set delay table fail: ' + str(e))
@@ -1,4 +1,6 @@
 import re
+import ast
+import numpy as np
 
 from .dependency import *
 from .df_utility import *
@@ -6,6 +8,163 @@ from ..DataHubEntry import DataHubEntry
 from ..Database.DatabaseEntry import DatabaseEntry
 
 
+class FormulaGraph:
+    """
+    Compile the formula expressions into an expression graph that evaluated on numpy arrays.
+        The expressions are parsed and validated by python ast, only arithmetic operation is allowed.
+        The reference of a result field is resolved to its expression, so the expressions are fused.
+        The same sub expressions are shared. The temporary arrays are released after their last use.
+    """
+
+    BINARY_OPERATOR = {
+        ast.Add: np.add,
+        ast.Sub: np.subtract,
+        ast.Mult: np.multiply,
+        ast.Div: np.true_divide,
+        ast.Pow: np.power,
+    }
+
+    UNARY_OPERATOR = {
+        ast.USub: np.negative,
+        ast.UAdd: np.positive,
+    }
+
+    FIELD_REFERENCE = re.compile(r'\[(.*?)\]')
+
+    def __init__(self, expressions: [(str, str)]):
+        """
+        :param expressions: The list of (result field, right side expression with field surrounded by [])
+        """
+        self.__expressions = {}
+        self.__nodes = []           # (kind, param, children)
+        self.__node_index = {}      # node key: node index
+        self.__inputs = {}          # input field: node index
+        self.__outputs = {}         # result field: node index
+        self.__program = []         # (node index, operator, children, release after evaluation)
+
+        for provide, expression in expressions:
+            if provide in self.__expressions:
+                print('Error: Duplicate result field: ' + provide)
+                continue
+            self.__expressions[provide] = expression
+        for provide in list(self.__expressions.keys()):
+            try:
+                self.__build_output(provide, [])
+            except Exception as e:
+                print('Error: Invalid expression [%s] = %s : %s' % (provide, self.__expressions[provide], str(e)))
+            finally:
+                pass
+        self.__build_program()
+
+    def inputs(self) -> [str]:
+        return list(self.__inputs.keys())
+
+    def outputs(self) -> [str]:
+        return list(self.__outputs.keys())
+
+    def node_count(self) -> int:
+        return len(self.__nodes)
+
+    def evaluate(self, inputs: dict) -> dict:
+        """
+        Evaluate the graph.
+        :param inputs: The dict of input field: array like. All arrays should have the same length.
+        :return: The dict of result field: numpy array
+        """
+        values = {}
+        for field, index in self.__inputs.items():
+            values[index] = np.asarray(inputs[field], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for index, operator, children, release in self.__program:
+                if operator is None:
+                    values[index] = np.float64(self.__nodes[index][1])
+                else:
+                    values[index] = operator(*[values[child] for child in children])
+                for child in release:
+                    del values[child]
+        return {provide: values[index] for provide, index in self.__outputs.items()}
+
+    # ---------------------------------------------------------------------------------
+
+    def __build_output(self, provide: str, building: [str]) -> int:
+        if provide in self.__outputs:
+            return self.__outputs[provide]
+        if provide in building:
+            raise ValueError('Circular reference of ' + provide)
+        references = []
+
+        def replace_reference(match) -> str:
+            references.append(match.group(1))
+            return '_f%d' % (len(references) - 1)
+
+        text = self.FIELD_REFERENCE.sub(replace_reference, self.__expressions[provide])
+        tree = ast.parse(text.strip(), mode='eval')
+        index = self.__build_node(tree.body, references, building + [provide])
+        self.__outputs[provide] = index
+        return index
+
+    def __build_node(self, node: ast.AST, references: [str], building: [str]) -> int:
+        if isinstance(node, ast.BinOp) and type(node.op) in self.BINARY_OPERATOR:
+            left = self.__build_node(node.left, references, building)
+            right = self.__build_node(node.right, references, building)
+            return self.__add_node('binary', type(node.op), [left, right])
+        if isinstance(node, ast.UnaryOp) and type(node.op) in self.UNARY_OPERATOR:
+            operand = self.__build_node(node.operand, references, building)
+            return self.__add_node('unary', type(node.op), [operand])
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and \
+                not isinstance(node.value, bool):
+            return self.__add_node('constant', float(node.value), [])
+        if isinstance(node, ast.Name) and re.fullmatch(r'_f\d+', node.id):
+            field = references[int(node.id[2:])]
+            if field in self.__expressions:
+                return self.__build_output(field, building)
+            index = self.__add_node('input', field, [])
+            self.__inputs[field] = index
+            return index
+        raise ValueError('Not supported syntax: ' + ast.dump(node))
+
+    def __add_node(self, kind: str, param: any, children: [int]) -> int:
+        key = (kind, param, tuple(children))
+        index = self.__node_index.get(key, None)
+        if index is None:
+            index = len(self.__nodes)
+            self.__nodes.append((kind, param, children))
+            self.__node_index[key] = index
+        return index
+
+    def __build_program(self):
+        # The nodes are built in topological order. Only keep the nodes that the outputs depend on.
+        used = set()
+        pending = list(self.__outputs.values())
+        while len(pending) > 0:
+            index = pending.pop()
+            if index not in used:
+                used.add(index)
+                pending.extend(self.__nodes[index][2])
+
+        last_use = {}
+        for index in sorted(used):
+            for child in self.__nodes[index][2]:
+                last_use[child] = index
+        keep = set(self.__outputs.values())
+        release = {}
+        for child, index in last_use.items():
+            if child not in keep:
+                release.setdefault(index, []).append(child)
+
+        for index in sorted(used):
+            kind, param, children = self.__nodes[index]
+            if kind == 'input':
+                continue
+            if kind == 'constant':
+                operator = None
+            elif kind == 'unary':
+                operator = self.UNARY_OPERATOR[param]
+            else:
+                operator = self.BINARY_OPERATOR[param]
+            self.__program.append((index, operator, children, release.get(index, [])))
+
+
 class FactorEngine:
     """
     The format of the formula:
@@ -25,6 +184,7 @@ class FactorEngine:
         self.__depends = []
         self.__provides = []
         self.__eval_formula = ''
+        self.__formula_graph = None
 
         self.__parse_formula()
 
@@ -51,10 +211,19 @@ class FactorEngine:
     def eval_formula(self) -> str:
         return self.__eval_formula
 
+    def formula_graph(self) -> FormulaGraph:
+        return self.__formula_graph
+
+    def evaluate(self, df: pd.DataFrame) -> dict:
+        """
+        Evaluate the formula with the depends columns in df.
+        :return: The dict of provides field: numpy array
+        """
+        return self.__formula_graph.evaluate({field: df[field].to_numpy() for field in self.__formula_graph.inputs()})
+
     def __parse_formula(self):
-        self.__formula.replace('\r', '')
-        self.__formula.replace('\n', ';')
-        expressions = self.__formula.split(';')
+        formula = self.__formula.replace('\r', '').replace('\n', ';')
+        expressions = formula.split(';')
 
         all_fields = []
         result_expressions = {}
@@ -94,6 +263,10 @@ class FactorEngine:
         all_fields = list(set(all_fields))
         self.__depends = [field for field in all_fields if field not in self.__provides]
 
+        # The right side of expressions for compiling
+        self.__formula_graph = FormulaGraph([(provide, exp.split('=')[1])
+                                             for provide, exp in result_expressions.items()])
+
     @staticmethod
     def __parse_single_expression(exp: str) -> (str, [str]):
         parts = exp.split('=')
@@ -124,9 +297,10 @@ class FinanceFactorEngine(FactorEngine):
     def calculate(self, identity: str or [str], time_serial: tuple, mapping: dict,
                   data_hub: DataHubEntry, database: DatabaseEntry, extra: dict):
         df = query_finance_pattern(data_hub, identity, time_serial, self.depends(), mapping)
-        eval_formula = self.eval_formula()
-        exec(eval_formula)
-        return df[self.provides() + ['stock_identity', 'period']]
+        result = self.evaluate(df)
+        return pd.DataFrame({**{provide: result.get(provide) for provide in self.provides()},
+                             'stock_identity': df['stock_identity'].to_numpy(),
+                             'period': df['period'].to_numpy()}, index=df.index)
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,55 @@
+import zlib
+import gzip
+
+"""
+The HTTP content compression that shared by RestInterface and the web api.
+    The response is compressed by the Accept-Encoding of request (gzip or deflate).
+    The large request body is compressed by client with Content-Encoding header.
+The small content is not compressed because the compression does not save the transfer time.
+"""
+
+COMPRESS_THRESHOLD = 1024
+COMPRESS_LEVEL = 5
+
+
+def accept_encoding(accept: str) -> str:
+    """
+    Select the content encoding by the Accept-Encoding header.
+    :return: 'gzip', 'deflate' or '' if not support
+    """
+    encodings = [item.split(';')[0].strip().lower() for item in accept.split(',')] if isinstance(accept, str) else []
+    if 'gzip' in encodings:
+        return 'gzip'
+    if 'deflate' in encodings:
+        return 'deflate'
+    return ''
+
+
+def compress_content(content: str or bytes, encoding: str) -> (bytes, str):
+    """
+    Compress content by the encoding.
+    :param content: The content. str will be encoded as utf-8
+    :param encoding: 'gzip', 'deflate' or ''
+    :return: (The content, The encoding of content). The encoding is '' if it's not compressed.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    if encoding == '' or len(content) < COMPRESS_THRESHOLD:
+        return content, ''
+    if encoding == 'gzip':
+        return gzip.compress(content, compresslevel=COMPRESS_LEVEL), 'gzip'
+    if encoding == 'deflate':
+        return zlib.compress(content, COMPRESS_LEVEL), 'deflate'
+    return content, ''
+
+
+def decompress_content(content: bytes, encoding: str) -> bytes:
+    """
+    Decompress content by the Content-Encoding header.
+    """
+    encoding = encoding.strip().lower() if isinstance(encoding, str) else ''
+    if encoding == 'gzip':
+        return gzip.decompress(content)
+    if encoding == 'deflate':
+        return zlib.decompress(content)
+    return content
@@ -133,6 +133,80 @@ def merge_on_columns(df1: pd.DataFrame, df2: pd.DataFrame, columns: str or [str]
     return df
 
 
+def join_on_keys(frames: [pd.DataFrame], keys: str or [str], how: str = 'left') -> pd.DataFrame or None:
+    """
+    Join multiple DataFrames on key columns in one pass. The result is the same as chaining
+        pd.merge(result, df, how=how, on=keys). But the keys of all frames are factorized together, each frame
+        is aligned to the first one by a row indexer, and the result is built only once.
+    If any frame (except the first one) has duplicated keys or conflicting non-key columns,
+        or how is 'outer', it falls back to the chained pd.merge.
+    :param frames: The DataFrame list. The first one is the left side of join. None is ignored.
+    :param keys: The key column or column list
+    :param how: 'left', 'inner' or 'outer'
+    :return: The joined DataFrame. None if no frame.
+    """
+    frames = [df for df in frames if df is not None]
+    if len(frames) == 0:
+        return None
+    if len(frames) == 1:
+        return frames[0]
+    if not isinstance(keys, (list, tuple)):
+        keys = list(keys) if isinstance(keys, set) else [keys]
+
+    codes = _factorize_join_keys(frames, keys) if how in ['left', 'inner'] else None
+    indexers = [] if codes is not None else None
+    columns = list(frames[0].columns)
+    base_codes = pd.Index(codes[0]) if codes is not None else None
+    for df, df_codes in zip(frames[1:], codes[1:] if codes is not None else []):
+        value_columns = [c for c in df.columns if c not in keys]
+        df_codes = pd.Index(df_codes)
+        if len(set(value_columns) & set(columns)) > 0 or not df_codes.is_unique:
+            indexers = None
+            break
+        columns.extend(value_columns)
+        indexers.append((df[value_columns].reset_index(drop=True), df_codes.get_indexer(base_codes)))
+
+    if indexers is None:
+        result = frames[0]
+        for df in frames[1:]:
+            result = pd.merge(result, df, how=how, on=keys)
+        return result
+
+    base = frames[0].reset_index(drop=True)
+    if how == 'inner':
+        # Drop the unmatched rows before reindex. So no NaN is filled and the int columns are kept as int.
+        matched = np.logical_and.reduce([indexer >= 0 for _, indexer in indexers])
+        if not matched.all():
+            base = base[matched].reset_index(drop=True)
+            indexers = [(values, indexer[matched]) for values, indexer in indexers]
+    parts = [base]
+    for values, indexer in indexers:
+        # The indexer is -1 if not matched, which is not in RangeIndex. So the row is filled with NaN.
+        values = values.reindex(indexer)
+        values.index = base.index
+        parts.append(values)
+    return pd.concat(parts, axis=1)
+
+
+def _factorize_join_keys(frames: [pd.DataFrame], keys: [str]) -> [np.ndarray] or None:
+    # Factorize the keys of all frames together and combine them into one int64 code per row
+    for df in frames:
+        if not set(keys).issubset(df.columns):
+            return None
+    combined = None
+    combined_size = 1
+    for key in keys:
+        values = pd.concat([df[key] for df in frames], ignore_index=True)
+        key_codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        combined_size *= max(len(uniques), 1)
+        if combined_size >= 2 ** 62:
+            return None
+        key_codes = key_codes.astype(np.int64)
+        combined = key_codes if combined is None else combined * len(uniques) + key_codes
+    offsets = np.cumsum([0] + [len(df) for df in frames])
+    return [combined[offsets[i]:offsets[i + 1]] for i in range(len(frames))]
+
+
 def group_as_list(df: pd.DataFrame, group_by: str or list) -> pd.DataFrame:
     if not isinstance(group_by, (list, tuple)):
         group_by = [group_by]
@@ -117,14 +117,39 @@ class EventQueue:
         self.__event_handler = []
         self.__event_queue = deque(maxlen=1000)
         self.__lock = threading.Lock()
+        # Notified when event posted or wake() called
+        self.__condition = threading.Condition(self.__lock)
+        self.__wakeup = False
 
     def post_event(self, event: Event):
-        with self.__lock:
+        with self.__condition:
             self.__event_queue.append(event)
+            self.__condition.notify_all()
 
     def insert_event(self, event: Event):
-        with self.__lock:
+        with self.__condition:
             self.__event_queue.appendleft(event)
+            self.__condition.notify_all()
+
+    def wait_event(self, timeout: float or None = None) -> bool:
+        """
+        Block until there's event in queue, or wake() is called, or timeout.
+        :param timeout: The timeout in seconds. None to wait forever.
+        :return: True if there's event in queue
+        """
+        with self.__condition:
+            if len(self.__event_queue) == 0 and not self.__wakeup:
+                self.__condition.wait_for(lambda: len(self.__event_queue) > 0 or self.__wakeup, timeout)
+            self.__wakeup = False
+            return len(self.__event_queue) > 0
+
+    def wake(self):
+        """
+        Wake up the thread that blocks in wait_event().
+        """
+        with self.__condition:
+            self.__wakeup = True
+            self.__condition.notify_all()
 
     def deliver_event(self, event: Event):
         self.__dispatch_event(event, True)
@@ -134,12 +159,20 @@ class EventQueue:
             self.__event_handler.append(event_handler)
 
     def polling(self, time_limit_ms: int) -> int:
-        polling_start = datetime.datetime.now()
-        while len(self.__event_queue) > 0:
-            event = self.__event_queue.popleft()
+        """
+        Dispatch the queued events until the queue is empty or the time limit reached.
+        :param time_limit_ms: The time budget in milliseconds
+        :return: The count of events that remain in queue
+        """
+        polling_start = time.monotonic()
+        while True:
+            with self.__lock:
+                if len(self.__event_queue) == 0:
+                    break
+                event = self.__event_queue.popleft()
             if self.__pre_process_event(event):
                 self.__dispatch_event(event, False)
-            if (datetime.datetime.now() - polling_start).microseconds >= time_limit_ms:
+            if (time.monotonic() - polling_start) * 1000 >= time_limit_ms:
                 break
         return len(self.__event_queue)
 
@@ -170,6 +203,7 @@ class EventDispatcher(EventHandler):
             self.__private_thread = threading.Thread(target=self.__polling_thread)
         else:
             self.__private_queue = None
+            self.__private_thread = None
         self.__quit = False
         self.__lock = threading.Lock()
         self.__handler_name = name
@@ -184,8 +218,10 @@ class EventDispatcher(EventHandler):
     def teardown(self):
         self.__quit = True
         if self.__private_thread is not None:
-            self.__log('Event dispatcher %s thread teardown, joining...' % self.__handler_name)
-            self.__private_thread.join()
+            self.__private_queue.wake()
+            if self.__private_thread.is_alive():
+                self.__log('Event dispatcher %s thread teardown, joining...' % self.__handler_name)
+                self.__private_thread.join()
             self.__log('Event dispatcher %s thread quit.' % self.__handler_name)
 
     # ----------------------------------------------------------------
@@ -193,8 +229,9 @@ class EventDispatcher(EventHandler):
     def dispatch_event(self, event: Event, sync: bool) -> bool:
         if self.__private_queue is not None and not sync:
             self.__private_queue.post_event(event)
-            if not self.__private_thread.is_alive():
-                self.__private_thread.start()
+            with self.__lock:
+                if self.__private_thread.ident is None:
+                    self.__private_thread.start()
             return True
         else:
             return self.__handle_event(event)
@@ -276,8 +313,8 @@ class EventDispatcher(EventHandler):
 
     def __polling_thread(self):
         while not self.__quit:
-            self.__private_queue.polling(1000)
-            time.sleep(0.1)
+            if self.__private_queue.wait_event(None):
+                self.__private_queue.polling(1000)
 
     def __log(self, text: str):
         print(text)
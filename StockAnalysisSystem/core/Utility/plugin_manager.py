@@ -1,4 +1,8 @@
 import os
+import json
+import fnmatch
+import hashlib
+import threading
 import traceback
 from functools import partial
 from inspect import getmembers, isfunction
@@ -8,13 +12,49 @@ from inspect import getmembers, isfunction
 A plug-in module should include following functions:
     plugin_prob() -> dict : Includes 'name', 'version', 'tags'
     plugin_capacities() -> [str] : Lists the capacity that module supports
+
+The capacities of plugins are kept in a capacity index file under the __pycache__ of plugin path.
+    The index entry is checked by the file mtime and size, then by the hash of file content.
+    The plugin that has a valid index entry is not imported until it's used.
+The capacity can be a wildcard pattern like 'test.*'.
+The results of the declaration functions (like fields()) are also kept in the index entry,
+    so they can be got by get_declarations() without importing the plugin.
 """
 
+PLUGIN_INDEX_VERSION = 2
+PLUGIN_INDEX_FILE = 'plugin_capacity_index.json'
+# The plugin functions that return static declarations. Their results are kept in the index.
+PLUGIN_INDEX_DECLARATIONS = ['fields']
+
 
 class PluginManager:
+    class Plugin:
+        def __init__(self, plugin_path: str, file_name: str, capacities: [str] or None, module: object = None):
+            self.plugin_path = plugin_path
+            self.file_name = file_name
+            self.capacities = capacities
+            self.module = module
+            # function name: The result of declaration function, None if not collected yet
+            self.declarations = None
+            # The (mtime, size) of plugin file
+            self.stamp = None
+            # True if import fail or it's not a plugin
+            self.invalid = False
+
+        def plugin_name(self) -> str:
+            return os.path.splitext(self.file_name)[0]
+
     def __init__(self, plugin_path: str = ''):
         self.__path = []
         self.__plugins = []
+        self.__revision = 0
+        self.__lock = threading.RLock()
+        # capacity: [Plugin]
+        self.__capacity_index = {}
+        # [(capacity pattern, Plugin)]
+        self.__wildcard_index = []
+        # capacity: [module], the result of find_module_has_capacity()
+        self.__capacity_cache = {}
         self.__last_exception = None
         self.__last_traceback = None
         if plugin_path != '':
@@ -26,6 +66,7 @@ class PluginManager:
     def refresh(self):
         """
         Refresh plugin list immediately. You should call this function if any updates to the plug-in folder.
+            Only the plugins that are new or updated will be imported.
         :return: None
         """
         all_plugin_list = []
@@ -41,24 +82,71 @@ class PluginManager:
                 print('Ignore.')
             finally:
                 pass
-        self.__plugins = all_plugin_list
+        with self.__lock:
+            if self.__plugin_stamps(all_plugin_list) != self.__plugin_stamps(self.__plugins):
+                self.__revision += 1
+            self.__plugins = all_plugin_list
+            self.__build_capacity_index()
+
+    def revision(self) -> int:
+        """
+        The revision increases when the plugin list or any plugin file changes by refresh().
+            The data derived from plugins can be cached with the revision.
+        """
+        return self.__revision
 
     def all_modules(self) -> list:
-        return [plugin for file_name, plugin in self.__plugins]
+        with self.__lock:
+            plugins = self.__plugins.copy()
+        modules = [self.__load_plugin(plugin) for plugin in plugins]
+        return [module for module in modules if module is not None]
+
+    def get_declarations(self, function: str) -> [object]:
+        """
+        Get the result of declaration function of all plugins. The result is read from the capacity index if the
+            function is in PLUGIN_INDEX_DECLARATIONS. Otherwise the plugin is imported and the function is executed.
+        :param function: The declaration function name, like 'fields'
+        :return: The result list in plugin order. The None result and the plugin without this function are skipped.
+        """
+        with self.__lock:
+            plugins = self.__plugins.copy()
+        result_list = []
+        for plugin in plugins:
+            if plugin.declarations is not None and function in plugin.declarations:
+                result = plugin.declarations[function]
+            else:
+                module = self.__load_plugin(plugin)
+                result = self.__execute_declaration(module, function) if module is not None else None
+            if result is not None:
+                result_list.append(result)
+        return result_list
 
     def find_module_has_capacity(self, capacity: str) -> [object]:
         """
         Finds the module that supports the specified feature.
+            The module is looked up in the capacity index that built from plugin_capacities().
+            If no module declares this capacity, it falls back to check plugin_adapt() of all modules.
         :param capacity: The capacity you want to check.
         :return: The module list that has this capacity.
         """
-        module_list = []
-        for file_name, plugin in self.__plugins:
-            # capacities = self.__safe_execute(plugin, 'plugin_capacities')
-            # if isinstance(capacities, list) and capacity in capacities:
-            if self.__safe_execute(plugin, 'plugin_adapt', capacity):
-                module_list.append(plugin)
-        return module_list
+        modules = self.__capacity_cache.get(capacity, None)
+        if modules is not None:
+            return list(modules)
+        with self.__lock:
+            plugins = self.__capacity_index.get(capacity, []) + \
+                [plugin for pattern, plugin in self.__wildcard_index if fnmatch.fnmatchcase(capacity, pattern)]
+            if len(plugins) > 1:
+                order = {id(plugin): index for index, plugin in enumerate(self.__plugins)}
+                plugins = sorted(set(plugins), key=lambda plugin: order[id(plugin)])
+            if len(plugins) == 0:
+                plugins = [plugin for plugin in self.__plugins
+                           if self.__load_plugin(plugin) is not None and
+                           self.__safe_execute(plugin.module, 'plugin_adapt', capacity)]
+            modules = [self.__load_plugin(plugin) for plugin in plugins]
+            # Do not cache if any plugin import fail, it will be retried next time.
+            if all(plugin.module is not None or plugin.invalid for plugin in plugins):
+                self.__capacity_cache[capacity] = [module for module in modules if module is not None]
+        return [module for module in modules if module is not None]
 
     def check_module_has_function(self, module: object, function: str) -> bool:
         try:
@@ -112,12 +200,17 @@ class PluginManager:
 
     def __load_from_single_path(self, plugin_path) -> list:
         """
-        Refresh plugin list immediately. You should call this function if any updates to the plug-in folder.
-        :return: None
+        Scan the plugin path and check each file with the capacity index.
+        :return: The list of Plugin
         """
 
         from os import sys
-        sys.path.append(plugin_path)
+        if plugin_path not in sys.path:
+            sys.path.append(plugin_path)
+
+        index_path = os.path.join(plugin_path, '__pycache__', PLUGIN_INDEX_FILE)
+        index = self.__load_plugin_index(index_path)
+        new_index = {}
 
         plugin_list = []
         module_files = os.listdir(plugin_path)
@@ -125,9 +218,58 @@ class PluginManager:
         for file_name in module_files:
             if not file_name.endswith('.py') or file_name.startswith('_') or file_name.startswith('.'):
                 continue
-            plugin_name = os.path.splitext(file_name)[0]
+            file_path = os.path.join(plugin_path, file_name)
+            stat = os.stat(file_path)
+            entry = index.get(file_name, None)
+
+            if entry is not None and (entry.get('mtime') != stat.st_mtime or entry.get('size') != stat.st_size):
+                # The file may be touched without change, check the content.
+                entry = entry if entry.get('hash') == self.__file_hash(file_path) else None
+            if entry is not None:
+                entry.update({'mtime': stat.st_mtime, 'size': stat.st_size})
+                new_index[file_name] = entry
+                if entry.get('plugin', False):
+                    plugin = PluginManager.Plugin(plugin_path, file_name, entry.get('capacities', []))
+                    plugin.declarations = entry.get('declarations', None)
+                    plugin.stamp = (stat.st_mtime, stat.st_size)
+                    plugin_list.append(plugin)
+                continue
+
+            # New or updated file, import it to get the capacities.
+            plugin = PluginManager.Plugin(plugin_path, file_name, None)
+            plugin.stamp = (stat.st_mtime, stat.st_size)
+            module = self.__load_plugin(plugin)
+            if module is None and not plugin.invalid:
+                # Import fail. Do not index it, so it will be retried next time.
+                continue
+            new_index[file_name] = {
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'hash': self.__file_hash(file_path),
+                'plugin': module is not None,
+                'capacities': plugin.capacities if module is not None else [],
+                'declarations': plugin.declarations if module is not None else {},
+            }
+            if module is not None:
+                plugin_list.append(plugin)
+
+        if new_index != index:
+            self.__save_plugin_index(index_path, new_index)
+        return plugin_list
+
+    def __load_plugin(self, plugin: Plugin) -> object or None:
+        """
+        Import the plugin module if it's not imported.
+        :return: The module or None if import fail or it's not a plugin
+        """
+        if plugin.module is not None or plugin.invalid:
+            return plugin.module
+        with self.__lock:
+            if plugin.module is not None or plugin.invalid:
+                return plugin.module
+            plugin_name = plugin.plugin_name()
             try:
-                plugin = __import__(plugin_name)
+                module = __import__(plugin_name)
             except Exception as e:
                 self.__last_exception = e
                 self.__last_traceback = traceback.format_exc()
@@ -135,14 +277,84 @@ class PluginManager:
                 print('Error =>', e)
                 print('Error =>', traceback.format_exc())
                 print('Error => Ignore')
-                continue
+                # Not mark as invalid: An importing fail may be caused by the environment.
+                return None
             finally:
                 pass
-            if not self.check_module_has_function(plugin, 'plugin_prob') or \
-                    not self.check_module_has_function(plugin, 'plugin_capacities'):
-                continue
-            plugin_list.append((file_name, plugin))
-        return plugin_list
+            if not self.check_module_has_function(module, 'plugin_prob') or \
+                    not self.check_module_has_function(module, 'plugin_capacities'):
+                plugin.invalid = True
+                return None
+            if plugin.capacities is None:
+                capacities = self.__safe_execute(module, 'plugin_capacities')
+                plugin.capacities = [str(c) for c in capacities] if isinstance(capacities, (list, tuple)) else []
+            if plugin.declarations is None:
+                plugin.declarations = self.__collect_declarations(module)
+            plugin.module = module
+            return module
+
+    def __build_capacity_index(self):
+        self.__capacity_index = {}
+        self.__wildcard_index = []
+        self.__capacity_cache = {}
+        for plugin in self.__plugins:
+            for capacity in plugin.capacities:
+                if any(c in capacity for c in '*?['):
+                    self.__wildcard_index.append((capacity, plugin))
+                else:
+                    self.__capacity_index.setdefault(capacity, []).append(plugin)
+
+    def __collect_declarations(self, module: object) -> dict:
+        # The result that can not be kept in json is not collected. It will be got by executing the function.
+        declarations = {}
+        for function in PLUGIN_INDEX_DECLARATIONS:
+            result = self.__execute_declaration(module, function)
+            try:
+                declarations[function] = json.loads(json.dumps(result))
+            except Exception:
+                pass
+            finally:
+                pass
+        return declarations
+
+    def __execute_declaration(self, module: object, function: str) -> object:
+        return self.__safe_execute(module, function) if callable(getattr(module, function, None)) else None
+
+    @staticmethod
+    def __plugin_stamps(plugins: [Plugin]) -> list:
+        return [(plugin.plugin_path, plugin.file_name, plugin.stamp) for plugin in plugins]
+
+    # ------------------------------------ Index File ------------------------------------
+
+    @staticmethod
+    def __file_hash(file_path: str) -> str:
+        with open(file_path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    @staticmethod
+    def __load_plugin_index(index_path: str) -> dict:
+        try:
+            with open(index_path, 'rt', encoding='utf-8') as f:
+                index_data = json.load(f)
+            return index_data.get('plugins', {}) if index_data.get('version') == PLUGIN_INDEX_VERSION else {}
+        except Exception:
+            return {}
+        finally:
+            pass
+
+    @staticmethod
+    def __save_plugin_index(index_path: str, index: dict):
+        # The plugin path may be read-only, the index is just not cached in this case.
+        try:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            temp_path = index_path + '.%d.tmp' % os.getpid()
+            with open(temp_path, 'wt', encoding='utf-8') as f:
+                json.dump({'version': PLUGIN_INDEX_VERSION, 'plugins': index}, f, indent=1)
+            os.replace(temp_path, index_path)
+        except Exception as e:
+            print('Save plugin index fail: ' + str(e))
+        finally:
+            pass
 
     # --------------------------------------- Execute ---------------------------------------
 
@@ -163,7 +163,8 @@ class ResourceTagUpdater(ResourceUpdater):
 class ResourceUpdateTask(TaskQueue.Task):
     def __init__(self, res_updater: ResourceUpdater):
         self.__res_updater = res_updater
-        super(ResourceUpdateTask, self).__init__('ResourceUpdateTask')
+        # The updater keeps polling until the resource finished. Run it in background.
+        super(ResourceUpdateTask, self).__init__('ResourceUpdateTask', TaskQueue.Task.PRIORITY_BACKGROUND)
 
     # ------------------- Override -------------------
 
@@ -30,6 +30,10 @@ class ResourceTask(TaskQueue.Task):
     def progress(self) -> ProgressRate:
         return self.__progress
 
+    def resources(self) -> [str]:
+        # The tasks with the same resource tag are mutual exclusive in TaskQueue
+        return self.__resource_manager.get_resource_tags(self.__resource_id)
+
     def update_result(self, result: any):
         self.__result = result
         self.__resource_manager.set_resource(
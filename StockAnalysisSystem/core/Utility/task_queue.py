@@ -5,6 +5,20 @@ import threading
 
 
 class TaskQueue:
+    """
+    The task queue that runs tasks by a pool of worker threads.
+        The pending task is scheduled by its priority class, then by its queued order.
+        The tasks that declare the same resource key never run at the same time.
+        If there're more than one worker, a worker is reserved for the interactive tasks.
+    The cancellation is cooperative: the running task is notified by quit() and cancel_requested().
+    """
+
+    # One worker is kept for the interactive tasks if the worker count is larger than 1
+    INTERACTIVE_RESERVED_WORKERS = 1
+
+    # The pending task is promoted one priority class for each PRIORITY_AGING seconds it waits.
+    #   So the batch and the background tasks will not be starved by the continuous higher priority tasks.
+    PRIORITY_AGING = 60
 
     # ---------------------------------------- Task -----------------------------------------
 
@@ -16,9 +30,26 @@ class TaskQueue:
         STATUS_FINISHED = 4
         STATUS_EXCEPTION = 5
 
-        def __init__(self, name: str):
+        PRIORITY_INTERACTIVE = 0
+        PRIORITY_BATCH = 1
+        PRIORITY_BACKGROUND = 2
+
+        PRIORITY_NAMES = {
+            PRIORITY_INTERACTIVE: 'interactive',
+            PRIORITY_BATCH: 'batch',
+            PRIORITY_BACKGROUND: 'background',
+        }
+
+        def __init__(self, name: str, priority: int = PRIORITY_BATCH):
             self.__name = name
             self.__status = TaskQueue.Task.STATUS_IDLE
+            self.__priority = priority
+            self.__cancel_event = threading.Event()
+
+            # The monotonic time of queued, started and finished. 0 if not happened.
+            self.__queued_time = 0
+            self.__started_time = 0
+            self.__finished_time = 0
 
         def __str__(self):
             return 'Task %s [%s]' % (self.name(), self.identity())
@@ -27,6 +58,18 @@ class TaskQueue:
             return self.__name
 
         def update(self, status: int):
+            now = time.monotonic()
+            if status == TaskQueue.Task.STATUS_PENDING:
+                self.__queued_time = now
+                self.__started_time = 0
+                self.__finished_time = 0
+                self.__cancel_event.clear()
+            elif status == TaskQueue.Task.STATUS_RUNNING:
+                self.__started_time = now
+            elif status in [TaskQueue.Task.STATUS_CANCELED,
+                            TaskQueue.Task.STATUS_FINISHED,
+                            TaskQueue.Task.STATUS_EXCEPTION]:
+                self.__finished_time = now
             self.__status = status
 
         def status(self) -> int:
@@ -35,6 +78,47 @@ class TaskQueue:
         def working(self) -> bool:
             return self.__status in [TaskQueue.Task.STATUS_PENDING, TaskQueue.Task.STATUS_RUNNING]
 
+        def priority(self) -> int:
+            return self.__priority
+
+        def set_priority(self, priority: int):
+            self.__priority = priority
+
+        # ----------------------- Cancellation -----------------------
+
+        def request_cancel(self):
+            self.__cancel_event.set()
+
+        def cancel_requested(self) -> bool:
+            return self.__cancel_event.is_set()
+
+        def wait_cancel(self, timeout: float) -> bool:
+            """
+            Sleep in run() that wakes up once the task is canceled.
+            :return: True if the task is canceled
+            """
+            return self.__cancel_event.wait(timeout)
+
+        # -------------------------- Metrics -------------------------
+
+        def queue_time(self) -> float:
+            """
+            The seconds that the task waits in queue.
+            """
+            if self.__queued_time == 0:
+                return 0.0
+            end = self.__started_time or self.__finished_time or time.monotonic()
+            return end - self.__queued_time
+
+        def run_time(self) -> float:
+            """
+            The seconds that the task runs.
+            """
+            if self.__started_time == 0:
+                return 0.0
+            end = self.__finished_time or time.monotonic()
+            return end - self.__started_time
+
         # -------------- Must Override --------------
 
         def run(self):
@@ -47,6 +131,15 @@ class TaskQueue:
             # Must override
             assert False
 
+        # -------------- Optional Override --------------
+
+        def resources(self) -> [str]:
+            """
+            The keys of resources that the task uses exclusively.
+                The tasks that have any same key will not run at the same time.
+            """
+            return []
+
     # -------------------------------------- Observer ---------------------------------------
 
     class Observer:
@@ -58,37 +151,88 @@ class TaskQueue:
 
     # -------------------------------------- TaskQueue --------------------------------------
 
-    def __init__(self, logger=print):
+    def __init__(self, logger=print, worker_count: int = 1):
         self.__lock = threading.Lock()
+        # Notified when task added, task finished or quit
+        self.__condition = threading.Condition(self.__lock)
         self.__quit_flag = True
         self.__observers = []
         self.__task_queue = []
-        self.__task_thread = None
-        self.__running_task = None
+        self.__task_threads = []
+        self.__worker_count = max(1, int(worker_count))
+        self.__running_tasks = []
+        # The resource key: The running task that holds it
+        self.__busy_resources = {}
         self.__will_task = None
+        # The will task runs once by the first quitting worker of each start-quit cycle
+        self.__will_task_done = False
+        # The priority: The metrics dict
+        self.__metrics = {}
         self.__logger = logger
 
     def join(self, timeout: int):
-        if self.__task_thread is not None:
-            self.__task_thread.join(timeout)
+        deadline = time.monotonic() + timeout
+        for thread in self.__task_threads.copy():
+            thread.join(max(0.0, deadline - time.monotonic()))
 
     def quit(self):
         canceled_tasks = []
         self.__lock.acquire()
         self.__quit_flag = True
         self.__clear_pending_task(canceled_tasks)
-        self.__cancel_running_task(canceled_tasks)
+        self.__cancel_running_task(None, canceled_tasks)
+        self.__condition.notify_all()
         self.__lock.release()
         self.notify_task_updated(canceled_tasks, 'canceled')
 
     def start(self):
-        if self.__task_thread is None or self.__task_thread.is_alive():
-            self.__quit_flag = False
-            self.__task_thread = threading.Thread(target=self.__task_thread_entry)
-            self.__task_thread.start()
+        self.__lock.acquire()
+        self.__quit_flag = False
+        self.__will_task_done = False
+        self.__task_threads = [thread for thread in self.__task_threads if thread.is_alive()]
+        while len(self.__task_threads) < self.__worker_count:
+            thread = threading.Thread(target=self.__task_thread_entry)
+            self.__task_threads.append(thread)
+            thread.start()
+        self.__lock.release()
+
+    def set_worker_count(self, worker_count: int):
+        """
+        Change the worker count. The extra workers quit after their running task finished.
+        """
+        self.__lock.acquire()
+        self.__worker_count = max(1, int(worker_count))
+        self.__condition.notify_all()
+        started = not self.__quit_flag
+        self.__lock.release()
+        if started:
+            self.start()
+
+    def get_worker_count(self) -> int:
+        return self.__worker_count
 
     def is_busy(self) -> bool:
-        return self.__running_task is not None or len(self.__task_queue) > 0
+        return len(self.__running_tasks) > 0 or len(self.__task_queue) > 0
+
+    def get_metrics(self) -> dict:
+        """
+        Get the queue-wait and run-time metrics of the tasks that left the queue, by priority class.
+        :return: {priority name: {count, canceled, exception, pending, running,
+                                  wait_total, wait_max, wait_avg, run_total, run_max, run_avg}}
+                    The time is in seconds.
+        """
+        metrics = {}
+        self.__lock.acquire()
+        priorities = set(self.__metrics.keys()) | set(TaskQueue.Task.PRIORITY_NAMES.keys())
+        for priority in sorted(priorities):
+            item = dict(self.__metrics.get(priority, self.__new_metrics()))
+            item['pending'] = len([task for task in self.__task_queue if task.priority() == priority])
+            item['running'] = len([task for task in self.__running_tasks if task.priority() == priority])
+            item['wait_avg'] = item['wait_total'] / item['count'] if item['count'] > 0 else 0.0
+            item['run_avg'] = item['run_total'] / item['count'] if item['count'] > 0 else 0.0
+            metrics[TaskQueue.Task.PRIORITY_NAMES.get(priority, str(priority))] = item
+        self.__lock.release()
+        return metrics
 
     # -------------------------------- Task Related --------------------------------
 
@@ -99,16 +243,16 @@ class TaskQueue:
             if (name is None and identity is None) or \
                     (name is not None and task.name):
                 task_list.append(task)
-        if self.__running_task is not None:
-            if identity is None or self.__running_task.identity() == identity:
-                task_list.insert(0, self.__running_task)
+        running_tasks = [task for task in self.__running_tasks if identity is None or task.identity() == identity]
         self.__lock.release()
-        return task_list
+        return running_tasks + task_list
 
-    def append_task(self, task: Task, unique: bool = True) -> bool:
+    def append_task(self, task: Task, unique: bool = True, priority: int or None = None) -> bool:
         if task.identity() is None or task == '':
             self.log('Task must have an identity.')
             return False
+        if priority is not None:
+            task.set_priority(priority)
         self.log('Task queue -> append : ' + str(task))
         self.__lock.acquire()
         if unique and (task.identity() is not None and
@@ -118,25 +262,31 @@ class TaskQueue:
             return False
         self.__task_queue.append(task)
         task.update(TaskQueue.Task.STATUS_PENDING)
+        self.__condition.notify_all()
         self.__lock.release()
         self.notify_task_updated(task, 'append')
         return True
 
-    def insert_task(self, task: Task, index: int = 0, unique: bool = True):
+    def insert_task(self, task: Task, index: int = 0, unique: bool = True, priority: int or None = None):
         if task.identity() is None or task == '':
             self.log('Task must have an identity.')
             return False
+        if priority is not None:
+            task.set_priority(priority)
         self.log('Task queue -> insert : ' + str(task))
+        canceled_tasks = []
         self.__lock.acquire()
         if unique:
-            self.__remove_pending_task(task.identity())
-            self.__check_cancel_running_task(task.identity())
+            self.__remove_pending_task(task.identity(), canceled_tasks)
+            self.__cancel_running_task(task.identity(), canceled_tasks)
         if index >= len(self.__task_queue):
             self.__task_queue.append(task)
         else:
             self.__task_queue.insert(index, task)
         task.update(TaskQueue.Task.STATUS_PENDING)
+        self.__condition.notify_all()
         self.__lock.release()
+        self.notify_task_updated(canceled_tasks, 'canceled')
         self.notify_task_updated(task, 'insert')
 
     def set_will_task(self, task: Task):
@@ -147,17 +297,17 @@ class TaskQueue:
         self.__lock.acquire()
         if identity is None:
             self.__clear_pending_task(canceled_tasks)
-            self.__cancel_running_task(canceled_tasks)
+            self.__cancel_running_task(None, canceled_tasks)
         else:
             self.__remove_pending_task(identity, canceled_tasks)
-            self.__check_cancel_running_task(identity, canceled_tasks)
+            self.__cancel_running_task(identity, canceled_tasks)
         self.__lock.release()
         self.notify_task_updated(canceled_tasks, 'canceled')
 
     def cancel_running_task(self):
         canceled_tasks = []
         self.__lock.acquire()
-        self.__cancel_running_task(canceled_tasks)
+        self.__cancel_running_task(None, canceled_tasks)
         self.__lock.release()
         self.notify_task_updated(canceled_tasks, 'canceled')
 
@@ -196,8 +346,10 @@ class TaskQueue:
         for task in self.__task_queue:
             if self.__adapt_task(task, name, identity):
                 tasks.append(task)
-        if self.__adapt_task(self.__running_task, name, identity):
-            tasks.append(self.__running_task)
+        for task in self.__running_tasks:
+            # The canceled task is still running until it quits. But it's not in the queue from the view of user.
+            if task.status() != TaskQueue.Task.STATUS_CANCELED and self.__adapt_task(task, name, identity):
+                tasks.append(task)
         return tasks
 
     def __remove_pending_task(self, identity, canceled_tasks: [Task]):
@@ -209,25 +361,83 @@ class TaskQueue:
                 canceled_tasks.append(task)
                 task.update(TaskQueue.Task.STATUS_CANCELED)
                 self.__task_queue.remove(task)
+                self.__record_metrics(task)
 
     def __clear_pending_task(self, canceled_tasks: [Task]):
         for task in self.__task_queue:
             canceled_tasks.append(task)
             task.update(TaskQueue.Task.STATUS_CANCELED)
+            self.__record_metrics(task)
         self.__task_queue.clear()
 
-    def __check_cancel_running_task(self, identity: str or None, canceled_tasks: [Task]):
-        if identity is None or \
-                (self.__running_task is not None and
-                 self.__running_task.identity() == identity):
-            canceled_tasks.append(self.__cancel_running_task(canceled_tasks))
+    def __cancel_running_task(self, identity: str or None, canceled_tasks: [Task]):
+        """
+        Cancel the running tasks (of the identity, or all if identity is None).
+            The task keeps its resources until it actually quits.
+        """
+        for task in self.__running_tasks:
+            if task.status() == TaskQueue.Task.STATUS_CANCELED:
+                continue
+            if identity is not None and task.identity() != identity:
+                continue
+            canceled_tasks.append(task)
+            task.update(TaskQueue.Task.STATUS_CANCELED)
+            task.request_cancel()
+            task.quit()
+
+    def __pick_task(self) -> Task or None:
+        """
+        Pick the task that can run now and remove it from pending queue. Must be called with lock.
+        """
+        now = time.monotonic()
+        aging = TaskQueue.PRIORITY_AGING
+
+        def effective_priority(_task: TaskQueue.Task) -> int:
+            return max(TaskQueue.Task.PRIORITY_INTERACTIVE, _task.priority() - int(_task.queue_time() / aging))
+
+        running_non_interactive = len([task for task in self.__running_tasks
+                                       if task.priority() != TaskQueue.Task.PRIORITY_INTERACTIVE])
+        reserved = self.__worker_count > TaskQueue.INTERACTIVE_RESERVED_WORKERS and \
+            running_non_interactive >= self.__worker_count - TaskQueue.INTERACTIVE_RESERVED_WORKERS
+
+        # The sort is stable, so the tasks in the same priority keep the queued order.
+        for task in sorted(self.__task_queue, key=effective_priority):
+            if reserved and task.priority() != TaskQueue.Task.PRIORITY_INTERACTIVE:
+                continue
+            if any(key in self.__busy_resources for key in task.resources()):
+                continue
+            self.__task_queue.remove(task)
+            return task
+        return None
+
+    def __worker_retired(self) -> bool:
+        thread = threading.current_thread()
+        return thread in self.__task_threads and self.__task_threads.index(thread) >= self.__worker_count
 
-    def __cancel_running_task(self, canceled_tasks: [Task]):
-        if self.__running_task is not None:
-            canceled_tasks.append(self.__running_task)
-            self.__running_task.update(TaskQueue.Task.STATUS_CANCELED)
-            self.__running_task.quit()
-            self.__running_task = None
+    @staticmethod
+    def __new_metrics() -> dict:
+        return {
+            'count': 0,
+            'canceled': 0,
+            'exception': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'run_total': 0.0,
+            'run_max': 0.0,
+        }
+
+    def __record_metrics(self, task: Task):
+        if task.priority() not in self.__metrics.keys():
+            self.__metrics[task.priority()] = self.__new_metrics()
+        metrics = self.__metrics[task.priority()]
+        wait_time, run_time = task.queue_time(), task.run_time()
+        metrics['count'] += 1
+        metrics['canceled'] += 1 if task.status() == TaskQueue.Task.STATUS_CANCELED else 0
+        metrics['exception'] += 1 if task.status() == TaskQueue.Task.STATUS_EXCEPTION else 0
+        metrics['wait_total'] += wait_time
+        metrics['wait_max'] = max(metrics['wait_max'], wait_time)
+        metrics['run_total'] += run_time
+        metrics['run_max'] = max(metrics['run_max'], run_time)
 
     def log(self, text: str, level: int = 0):
         if self.__logger is not None:
@@ -241,37 +451,59 @@ class TaskQueue:
         quit_thread = False
         while not quit_thread:
             self.__lock.acquire()
-            if self.__quit_flag:
+            # Sleep until a task can run or quit
+            task = None
+            while not self.__quit_flag and not self.__worker_retired():
+                task = self.__pick_task()
+                if task is not None:
+                    break
+                self.__condition.wait()
+            if task is None:
                 quit_thread = True
-                task = self.__will_task
-            else:
-                task = self.__task_queue.pop(0) if len(self.__task_queue) > 0 else None
-            self.__running_task = task
+                if self.__quit_flag:
+                    # The will task is kept and runs again when the queue is started and quit again
+                    task = self.__will_task if not self.__will_task_done else None
+                    self.__will_task_done = True
+                else:
+                    self.__task_threads.remove(threading.current_thread())
+            resources = [] if task is None or quit_thread else list(task.resources())
+            if task is not None:
+                self.__running_tasks.append(task)
+                for key in resources:
+                    self.__busy_resources[key] = task
+                task.update(TaskQueue.Task.STATUS_RUNNING)
             self.__lock.release()
 
-            clock = time.time()
             if task is not None:
-                try:
-                    self.log('Task queue -> start: ' + str(task))
-                    task.update(TaskQueue.Task.STATUS_RUNNING)
-                    self.notify_task_updated(task, 'started')
-                    task.run()
-                    task.update(TaskQueue.Task.STATUS_FINISHED) \
-                        if task.status() != TaskQueue.Task.STATUS_CANCELED else None
-                except Exception as e:
-                    task.update(TaskQueue.Task.STATUS_EXCEPTION)
-                    self.log('Task queue -> ' + str(task) + ' got exception:', 10)
-                    self.log(e, 10)
-                    self.log(traceback.format_exc(), 10)
-                finally:
-                    self.log('Task queue -> finish: %s, time spending: %.2f ms' %
-                          (str(task), (time.time() - clock) * 1000))
-                    self.notify_task_updated(task, 'finished')
-                    self.__lock.acquire()
-                    self.__running_task = None
-                    self.__lock.release()
-            else:
-                time.sleep(0.1)
+                self.__execute_task(task, resources)
+
+    def __execute_task(self, task: Task, resources: [str]):
+        try:
+            self.log('Task queue -> start: ' + str(task))
+            self.notify_task_updated(task, 'started')
+            if not task.cancel_requested():
+                task.run()
+            task.update(TaskQueue.Task.STATUS_FINISHED
+                        if task.status() != TaskQueue.Task.STATUS_CANCELED else TaskQueue.Task.STATUS_CANCELED)
+        except Exception as e:
+            task.update(TaskQueue.Task.STATUS_EXCEPTION)
+            self.log('Task queue -> ' + str(task) + ' got exception:', 10)
+            self.log(e, 10)
+            self.log(traceback.format_exc(), 10)
+        finally:
+            self.log('Task queue -> finish: %s, waiting: %.2f ms, time spending: %.2f ms' %
+                     (str(task), task.queue_time() * 1000, task.run_time() * 1000))
+            self.__lock.acquire()
+            if task in self.__running_tasks:
+                self.__running_tasks.remove(task)
+            for key in resources:
+                if self.__busy_resources.get(key, None) is task:
+                    del self.__busy_resources[key]
+            self.__record_metrics(task)
+            # The tasks that wait for the resources can run now
+            self.__condition.notify_all()
+            self.__lock.release()
+            self.notify_task_updated(task, 'finished')
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -285,10 +517,12 @@ class TestTask(TaskQueue.Task):
         TestTask.LOG_START.clear()
         TestTask.LOG_FINISH.clear()
 
-    def __init__(self, name: str, _id: str, delay: int):
-        super(TestTask, self).__init__(name)
+    def __init__(self, name: str, _id: str, delay: int,
+                 priority: int = TaskQueue.Task.PRIORITY_BATCH, resources: [str] = None):
+        super(TestTask, self).__init__(name, priority)
         self.__id = _id
         self.__delay = delay
+        self.__resources = resources if resources is not None else []
         self.__quit_flag = False
 
     def run(self):
@@ -307,6 +541,31 @@ class TestTask(TaskQueue.Task):
     def identity(self) -> str:
         return self.__id
 
+    def resources(self) -> [str]:
+        return self.__resources
+
+    def log(self, text: str):
+        print(text)
+
+
+class CooperativeTask(TestTask):
+    def __init__(self, name: str, _id: str, delay: int, resources: [str] = None):
+        super(CooperativeTask, self).__init__(name, _id, delay, resources=resources)
+        self.__id = _id
+        self.__delay = delay
+        self.canceled = False
+
+    def run(self):
+        TestTask.LOG_START.append(self.__id)
+        # Do not quit immediately, the resource should be kept until run() returns.
+        self.canceled = self.wait_cancel(self.__delay)
+        time.sleep(0.5)
+        TestTask.LOG_FINISH.append(self.__id)
+
+    def quit(self):
+        # Only cancel_requested() is used
+        pass
+
 
 def test_basic_feature():
     task_queue = TaskQueue()
@@ -357,9 +616,100 @@ def test_basic_feature():
     assert 'will' in TestTask.LOG_START
     assert 'will' in TestTask.LOG_FINISH
 
+    # The will task runs on each quit
+    task_queue.start()
+    task_queue.quit()
+    task_queue.join(1)
+    assert TestTask.LOG_FINISH.count('will') == 2
+
+
+def test_priority_and_resource():
+    task_queue = TaskQueue(worker_count=3)
+    task_queue.start()
+    TestTask.reset()
+
+    update_a = TestTask('Update', 'update_a', 2, TaskQueue.Task.PRIORITY_BACKGROUND, ['update_task'])
+    update_b = TestTask('Update', 'update_b', 0.5, TaskQueue.Task.PRIORITY_BACKGROUND, ['update_task'])
+    analysis_a = TestTask('Analysis', 'analysis_a', 3.5, TaskQueue.Task.PRIORITY_BATCH, ['analysis_task'])
+    analysis_b = TestTask('Analysis', 'analysis_b', 1)
+    query = TestTask('Query', 'query', 0)
+
+    task_queue.append_task(update_a)
+    task_queue.append_task(update_b)
+    task_queue.append_task(analysis_a)
+    time.sleep(0.5)
+    # The update_b is blocked by the resource
+    assert TestTask.LOG_START == ['update_a', 'analysis_a'] or TestTask.LOG_START == ['analysis_a', 'update_a']
+
+    # The last worker is kept for the interactive task
+    task_queue.append_task(analysis_b)
+    task_queue.append_task(query, priority=TaskQueue.Task.PRIORITY_INTERACTIVE)
+    time.sleep(0.5)
+    assert 'query' in TestTask.LOG_FINISH
+    assert 'analysis_b' not in TestTask.LOG_START
+
+    # The batch task goes before the background task
+    time.sleep(1.5)
+    assert 'update_a' in TestTask.LOG_FINISH
+    assert 'analysis_b' in TestTask.LOG_START
+    assert 'update_b' not in TestTask.LOG_START
+
+    time.sleep(2.0)
+    assert 'update_b' in TestTask.LOG_FINISH
+    assert not task_queue.is_busy()
+
+    metrics = task_queue.get_metrics()
+    assert metrics['interactive']['count'] == 1
+    assert metrics['interactive']['wait_max'] < 0.5
+    assert metrics['batch']['count'] == 2
+    assert metrics['background']['count'] == 2
+    assert metrics['background']['wait_max'] > 1.0
+    assert metrics['background']['run_max'] > 1.5
+
+    # Only one of the workers runs the will task
+    task_queue.set_will_task(TestTask('TaskWill', 'will', 0))
+    task_queue.quit()
+    task_queue.join(1)
+    assert TestTask.LOG_FINISH.count('will') == 1
+
+
+def test_cooperative_cancel():
+    task_queue = TaskQueue(worker_count=2)
+    task_queue.start()
+    TestTask.reset()
+
+    task_a = CooperativeTask('Cooperative', 'task_a', 30, ['resource'])
+    task_b = TestTask('Waiting', 'task_b', 0, resources=['resource'])
+
+    task_queue.append_task(task_a)
+    task_queue.append_task(task_b)
+    time.sleep(0.3)
+    task_queue.cancel_task('task_a')
+    assert task_a.status() == TaskQueue.Task.STATUS_CANCELED
+
+    # The canceled task is dropped from the view of user, but it keeps the resource until quit.
+    assert len(task_queue.find_matching_tasks(None, 'task_a')) == 0
+    time.sleep(0.2)
+    assert task_a.canceled
+    assert 'task_b' not in TestTask.LOG_START
+    time.sleep(0.6)
+    assert 'task_b' in TestTask.LOG_FINISH
+    assert task_a.status() == TaskQueue.Task.STATUS_CANCELED
+    assert task_queue.get_metrics()['batch']['canceled'] == 1
+
+    task_queue.set_worker_count(1)
+    time.sleep(0.2)
+    assert task_queue.get_worker_count() == 1
+
+    task_queue.quit()
+    task_queue.join(1)
+    assert not task_queue.is_busy()
+
 
 def test_entry() -> bool:
     test_basic_feature()
+    test_priority_and_resource()
+    test_cooperative_cancel()
     return True
 
 
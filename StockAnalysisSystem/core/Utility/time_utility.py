@@ -1,5 +1,6 @@
 import time
 import datetime
+import threading
 
 
 def now() -> datetime.datetime:
@@ -268,6 +269,59 @@ class DelayerMinuteLimit(Delayer):
         super(DelayerMinuteLimit, self).__init__(delay)
 
 
+# ---------------------------------------------------- TokenBucket -----------------------------------------------------
+
+class TokenBucket:
+    """
+    Thread safe rate limiter. The tokens refill at the specified rate and at most capacity tokens can be stored.
+    The acquire() blocks until the token is available. The waiting threads are served in the order of acquiring.
+    It has the same delay() interface as Delayer, so it can be shared by the threads that access the same resource.
+    """
+    def __init__(self, rate_per_sec: float, capacity: int = 1):
+        self.__rate = rate_per_sec
+        self.__capacity = max(1, capacity)
+        self.__tokens = float(self.__capacity)
+        self.__last = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reset(self):
+        with self.__lock:
+            self.__tokens = float(self.__capacity)
+            self.__last = time.monotonic()
+
+    def acquire(self, tokens: int = 1) -> float:
+        """
+        Take tokens from bucket. Wait if there's not enough tokens.
+        :param tokens: The token count
+        :return: The waiting time in seconds
+        """
+        if self.__rate <= 0:
+            return 0.0
+        with self.__lock:
+            current = time.monotonic()
+            self.__tokens = min(self.__capacity, self.__tokens + (current - self.__last) * self.__rate)
+            self.__last = current
+            # Reserve the tokens even if it's not enough. The later one will wait longer.
+            self.__tokens -= tokens
+            wait = -self.__tokens / self.__rate if self.__tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def delay(self):
+        wait = self.acquire()
+        if wait > 0:
+            print('Delay %s ms' % int(wait * 1000))
+
+
+class TokenBucketMinuteLimit(TokenBucket):
+    """
+    Use the class to create minute limitation token bucket
+    """
+    def __init__(self, limit_per_min: int, capacity: int = 1):
+        super(TokenBucketMinuteLimit, self).__init__(limit_per_min / 60 if limit_per_min > 0 else 0, capacity)
+
+
 # -------------------------------------------------- DateTimeIterator --------------------------------------------------
 
 class DateTimeIterator:
@@ -67,8 +67,8 @@ def project_path() -> str:
     return sas().get_project_path()
 
 
-def append_task(task: TaskQueue.Task):
-    sas().get_task_queue().append_task(task)
+def append_task(task: TaskQueue.Task, priority: int or None = None):
+    sas().get_task_queue().append_task(task, priority=priority)
 
 
 # ----------------------------------- DataHub -----------------------------------
@@ -77,11 +77,25 @@ def query(uri: str, identity: str or [str] = None, time_serial: tuple = None, **
     return data_center().query(uri, identity, time_serial, **extra)
 
 
+def query_batch(uri: str or [str], identity: [str] = None, time_serial: tuple = None,
+                group_by: str = '', **extra) -> pd.DataFrame or dict or None:
+    return data_center().query_batch(uri, identity, time_serial, group_by, **extra)
+
+
 def update(uri: str, identity: str or [str] = None,
            time_serial: tuple = None, force: bool = False, **extra) -> bool:
     return data_center().update_local_data(uri, identity, time_serial, force, **extra)
 
 
+def query_cache_statistics() -> dict:
+    """
+    Get the hit/miss statistics and memory usage of query result cache.
+    :return: dict, keys includes [hit, miss, hit_rate, eviction, invalidation,
+                                  entry_count, entry_limit, memory_usage, memory_limit]
+    """
+    return data_center().query_cache_statistics()
+
+
 # ------------------------------------ Datahub ------------------------------------
 
 # def post_auto_update_task(uri: str, identity: str or [str] = None, force: bool = False, **extra) -> ResourceTask:
@@ -227,6 +241,10 @@ def factor_query(stock_identity: str, factor_name: str or [str],
     return factor_center().query(stock_identity, factor_name, time_serial, mapping, extra)
 
 
+def factor_materialize(securities: [str] = None, force: bool = False, progress: ProgressRate = None) -> int:
+    return factor_center().materialize(securities, force, progress)
+
+
 # ------------------------------------------------------ Sys Call ------------------------------------------------------
 
 def sys_call(func_name: str, *args, **kwargs):
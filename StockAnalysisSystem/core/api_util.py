@@ -26,6 +26,9 @@ class SasUpdateTask(ResourceTask):
         self.clock = Clock(False)
         self.progress = ProgressRate()
 
+        # Add resource tags here
+        resource_manager.set_resource_tags(self.res_id(), ['update_task'])
+
     def in_work_package(self, uri: str) -> bool:
         return self.agent.adapt(uri)
 
@@ -140,6 +143,9 @@ class SasAnalysisTask(ResourceTask):
         self.__enable_from_cache = enable_from_cache
         self.__extra_params = kwargs
 
+        # Add resource tags here
+        resource_manager.set_resource_tags(self.res_id(), ['analysis_task'])
+
     def run(self):
         stock_list = self.selected_securities()
         result_list = self.analysis(stock_list)
@@ -47,6 +47,8 @@ class SasUpdateTask(ResourceTask):
 
         # Add resource tags here
         resource_manager.set_resource_tags(self.res_id(), ['update_task'])
+        # The bulk update should not block the analysis and the interactive tasks
+        self.set_priority(TaskQueue.Task.PRIORITY_BACKGROUND)
 
     def in_work_package(self, uri: str) -> bool:
         return self.__agent.adapt(uri)
@@ -185,6 +187,7 @@ class SasAnalysisTask(ResourceTask):
 
         # Add resource tags here
         resource_manager.set_resource_tags(self.res_id(), ['analysis_task'])
+        self.set_priority(kwargs.get('priority', TaskQueue.Task.PRIORITY_BATCH))
 
     def run(self):
         if self.__extra_params.get('attach_basic_index', False):
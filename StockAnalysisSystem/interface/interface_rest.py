@@ -1,13 +1,19 @@
+import json
 import requests
 import datetime
+import threading
 import traceback
 import pandas as pd
 from functools import partial
 from StockAnalysisSystem.core.Utility.JsonSerializer import serialize, deserialize
+from StockAnalysisSystem.core.Utility.BinarySerializer import \
+    binary_supported, is_binary, deserialize_binary, BINARY_CONTENT_TYPE, JSON_CONTENT_TYPE
+from StockAnalysisSystem.core.Utility.HttpCompression import compress_content
 import StockAnalysisSystem.core.Utility.JsonSerializerImpl
 
 # --------------------------------------------------------------------------------------
-# Just porting THIS FILE and JsonSerializerImpl.py, JsonSerializer.py into your project.
+# Just porting THIS FILE and JsonSerializerImpl.py, JsonSerializer.py, BinarySerializer.py, HttpCompression.py
+#     into your project.
 #     Then you can access StockAnalysisSystem (sas) data by REST interface
 #         without porting the whole sas project into your code.
 # --------------------------------------------------------------------------------------
@@ -18,14 +24,34 @@ class RestInterface:
         self.__token = None
         self.__timeout = 9999   # Blocking in request for debug
         self.__api_url = 'http://127.0.0.1:80/api'
+        self.__binary = True
+        self.__compress = True
 
-    def if_init(self, api_uri: str = None, token: str = None, timeout=None) -> bool:
+        # The keep-alive session of each thread. The connection is reused by the calls in the same thread
+        #   if the server keeps it alive (a production WSGI server does, the werkzeug development server does not).
+        self.__session_local = threading.local()
+
+    def if_init(self, api_uri: str = None, token: str = None, timeout=None,
+                binary: bool = None, compress: bool = None) -> bool:
+        """
+        :param api_uri: The url of web api
+        :param token: The access token
+        :param timeout: The timeout of request
+        :param binary: If True, accept the binary response (requires pyarrow). Else accept JSON only.
+        :param compress: If True, the large request body is compressed by gzip.
+                            The response is always compressed if the server supports.
+        :return: True
+        """
         if token is not None:
             self.__token = token
         if timeout is not None:
             self.__timeout = timeout
         if api_uri is not None:
             self.__api_url = api_uri
+        if binary is not None:
+            self.__binary = binary
+        if compress is not None:
+            self.__compress = compress
         return True
 
     def if_prob(self) -> dict:
@@ -53,22 +79,69 @@ class RestInterface:
             'args': serialize(args),
             'kwargs': serialize(kwargs),
         }
-        headers = {
+        try:
+            return self.__post(self.__api_url, payload)
+        except Exception as e:
+            print('Parse result fail: ' + str(e))
+            print(traceback.format_exc())
+        finally:
+            pass
 
+    def rest_interface_batch(self, calls: [(str, tuple, dict)]) -> [any]:
+        """
+        Cooperate with WebApiInterface.rest_interface_batch_stub
+        Call multiple apis in one request. The calls are executed in order in server side.
+        :param calls: The list of (api, args, kwargs)
+        :return: The list of response in the order of calls. The response of the failed call is None.
+        """
+        payload = {
+            'token': self.__token,
+            'calls': [{
+                'api': api,
+                'args': serialize(args),
+                'kwargs': serialize(kwargs),
+            } for api, args, kwargs in calls],
         }
-
         try:
-            resp = requests.post(self.__api_url, json=payload, headers=headers, timeout=self.__timeout)
-            return self.deserialize_response(resp.text) if (resp.text is not None and resp.text != '') else None
+            result = self.__post(self.__api_url.rstrip('/') + '/batch', payload)
+            if isinstance(result, list) and len(result) == len(calls):
+                return result
+            print('Batch result mismatch.')
         except Exception as e:
-            print('Parse result fail: ' + str(e))
+            print('Parse batch result fail: ' + str(e))
             print(traceback.format_exc())
         finally:
             pass
+        return [None] * len(calls)
+
+    def __post(self, url: str, payload: dict) -> any:
+        headers = {
+            'Accept': (BINARY_CONTENT_TYPE + ', ' + JSON_CONTENT_TYPE)
+            if self.__binary and binary_supported() else JSON_CONTENT_TYPE,
+            'Content-Type': JSON_CONTENT_TYPE,
+        }
+        body, encoding = compress_content(json.dumps(payload), 'gzip' if self.__compress else '')
+        if encoding != '':
+            headers['Content-Encoding'] = encoding
+
+        # The response is decompressed by requests with the Content-Encoding header
+        resp = self.__session().post(url, data=body, headers=headers, timeout=self.__timeout)
+        return self.deserialize_response(resp.content) if (resp.content is not None and resp.content != b'') else None
+
+    def __session(self) -> requests.Session:
+        session = getattr(self.__session_local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self.__session_local.session = session
+        return session
 
     @staticmethod
-    def deserialize_response(resp_text: str) -> any:
-        result = deserialize(resp_text)
+    def deserialize_response(resp_content: str or bytes) -> any:
+        if is_binary(resp_content):
+            return deserialize_binary(resp_content)
+        if isinstance(resp_content, (bytes, bytearray)):
+            resp_content = resp_content.decode('utf-8')
+        result = deserialize(resp_content)
         return result
 
 
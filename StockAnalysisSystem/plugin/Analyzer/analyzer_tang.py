@@ -47,7 +47,7 @@ def analyzer_stock_portrait(securities: str, time_serial: tuple, data_hub: DataH
 
     df_balance, result = query_readable_annual_report_pattern(data_hub, 'Finance.BalanceSheet',
                                                               securities, time_serial,
-                                                              ['资产总计', '负债合计'])
+                                                              ['资产总计', '负债合计'], context)
     if result is not None:
         return result
 
@@ -55,7 +55,7 @@ def analyzer_stock_portrait(securities: str, time_serial: tuple, data_hub: DataH
                                                            securities, time_serial,
                                                            ['经营活动产生的现金流量净额',
                                                             '投资活动产生的现金流量净额',
-                                                            '筹资活动产生的现金流量净额'])
+                                                            '筹资活动产生的现金流量净额'], context)
     if result is not None:
         return result
 
@@ -114,7 +114,7 @@ def analyzer_check_monetary_fund(securities: str, time_serial: tuple, data_hub:
                             '应收票据', '流动负债合计',
                             '交易性金融资产', '可供出售金融资产']
     df_balance_sheet, result = query_readable_annual_report_pattern(
-        data_hub, 'Finance.BalanceSheet', securities, time_serial, fields_balance_sheet)
+        data_hub, 'Finance.BalanceSheet', securities, time_serial, fields_balance_sheet, context)
     if result is not None:
         return result
 
@@ -199,7 +199,7 @@ def analyzer_check_receivable_and_prepaid(
     fields_income_statement = ['营业收入', '营业总收入', '减:营业成本']
 
     df, result = batch_query_readable_annual_report_pattern(
-        data_hub, securities, time_serial, fields_balance_sheet, fields_income_statement)
+        data_hub, securities, time_serial, fields_balance_sheet, fields_income_statement, context=context)
     if result is not None:
         return result
 
@@ -312,7 +312,7 @@ def analyzer_asset_composition(securities: str, time_serial: tuple, data_hub: Da
     # fields_income_statement = ['息税前利润']
 
     df, result = batch_query_readable_annual_report_pattern(
-        data_hub, securities, time_serial, fields_balance_sheet)
+        data_hub, securities, time_serial, fields_balance_sheet, context=context)
     if result is not None:
         return result
 
@@ -400,7 +400,7 @@ def analyzer_income_statement(securities: str, time_serial: tuple, data_hub: Dat
 
     df, result = batch_query_readable_annual_report_pattern(
         data_hub, securities, time_serial,
-        fields_balance_sheet, fields_income_statement, fields_cash_flow_statement)
+        fields_balance_sheet, fields_income_statement, fields_cash_flow_statement, context=context)
     if result is not None:
         return result
 
@@ -537,6 +537,141 @@ def analyzer_income_statement(securities: str, time_serial: tuple, data_hub: Dat
     #     return AnalysisResult(securities, AnalysisResult.SCORE_NOT_APPLIED, '无数据')
 
 
+# ----------------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------- Batch Analysis ---------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------
+
+NOT_APPLIED_INDUSTRIES = ['银行', '保险', '房地产', '全国地产', '区域地产']
+
+
+def batch_stock_portrait(securities: [str], df: pd.DataFrame, time_serial: tuple, data_hub: DataHubEntry,
+                         database: DatabaseEntry, context: AnalysisContext, **kwargs) -> pd.DataFrame:
+    nop(time_serial, database, kwargs)
+
+    df, df_not_applied = batch_industry_not_applied(securities, NOT_APPLIED_INDUSTRIES, df, data_hub, context)
+
+    net_assets = df['资产总计'] - df['负债合计']
+    # No data
+    df = df[~(net_assets < 1)]
+    net_assets = net_assets[~(net_assets < 1)]
+
+    def __portrait_sign(field: str) -> pd.Series:
+        ignore_or_negative = (df[field] < 0.0) | (df[field].abs() / net_assets < 0.1)
+        return pd.Series(np.where(ignore_or_negative, '-', '+'), index=df.index)
+
+    portrait = __portrait_sign('经营活动产生的现金流量净额') + \
+        __portrait_sign('投资活动产生的现金流量净额') + \
+        __portrait_sign('筹资活动产生的现金流量净额')
+
+    brief = portrait.map(lambda p: portrait_comments_table.get(p, ''))
+    score = portrait.map(lambda p: portrait_score_table.get(p, 0)).astype(object)
+    reason = batch_format_year(df['period']) + ' : [' + portrait + '] ' + brief
+
+    return pd.concat([batch_result_frame(df, score, reason, brief), df_not_applied], ignore_index=True)
+
+
+def batch_check_monetary_fund(securities: [str], df: pd.DataFrame, time_serial: tuple, data_hub: DataHubEntry,
+                              database: DatabaseEntry, context: AnalysisContext, **kwargs) -> pd.DataFrame:
+    nop(time_serial, database, kwargs)
+
+    df, df_not_applied = batch_industry_not_applied(securities, NOT_APPLIED_INDUSTRIES, df, data_hub, context)
+    df = df.copy()
+
+    df['短期负债'] = df['短期借款'] + df['一年内到期的非流动负债'] + df['其他流动负债']
+    df['有息负债'] = df['短期负债'] + df['长期借款'] + df['应付债券'] + df['其他非流动负债']
+    df['金融资产'] = df['交易性金融资产'] + df['可供出售金融资产']
+
+    df['货币资金/有息负债'] = df['货币资金'] / df['有息负债']
+    df['货币资金/短期负债'] = df['货币资金'] / df['短期负债']
+    df['有息负债/资产总计'] = df['有息负债'] / df['资产总计']
+    df['货币资金+金融资产'] = df['货币资金'] + df['金融资产']
+
+    year = batch_format_year(df['period'])
+    empty = pd.Series('', index=df.index)
+
+    # The NaN ratio does not take part in scoring, which is the same as the per securities analysis.
+    ratio = df['货币资金/有息负债']
+    enough = np.isinf(ratio) | (ratio >= 3.0)
+    less_2 = ~enough & (ratio < 2.0)
+    less_3 = ~enough & ~less_2 & (ratio < 3.0)
+    score_sum = np.where(enough, 100, 0) + np.where(less_3, 60, 0)
+    score_count = (enough | less_2 | less_3).astype(int)
+    brief_1 = empty.mask(less_2, '货币资金/有息负债 < 2').mask(less_3, '货币资金/有息负债 < 3')
+    reason_1 = empty.mask(less_2, year + ' : 货币资金/有息负债 = ' + batch_format_pct(ratio) + ', 小于2倍') \
+                    .mask(less_3, year + ' : 货币资金/有息负债 = ' + batch_format_pct(ratio) + ', 小于3倍')
+
+    short_debt_fail = df['货币资金/短期负债'] < 1.0
+    brief_2 = empty.mask(short_debt_fail, '货币资金/短期负债 < 1')
+    reason_2 = empty.mask(short_debt_fail, year + ' : 货币资金/短期负债 = ' +
+                          batch_format_pct(df['货币资金/短期负债']) + ', 小于1')
+
+    debt_ratio_fail = df['有息负债/资产总计'] > 0.6
+    brief_3 = empty.mask(debt_ratio_fail, '有息负债/资产总计 > 60%%')
+    reason_3 = empty.mask(debt_ratio_fail, year + ' 有息负债/资产总计 = ' +
+                          batch_format_pct(df['有息负债/资产总计']) + ', 大于 60%')
+
+    fund_fail = df['货币资金+金融资产'] < df['有息负债']
+    brief_4 = empty.mask(fund_fail, '货币资金+金融资产 < 有息负债')
+    reason_4 = empty.mask(fund_fail, year + ' : 货币资金+金融资产 = ' + batch_format_w(df['货币资金+金融资产']) +
+                          ' 小于 有息负债 ' + batch_format_w(df['有息负债']))
+
+    score_sum = score_sum + np.where(short_debt_fail, 0, 100) + \
+        np.where(debt_ratio_fail, 0, 100) + np.where(fund_fail, 0, 100)
+    score_count = score_count + 3
+    score = pd.Series((score_sum / score_count).astype(int), index=df.index).astype(object)
+
+    brief = batch_join_text([brief_1, brief_2, brief_3, brief_4], '; ', '正常')
+    reason = batch_join_text([reason_1, reason_2, reason_3, reason_4], '\n')
+
+    return pd.concat([batch_result_frame(df, score, reason, brief), df_not_applied], ignore_index=True)
+
+
+def batch_asset_composition(securities: [str], df: pd.DataFrame, time_serial: tuple, data_hub: DataHubEntry,
+                            database: DatabaseEntry, context: AnalysisContext, **kwargs) -> pd.DataFrame:
+    nop(securities, time_serial, data_hub, database, context, kwargs)
+
+    # Same as batch_query_readable_annual_report_pattern(): period ascending
+    df = df.sort_values(['stock_identity', 'period'], kind='mergesort')
+    df['净资产'] = df['资产总计'] - df['负债合计']
+    df['商誉/净资产'] = df['商誉'] / df['净资产']
+    df['商誉/总资产'] = df['商誉'] / df['资产总计']
+    df['在建工程/总资产'] = df['在建工程'] / df['资产总计']
+    df['固定资产/总资产'] = df['固定资产'] / df['资产总计']
+
+    year = batch_format_year(df['period'])
+    empty = pd.Series('', index=df.index)
+
+    insolvent = df['净资产'] < 10000.0
+    brief_1 = empty.mask(insolvent, '资不抵债')
+    reason_1 = empty.mask(insolvent, year + ' : 净资产（' + df['净资产'].map(str) + '）为负或过低（资不抵债）')
+
+    goodwill_high = (df['商誉/净资产'] > 0.2) | (df['商誉/总资产'] > 0.1)
+    brief_2 = empty.mask(goodwill_high, '商誉过高')
+    reason_2 = empty.mask(goodwill_high, year + ' : 商誉/净资产 = ' + batch_format_pct(df['商誉/净资产']) +
+                          '，商誉/总资产 = ' + batch_format_pct(df['商誉/总资产']) + ' - 占比过高')
+
+    construction_high = df['在建工程/总资产'] > 0.1
+    brief_3 = empty.mask(construction_high, '在建工程占比过高')
+    reason_3 = empty.mask(construction_high, year + ' : 在建工程/总资产 = ' +
+                          batch_format_pct(df['在建工程/总资产']) + ' - 占比过高')
+
+    fixed_ratio = df['固定资产/总资产']
+    fixed_score = np.select([fixed_ratio < 0.1, fixed_ratio < 0.3, fixed_ratio < 0.4, fixed_ratio < 0.6],
+                            [100, 90, 80, 70], 60)
+    judgement = pd.Series(np.select([fixed_ratio < 0.3, fixed_ratio < 0.6], ['', '中资产公司'], '重资产公司'),
+                          index=df.index)
+    reason_4 = empty.mask(judgement != '', year + ' : 固定资产/总资产 = ' +
+                          batch_format_pct(fixed_ratio) + ' - ' + judgement)
+
+    score_count = insolvent.astype(int) + goodwill_high.astype(int) + construction_high.astype(int) + 1
+    score = pd.Series((fixed_score / score_count).astype(int), index=df.index).astype(object)
+
+    brief = batch_join_text([brief_1, brief_2, brief_3], '; ', '正常')
+    reason = batch_join_text([reason_1, reason_2, reason_3, reason_4], '\n')
+
+    return batch_result_frame(df, score, reason, brief)
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 METHOD_LIST = [
@@ -554,6 +689,49 @@ METHOD_LIST = [
 ]
 
 
+DATA_DECLARATION = {
+    '3ee3a4ff-a2cf-4244-8f45-c319016ee16b': {
+        'Finance.BalanceSheet': ['资产总计', '负债合计'],
+        'Finance.CashFlowStatement': ['经营活动产生的现金流量净额', '投资活动产生的现金流量净额', '筹资活动产生的现金流量净额'],
+        'Market.SecuritiesInfo': ['industry'],
+    },
+    '7e132f82-a28e-4aa9-aaa6-81fa3692b10c': {
+        'Finance.BalanceSheet': ['货币资金', '资产总计', '负债合计',
+                                 '短期借款', '一年内到期的非流动负债', '其他流动负债',
+                                 '长期借款', '应付债券', '其他非流动负债',
+                                 '应收票据', '流动负债合计',
+                                 '交易性金融资产', '可供出售金融资产'],
+        'Market.SecuritiesInfo': ['industry'],
+    },
+    '7b0478d3-1e15-4bce-800c-6f89ee743600': {
+        'Finance.BalanceSheet': ['应收账款', '应收票据', '其他应收款', '长期应收款', '应收款项', '预付款项'],
+        'Finance.IncomeStatement': ['营业收入', '营业总收入', '减:营业成本'],
+        'Market.SecuritiesInfo': ['industry'],
+    },
+    'fff6c3cf-a6e5-4fa2-9dce-7d0566b581a1': {
+        'Finance.BalanceSheet': ['商誉', '在建工程', '固定资产', '资产总计', '负债合计'],
+    },
+    'd2ced262-7a03-4428-9220-3d4a2a8fe201': {
+        'Finance.BalanceSheet': ['商誉', '在建工程', '固定资产', '资产总计', '负债合计'],
+        'Finance.IncomeStatement': ['营业利润', '营业收入', '营业总收入', '净利润(含少数股东损益)',
+                                    '加:营业外收入', '减:资产减值损失', '减:营业成本',
+                                    '减:销售费用', '减:管理费用', '减:财务费用'],
+        'Finance.CashFlowStatement': ['经营活动产生的现金流量净额'],
+        'Market.SecuritiesInfo': ['industry'],
+    },
+}
+
+
+BATCH_METHOD_LIST = [
+    ('3ee3a4ff-a2cf-4244-8f45-c319016ee16b', DATA_DECLARATION['3ee3a4ff-a2cf-4244-8f45-c319016ee16b'],
+     batch_stock_portrait),
+    ('7e132f82-a28e-4aa9-aaa6-81fa3692b10c', DATA_DECLARATION['7e132f82-a28e-4aa9-aaa6-81fa3692b10c'],
+     batch_check_monetary_fund),
+    ('fff6c3cf-a6e5-4fa2-9dce-7d0566b581a1', DATA_DECLARATION['fff6c3cf-a6e5-4fa2-9dce-7d0566b581a1'],
+     batch_asset_composition),
+]
+
+
 def plugin_prob() -> dict:
     return {
         'plugin_id': '0da12555-d18a-4f0c-9bfe-b3903d927aa6',
@@ -578,9 +756,14 @@ def plugin_capacities() -> list:
 
 # ----------------------------------------------------------------------------------------------------------------------
 
+def data_declaration(methods: [str]) -> dict:
+    return standard_data_declaration(methods, DATA_DECLARATION)
+
+
 def analysis(methods: [str], securities: [str], time_serial: tuple,
              data_hub: DataHubEntry, database: DatabaseEntry, **kwargs) -> [AnalysisResult]:
-    return standard_dispatch_analysis(methods, securities, time_serial, data_hub, database, kwargs, METHOD_LIST)
+    return standard_dispatch_analysis(methods, securities, time_serial, data_hub, database, kwargs,
+                                      METHOD_LIST, BATCH_METHOD_LIST)
 
 
 
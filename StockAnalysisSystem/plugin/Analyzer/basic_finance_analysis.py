@@ -57,7 +57,7 @@ def analysis_consecutive_losses(securities: str, time_serial: tuple, data_hub: D
     nop(database, context, kwargs)
     df, result = query_readable_annual_report_pattern(data_hub, 'Finance.IncomeStatement',
                                                       securities, time_serial,
-                                                      ['利润总额', '营业利润'])
+                                                      ['利润总额', '营业利润'], context)
     if result is not None:
         return result
 
@@ -93,7 +93,7 @@ def analysis_profit_structure(securities: str, time_serial: tuple, data_hub: Dat
     nop(database, context, kwargs)
     df, result = query_readable_annual_report_pattern(data_hub, 'Finance.IncomeStatement',
                                                       securities, time_serial,
-                                                      ['营业收入', '营业总收入', '其他业务收入'])
+                                                      ['营业收入', '营业总收入', '其他业务收入'], context)
     if result is not None:
         return result
 
@@ -135,12 +135,12 @@ def analysis_cash_loan_both_high(securities: str, time_serial: tuple, data_hub:
     fields_income_statement = ['净利润(含少数股东损益)', '减:财务费用']
 
     df_balance_sheet, result = query_readable_annual_report_pattern(
-        data_hub, 'Finance.BalanceSheet', securities, time_serial, fields_balance_sheet)
+        data_hub, 'Finance.BalanceSheet', securities, time_serial, fields_balance_sheet, context)
     if result is not None:
         return result
 
     df_income_statement, result = query_readable_annual_report_pattern(
-        data_hub, 'Finance.IncomeStatement', securities, time_serial, fields_income_statement)
+        data_hub, 'Finance.IncomeStatement', securities, time_serial, fields_income_statement, context)
     if result is not None:
         return result
 
@@ -197,7 +197,7 @@ def goodwill_is_too_high(securities: str, time_serial: tuple, data_hub: DataHubE
     nop(database, context, kwargs)
     df, result = query_readable_annual_report_pattern(data_hub, 'Finance.BalanceSheet',
                                                       securities, time_serial,
-                                                      ['商誉', '资产总计', '负债合计'])
+                                                      ['商誉', '资产总计', '负债合计'], context)
     if result is not None:
         return result
 
@@ -238,7 +238,7 @@ def interest_too_high(securities: str, time_serial: tuple, data_hub: DataHubEntr
     nop(database, context, kwargs)
     df, result = query_readable_annual_report_pattern(data_hub, 'Finance.BalanceSheet',
                                                       securities, time_serial,
-                                                      ['减:利息支出', '净利润(不含少数股东损益)'])
+                                                      ['减:利息支出', '净利润(不含少数股东损益)'], context)
     if result is not None:
         return result
 
@@ -394,6 +394,63 @@ def analysis_roe_roa(securities: str, time_serial: tuple, data_hub: DataHubEntry
 # ------------------------------------------------------ 11 - 15 -------------------------------------------------------
 
 
+# --------------------------------------------------- Batch Analysis ---------------------------------------------------
+
+def batch_consecutive_losses(securities: [str], df: pd.DataFrame, time_serial: tuple, data_hub: DataHubEntry,
+                             database: DatabaseEntry, context: AnalysisContext, **kwargs) -> pd.DataFrame:
+    nop(securities, time_serial, data_hub, database, context, kwargs)
+
+    year = batch_format_year(df['period'])
+    empty = pd.Series('', index=df.index)
+
+    total_loss = df['利润总额'] < 0
+    operating_loss = df['营业利润'] < 0
+    reason_1 = empty.mask(total_loss, '利润总额 < 0\n' + year + '：利润总额 ' + batch_format_w(df['利润总额']))
+    reason_2 = empty.mask(operating_loss, '营业利润 < 0\n' + year + '：营业利润 ' + batch_format_w(df['营业利润']))
+
+    score = pd.Series(100 - np.where(total_loss, 50, 0) - np.where(operating_loss, 50, 0), index=df.index)
+    reason = batch_join_text([reason_1, reason_2], '\n')
+    brief = pd.Series('正常', index=df.index)
+
+    return batch_result_frame(df, score.astype(object), reason, brief)
+
+
+def batch_cash_loan_both_high(securities: [str], df: pd.DataFrame, time_serial: tuple, data_hub: DataHubEntry,
+                              database: DatabaseEntry, context: AnalysisContext, **kwargs) -> pd.DataFrame:
+    nop(securities, time_serial, data_hub, database, context, kwargs)
+
+    year = batch_format_year(df['period'])
+    cash = df['货币资金'] + df['其他流动资产']
+    loan = df['短期借款'] + df['长期借款'] + df['一年内到期的非流动负债'] + df['应付债券'] + df['其他流动负债']
+    net_profit = df['净利润(含少数股东损益)']
+
+    loan_vs_totol_asset = loan / df['资产总计']
+    fin_fee_vs_benefit = df['减:财务费用'] / net_profit
+    cash_vs_loan = cash / loan
+
+    no_asset = df['资产总计'] < 1.0
+    no_profit = ~no_asset & (net_profit < 1.0)
+    no_loan = ~no_asset & ~no_profit & (loan < 0.001)
+    not_applied = no_asset | no_profit | no_loan
+    both_high = ~not_applied & (cash_vs_loan > 1.0) & (cash_vs_loan < 1.7) & (loan_vs_totol_asset > 0.3)
+
+    def __format_2f(value: pd.Series) -> pd.Series:
+        return value.map(lambda v: '%.2f' % v)
+
+    reason = pd.Series(np.select(
+        [no_asset, no_profit, no_loan, both_high],
+        [year + ': 资产总计为0，可能数据缺失',
+         year + ': 净利润(含少数股东损益) = ' + __format_2f(net_profit) + '，不适用',
+         year + ': 流动负债合计为0，可能数据缺失',
+         year + ': 资金：' + (cash / 10000).map(str) + '万；借款：' + (loan / 10000).map(str) +
+         '万。贷款总资产比：' + __format_2f(loan_vs_totol_asset * 100) +
+         '%。利息净利润比' + __format_2f(fin_fee_vs_benefit * 100) + '%'], ''), index=df.index)
+    brief = pd.Series(np.select([not_applied, both_high], ['无数据', '疑似存贷双高'], '正常'), index=df.index)
+    score = pd.Series(np.select([not_applied, both_high], [None, 0], 100), index=df.index)
+
+    return batch_result_frame(df, score, reason, brief)
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 METHOD_LIST = [
@@ -413,6 +470,30 @@ METHOD_LIST = [
 ]
 
 
+DATA_DECLARATION = {
+    'b0e34011-c5bf-4ac3-b6a4-c15e5ea150a6': {
+        'Finance.IncomeStatement': ['利润总额', '营业利润'],
+    },
+    'd811ebd6-ee28-4d2f-b7e0-79ce0ecde7f7': {
+        'Finance.IncomeStatement': ['营业收入', '营业总收入', '其他业务收入'],
+    },
+    '2c05bb4c-935e-4be7-9c04-ae12720cd757': {
+        'Finance.BalanceSheet': ['短期借款', '长期借款', '货币资金', '其他流动资产',  '应付债券',
+                                 '一年内到期的非流动负债', '应收票据', '其他流动负债', '流动负债合计',
+                                 '资产总计'],
+        'Finance.IncomeStatement': ['净利润(含少数股东损益)', '减:财务费用'],
+    },
+}
+
+
+BATCH_METHOD_LIST = [
+    ('b0e34011-c5bf-4ac3-b6a4-c15e5ea150a6', DATA_DECLARATION['b0e34011-c5bf-4ac3-b6a4-c15e5ea150a6'],
+     batch_consecutive_losses),
+    ('2c05bb4c-935e-4be7-9c04-ae12720cd757', DATA_DECLARATION['2c05bb4c-935e-4be7-9c04-ae12720cd757'],
+     batch_cash_loan_both_high),
+]
+
+
 def plugin_prob() -> dict:
     return {
         'plugin_id': '7b59e0e4-5572-4cd8-8982-baa94f8af3d9',
@@ -435,9 +516,14 @@ def plugin_capacities() -> list:
 
 # ----------------------------------------------------------------------------------------------------------------------
 
+def data_declaration(methods: [str]) -> dict:
+    return standard_data_declaration(methods, DATA_DECLARATION)
+
+
 def analysis(methods: [str], securities: [str], time_serial: tuple,
              data_hub: DataHubEntry, database: DatabaseEntry, **kwargs) -> [AnalysisResult]:
-    return standard_dispatch_analysis(methods, securities, time_serial, data_hub, database, kwargs, METHOD_LIST)
+    return standard_dispatch_analysis(methods, securities, time_serial, data_hub, database, kwargs,
+                                      METHOD_LIST, BATCH_METHOD_LIST)
 
 
 
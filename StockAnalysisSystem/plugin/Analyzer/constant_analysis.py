@@ -40,11 +40,7 @@ def analysis_less_than_3_years(securities: str, time_serial: tuple, data_hub: Da
     nop(database)
     nop(time_serial)
 
-    if context.cache.get('securities_info', None) is None:
-        context.cache['securities_info'] = data_hub.get_data_center().query('Market.SecuritiesInfo')
-    df = context.cache.get('securities_info', None)
-
-    df_slice = df[df['stock_identity'] == securities]
+    df_slice = query_securities_info_slice(securities, data_hub, context)
     listing_date = get_dataframe_slice_item(df_slice, 'listing_date', 0, now())
     less_than_3_years = now().year - listing_date.year < 3
     brief = '小于三年' if less_than_3_years else '大于三年'
@@ -58,11 +54,7 @@ def analysis_location_limitation(securities: str, time_serial: tuple, data_hub:
     nop(database)
     nop(time_serial)
 
-    if context.cache.get('securities_info', None) is None:
-        context.cache['securities_info'] = data_hub.get_data_center().query('Market.SecuritiesInfo')
-    df = context.cache.get('securities_info', None)
-
-    df_slice = df[df['stock_identity'] == securities]
+    df_slice = query_securities_info_slice(securities, data_hub, context)
     area = get_dataframe_slice_item(df_slice, 'area', 0, '')
 
     # Add your exclude area here
@@ -80,11 +72,7 @@ def analysis_exclude_industries(securities: str, time_serial: tuple, data_hub: D
     nop(database)
     nop(time_serial)
 
-    if context.cache.get('securities_info', None) is None:
-        context.cache['securities_info'] = data_hub.get_data_center().query('Market.SecuritiesInfo')
-    df = context.cache.get('securities_info', None)
-
-    df_slice = df[df['stock_identity'] == securities]
+    df_slice = query_securities_info_slice(securities, data_hub, context)
 
     industry = get_dataframe_slice_item(df_slice, 'industry', 0, '')
     exclude = industry in ['种植业', '渔业', '林业', '畜禽养殖', '农业综合']
@@ -19,6 +19,10 @@ def equity_interest_pledge_too_high(securities: str, time_serial: tuple, data_hu
 
     df = data_hub.get_data_center().query('Stockholder.PledgeStatus', securities, (years_ago(2), now()),
                                           fields=query_fields + ['stock_identity', 'due_date'], readable=True)
+    return __pledge_result(securities, df)
+
+
+def __pledge_result(securities: str, df: pd.DataFrame) -> AnalysisResult:
     if df is None or len(df) == 0:
         return AnalysisResult(securities, None, AnalysisResult.SCORE_NOT_APPLIED, '没有数据', '没有数据')
     df = df.sort_values('due_date', ascending=False)
@@ -53,6 +57,10 @@ def analysis_dispersed_ownership(securities: str, time_serial: tuple, data_hub:
                                  database: DatabaseEntry, context: AnalysisContext, **kwargs) -> AnalysisResult:
     nop(database, context, kwargs)
     df = data_hub.get_data_center().query('Stockholder.Statistics', securities, (years_ago(3), now()))
+    return __dispersed_ownership_result(securities, df)
+
+
+def __dispersed_ownership_result(securities: str, df: pd.DataFrame) -> AnalysisResult:
     if df is None or len(df) == 0:
         return AnalysisResult(securities, None, AnalysisResult.SCORE_NOT_APPLIED, '没有数据', '没有数据')
     df = df[df['period'].dt.month == 12]
@@ -104,9 +112,12 @@ def analysis_dispersed_ownership(securities: str, time_serial: tuple, data_hub:
 def analysis_stock_unlock(securities: str, time_serial: tuple, data_hub: DataHubEntry,
                           database: DatabaseEntry, context: AnalysisContext, **kwargs) -> AnalysisResult:
     nop(time_serial, database, context, kwargs)
-    no_data_result = AnalysisResult(securities, None, AnalysisResult.SCORE_PASS, '前三个月或后半年内没有解禁数据', '无解禁数据')
-
     df: pd.DataFrame = data_hub.get_data_center().query('Stockholder.StockUnlock', securities, (years_ago(2), now()))
+    return __stock_unlock_result(securities, df)
+
+
+def __stock_unlock_result(securities: str, df: pd.DataFrame) -> AnalysisResult:
+    no_data_result = AnalysisResult(securities, None, AnalysisResult.SCORE_PASS, '前三个月或后半年内没有解禁数据', '无解禁数据')
     if df is None or df.empty:
         return no_data_result
 
@@ -151,6 +162,10 @@ def analysis_repurchase(securities: str, time_serial: tuple, data_hub: DataHubEn
                         database: DatabaseEntry, context: AnalysisContext, **kwargs) -> AnalysisResult:
     nop(time_serial, database, context, kwargs)
     df = data_hub.get_data_center().query('Stockholder.Repurchase', securities, (years_ago(1), now()))
+    return __repurchase_result(securities, df)
+
+
+def __repurchase_result(securities: str, df: pd.DataFrame) -> AnalysisResult:
     if df is None or len(df) == 0:
         return AnalysisResult(securities, None, AnalysisResult.SCORE_JUST, '前后一年内没有回购数据', '无回购数据')
     # df = df.where(df.notnull(), None)
@@ -205,9 +220,12 @@ def analysis_repurchase(securities: str, time_serial: tuple, data_hub: DataHubEn
 def analysis_increase_decrease(securities: str, time_serial: tuple, data_hub: DataHubEntry,
                                database: DatabaseEntry, context: AnalysisContext, **kwargs) -> AnalysisResult:
     nop(time_serial, database, context, kwargs)
-    no_data_result = AnalysisResult(securities, None, AnalysisResult.SCORE_NOT_APPLIED, '前后一年内没有增减持数据', '近一年无数据')
-
     df = data_hub.get_data_center().query('Stockholder.ReductionIncrease', securities, (years_ago(2), now()))
+    return __increase_decrease_result(securities, df)
+
+
+def __increase_decrease_result(securities: str, df: pd.DataFrame) -> AnalysisResult:
+    no_data_result = AnalysisResult(securities, None, AnalysisResult.SCORE_NOT_APPLIED, '前后一年内没有增减持数据', '近一年无数据')
     if df is None or len(df) == 0:
         return no_data_result
 
@@ -268,6 +286,62 @@ def analysis_increase_decrease(securities: str, time_serial: tuple, data_hub: Da
 # ------------------------------------------------------ 11 - 15 -------------------------------------------------------
 
 
+# --------------------------------------------------- Batch Analysis ---------------------------------------------------
+
+# The stockholder data is not annual report shaped. The batch entries query each uri once for all securities
+#   and apply the per securities logic to the data of each securities.
+
+def __batch_results(securities: [str], df_table: {str: pd.DataFrame}, result_entry) -> pd.DataFrame:
+    return batch_result_frame_of([result_entry(s, df_table.get(s, None)) for s in securities])
+
+
+def batch_equity_interest_pledge_too_high(securities: [str], df: pd.DataFrame, time_serial: tuple,
+                                          data_hub: DataHubEntry, database: DatabaseEntry,
+                                          context: AnalysisContext, **kwargs) -> pd.DataFrame:
+    nop(df, time_serial, database, context, kwargs)
+
+    query_fields = ['质押次数', '无限售股质押数量', '限售股份质押数量', '总股本', '质押比例']
+    if not data_hub.get_data_center().check_readable_name(query_fields):
+        return batch_result_frame_of([AnalysisResult(s, None, AnalysisResult.SCORE_NOT_APPLIED,
+                                                     '无法识别的字段名', '无法识别的字段名') for s in securities])
+    df_table = batch_query_by_securities(data_hub, 'Stockholder.PledgeStatus', securities, (years_ago(2), now()),
+                                         fields=query_fields + ['stock_identity', 'due_date'], readable=True)
+    return __batch_results(securities, df_table, __pledge_result)
+
+
+def batch_dispersed_ownership(securities: [str], df: pd.DataFrame, time_serial: tuple,
+                              data_hub: DataHubEntry, database: DatabaseEntry,
+                              context: AnalysisContext, **kwargs) -> pd.DataFrame:
+    nop(df, time_serial, database, context, kwargs)
+    df_table = batch_query_by_securities(data_hub, 'Stockholder.Statistics', securities, (years_ago(3), now()))
+    return __batch_results(securities, df_table, __dispersed_ownership_result)
+
+
+def batch_stock_unlock(securities: [str], df: pd.DataFrame, time_serial: tuple,
+                       data_hub: DataHubEntry, database: DatabaseEntry,
+                       context: AnalysisContext, **kwargs) -> pd.DataFrame:
+    nop(df, time_serial, database, context, kwargs)
+    df_table = batch_query_by_securities(data_hub, 'Stockholder.StockUnlock', securities, (years_ago(2), now()))
+    return __batch_results(securities, df_table, __stock_unlock_result)
+
+
+def batch_repurchase(securities: [str], df: pd.DataFrame, time_serial: tuple,
+                     data_hub: DataHubEntry, database: DatabaseEntry,
+                     context: AnalysisContext, **kwargs) -> pd.DataFrame:
+    nop(df, time_serial, database, context, kwargs)
+    df_table = batch_query_by_securities(data_hub, 'Stockholder.Repurchase', securities, (years_ago(1), now()))
+    return __batch_results(securities, df_table, __repurchase_result)
+
+
+def batch_increase_decrease(securities: [str], df: pd.DataFrame, time_serial: tuple,
+                            data_hub: DataHubEntry, database: DatabaseEntry,
+                            context: AnalysisContext, **kwargs) -> pd.DataFrame:
+    nop(df, time_serial, database, context, kwargs)
+    df_table = batch_query_by_securities(data_hub, 'Stockholder.ReductionIncrease', securities,
+                                         (years_ago(2), now()))
+    return __batch_results(securities, df_table, __increase_decrease_result)
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 METHOD_LIST = [
@@ -280,6 +354,15 @@ METHOD_LIST = [
 ]
 
 
+BATCH_METHOD_LIST = [
+    ('4ccedeea-b731-4b97-9681-d804838e351b', None, batch_equity_interest_pledge_too_high),
+    ('e515bd4b-db4f-49e2-ac55-1927a28d2a1c', None, batch_dispersed_ownership),
+    ('41e20665-4b1b-4423-97de-33764de09e02', None, batch_stock_unlock),
+    ('1dfe5faa-183c-4b30-aa5f-e0c55e064c31', None, batch_repurchase),
+    ('b646a253-33ec-4313-a5f3-7419363079a8', None, batch_increase_decrease),
+]
+
+
 def plugin_prob() -> dict:
     return {
         'plugin_id': 'ad29184c-8a01-4f18-b2a9-60650b2df91a',
@@ -304,7 +387,8 @@ def plugin_capacities() -> list:
 
 def analysis(methods: [str], securities: [str], time_serial: tuple,
              data_hub: DataHubEntry, database: DatabaseEntry, **kwargs) -> [AnalysisResult]:
-    return standard_dispatch_analysis(methods, securities, time_serial, data_hub, database, kwargs, METHOD_LIST)
+    return standard_dispatch_analysis(methods, securities, time_serial, data_hub, database, kwargs,
+                                      METHOD_LIST, BATCH_METHOD_LIST)
 
 
 
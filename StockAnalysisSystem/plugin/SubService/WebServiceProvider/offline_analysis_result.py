@@ -1,8 +1,13 @@
 import os
 import json
+import mmap
+import time
+import zlib
+import shutil
+import tempfile
 import threading
 import traceback
-import pandas as pd
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 
 from StockAnalysisSystem.core.config import Config
@@ -13,7 +18,136 @@ with RelativeImport(__file__):
     from common_render import data_frame_to_html
 
 
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                 Analysis Result Store
+# ----------------------------------------------------------------------------------------------------------------------
+
+# The store is built from the analysis result json (and the analyzer name json) as 2 files:
+#     <store>.<build id>.dat  : The zlib compressed html fragment of each security, one by one.
+#     <store>.idx             : The json of {source stamp, name stamp, data file name, {security: [offset, length]}}
+# The data file is memory mapped. Only the index is kept in memory.
+# The data file is written as <store>.<build id>.dat.tmp and renamed when complete, so the cleanup of other process
+#     never removes a data file that is still being written.
+
+STORE_VERSION = 1
+STORE_BUCKET_COUNT = 64
+STORE_COMPRESS_LEVEL = 6
+STORE_TEMP_SUFFIX = '.tmp'
+
+
+def file_stamp(path: str) -> [float, int] or None:
+    try:
+        stat = os.stat(path)
+        return [stat.st_mtime, stat.st_size]
+    except Exception:
+        return None
+    finally:
+        pass
+
+
+def security_key(security: str) -> str:
+    return security.split('.')[0]
+
+
+def render_security_result(security_analysis_result: dict, analyzer_name_dict: dict) -> str:
+    security_analysis_result_df = analyzer_util.analyzer_table_to_dataframe(security_analysis_result)
+    security_analysis_result_df = security_analysis_result_df.rename(columns=analyzer_name_dict)
+    security_analysis_result_df = security_analysis_result_df.fillna('-')
+    return data_frame_to_html(security_analysis_result_df)
+
+
+def build_analysis_result_store(result_path: str, name_dict_path: str, store_path: str) -> bool:
+    """
+    Build the store from analysis result json. The json is parsed item by item and spilled into bucket files
+        by security, then each bucket is rendered. So the memory usage does not grow with the result file size.
+    The data file is renamed from the temp name when complete, and the index file is replaced at last.
+        The reader always sees a complete store.
+    """
+    source_stamp = file_stamp(result_path)
+    if source_stamp is None:
+        return False
+    name_stamp = file_stamp(name_dict_path)
+
+    analyzer_name_dict = {}
+    if name_stamp is not None:
+        with open(name_dict_path, 'rt') as f:
+            analyzer_name_dict = json.load(f)
+
+    store_dir = os.path.dirname(os.path.abspath(store_path))
+    data_name = '%s.%d.dat' % (os.path.basename(store_path), time.time_ns())
+    data_path = os.path.join(store_dir, data_name)
+    data_temp_path = data_path + STORE_TEMP_SUFFIX
+    bucket_dir = tempfile.mkdtemp(dir=store_dir)
+
+    index = OrderedDict()
+    try:
+        # Spill the result items into buckets by security
+        buckets = [open(os.path.join(bucket_dir, '%d.jsonl' % i), 'wt', encoding='utf-8')
+                   for i in range(STORE_BUCKET_COUNT)]
+        try:
+            with open(result_path, 'rt') as f:
+                for item in analyzer_util.iter_analysis_result_dicts_from_json(f):
+                    key = security_key(str(item.get('stock_identity', '')))
+                    bucket = buckets[zlib.crc32(key.encode('utf-8')) % STORE_BUCKET_COUNT]
+                    bucket.write(json.dumps(item))
+                    bucket.write('\n')
+        finally:
+            for bucket in buckets:
+                bucket.close()
+
+        offset = 0
+        with open(data_temp_path, 'wb') as data_file:
+            for i in range(STORE_BUCKET_COUNT):
+                result_list = []
+                with open(os.path.join(bucket_dir, '%d.jsonl' % i), 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        analysis_result = analyzer_util.AnalysisResult()
+                        analysis_result.unpack(json.loads(line))
+                        result_list.append(analysis_result)
+                result_table = analyzer_util.analysis_result_list_to_security_analyzer_table(result_list)
+                for security, security_analysis_result in result_table.items():
+                    html = render_security_result(security_analysis_result, analyzer_name_dict)
+                    content = zlib.compress(html.encode('utf-8'), STORE_COMPRESS_LEVEL)
+                    data_file.write(content)
+                    index[security_key(security)] = [offset, len(content)]
+                    offset += len(content)
+        os.replace(data_temp_path, data_path)
+
+        index_data = {
+            'version': STORE_VERSION,
+            'source': source_stamp,
+            'names': name_stamp,
+            'data': data_name,
+            'index': index,
+        }
+        index_temp_path = store_path + '.idx.tmp'
+        with open(index_temp_path, 'wt') as f:
+            json.dump(index_data, f)
+        os.replace(index_temp_path, store_path + '.idx')
+    except Exception:
+        for path in [data_temp_path, data_path]:
+            try:
+                os.remove(path)
+            except Exception:
+                pass
+            finally:
+                pass
+        raise
+    finally:
+        shutil.rmtree(bucket_dir, ignore_errors=True)
+    return True
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                OfflineAnalysisResult
+# ----------------------------------------------------------------------------------------------------------------------
+
 class OfflineAnalysisResult:
+    # The interval (in seconds) of checking whether the analysis result file is updated
+    RELOAD_CHECK_INTERVAL = 30
+    # The max interval (in seconds) of retrying the failed build of the same analysis result file
+    BUILD_RETRY_MAX_INTERVAL = 3600
+
     def __init__(self, logger: any):
         self.__logger = logger
         self.__lock = threading.Lock()
@@ -21,100 +155,188 @@ class OfflineAnalysisResult:
         self.__result_url = ''
         self.__result_path = ''
         self.__name_dict_path = ''
-        self.__analyzer_name_dict = {}
-        self.__analysis_result_html = {}
-        self.__analysis_result_table = {}
+        self.__store_path = ''
+
+        # The failed build: the source stamps, the fail count and the time of next retry
+        self.__fail_stamp = None
+        self.__fail_count = 0
+        self.__retry_time = 0
+
+        # The loaded store
+        self.__index = {}
+        self.__index_stamp = (None, None)
+        self.__data_path = ''
+        self.__data_file = None
+        self.__data_map = None
+        self.__last_check = 0
 
     def init(self, config: Config):
         self.__result_url = config.get('analysis_result_url', 'http://sleepysoft.xyz/analysis?security=%s')
         self.__result_path = config.get('analysis_result_path', 'analysis_result.json')
         self.__name_dict_path = config.get('analysis_name_dict_path', 'analyzer_names.json')
-        self.create_load_offline_data_task()
+        self.__store_path = config.get('analysis_result_store_path', self.__result_path + '.store')
+        self.load_store()
+        self.check_reload(force=True)
 
     # ------------------------------------ Load ------------------------------------
 
-    def create_load_offline_data_task(self):
+    def check_reload(self, force: bool = False):
+        """
+        Rebuild the store in background if the analysis result file or the analyzer name file is updated.
+            The current store keeps serving until the new store is built.
+            If the build fails, it is retried with exponential backoff until the source files are updated again.
+        :param force: Check now without waiting for the check interval
+        """
+        now = time.time()
         with self.__lock:
-            if self.__future is None:
-                executor = ThreadPoolExecutor(1)
-                self.__future = executor.submit(self.load_offline_data, self.__name_dict_path, self.__result_path)
-                executor.shutdown(wait=False)
+            if not force and now - self.__last_check < OfflineAnalysisResult.RELOAD_CHECK_INTERVAL:
+                return
+            self.__last_check = now
+            if self.__future is not None:
+                return
+            stamp = (file_stamp(self.__result_path), file_stamp(self.__name_dict_path))
+            if stamp == self.__index_stamp or stamp[0] is None:
+                return
+            if stamp == self.__fail_stamp and now < self.__retry_time:
+                return
+            executor = ThreadPoolExecutor(1)
+            self.__future = executor.submit(self.build_store)
+            executor.shutdown(wait=False)
 
-    def load_offline_data(self, name_dict_path: str, result_path: str):
-        analyzer_name_dict = {}
-        analysis_result_table = {}
+    def wait_build(self, timeout: float = None) -> bool:
+        """
+        Wait for the building store task.
+        :return: True if no building task else False
+        """
+        with self.__lock:
+            future = self.__future
+        if future is not None:
+            try:
+                future.result(timeout)
+            except Exception:
+                return False
+            finally:
+                pass
+        return True
+
+    def create_load_offline_data_task(self):
+        self.check_reload(force=True)
 
+    def build_store(self):
+        stamp = (file_stamp(self.__result_path), file_stamp(self.__name_dict_path))
         try:
-            self.log('Loading analyzer name table...')
-            with open(name_dict_path, 'rt') as f:
-                analyzer_name_dict = json.load(f)
-            self.log('Load analyzer name table done.')
+            self.log('Building analysis result store...')
+            build_analysis_result_store(self.__result_path, self.__name_dict_path, self.__store_path)
+            self.log('Build analysis result store done.')
+            fail = False
         except Exception as e:
-            self.log('Load analyzer name table fail.')
+            self.log('Build analysis result store fail.')
             self.log(str(e))
             self.log(str(traceback.format_exc()))
+            fail = True
         finally:
             pass
-    
+
+        with self.__lock:
+            self.__future = None
+            if not fail:
+                self.__fail_stamp, self.__fail_count = None, 0
+            else:
+                self.__fail_count = self.__fail_count + 1 if stamp == self.__fail_stamp else 1
+                self.__fail_stamp = stamp
+                retry_interval = min(OfflineAnalysisResult.RELOAD_CHECK_INTERVAL * 2 ** (self.__fail_count - 1),
+                                     OfflineAnalysisResult.BUILD_RETRY_MAX_INTERVAL)
+                self.__retry_time = time.time() + retry_interval
+                self.log('Retry building analysis result store after %d seconds.' % retry_interval)
+        self.load_store()
+
+    def load_store(self) -> bool:
         try:
-            with open(result_path, 'rt') as f:
-                self.log('Loading analysis result...')
-                analysis_result = analyzer_util.analysis_results_from_json(f)
-                self.log('Convert analysis result...')
-                analysis_result_table = analyzer_util.analysis_result_list_to_security_analyzer_table(analysis_result)
-                analysis_result_table = {k.split('.')[0]: v for k, v in analysis_result_table.items()}
-                self.log('Load analysis result done.')
+            with open(self.__store_path + '.idx', 'rt') as f:
+                index_data = json.load(f)
+            if index_data.get('version', None) != STORE_VERSION:
+                return False
+            data_path = os.path.join(os.path.dirname(os.path.abspath(self.__store_path)), index_data['data'])
+            data_file = open(data_path, 'rb')
+            data_map = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) \
+                if os.path.getsize(data_path) > 0 else None
+        except FileNotFoundError:
+            return False
         except Exception as e:
-            self.log('Load analysis result fail.')
+            self.log('Load analysis result store fail.')
             self.log(str(e))
             self.log(str(traceback.format_exc()))
+            return False
         finally:
             pass
 
-        self.yield_loaded_offline_data(analyzer_name_dict, analysis_result_table)
-
-    def yield_loaded_offline_data(self, analyzer_name_dict: dict, analysis_result_table: dict):
         with self.__lock:
-            self.__future = None
-            self.__analyzer_name_dict = analyzer_name_dict
-            self.__analysis_result_table = analysis_result_table
+            prev_data_path, prev_data_file, prev_data_map = self.__data_path, self.__data_file, self.__data_map
+            self.__index = index_data['index']
+            self.__index_stamp = (index_data['source'], index_data['names'])
+            self.__data_path, self.__data_file, self.__data_map = data_path, data_file, data_map
+        self.log('Analysis result store loaded: %d securities.' % len(index_data['index']))
+
+        if prev_data_file is not None:
+            self.__release_data(prev_data_path, prev_data_file, prev_data_map)
+        self.__remove_expired_data()
+        return True
+
+    def __release_data(self, data_path: str, data_file, data_map):
+        try:
+            if data_map is not None:
+                data_map.close()
+            data_file.close()
+            if data_path != self.__data_path:
+                os.remove(data_path)
+        except Exception:
+            pass
+        finally:
+            pass
+
+    def __remove_expired_data(self):
+        # Remove the data files that left by the previous run. The temp data file being written is not matched.
+        #   The data file referred by the index file is kept, which may be just built by other process.
+        store_dir = os.path.dirname(os.path.abspath(self.__store_path))
+        prefix = os.path.basename(self.__store_path) + '.'
+        keep_paths = [self.__data_path]
+        try:
+            with open(self.__store_path + '.idx', 'rt') as f:
+                keep_paths.append(os.path.join(store_dir, json.load(f)['data']))
+        except Exception:
+            pass
+        finally:
+            pass
+        for file_name in os.listdir(store_dir):
+            path = os.path.join(store_dir, file_name)
+            if file_name.startswith(prefix) and file_name.endswith('.dat') and path not in keep_paths:
+                try:
+                    os.remove(path)
+                except Exception:
+                    pass
+                finally:
+                    pass
 
     # -------------------------------------------------------------------------------
 
     def security_result_exists(self, security: str) -> bool:
+        self.check_reload()
         with self.__lock:
-            return security in self.__analysis_result_html or security in self.__analysis_result_table
+            return security_key(security) in self.__index
 
     def get_analysis_result_url(self, security: str) -> str:
         return self.__result_url % security
 
     def get_analysis_result_html(self, security: str) -> str:
-        security = security.split('.')[0]
-
+        self.check_reload()
         with self.__lock:
-            result = self.__analysis_result_html.get(security, None)
-            if result is not None:
-                return result
-
-            if security not in self.__analysis_result_table:
+            position = self.__index.get(security_key(security), None)
+            if position is None or self.__data_map is None:
                 return ''
-
-            security_analysis_result = self.__analysis_result_table[security]
-
-        security_analysis_result_df = analyzer_util.analyzer_table_to_dataframe(security_analysis_result)
-        security_analysis_result_df = security_analysis_result_df.rename(columns=self.__analyzer_name_dict)
-        security_analysis_result_df = security_analysis_result_df.fillna('-')
-
-        security_analysis_result_html = data_frame_to_html(security_analysis_result_df)
-        with self.__lock:
-            self.__analysis_result_html[security] = security_analysis_result_html
-    
-        return security_analysis_result_html
+            offset, length = position
+            content = self.__data_map[offset:offset + length]
+        return zlib.decompress(content).decode('utf-8')
 
     def log(self, text: str):
         if self.__logger is not None:
             self.__logger(text)
-
-
-
-
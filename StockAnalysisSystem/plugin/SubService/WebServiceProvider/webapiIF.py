@@ -1,10 +1,13 @@
 import os
 import json
 import traceback
-from flask import request
+from flask import request, Response
 from StockAnalysisSystem.core.config import Config
 from StockAnalysisSystem.core.Utility.relative_import import RelativeImport
 from StockAnalysisSystem.core.Utility.JsonSerializer import serialize, deserialize
+from StockAnalysisSystem.core.Utility.BinarySerializer import \
+    serialize_binary, accept_binary, BINARY_CONTENT_TYPE, JSON_CONTENT_TYPE
+from StockAnalysisSystem.core.Utility.HttpCompression import accept_encoding, compress_content, decompress_content
 import StockAnalysisSystem.core.Utility.JsonSerializerImpl
 
 with RelativeImport(__file__):
@@ -17,11 +20,12 @@ class WebApiInterface:
     def __init__(self, provider: ServiceProvider):
         self.__provider: ServiceProvider = provider
 
-    def rest_interface_stub(self, req_args: dict) -> str:
+    def rest_interface_stub(self, req_args: dict, binary: bool = False) -> str or bytes:
         """
         Cooperate with RestInterface.rest_interface_proxy
         Check and dispatch the rest call to local interface
         :param req_args: The web request args
+        :param binary: If True, the response is serialized in binary format. Else JSON.
         :return: Web response
         """
         resp = ''
@@ -33,11 +37,45 @@ class WebApiInterface:
         print('==> ' + api)
         if self.check_request(api, token, args_json, kwargs_json):
             success, args, kwargs = self.parse_request(args_json, kwargs_json)
-            resp = self.dispatch_request(api, token, *args, **kwargs)
+            resp = self.dispatch_request(api, token, *args, binary=binary, **kwargs)
         print('<== ' + api)
 
         return resp
 
+    def rest_interface_batch_stub(self, req_args: dict, binary: bool = False) -> str or bytes:
+        """
+        Cooperate with RestInterface.rest_interface_batch
+        Dispatch the calls in order and response the results as a list in one response.
+        :param req_args: The web request args which includes token and calls: [{api, args, kwargs}]
+        :param binary: If True, the response is serialized in binary format. Else JSON.
+        :return: Web response
+        """
+        token = req_args.get('token', None)
+        calls = req_args.get('calls', None)
+        if not isinstance(calls, list):
+            return ''
+
+        print('==> batch (%d)' % len(calls))
+        results = []
+        for call in calls:
+            result = None
+            try:
+                api = call.get('api', None)
+                args_json = call.get('args', '')
+                kwargs_json = call.get('kwargs', '')
+                if self.check_request(api, token, args_json, kwargs_json):
+                    success, args, kwargs = self.parse_request(args_json, kwargs_json)
+                    result = self.invoke_request(api, token, *args, **kwargs)
+            except Exception as e:
+                print('Batch call error: ' + str(e))
+                print(traceback.format_exc())
+            finally:
+                pass
+            results.append(result)
+        print('<== batch (%d)' % len(calls))
+
+        return self.serialize_response(results, binary)
+
     def check_request(self, api: str, token: str, args_json: str, kwargs_json: str) -> bool:
         return isinstance(api, str) and api != '' and \
                isinstance(token, str) and token != '' and \
@@ -54,21 +92,27 @@ class WebApiInterface:
         finally:
             pass
 
-    def dispatch_request(self, api: str, token: str, *args, **kwargs) -> any:
+    def dispatch_request(self, api: str, token: str, *args, binary: bool = False, **kwargs) -> any:
         # if api == 'query':
         #     df = self.__provider.query(*args, **kwargs, token=token)
         #     return '' if df is None else self.serialize_response(df)
         # else:
+        resp = self.invoke_request(api, token, *args, **kwargs)
+        resp_serialized = self.serialize_response(resp, binary)
+        return resp_serialized
+
+    def invoke_request(self, api: str, token: str, *args, **kwargs) -> any:
         resp = self.__provider.interface_call(token, api, *args, **kwargs)
         if resp is None:
             resp = self.__provider.sys_call(token, api, *args, **kwargs)
-        resp_serialized = self.serialize_response(resp)
-        return resp_serialized
+        return resp
 
     @staticmethod
-    def serialize_response(resp) -> str:
+    def serialize_response(resp, binary: bool = False) -> str or bytes:
         try:
-            return serialize(resp) if resp is not None else ''
+            if resp is None:
+                return ''
+            return serialize_binary(resp) if binary else serialize(resp)
         except Exception as e:
             print('Serialize Response Fail: ' + str(e))
             print(traceback.format_exc())
@@ -85,12 +129,39 @@ service_provider: ServiceProvider = None
 
 # ----------------------------------------------------------------------------------------------------------------------
 
-def handle_request(flask_request: request) -> str:
-    req_data = flask_request.data
-    req_dict = json.loads(req_data)
+def handle_request(flask_request: request) -> Response:
+    req_dict = parse_request_data(flask_request)
+
+    # Response in binary format if client accepts it
+    binary = accept_binary(flask_request.headers.get('Accept', ''))
+
+    global webapi_interface
+    resp = webapi_interface.rest_interface_stub(req_dict, binary)
+    return build_response(flask_request, resp, binary)
+
+
+def handle_batch_request(flask_request: request) -> Response:
+    req_dict = parse_request_data(flask_request)
+    binary = accept_binary(flask_request.headers.get('Accept', ''))
 
     global webapi_interface
-    return webapi_interface.rest_interface_stub(req_dict)
+    resp = webapi_interface.rest_interface_batch_stub(req_dict, binary)
+    return build_response(flask_request, resp, binary)
+
+
+def parse_request_data(flask_request: request) -> dict:
+    req_data = decompress_content(flask_request.get_data(), flask_request.headers.get('Content-Encoding', ''))
+    return json.loads(req_data)
+
+
+def build_response(flask_request: request, resp: str or bytes, binary: bool) -> Response:
+    encoding = accept_encoding(flask_request.headers.get('Accept-Encoding', ''))
+    content, encoding = compress_content(resp, encoding)
+    response = Response(content, mimetype=BINARY_CONTENT_TYPE if binary else JSON_CONTENT_TYPE)
+    if encoding != '':
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -82,6 +82,14 @@ class UpdateService:
             print('> Check update for %s.' % uri)
             self.check_update_single(uri, properties, data_agent)
             print('< Check update for %s finished, time spending: %sms' % (uri, clock.elapsed_ms()))
+        self.materialize_factors()
+
+    def materialize_factors(self):
+        clock = Clock()
+        print('> Materialize finance factors.')
+        if not self.__nop:
+            self.__sub_service_context.sas_api.factor_materialize(progress=self.__progress)
+        print('< Materialize finance factors finished, time spending: %sms' % clock.elapsed_ms())
 
     def check_update_single(self, uri: str, properties: tuple, data_agent: DataAgent) -> bool:
         update_period, can_slice, only_trade_day = properties
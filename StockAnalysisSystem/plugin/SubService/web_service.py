@@ -102,6 +102,18 @@ def startup() -> bool:
             pass
         return response
 
+    @flaskApp.route('/api/batch', methods=['POST'])
+    def webapi_batch_entry():
+        try:
+            response = webapiIF.handle_batch_request(request)
+        except Exception as e:
+            print('/api/batch Error', e)
+            print(traceback.format_exc())
+            response = ''
+        finally:
+            pass
+        return response
+
     @flaskApp.route('/analysis', methods=['GET', 'POST'])
     def analysis_entry():
         print('-> Request /analysis')
@@ -143,5 +155,8 @@ def thread(context: dict):
         debug = config.get('service_debug', 'true')
         print('Start service: port = %s, debug = %s.' % (port, debug))
         # https://stackoverflow.com/a/9476701/12929244
+        # The werkzeug development server closes the connection after each response, even in HTTP/1.1.
+        #   For the keep-alive connection of RestInterface, serve flaskApp by a production WSGI server
+        #   (like waitress or gunicorn) instead.
         flaskApp.run(host='0.0.0.0', port=str(port), debug=(debug == 'true'), use_reloader=False)
 
@@ -5,7 +5,8 @@ from StockAnalysisSystem.interface.interface import SasInterface as sasIF
 class UiContext:
     def __init__(self):
         self.__sas_interface = None
-        self.__ui_task_queue = TaskQueue(logger=None)
+        # The progress updaters keep running. Multiple workers to avoid blocking the refresh tasks.
+        self.__ui_task_queue = TaskQueue(logger=None, worker_count=3)
         self.__ui_task_queue.start()
         # self.__res_sync = ResourceSync()
         # self.__res_sync.start()
@@ -155,7 +155,7 @@ DEFAULT_INFO = """数据更新界面说明：
 
 class RefreshTask(TaskQueue.Task):
     def __init__(self, ui):
-        super(RefreshTask, self).__init__('RefreshTask')
+        super(RefreshTask, self).__init__('RefreshTask', TaskQueue.Task.PRIORITY_INTERACTIVE)
         self.__ui = ui
 
     def run(self):
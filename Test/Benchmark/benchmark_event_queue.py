@@ -0,0 +1,222 @@
+import time
+import random
+import threading
+import traceback
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.Utility.event_queue import *
+from StockAnalysisSystem.core.Utility.task_queue import TaskQueue
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Benchmark the event delivery and task scheduling of the wait/notify queues against the previous sleep polling loops.
+#   Legacy: The consumer thread polls the queue and sleeps a fixed interval (0.1s) when idle.
+#   Current: The consumer thread blocks on condition variable and wakes up when event / task comes.
+# ----------------------------------------------------------------------------------------------------------------------
+
+LEGACY_SLEEP_INTERVAL = 0.1
+
+
+class CountHandler(EventHandler):
+    def __init__(self):
+        super(CountHandler, self).__init__()
+        self.count = 0
+        self.target = 0
+        self.done = threading.Event()
+
+    def identity(self) -> str:
+        return 'count'
+
+    def expect(self, count: int):
+        self.count = 0
+        self.target = count
+        self.done.clear()
+
+    def handle_event(self, event: Event, sync: bool):
+        self.count += 1
+        if self.count >= self.target:
+            self.done.set()
+
+
+class EventConsumer:
+    def __init__(self, legacy: bool):
+        self.legacy = legacy
+        self.queue = EventQueue()
+        self.handler = CountHandler()
+        self.queue.add_event_handler(self.handler)
+        self.wakeups = 0
+        self.quit = False
+        self.thread = threading.Thread(target=self.run)
+
+    def run(self):
+        while not self.quit:
+            self.wakeups += 1
+            if self.legacy:
+                self.queue.polling(1000)
+                time.sleep(LEGACY_SLEEP_INTERVAL)
+            elif self.queue.wait_event(None):
+                self.queue.polling(1000)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.quit = True
+        self.queue.wake()
+        self.thread.join()
+
+
+class LegacyTaskQueue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tasks = []
+        self.quit = False
+        self.wakeups = 0
+        self.thread = threading.Thread(target=self.run)
+
+    def append_task(self, task: TaskQueue.Task, unique: bool = True):
+        with self.lock:
+            self.tasks.append(task)
+
+    def run(self):
+        while not self.quit:
+            self.wakeups += 1
+            with self.lock:
+                task = self.tasks.pop(0) if len(self.tasks) > 0 else None
+            if task is not None:
+                task.run()
+            else:
+                time.sleep(LEGACY_SLEEP_INTERVAL)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.quit = True
+        self.thread.join()
+
+
+class SignalTask(TaskQueue.Task):
+    def __init__(self, index: int, done: threading.Event, last: bool):
+        super(SignalTask, self).__init__('SignalTask')
+        self.__index = index
+        self.__done = done
+        self.__last = last
+
+    def run(self):
+        if self.__last:
+            self.__done.set()
+
+    def identity(self) -> str:
+        return 'signal_task_%d' % self.__index
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def measure_event_latency(consumer: EventConsumer, count: int) -> [float]:
+    latency = []
+    for i in range(count):
+        time.sleep(random.uniform(0.005, 0.02))
+        consumer.handler.expect(1)
+        clock = time.perf_counter()
+        consumer.queue.post_event(Event(Event.EVENT_BROADCAST, None))
+        consumer.handler.done.wait()
+        latency.append(time.perf_counter() - clock)
+    return latency
+
+
+def measure_event_throughput(consumer: EventConsumer, count: int) -> float:
+    consumer.handler.expect(count)
+    clock = time.perf_counter()
+    for i in range(count):
+        # The queue keeps at most 1000 events. Wait for consumer if it's full.
+        while consumer.handler.count + 900 < i:
+            time.sleep(0)
+        consumer.queue.post_event(Event(Event.EVENT_BROADCAST, None))
+    consumer.handler.done.wait()
+    return count / (time.perf_counter() - clock)
+
+
+def measure_idle_wakeups(counter, duration: float) -> float:
+    start = counter()
+    time.sleep(duration)
+    return (counter() - start) / duration
+
+
+def benchmark_event_queue(legacy: bool) -> dict:
+    consumer = EventConsumer(legacy)
+    consumer.start()
+    try:
+        latency = sorted(measure_event_latency(consumer, 30))
+        throughput = measure_event_throughput(consumer, 20000)
+        wakeups = measure_idle_wakeups(lambda: consumer.wakeups, 1.0)
+    finally:
+        consumer.stop()
+    return {
+        'latency_median_ms': latency[len(latency) // 2] * 1000,
+        'latency_max_ms': latency[-1] * 1000,
+        'throughput_per_s': throughput,
+        'idle_wakeups_per_s': wakeups,
+    }
+
+
+def benchmark_task_queue(legacy: bool) -> dict:
+    task_queue = LegacyTaskQueue() if legacy else TaskQueue(logger=None)
+    task_queue.start()
+    try:
+        latency = []
+        for i in range(30):
+            time.sleep(random.uniform(0.005, 0.02))
+            done = threading.Event()
+            clock = time.perf_counter()
+            task_queue.append_task(SignalTask(i, done, True), False)
+            done.wait()
+            latency.append(time.perf_counter() - clock)
+        latency.sort()
+
+        count = 2000
+        done = threading.Event()
+        clock = time.perf_counter()
+        for i in range(count):
+            task_queue.append_task(SignalTask(1000 + i, done, i == count - 1), False)
+        done.wait()
+        throughput = count / (time.perf_counter() - clock)
+    finally:
+        if legacy:
+            task_queue.stop()
+        else:
+            task_queue.quit()
+            task_queue.join(5)
+    return {
+        'latency_median_ms': latency[len(latency) // 2] * 1000,
+        'latency_max_ms': latency[-1] * 1000,
+        'throughput_per_s': throughput,
+    }
+
+
+def print_result(title: str, legacy: dict, current: dict):
+    print('-' * 70)
+    print(title)
+    print('%-24s %20s %20s' % ('', 'legacy (sleep)', 'current (notify)'))
+    for key in legacy.keys():
+        print('%-24s %20.3f %20.3f' % (key, legacy[key], current[key]))
+
+
+def main():
+    print_result('EventQueue', benchmark_event_queue(True), benchmark_event_queue(False))
+    print_result('TaskQueue', benchmark_task_queue(True), benchmark_task_queue(False))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
@@ -22,6 +22,401 @@ def test_analyzer_prob():
     print(probs)
 
 
+def test_merge_shard_results():
+    def __results(method: str, securities: [str]) -> [AnalysisResult]:
+        results = [AnalysisResult(s, None, 0) for s in securities]
+        for r in results:
+            r.method = method
+        return results
+
+    shard_results = [
+        __results('m1', ['000001', '000002']) + __results('m2', ['000001', '000002']),
+        __results('m1', ['000003']) + __results('m2', ['000003']),
+        __results('m1', ['000004']) + __results('m2', ['000004']),
+    ]
+    merged = StrategyEntry.merge_shard_results(shard_results)
+    assert [(r.method, r.securities) for r in merged] == \
+        [('m1', '000001'), ('m1', '000002'), ('m1', '000003'), ('m1', '000004'),
+         ('m2', '000001'), ('m2', '000002'), ('m2', '000003'), ('m2', '000004')]
+
+
+def test_batch_result_frame_to_list():
+    df = pd.DataFrame({
+        'stock_identity': ['000002', '000001', '000001'],
+        'period': [pd.NaT, pd.Timestamp('2019-12-31'), pd.Timestamp('2018-12-31')],
+    })
+    score = pd.Series([None, 100, 0], dtype=object)
+    reason = batch_join_text([pd.Series(['', 'a', '']), pd.Series(['', 'b', 'c'])], '\n')
+    brief = batch_join_text([pd.Series(['', '', 'x'])], '; ', '正常')
+    assert reason.tolist() == ['', 'a\nb', 'c']
+    assert brief.tolist() == ['正常', '正常', 'x']
+
+    results = analysis_result_frame_to_list(batch_result_frame(df, score, reason, brief),
+                                            ['000001', '000002'], 'm1')
+    assert [(r.securities, r.score) for r in results] == [('000001', 100), ('000001', 0), ('000002', None)]
+    assert results[0].period == datetime.datetime(2019, 12, 31) and results[2].period is None
+    assert all(r.method == 'm1' for r in results)
+
+
+def test_analysis_prefetch():
+    class FakeDataCenter:
+        def __init__(self):
+            self.query_count = 0
+
+        def check_readable_name(self, readable: [str]) -> bool:
+            return True
+
+        def query(self, uri: str, identity: [str] = None, time_serial: tuple = None, **extra) -> pd.DataFrame:
+            self.query_count += 1
+            return pd.DataFrame({
+                'stock_identity': ['000001', '000002', '000001'],
+                'period': [datetime.datetime(2019, 12, 31), datetime.datetime(2019, 12, 31),
+                           datetime.datetime(2018, 12, 31)],
+                'a': [1.0, 2.0, 3.0],
+                'b': [4.0, 5.0, 6.0],
+            })
+
+    class FakeDataHub:
+        def __init__(self):
+            self.data_center = FakeDataCenter()
+
+        def get_data_center(self):
+            return self.data_center
+
+    data_hub = FakeDataHub()
+    time_serial = (datetime.datetime(2010, 1, 1), datetime.datetime(2020, 1, 1))
+    prefetch = AnalysisPrefetch(data_hub, ['000001', '000002'], time_serial)
+    prefetch.declare_all({'Finance.BalanceSheet': ['a']})
+    prefetch.declare('Finance.BalanceSheet', ['b'])
+
+    assert prefetch.covers('Finance.BalanceSheet', '000001', time_serial, ['a', 'b', 'period'])
+    assert not prefetch.covers('Finance.BalanceSheet', '000001', time_serial, ['c'])
+    assert not prefetch.covers('Finance.BalanceSheet', '000003', time_serial, ['a'])
+    assert not prefetch.covers('Finance.IncomeStatement', '000001', time_serial, ['a'])
+
+    context = AnalysisContext()
+    context.prefetch = prefetch
+    df = query_readable_data(data_hub, 'Finance.BalanceSheet', '000001', time_serial, ['a', 'period'], context)
+    assert df['a'].tolist() == [1.0, 3.0] and list(df.columns) == ['a', 'period']
+    df['a'] = 0.0
+    df = query_readable_data(data_hub, 'Finance.BalanceSheet', '000002', time_serial, ['a', 'b'], context)
+    assert df['a'].tolist() == [2.0] and df['b'].tolist() == [5.0]
+    assert prefetch.frame('Finance.BalanceSheet')['a'].tolist() == [1.0, 2.0, 3.0]
+    assert data_hub.get_data_center().query_count == 1
+
+    prefetch.release()
+    assert prefetch.memory_usage() == 0
+
+
+def __stamp_result(update_table, analyzer: str, security: str, window: str, calc_time: datetime.datetime):
+    tags = ['Result', 'Analyzer', analyzer, security.replace('.', '_')]
+    update_table.update_latest_update_time(tags, calc_time)
+    update_table.update_latest_update_time(tags + [window], calc_time)
+
+
+def test_stale_securities():
+    class FakeUpdateTable:
+        def __init__(self):
+            self.records = {}
+
+        def get_last_update_time(self, tags: [str]):
+            return self.records.get('.'.join(tags), None)
+
+        def update_latest_update_time(self, tags: [str], update_time: datetime.datetime = None) -> bool:
+            self.records['.'.join(tags)] = update_time
+            return True
+
+    class FakeDataCenter:
+        def __init__(self):
+            self.update_table = FakeUpdateTable()
+
+        def get_update_table(self):
+            return self.update_table
+
+    class FakeDataHub:
+        def __init__(self):
+            self.data_center = FakeDataCenter()
+
+        def get_data_center(self):
+            return self.data_center
+
+    root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+    plugin_mgr = PluginManager(path.join(root_path, 'StockAnalysisSystem', 'plugin', 'Analyzer'))
+    plugin_mgr.refresh()
+    data_hub = FakeDataHub()
+    se = StrategyEntry(plugin_mgr, data_hub, None)
+
+    analyzer = '2c05bb4c-935e-4be7-9c04-ae12720cd757'
+    dependencies = se.analyzer_dependencies(analyzer)
+    assert sorted(dependencies) == ['Finance.BalanceSheet', 'Finance.IncomeStatement']
+    assert se.analyzer_dependencies('not-exists-analyzer') == []
+
+    update_table = data_hub.get_data_center().get_update_table()
+    calc_time = datetime.datetime(2020, 6, 1)
+    time_serial = (datetime.datetime(2010, 1, 1), datetime.datetime(2020, 1, 1))
+    for s in ['000001.SZSE', '000002.SZSE', '000003.SZSE']:
+        __stamp_result(update_table, analyzer, s, 'W20100101_20200101', calc_time)
+
+    # Per security update time
+    update_table.update_latest_update_time(['Finance', 'BalanceSheet', '000001_SZSE'],
+                                           datetime.datetime(2020, 5, 1))
+    update_table.update_latest_update_time(['Finance', 'IncomeStatement', '000002_SZSE'],
+                                           datetime.datetime(2020, 7, 1))
+    # Uri update time is used if the security update time is absent
+    update_table.update_latest_update_time(['Finance', 'BalanceSheet'], datetime.datetime(2020, 5, 1))
+
+    securities = ['000004.SZSE', '000003.SZSE', '000002.SZSE', '000001.SZSE']
+    assert se.stale_securities(analyzer, dependencies, securities, time_serial) == ['000004.SZSE', '000002.SZSE']
+
+    # The result that calculated with another window is stale
+    assert se.stale_securities(analyzer, dependencies, securities,
+                               (datetime.datetime(2005, 1, 1), datetime.datetime(2020, 1, 1))) == securities
+    # The cached result is replaced by the calculation of another window
+    __stamp_result(update_table, analyzer, '000003.SZSE', 'W20050101_20200101', datetime.datetime(2020, 6, 2))
+    assert se.stale_securities(analyzer, dependencies, securities, time_serial) == \
+           ['000004.SZSE', '000003.SZSE', '000002.SZSE']
+    assert se.stale_securities(analyzer, dependencies, securities,
+                               (datetime.datetime(2005, 1, 1), datetime.datetime(2020, 1, 1))) == \
+           ['000004.SZSE', '000002.SZSE', '000001.SZSE']
+
+    # The until that reaches today is open-ended
+    __stamp_result(update_table, analyzer, '000001.SZSE', 'W20100101_now', datetime.datetime(2020, 6, 3))
+    assert '000001.SZSE' not in se.stale_securities(analyzer, dependencies, securities,
+                                                    (datetime.datetime(2010, 1, 1), now()))
+    assert '000001.SZSE' not in se.stale_securities(analyzer, dependencies, securities,
+                                                    (datetime.datetime(2010, 1, 1), None))
+
+    update_table.update_latest_update_time(['Finance', 'BalanceSheet'], datetime.datetime(2020, 8, 1))
+    assert se.stale_securities(analyzer, dependencies, securities, time_serial) == \
+           ['000004.SZSE', '000003.SZSE', '000002.SZSE', '000001.SZSE']
+
+
+def test_stockholder_batch_analysis():
+    from StockAnalysisSystem.plugin.Analyzer import stockholder_analysis
+
+    def __holders(ratio: float) -> list:
+        return [{'holder_name': 'holder%d' % i, 'hold_ratio': ratio / (i + 1)} for i in range(10)]
+
+    tables = {
+        'Stockholder.PledgeStatus': pd.DataFrame({
+            'stock_identity': ['000001', '000001', '000002'],
+            'due_date': [days_ago(100), days_ago(10), days_ago(10)],
+            '质押次数': [1, 2, 1], '无限售股质押数量': [0, 0, 0], '限售股份质押数量': [0, 0, 0],
+            '总股本': [100, 100, 100], '质押比例': [10.0, 30.0, 60.0],
+        }),
+        'Stockholder.Statistics': pd.DataFrame({
+            'stock_identity': ['000001', '000002', '000002'],
+            'period': [datetime.datetime(2019, 12, 31), datetime.datetime(2019, 12, 31),
+                       datetime.datetime(2019, 6, 30)],
+            'stockholder_top10': [__holders(0.3), __holders(0.05), __holders(0.5)],
+        }),
+        'Stockholder.StockUnlock': pd.DataFrame({
+            'stock_identity': ['000001', '000001', '000002'],
+            'unlock_date': [days_after(10), days_after(10), days_ago(300)],
+            'float_share': [100, 200, 300],
+            'float_ratio': [1.0, 2.0, 3.0],
+        }),
+        # The high_limit of 000002 is missing, which is the same as querying it alone
+        'Stockholder.Repurchase': pd.DataFrame({
+            'stock_identity': ['000001', '000002', '000002'],
+            'proc': ['股东大会通过', '股东大会通过', '实施'],
+            'ann_date': [days_ago(10), days_ago(20), days_ago(30)],
+            'end_date': [days_after(100), None, None],
+            'vol': [1000.0, None, None],
+            'low_limit': [10.0, 20.0, None],
+            'high_limit': [12.0, None, None],
+        }),
+        'Stockholder.ReductionIncrease': pd.DataFrame({
+            'stock_identity': ['000001', '000002', '000002'],
+            'stock_holder': ['a', 'b', 'c'],
+            'holder_type': ['G', 'P', 'C'],
+            'in_de': ['IN', 'DE', 'IN'],
+            'change_vol': [100, 300, 100],
+            'change_ratio': [0.1, 0.3, 0.1],
+            'avg_price': [1.0, None, None],
+            'begin_date': [days_ago(10), days_ago(20), days_ago(400)],
+            'close_date': [days_ago(5), days_ago(15), days_ago(380)],
+        }),
+    }
+
+    class FakeDataCenter:
+        def __init__(self):
+            self.query_count = 0
+
+        def check_readable_name(self, readable: [str]) -> bool:
+            return True
+
+        def query(self, uri: str, identity: str or [str] = None, time_serial: tuple = None, **extra) -> pd.DataFrame:
+            self.query_count += 1
+            identities = [identity] if isinstance(identity, str) else identity
+            df = tables[uri]
+            df = df[df['stock_identity'].isin(identities)]
+            # Querying one securities does not get the field that it does not have
+            return df.dropna(axis=1, how='all').reset_index(drop=True) if isinstance(identity, str) else \
+                df.reset_index(drop=True)
+
+    class FakeDataHub:
+        def __init__(self):
+            self.data_center = FakeDataCenter()
+
+        def get_data_center(self):
+            return self.data_center
+
+    methods = [method[0] for method in stockholder_analysis.METHOD_LIST]
+    securities = ['000003', '000002', '000001']
+    time_serial = (years_ago(5), now())
+
+    data_hub = FakeDataHub()
+    per_securities = stockholder_analysis.analysis(methods, securities, time_serial, data_hub, None,
+                                                   batch_analysis=False)
+    assert data_hub.get_data_center().query_count == len(methods) * len(securities)
+
+    data_hub = FakeDataHub()
+    batch = stockholder_analysis.analysis(methods, securities, time_serial, data_hub, None)
+    assert data_hub.get_data_center().query_count == len(methods)
+
+    assert [(r.method, r.securities, r.period, r.score, r.reason, r.brief, r.weight) for r in batch] == \
+           [(r.method, r.securities, r.period, r.score, r.reason, r.brief, r.weight) for r in per_securities]
+    assert len(batch) == len(methods) * len(securities)
+
+
+def test_annual_report_pattern_partial():
+    class FakeDataCenter:
+        def check_readable_name(self, readable: [str]) -> bool:
+            return True
+
+        def query(self, uri: str, identity: str = None, time_serial: tuple = None, **extra) -> pd.DataFrame:
+            if uri == 'Finance.CashFlowStatement':
+                return pd.DataFrame()
+            field = 'asset' if uri == 'Finance.BalanceSheet' else 'income'
+            return pd.DataFrame({
+                'stock_identity': [identity, identity],
+                'period': [datetime.datetime(2018, 12, 31), datetime.datetime(2019, 12, 31)],
+                field: [1.0, 2.0],
+            })
+
+    class FakeDataHub:
+        def __init__(self):
+            self.data_center = FakeDataCenter()
+
+        def get_data_center(self):
+            return self.data_center
+
+    time_serial = (datetime.datetime(2010, 1, 1), datetime.datetime(2020, 1, 1))
+    df, result = batch_query_readable_annual_report_pattern(
+        FakeDataHub(), '000001', time_serial, ['asset'], ['income'], ['cash'])
+    assert df is not None and df['income'].tolist() == [2.0, 1.0] and df['asset'].tolist() == [2.0, 1.0]
+    assert result is not None and result.score == AnalysisResult.SCORE_NOT_APPLIED
+
+    df, result = batch_query_readable_annual_report_pattern(
+        FakeDataHub(), '000001', time_serial, ['asset'], ['income'])
+    assert result is None and df['period'].is_monotonic_increasing and set(df.columns) >= {'asset', 'income'}
+
+
+def test_incremental_prefetch():
+    import tempfile
+
+    portrait = '3ee3a4ff-a2cf-4244-8f45-c319016ee16b'
+    cash_loan = '2c05bb4c-935e-4be7-9c04-ae12720cd757'
+    securities = ['000001.SZSE', '000002.SZSE', '000003.SZSE']
+    periods = [datetime.datetime(2019, 12, 31), datetime.datetime(2018, 12, 31)]
+
+    class FakeUpdateTable:
+        def __init__(self):
+            self.records = {}
+
+        def get_last_update_time(self, tags: [str]):
+            return self.records.get('.'.join(tags), None)
+
+        def update_latest_update_time(self, tags: [str], update_time: datetime.datetime = None) -> bool:
+            self.records['.'.join(tags)] = update_time
+            return True
+
+        def flush(self) -> bool:
+            return True
+
+    class FakeDataCenter:
+        def __init__(self):
+            self.update_table = FakeUpdateTable()
+            self.queries = []
+
+        def get_update_table(self):
+            return self.update_table
+
+        def check_readable_name(self, readable: [str]) -> bool:
+            return True
+
+        def query(self, uri: str, identity: str or [str] = None, time_serial: tuple = None, **extra) -> pd.DataFrame:
+            self.queries.append((uri, identity))
+            if uri == 'Result.Analyzer':
+                # The cached results of all securities
+                return pd.DataFrame([{'period': periods[0], 'analyzer': analyzer, 'stock_identity': s,
+                                      'score': 50, 'reason': 'cached', 'weight': 1}
+                                     for analyzer in extra.get('analyzer') for s in identity])
+            if uri == 'Market.SecuritiesInfo':
+                return pd.DataFrame({'stock_identity': securities, 'industry': ['银行', '', '']})
+            identities = [identity] if isinstance(identity, str) else identity
+            fields = [f for f in extra.get('fields', []) if f not in ['stock_identity', 'period']]
+            df = pd.DataFrame({
+                'stock_identity': [s for s in identities for _ in periods],
+                'period': periods * len(identities),
+            })
+            for field in fields:
+                df[field] = 100.0 if field == '资产总计' else 10.0
+            return df
+
+        def delete_local_data(self, uri: str, identity: [str] = None, **extra):
+            pass
+
+        def merge_local_data(self, uri: str, identity: str, data):
+            pass
+
+    class FakeDataHub:
+        def __init__(self):
+            self.data_center = FakeDataCenter()
+
+        def get_data_center(self):
+            return self.data_center
+
+    root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+    plugin_mgr = PluginManager(path.join(root_path, 'StockAnalysisSystem', 'plugin', 'Analyzer'))
+    plugin_mgr.refresh()
+    data_hub = FakeDataHub()
+    se = StrategyEntry(plugin_mgr, data_hub, None)
+    assert 'Market.SecuritiesInfo' in se.analyzer_dependencies(portrait)
+
+    update_table = data_hub.get_data_center().get_update_table()
+    for analyzer in [portrait, cash_loan]:
+        for s in securities:
+            __stamp_result(update_table, analyzer, s, 'W20100101_20200101', datetime.datetime(2020, 6, 1))
+    # 000002 is stale for both analyzers, the industry of 000001 changed so it's stale for portrait
+    update_table.update_latest_update_time(['Finance', 'BalanceSheet', '000002_SZSE'], datetime.datetime(2020, 7, 1))
+    update_table.update_latest_update_time(['Market', 'SecuritiesInfo', '000001_SZSE'], datetime.datetime(2020, 7, 1))
+
+    time_serial = (datetime.datetime(2010, 1, 1), datetime.datetime(2020, 1, 1))
+    with tempfile.TemporaryDirectory() as dump_path:
+        result = se.analysis_advance(securities, [portrait, cash_loan], time_serial, ProgressRate(),
+                                     dump_path=dump_path)
+
+    # The data of the stale securities of all incremental analyzers is queried once
+    queries = [(uri, identity) for uri, identity in data_hub.get_data_center().queries if uri != 'Result.Analyzer']
+    assert sorted(uri for uri, _ in queries) == ['Finance.BalanceSheet', 'Finance.CashFlowStatement',
+                                                  'Finance.IncomeStatement', 'Market.SecuritiesInfo']
+    assert all(identity == ['000001.SZSE', '000002.SZSE'] for uri, identity in queries
+               if uri.startswith('Finance.'))
+
+    reasons = {(r.method, r.securities): r.reason for r in result}
+    assert reasons[(portrait, '000001.SZSE')] == '不适用于此行业'
+    assert reasons[(portrait, '000003.SZSE')] == 'cached' and reasons[(cash_loan, '000001.SZSE')] == 'cached'
+    assert reasons[(portrait, '000002.SZSE')] != 'cached' and reasons[(cash_loan, '000002.SZSE')] != 'cached'
+
+    # The recalculated securities are stamped with the window
+    calc_time = update_table.get_last_update_time(['Result', 'Analyzer', cash_loan, '000002_SZSE'])
+    assert calc_time > datetime.datetime(2020, 7, 1)
+    assert update_table.get_last_update_time(
+        ['Result', 'Analyzer', cash_loan, '000002_SZSE', 'W20100101_20200101']) == calc_time
+
+
 # The result format is different
 # def test_score():
 #     se = __prepare_instance()
@@ -58,6 +453,13 @@ def test_analyzer_prob():
 
 def test_entry():
     test_analyzer_prob()
+    test_merge_shard_results()
+    test_batch_result_frame_to_list()
+    test_stockholder_batch_analysis()
+    test_analysis_prefetch()
+    test_stale_securities()
+    test_annual_report_pattern_partial()
+    test_incremental_prefetch()
     # test_score()
     # test_inclusive()
     # test_exclusive()
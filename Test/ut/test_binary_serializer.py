@@ -0,0 +1,103 @@
+import datetime
+import traceback
+import numpy as np
+import pandas as pd
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.Utility.JsonSerializer import serialize, deserialize
+import StockAnalysisSystem.core.Utility.JsonSerializerImpl
+from StockAnalysisSystem.core.Utility.BinarySerializer import *
+from StockAnalysisSystem.interface.interface_rest import RestInterface
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def __build_frame(count: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'stock_identity': ['%06d.SZSE' % (i % 100) for i in range(count)],
+        'trade_date': pd.Timestamp('2010-01-01') + pd.to_timedelta(rng.integers(0, 3650, count), 'D'),
+        'close': rng.random(count),
+        'amount': rng.integers(0, 10000, count),
+    }, index=range(100, 100 + count))
+
+
+def test_binary_round_trip():
+    df = __build_frame(1000)
+    data = {
+        'frame': df,
+        'list': [df.head(5), None, 1, 'text'],
+        'time': datetime.datetime(2020, 1, 2, 3, 4, 5),
+        'object_frame': pd.DataFrame({'x': [{'k': 1}, 2]}),
+    }
+    serialized = serialize_binary(data)
+    assert is_binary(serialized)
+    result = deserialize_binary(serialized)
+
+    # Same as JSON serializer, the index is not kept
+    expect = df.reset_index(drop=True)
+    assert result['frame'].equals(expect)
+    assert result['frame'].dtypes.to_dict() == expect.dtypes.to_dict()
+    assert result['list'][0].equals(expect.head(5))
+    assert result['list'][1:] == [None, 1, 'text']
+    assert result['time'] == data['time']
+    # Fallback to JSON records
+    assert result['object_frame']['x'].tolist() == [{'k': 1}, 2]
+
+    assert deserialize_binary(serialize_binary(None)) is None
+    assert deserialize_binary(serialize_binary(pd.DataFrame())).empty
+
+
+def test_rest_response():
+    df = __build_frame(10000)
+    binary = serialize_binary(df)
+    text = serialize(df)
+    assert len(binary) * 2 < len(text.encode('utf-8'))
+
+    assert RestInterface.deserialize_response(binary).equals(df.reset_index(drop=True))
+    assert RestInterface.deserialize_response(text.encode('utf-8'))['close'].tolist() == df['close'].tolist()
+    assert RestInterface.deserialize_response(text)['close'].tolist() == df['close'].tolist()
+
+    assert accept_binary(BINARY_CONTENT_TYPE + ', ' + JSON_CONTENT_TYPE)
+    assert not accept_binary(JSON_CONTENT_TYPE)
+    assert not accept_binary(None)
+
+
+def test_entry():
+    test_binary_round_trip()
+    test_rest_response()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
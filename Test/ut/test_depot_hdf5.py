@@ -0,0 +1,160 @@
+import shutil
+import datetime
+import tempfile
+import traceback
+import pandas as pd
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.UniversalDataDepot.DepotHDF5 import DepotHDF5
+from StockAnalysisSystem.core.UniversalDataDepot.DepotTestCommon import basic_rw_test, basic_interface_test
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def test_basic_rw():
+    depot_path = tempfile.mkdtemp()
+    try:
+        # Threshold 1: Compact on each upsert. Threshold 100: Never compact.
+        for compact_threshold in [1, 100]:
+            depot = DepotHDF5(['pk1', 'pk2'], path.join(depot_path, 'test_%d.h5' % compact_threshold),
+                              compact_threshold=compact_threshold)
+            basic_rw_test(depot)
+            basic_interface_test(depot)
+
+            assert depot.record_count() == 20
+            assert depot.range_of('pk2') == (0, 109)
+            assert depot.range_of('pk2', conditions={'pk1': 'F'}) == (5, 100)
+            assert len(depot.query(conditions={'pk1': ['F', 'G'], 'pk2': (0, 99)})) == 2
+            assert list(depot.query('J', fields=['field3']).columns) == ['field3']
+            depot.drop()
+    finally:
+        shutil.rmtree(depot_path)
+
+
+def test_multiple_keys():
+    depot_path = tempfile.mkdtemp()
+    try:
+        depot = DepotHDF5(['stock_identity', 'trade_date', 'exchange'], path.join(depot_path, 'test.h5'))
+        for stock in ['000001.SZSE', '600000.SSE']:
+            depot.upsert(pd.DataFrame({
+                'stock_identity': [stock] * 400,
+                'trade_date': pd.date_range('2019-06-01', periods=400),
+                'exchange': stock.split('.')[1],
+                'close': [float(i) for i in range(400)],
+            }))
+        # Partial update should not overwrite the exists fields
+        depot.upsert(pd.DataFrame({
+            'stock_identity': ['000001.SZSE'], 'trade_date': [datetime.datetime(2019, 6, 1)],
+            'exchange': ['SZSE'], 'volume': [100.0],
+        }))
+        assert depot.compact()
+        assert depot.record_count() == 800
+
+        df = depot.query('000001.SZSE', (datetime.datetime(2020, 3, 1), datetime.datetime(2020, 3, 10)))
+        assert len(df) == 10
+        assert df['trade_date'].iloc[0] == datetime.datetime(2020, 3, 1)
+
+        df = depot.query('000001.SZSE', datetime.datetime(2019, 6, 1))
+        assert df['close'].iloc[0] == 0.0 and df['volume'].iloc[0] == 100.0
+
+        assert depot.delete(conditions={'trade_date': (datetime.datetime(2020, 3, 1), None)})
+        assert depot.range_of('trade_date')[1] == datetime.datetime(2020, 2, 29)
+        depot.drop()
+    finally:
+        shutil.rmtree(depot_path)
+
+
+def test_delta_merge_non_key_field():
+    depot_path = tempfile.mkdtemp()
+    try:
+        depot = DepotHDF5(['stock_identity', 'trade_date'], path.join(depot_path, 'test.h5'))
+        depot.upsert(pd.DataFrame({
+            'stock_identity': ['000001.SZSE', '000001.SZSE', '600000.SSE'],
+            'trade_date': pd.date_range('2020-01-01', periods=3),
+            'close': [1.0, 2.0, 3.0],
+            'volume': [10.0, 20.0, 30.0],
+            'name': ['A', 'A', 'B'],
+        }))
+        assert depot.compact()
+
+        # The delta only changes a non-key field. The query by that field should get the full record.
+        depot.upsert(pd.DataFrame({
+            'stock_identity': ['000001.SZSE'], 'trade_date': [datetime.datetime(2020, 1, 2)], 'close': [9.0],
+        }))
+        for compact in [False, True]:
+            if compact:
+                assert depot.compact()
+            df = depot.query(conditions={'close': 9.0})
+            assert len(df) == 1
+            assert df['volume'].iloc[0] == 20.0 and df['name'].iloc[0] == 'A'
+            df = depot.query('000001.SZSE', conditions={'close': (5.0, None)}, fields=['close', 'name'])
+            assert list(df.columns) == ['close', 'name'] and df['name'].tolist() == ['A']
+            # The record that changed no longer matches the old value
+            assert depot.query(conditions={'close': 2.0}).empty
+            assert depot.record_count() == 3
+    finally:
+        shutil.rmtree(depot_path)
+
+
+def test_object_column_kind():
+    depot_path = tempfile.mkdtemp()
+    try:
+        depot = DepotHDF5(['pk'], path.join(depot_path, 'test.h5'))
+        # The object column of numbers and None is stored as number
+        depot.upsert(pd.DataFrame({'pk': ['A', 'B'], 'v': pd.Series([1.5, None], dtype=object),
+                                   'name': pd.Series([None, None], dtype=object)}))
+        depot.upsert(pd.DataFrame({'pk': ['C'], 'v': [2.5], 'name': ['c']}))
+        # The all None column keeps the kind of exists data
+        depot.upsert(pd.DataFrame({'pk': ['D'], 'v': pd.Series([None], dtype=object), 'name': [None]}))
+        for compact in [False, True]:
+            if compact:
+                assert depot.compact()
+            df = depot.query()
+            assert df['v'].dtype.kind == 'f'
+            assert df['v'].tolist()[0] == 1.5 and df['v'].tolist()[2] == 2.5
+            assert df['v'].isna().tolist() == [False, True, False, True]
+            assert df['name'].isna().tolist() == [True, True, False, True] and df['name'].iloc[2] == 'c'
+    finally:
+        shutil.rmtree(depot_path)
+
+
+def test_entry():
+    test_basic_rw()
+    test_multiple_keys()
+    test_delta_merge_non_key_field()
+    test_object_column_kind()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
@@ -0,0 +1,297 @@
+import datetime
+import threading
+import traceback
+import pandas as pd
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from StockAnalysisSystem.core.UniversalDataDepot.DepotMongoDB import DepotMongoDB
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                   Fake Collection
+# ----------------------------------------------------------------------------------------------------------------------
+
+class FakeCursor:
+    def __init__(self, documents: [dict]):
+        self.__iter = iter(documents)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.__iter)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCollection:
+    """
+    Records the write calls instead of writing to mongodb. The exists documents are only used for find.
+    """
+
+    def __init__(self, documents: [dict] = None):
+        self.documents = list(documents) if documents is not None else []
+        self.calls = []
+        # The write errors of the next insert_many, [(index, code)]
+        self.insert_errors = []
+        self.__lock = threading.Lock()
+
+    def create_index(self, index, unique: bool = False):
+        pass
+
+    def find_one(self, spec: dict, projection: dict = None):
+        with self.__lock:
+            self.calls.append(('find_one', spec))
+        return next((document for document in self.documents if self.__match(document, spec)), None)
+
+    def find(self, spec: dict, projection: dict = None, batch_size: int = 0):
+        documents = [document for document in self.documents if self.__match(document, spec)]
+        if projection is not None:
+            documents = [{k: v for k, v in document.items() if k in projection or k == '_id'}
+                         for document in documents]
+        return FakeCursor(documents)
+
+    def insert_many(self, documents: [dict], ordered: bool = True):
+        with self.__lock:
+            self.calls.append(('insert_many', [dict(document) for document in documents], ordered))
+            for i, document in enumerate(documents):
+                document['_id'] = i
+            errors, self.insert_errors = self.insert_errors, []
+        if len(errors) > 0:
+            raise BulkWriteError({'writeErrors': [{'index': index, 'code': code, 'errmsg': 'error'}
+                                                  for index, code in errors]})
+
+    def bulk_write(self, operations: list, ordered: bool = True):
+        with self.__lock:
+            self.calls.append(('bulk_write', list(operations), ordered))
+
+    def write_calls(self) -> list:
+        return [call for call in self.calls if call[0] in ('insert_many', 'bulk_write')]
+
+    @staticmethod
+    def __match(document: dict, spec: dict) -> bool:
+        for k, cond in spec.items():
+            if k not in document:
+                return False
+            v = document[k]
+            if '$gte' in cond and not v >= cond['$gte']:
+                return False
+            if '$lte' in cond and not v <= cond['$lte']:
+                return False
+            if '$in' in cond and v not in cond['$in']:
+                return False
+            if '$eq' in cond and v != cond['$eq']:
+                return False
+        return True
+
+
+class FakeDatabase:
+    def __init__(self, collection: FakeCollection):
+        self.__collection = collection
+
+    def list_collection_names(self) -> [str]:
+        return ['TestTable']
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self.__collection
+
+
+class FakeClient:
+    def __init__(self, collection: FakeCollection):
+        self.__database = FakeDatabase(collection)
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        return self.__database
+
+
+def build_depot(documents: [dict] = None, batch_size: int = 1000, writer_threads: int = 1) -> \
+        (DepotMongoDB, FakeCollection):
+    collection = FakeCollection(documents)
+    depot = DepotMongoDB(['pk1', 'pk2'], FakeClient(collection), 'TestDB', 'TestTable',
+                         batch_size=batch_size, writer_threads=writer_threads)
+    return depot, collection
+
+
+def build_patch(pk1: [str], pk2: [int]) -> pd.DataFrame:
+    return pd.DataFrame({'pk1': pk1, 'pk2': pk2, 'value': [float(v) for v in pk2]})
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                     Write Path
+# ----------------------------------------------------------------------------------------------------------------------
+
+def test_upsert_empty_range():
+    # No exists record in the key range: upsert is written as insert
+    depot, collection = build_depot([{'pk1': 'Z', 'pk2': 5, 'value': 1.0}])
+    assert depot.upsert(build_patch(['A', 'B'], [1, 2]))
+    assert [call[0] for call in collection.write_calls()] == ['insert_many']
+    assert collection.write_calls()[0][1] == [{'pk1': 'A', 'pk2': 1, 'value': 1.0},
+                                              {'pk1': 'B', 'pk2': 2, 'value': 2.0}]
+
+    # Exists record in the key range: upsert
+    depot, collection = build_depot([{'pk1': 'A', 'pk2': 2, 'value': 1.0}])
+    assert depot.upsert(build_patch(['A', 'B'], [1, 2]))
+    assert [call[0] for call in collection.write_calls()] == ['bulk_write']
+    assert collection.write_calls()[0][1][0] == \
+        UpdateOne({'pk1': 'A', 'pk2': 1}, {'$set': {'value': 1.0}}, upsert=True)
+
+
+def test_insert_duplicate_key_retry():
+    depot, collection = build_depot()
+    collection.insert_errors = [(1, 11000), (2, 11000)]
+    assert depot.upsert(build_patch(['A', 'B', 'C'], [1, 2, 3]))
+
+    calls = collection.write_calls()
+    assert [call[0] for call in calls] == ['insert_many', 'bulk_write']
+    # Only the failed documents are retried as upsert, and the _id of insert is removed
+    assert calls[1][1] == [UpdateOne({'pk1': 'B', 'pk2': 2}, {'$set': {'value': 2.0}}, upsert=True),
+                           UpdateOne({'pk1': 'C', 'pk2': 3}, {'$set': {'value': 3.0}}, upsert=True)]
+
+
+def test_insert_mixed_error():
+    depot, collection = build_depot()
+    collection.insert_errors = [(0, 11000), (1, 121)]
+    assert not depot.upsert(build_patch(['A', 'B'], [1, 2]))
+    assert [call[0] for call in collection.write_calls()] == ['insert_many']
+
+    # The duplicate key error of insert() is not retried
+    depot, collection = build_depot()
+    collection.insert_errors = [(0, 11000)]
+    assert not depot.insert(build_patch(['A'], [1]))
+    assert [call[0] for call in collection.write_calls()] == ['insert_many']
+
+
+def test_duplicate_primary_keys_ordered():
+    depot, collection = build_depot(batch_size=2, writer_threads=4)
+    patch = build_patch(['A', 'A', 'B', 'A', 'C'], [1, 1, 2, 1, 3])
+    assert depot.upsert(patch)
+
+    # No range checking, all batches are written serially in order
+    assert not any(call[0] == 'find_one' for call in collection.calls)
+    calls = collection.write_calls()
+    assert [(call[0], len(call[1]), call[2]) for call in calls] == \
+           [('bulk_write', 2, True), ('bulk_write', 2, True), ('bulk_write', 1, True)]
+    values = [operation._doc['$set']['value'] for call in calls for operation in call[1]]
+    assert values == [1.0, 1.0, 2.0, 1.0, 3.0]
+
+
+def test_parallel_batches():
+    depot, collection = build_depot(batch_size=2, writer_threads=4)
+    assert depot.upsert(build_patch(['A'] * 7, list(range(7))))
+    calls = collection.write_calls()
+    assert all(call[0] == 'insert_many' and not call[2] for call in calls)
+    assert sorted(document['pk2'] for call in calls for document in call[1]) == list(range(7))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                     Read Path
+# ----------------------------------------------------------------------------------------------------------------------
+
+DECODE_DOCUMENTS = [
+    {'_id': 0, 'pk1': 'A', 'pk2': 1, 'date': datetime.datetime(2020, 1, 1), 'value': 1.5, 'mixed': 1.5,
+     'name': 'a'},
+    {'_id': 1, 'pk1': 'A', 'pk2': 2, 'date': datetime.datetime(2020, 1, 2), 'mixed': datetime.datetime(2020, 1, 1)},
+    {'_id': 2, 'pk1': 'B', 'pk2': 3, 'value': 3, 'mixed': None, 'extra': True},
+    {'_id': 3, 'pk1': 'B', 'pk2': 4, 'date': None, 'value': None, 'mixed': datetime.datetime(2020, 1, 3),
+     'name': 'd'},
+    {'_id': 4, 'pk1': 'C', 'pk2': 5, 'value': 5.5, 'mixed': 2.5},
+]
+
+
+def assert_same_as_list_decode(df: pd.DataFrame, documents: [dict]):
+    # The result should be the same as the old decoding: pd.DataFrame(list(cursor))
+    expect = pd.DataFrame(list(documents))
+    assert sorted(df.columns) == sorted(expect.columns)
+    expect = expect[list(df.columns)]
+    assert df.dtypes.equals(expect.dtypes)
+    # The missing field is backfilled with None, which is NaN in the old object column. Both are null.
+    pd.testing.assert_frame_equal(df.astype(object).where(df.notna(), None),
+                                  expect.astype(object).where(expect.notna(), None))
+
+
+def test_decode_documents():
+    depot, collection = build_depot(DECODE_DOCUMENTS)
+
+    # The missing fields are filled with None, the mixed datetime and float column keeps as object
+    df = depot.query()
+    assert_same_as_list_decode(df, DECODE_DOCUMENTS)
+    assert df['date'].dtype.kind == 'M' and df['value'].dtype.kind == 'f'
+    assert df['mixed'].dtype == object and df['mixed'].iloc[4] == 2.5
+    assert df['extra'].tolist() == [None, None, True, None, None]
+
+    # The projection fields are the leading columns
+    df = depot.query(fields=['value', 'name'])
+    assert list(df.columns) == ['value', 'name', '_id']
+    assert_same_as_list_decode(df, [{k: v for k, v in document.items() if k in ['_id', 'value', 'name']}
+                                    for document in DECODE_DOCUMENTS])
+
+    df = depot.query(conditions={'pk1': 'B'})
+    assert_same_as_list_decode(df, DECODE_DOCUMENTS[2:4])
+
+
+def test_decode_empty_cursor():
+    depot, collection = build_depot(DECODE_DOCUMENTS)
+    df = depot.query(conditions={'pk1': 'X'}, fields=['pk2', 'value'])
+    assert df.empty and list(df.columns) == ['pk2', 'value']
+    df = depot.query(conditions={'pk1': 'X'})
+    assert df.empty and len(df.columns) == 0
+
+
+def test_decode_chunks():
+    depot, collection = build_depot(DECODE_DOCUMENTS)
+    chunks = list(depot.query_chunks(chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    # Each chunk only has the fields of its documents
+    assert_same_as_list_decode(chunks[0], DECODE_DOCUMENTS[0:2])
+    assert_same_as_list_decode(chunks[1], DECODE_DOCUMENTS[2:4])
+    assert_same_as_list_decode(chunks[2], DECODE_DOCUMENTS[4:5])
+
+    chunks = list(depot.query_chunks(fields=['pk2'], chunk_size=10))
+    assert len(chunks) == 1 and chunks[0]['pk2'].tolist() == [1, 2, 3, 4, 5]
+    assert list(depot.query_chunks(conditions={'pk1': 'X'})) == []
+
+
+def test_entry():
+    test_upsert_empty_range()
+    test_insert_duplicate_key_retry()
+    test_insert_mixed_error()
+    test_duplicate_primary_keys_ordered()
+    test_parallel_batches()
+    test_decode_documents()
+    test_decode_empty_cursor()
+    test_decode_chunks()
+
+
+def main():
+    test_entry()
+    print('All Test Passed.')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
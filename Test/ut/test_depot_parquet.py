@@ -0,0 +1,155 @@
+import os
+import shutil
+import datetime
+import tempfile
+import threading
+import traceback
+import multiprocessing
+import pandas as pd
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.UniversalDataDepot.DepotParquet import DepotParquet
+from StockAnalysisSystem.core.UniversalDataDepot.DepotTestCommon import basic_rw_test, basic_interface_test
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def test_basic_rw():
+    depot_path = tempfile.mkdtemp()
+    try:
+        for partition_mode in [DepotParquet.PARTITION_NONE, DepotParquet.PARTITION_VALUE]:
+            depot = DepotParquet(['pk1', 'pk2'], depot_path, 'TestTable', 'pk1', partition_mode)
+            basic_rw_test(depot)
+            basic_interface_test(depot)
+
+            assert depot.record_count() == 20
+            assert depot.range_of('pk2') == (0, 109)
+            assert depot.range_of('pk2', conditions={'pk1': 'F'}) == (5, 100)
+            assert len(depot.query(conditions={'pk1': ['F', 'G'], 'pk2': (0, 99)})) == 2
+            assert list(depot.query('J', fields=['field3']).columns) == ['field3']
+    finally:
+        shutil.rmtree(depot_path)
+
+
+def test_partition_by_year():
+    depot_path = tempfile.mkdtemp()
+    try:
+        depot = DepotParquet(['stock_identity', 'trade_date'], depot_path, 'TestDaily',
+                             'trade_date', DepotParquet.PARTITION_YEAR)
+        depot.upsert(pd.DataFrame({
+            'stock_identity': ['000001.SZSE'] * 400,
+            'trade_date': pd.date_range('2019-06-01', periods=400),
+            'close': range(400),
+        }))
+        assert depot.record_count() == 400
+
+        df = depot.query(conditions={'trade_date': (datetime.datetime(2020, 3, 1), datetime.datetime(2020, 3, 10))})
+        assert len(df) == 10
+
+        assert depot.delete(conditions={'trade_date': (datetime.datetime(2020, 3, 1), None)})
+        assert depot.range_of('trade_date')[1] == datetime.datetime(2020, 2, 29)
+    finally:
+        shutil.rmtree(depot_path)
+
+
+def test_null_and_unsafe_partition():
+    depot_path = tempfile.mkdtemp()
+    try:
+        depot = DepotParquet(['pk1', 'pk2'], depot_path, 'TestTable', 'pk1')
+        # The null partition value is kept, and the values that are escaped to the same name use different files
+        assert depot.upsert(pd.DataFrame({'pk1': ['A', None, 'a/b', 'a_b', 'a:b'], 'pk2': [1, 2, 3, 4, 5],
+                                          'value': [1.0, 2.0, 3.0, 4.0, 5.0]}))
+        assert depot.record_count() == 5
+        assert len([f for f in os.listdir(depot.table_path()) if f.endswith('.parquet')]) == 5
+        assert depot.query(conditions={'pk1': 'a_b'})['pk2'].tolist() == [4]
+        assert depot.query(conditions={'pk1': 'a/b'})['pk2'].tolist() == [3]
+
+        # Upsert the null key again
+        assert depot.upsert(pd.DataFrame({'pk1': [None], 'pk2': [2], 'value': [20.0]}))
+        df = depot.query()
+        assert len(df) == 5 and df[df['pk1'].isna()]['value'].tolist() == [20.0]
+
+        depot = DepotParquet(['stock_identity', 'trade_date'], depot_path, 'TestDaily',
+                             'trade_date', DepotParquet.PARTITION_YEAR)
+        assert depot.upsert(pd.DataFrame({'stock_identity': ['000001.SZSE'] * 2,
+                                          'trade_date': [datetime.datetime(2020, 1, 2), None],
+                                          'close': [1.0, 2.0]}))
+        assert depot.record_count() == 2
+        assert len(depot.query(conditions={'trade_date': (datetime.datetime(2020, 1, 1), None)})) == 1
+    finally:
+        shutil.rmtree(depot_path)
+
+
+def __write_rows(depot_path: str, writer: int, count: int):
+    depot = DepotParquet(['pk1', 'pk2'], depot_path, 'TestTable', 'pk1')
+    for i in range(count):
+        assert depot.upsert(pd.DataFrame({'pk1': ['A'], 'pk2': [writer * 1000 + i], 'value': [float(i)]}))
+
+
+def test_concurrent_write_partition():
+    depot_path = tempfile.mkdtemp()
+    try:
+        # All writers write to the same partition 'A'. No row should be lost.
+        threads = [threading.Thread(target=__write_rows, args=(depot_path, writer, 10)) for writer in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        depot = DepotParquet(['pk1', 'pk2'], depot_path, 'TestTable', 'pk1')
+        assert depot.record_count() == 40
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            processes = [context.Process(target=__write_rows, args=(depot_path, writer, 10))
+                         for writer in range(4, 8)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+                assert process.exitcode == 0
+            assert depot.record_count() == 80
+        assert depot.query('A', fields=['pk2'])['pk2'].is_unique
+    finally:
+        shutil.rmtree(depot_path)
+
+
+def test_entry():
+    test_basic_rw()
+    test_partition_by_year()
+    test_null_and_unsafe_partition()
+    test_concurrent_write_partition()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
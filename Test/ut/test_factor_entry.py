@@ -0,0 +1,213 @@
+import datetime
+import traceback
+import numpy as np
+import pandas as pd
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.FactorEntry import FactorCenter
+from StockAnalysisSystem.core.Utility.plugin_manager import PluginManager
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+class FakeUpdateTable:
+    def __init__(self):
+        self.records = {}
+
+    def get_until(self, tags: [str]):
+        return self.records.get('.'.join(tags), {}).get('until', None)
+
+    def get_last_update_time(self, tags: [str]):
+        return self.records.get('.'.join(tags), {}).get('last_update', None)
+
+    def update_until(self, tags: [str], until: datetime.datetime) -> bool:
+        if until is None:
+            return False
+        record = self.records.setdefault('.'.join(tags), {})
+        if record.get('until', None) is None or until > record['until']:
+            record['until'] = until
+        return True
+
+    def update_update_range(self, tags: [str], since: datetime.datetime, until: datetime.datetime) -> bool:
+        return self.update_until(tags, until)
+
+    def update_latest_update_time(self, tags: [str], update_time: datetime.datetime = None) -> bool:
+        self.records.setdefault('.'.join(tags), {})['last_update'] = \
+            update_time if update_time is not None else datetime.datetime.now()
+        return True
+
+    def flush(self) -> bool:
+        return True
+
+
+class FakeDataCenter:
+    """
+    The finance data of each security and period is a fixed value. The factors are persisted in memory.
+    """
+    def __init__(self):
+        self.update_table = FakeUpdateTable()
+        self.version = {}
+        self.materialized = {}
+        self.source_query = []
+
+    def get_update_table(self):
+        return self.update_table
+
+    def readable_to_uri(self, readable: [str]) -> dict:
+        group = {}
+        for r in readable:
+            uri = 'Finance.IncomeStatement' if r in ['营业收入', '营业利润', '减:营业成本', '其他业务收入',
+                                                     '净利润(含少数股东损益)'] else 'Finance.BalanceSheet'
+            group.setdefault(uri, []).append(r)
+        return group
+
+    def source(self, identity: str or [str], time_serial: tuple, fields: [str]) -> pd.DataFrame:
+        identities = identity if isinstance(identity, (list, tuple)) else [identity]
+        periods = pd.to_datetime(['2018-12-31', '2019-06-30', '2019-12-31'])
+        if time_serial is not None and time_serial[0] is not None:
+            periods = periods[periods >= pd.Timestamp(time_serial[0])]
+        self.source_query.append((list(identities), time_serial))
+        rows = []
+        for s in identities:
+            for p in periods:
+                row = {'stock_identity': s, 'period': p}
+                for i, f in enumerate(fields):
+                    row[f] = float(i + 1 + hash(s) % 7 + self.version.get((s, p), 0))
+                rows.append(row)
+        return pd.DataFrame(rows, columns=['stock_identity', 'period'] + list(fields))
+
+    def query(self, uri: str, identity: str or [str] = None, time_serial: tuple = None,
+              fields: [str] = None, **extra) -> pd.DataFrame:
+        assert uri == FactorCenter.MATERIALIZE_URI
+        identities = identity if isinstance(identity, (list, tuple)) else [identity]
+        rows = [v for k, v in self.materialized.items() if k[0] in identities]
+        return pd.DataFrame(rows).reindex(columns=fields)
+
+    def merge_local_data(self, uri: str, identity: str, data: pd.DataFrame) -> bool:
+        for row in data.to_dict('records'):
+            self.materialized[(row['stock_identity'], row['period'])] = row
+        return True
+
+
+class FakeDataUtility:
+    def __init__(self, data_center: FakeDataCenter):
+        self.data_center = data_center
+
+    def get_stock_identities(self) -> [str]:
+        return ['000001.SZSE', '000002.SZSE', '600000.SSE']
+
+    def auto_query(self, identity: str or [str], time_serial: tuple, fields: [str],
+                   join_on: [str] = None) -> pd.DataFrame:
+        return self.data_center.source(identity, time_serial, fields)
+
+
+class FakeDataHub:
+    def __init__(self):
+        self.data_center = FakeDataCenter()
+        self.data_utility = FakeDataUtility(self.data_center)
+
+    def get_data_center(self):
+        return self.data_center
+
+    def get_data_utility(self):
+        return self.data_utility
+
+
+def __build_factor_center(data_hub) -> FactorCenter:
+    plugin = PluginManager(path.join(root_path, 'StockAnalysisSystem', 'plugin', 'Factor'))
+    factor_center = FactorCenter(data_hub, None, plugin)
+    factor_center.reload_plugin()
+    return factor_center
+
+
+def __calculated(factor_center: FactorCenter, identity: [str], factors: [str]) -> pd.DataFrame:
+    df = factor_center.query(identity, factors, None, {}, {'materialized': False})
+    df = df[factors + ['stock_identity', 'period']]
+    return df.sort_values(['stock_identity', 'period']).reset_index(drop=True)
+
+
+def test_materialize():
+    data_hub = FakeDataHub()
+    data_center = data_hub.get_data_center()
+    update_table = data_center.get_update_table()
+    factor_center = __build_factor_center(data_hub)
+
+    securities = data_hub.get_data_utility().get_stock_identities()
+    factors = ['流动比率', '毛利率', '货币资金/有息负债']
+
+    assert factor_center.materialize() == 3
+    assert len(factor_center.unmaterialized_factors()) == 0
+    assert factor_center.materialize() == 0
+
+    data_center.source_query.clear()
+    df = factor_center.query(securities, factors, None, {}, {})
+    assert len(data_center.source_query) == 0
+    df = df.sort_values(['stock_identity', 'period']).reset_index(drop=True)
+    assert np.allclose(df[factors].values, __calculated(factor_center, securities, factors)[factors].values)
+
+    # The source data of one security changed in the latest period
+    data_center.version[('000002.SZSE', pd.Timestamp('2019-12-31'))] = 10
+    update_table.update_latest_update_time(['Finance', 'IncomeStatement', '000002_SZSE'])
+
+    # Not materialized yet, the changed security is calculated from the source
+    data_center.source_query.clear()
+    df = factor_center.query(securities, factors, None, {}, {})
+    assert [q[0] for q in data_center.source_query] == [['000002.SZSE']] * len(data_center.source_query)
+    df = df.sort_values(['stock_identity', 'period']).reset_index(drop=True)
+    assert np.allclose(df[factors].values, __calculated(factor_center, securities, factors)[factors].values)
+
+    # Only the changed security is re-calculated, since its last materialized period
+    data_center.source_query.clear()
+    assert factor_center.materialize() == 1
+    assert all(q == (['000002.SZSE'], (pd.Timestamp('2019-12-31'), None)) for q in data_center.source_query)
+
+    data_center.source_query.clear()
+    df = factor_center.query('000002.SZSE', factors, None, {}, {})
+    assert len(data_center.source_query) == 0
+    df = df.sort_values(['stock_identity', 'period']).reset_index(drop=True)
+    assert np.allclose(df[factors].values, __calculated(factor_center, ['000002.SZSE'], factors)[factors].values)
+
+    # The market wide update extends the source range
+    update_table.update_until(['Finance', 'BalanceSheet'], datetime.datetime(2020, 3, 31))
+    assert factor_center.query('000001.SZSE', ['流动比率'], None, {}, {}) is not None
+    assert factor_center.materialize() == 3
+    assert factor_center.materialize() == 0
+
+
+def test_entry():
+    test_materialize()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
@@ -0,0 +1,120 @@
+import traceback
+import numpy as np
+import pandas as pd
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.Trader.Interface import IMarket
+from StockAnalysisSystem.core.Trader.Market import BackTestingData, DailyHistory, MarketBackTesting
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def __build_daily_data(days: pd.DatetimeIndex, keep: np.ndarray, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    index = days[keep]
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(index))))
+    return pd.DataFrame({
+        'open': close, 'close': close, 'high': close * 1.02, 'low': close * 0.98,
+        'volume': rng.integers(100000, 1000000, len(index)).astype(float),
+    }, index=index)
+
+
+def test_back_testing_data():
+    days = pd.bdate_range('2020-01-01', periods=30)
+    rng = np.random.default_rng(0)
+    daily_data = {
+        'A': __build_daily_data(days, np.ones(30, dtype=bool), 1),
+        'B': __build_daily_data(days, rng.random(30) > 0.3, 2),
+        'C': __build_daily_data(days, np.arange(30) >= 10, 3),
+    }
+    data = BackTestingData(days, daily_data)
+
+    for day in range(len(days)):
+        history = DailyHistory(data, day)
+        assert sorted(history.keys()) == ['A', 'B', 'C']
+        for security, df in daily_data.items():
+            expect = df[df.index <= days[day]]
+            assert history[security].equals(expect)
+            assert np.array_equal(history.window(security, 'close'), expect['close'].to_numpy())
+            assert np.array_equal(history.window(security, 'close', 5), expect['close'].to_numpy()[-5:])
+            if len(expect) > 0:
+                assert data.row(security, day) == expect.iloc[-1].to_dict()
+                assert data.row(security, day, 0) == expect.iloc[0].to_dict()
+            else:
+                assert data.row(security, day) == {}
+        mask, values = data.latest(day, 'close')
+        assert mask.tolist() == [len(df[df.index <= days[day]]) > 0 for df in daily_data.values()]
+        assert values.tolist() == [data.value(s, day, 'close') for s, m in zip(data.securities(), mask) if m]
+
+    # Zero-copy and read-only
+    window = data.window('A', 29, 'close')
+    assert not window.flags.writeable and not window.flags.owndata
+
+
+def test_market_back_testing():
+    class Recorder(IMarket.Observer):
+        def __init__(self, market: MarketBackTesting):
+            super(Recorder, self).__init__()
+            self.market = market
+            self.records = []
+
+        def level(self) -> int:
+            return IMarket.Observer.LEVEL_LAST
+
+        def on_after_trading(self, price_history: dict, *args, **kwargs):
+            df = price_history['B']
+            self.records.append((len(df), self.market.get_price('B'), self.market.get_day_limit('B')))
+
+    days = pd.bdate_range('2020-01-01', periods=20)
+    market = MarketBackTesting(None, None, None)
+    market.add_back_testing_data('A', __build_daily_data(days, np.ones(20, dtype=bool), 1), None, True)
+    market.add_back_testing_data('B', __build_daily_data(days, np.arange(20) % 3 != 1, 2), None)
+    recorder = Recorder(market)
+    market.watch_security('B', recorder)
+    market.back_testing_entry()
+
+    b = market.get_window('B', 'close')
+    assert len(recorder.records) == 19
+    assert recorder.records[-1][0] == len(b)
+    assert recorder.records[-1][1] == b[-1]
+    assert market.get_daily('B')['close'] == b[-1]
+
+
+def test_entry():
+    test_back_testing_data()
+    test_market_back_testing()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
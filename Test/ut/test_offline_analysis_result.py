@@ -0,0 +1,179 @@
+import io
+import os
+import json
+import shutil
+import datetime
+import tempfile
+import traceback
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+import StockAnalysisSystem.core.Utility.AnalyzerUtility as analyzer_util
+from StockAnalysisSystem.core.Utility.AnalyzerUtility import AnalysisResult
+from StockAnalysisSystem.plugin.SubService.WebServiceProvider.offline_analysis_result import \
+    OfflineAnalysisResult, render_security_result
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def __build_results(security_count: int, score: int) -> [AnalysisResult]:
+    results = []
+    for i in range(security_count):
+        for analyzer in ['analyzer_a', 'analyzer_b']:
+            for year in [2018, 2019]:
+                result = AnalysisResult('%06d.SZSE' % i, datetime.datetime(year, 12, 31),
+                                        score, 'Reason %d %s' % (i, analyzer))
+                result.method = analyzer
+                results.append(result)
+    return results
+
+
+def __expect_html(result_path: str, security: str, name_dict: dict) -> str:
+    with open(result_path, 'rt') as f:
+        results = analyzer_util.analysis_results_from_json(f)
+    table = analyzer_util.analysis_result_list_to_security_analyzer_table(results)
+    return render_security_result(table[security], name_dict)
+
+
+def test_iter_analysis_result_json():
+    results = __build_results(20, 60)
+    text = analyzer_util.analysis_results_to_json(results)
+    items = list(analyzer_util.iter_analysis_result_dicts_from_json(io.StringIO(text), chunk_size=17))
+    assert items == json.loads(text)
+    assert list(analyzer_util.iter_analysis_result_dicts_from_json(io.StringIO('[]'))) == []
+
+
+def test_offline_analysis_result():
+    work_path = tempfile.mkdtemp()
+    try:
+        result_path = os.path.join(work_path, 'analysis_result.json')
+        name_dict_path = os.path.join(work_path, 'analyzer_names.json')
+        name_dict = {'analyzer_a': 'Analyzer A', 'analyzer_b': 'Analyzer B'}
+        with open(name_dict_path, 'wt') as f:
+            json.dump(name_dict, f)
+
+        results = __build_results(100, 60)
+        with open(result_path, 'wt') as f:
+            analyzer_util.analysis_results_to_json(results, f)
+
+        config = {'analysis_result_path': result_path, 'analysis_name_dict_path': name_dict_path}
+        offline_result = OfflineAnalysisResult(None)
+        offline_result.init(config)
+        assert offline_result.wait_build(30)
+
+        assert offline_result.security_result_exists('000001.SZSE')
+        assert offline_result.security_result_exists('000099')
+        assert not offline_result.security_result_exists('000100.SZSE')
+        assert offline_result.get_analysis_result_html('000100.SZSE') == ''
+        for security in ['000000.SZSE', '000042.SZSE', '000099.SZSE']:
+            html = offline_result.get_analysis_result_html(security)
+            assert html == __expect_html(result_path, security, name_dict)
+            assert 'Analyzer A' in html
+
+        # Another instance loads the existing store without building
+        another_result = OfflineAnalysisResult(None)
+        another_result.init(config)
+        assert another_result.wait_build(0)
+        assert another_result.get_analysis_result_html('000042') == \
+               offline_result.get_analysis_result_html('000042.SZSE')
+
+        # Hot reload when new analysis result dumped
+        results = __build_results(120, 80)
+        with open(result_path, 'wt') as f:
+            analyzer_util.analysis_results_to_json(results, f)
+        offline_result.check_reload(force=True)
+        assert offline_result.wait_build(30)
+        assert offline_result.security_result_exists('000110.SZSE')
+        assert offline_result.get_analysis_result_html('000042.SZSE') == \
+               __expect_html(result_path, '000042.SZSE', name_dict)
+
+        data_files = [f for f in os.listdir(work_path) if f.endswith('.dat')]
+        assert len(data_files) == 1
+
+        # The temp data file that other process is writing is not removed by the cleanup
+        temp_data_path = os.path.join(work_path, 'analysis_result.json.store.0.dat.tmp')
+        with open(temp_data_path, 'wb') as f:
+            f.write(b'writing')
+        another_result.load_store()
+        assert os.path.exists(temp_data_path)
+        assert another_result.get_analysis_result_html('000110') == \
+               offline_result.get_analysis_result_html('000110.SZSE')
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+
+
+def test_build_fail_backoff():
+    work_path = tempfile.mkdtemp()
+    try:
+        result_path = os.path.join(work_path, 'analysis_result.json')
+        with open(result_path, 'wt') as f:
+            f.write('[{"broken": ')
+
+        build_count = [0]
+        offline_result = OfflineAnalysisResult(None)
+        build_store = offline_result.build_store
+
+        def counting_build_store():
+            build_count[0] += 1
+            build_store()
+        offline_result.build_store = counting_build_store
+
+        offline_result.init({'analysis_result_path': result_path})
+        assert offline_result.wait_build(30)
+        assert build_count[0] == 1
+        assert not [f for f in os.listdir(work_path) if '.dat' in f]
+
+        # The failed build of the same file is not retried until the backoff expires
+        offline_result.check_reload(force=True)
+        assert offline_result.wait_build(30)
+        assert build_count[0] == 1
+
+        # The updated file is built at once
+        with open(result_path, 'wt') as f:
+            analyzer_util.analysis_results_to_json(__build_results(10, 60), f)
+        offline_result.check_reload(force=True)
+        assert offline_result.wait_build(30)
+        assert build_count[0] == 2
+        assert offline_result.security_result_exists('000009.SZSE')
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+
+
+def test_entry():
+    test_iter_analysis_result_json()
+    test_offline_analysis_result()
+    test_build_fail_backoff()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
@@ -0,0 +1,157 @@
+import traceback
+import numpy as np
+import pandas as pd
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.Trader.Broker import Broker
+from StockAnalysisSystem.core.Trader.Market import BackTestingData, MarketBackTesting
+from StockAnalysisSystem.core.Trader.TradeStrategy import GridTrader
+from StockAnalysisSystem.core.Trader.ParameterSweep import ParameterSweep
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def __build_daily_data(security_count: int, day_count: int) -> dict:
+    rng = np.random.default_rng(7)
+    days = pd.bdate_range('2018-01-01', periods=day_count)
+    daily_data = {}
+    for i in range(security_count):
+        index = days[rng.random(day_count) > (0.0 if i == 0 else 0.1)]
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.03, len(index))))
+        daily_data['%06d.SZSE' % i] = pd.DataFrame({
+            'open': close, 'close': close, 'high': close * 1.02, 'low': close * 0.98,
+            'volume': np.full(len(index), 1000000.0),
+        }, index=index)
+    return daily_data
+
+
+def test_back_testing_data_arrays():
+    daily_data = __build_daily_data(3, 40)
+    data = BackTestingData(daily_data['000000.SZSE'].index, daily_data)
+    rebuilt = BackTestingData.from_arrays(data.arrays())
+
+    assert rebuilt.securities() == data.securities()
+    for day in range(40):
+        for security in data.securities():
+            assert rebuilt.count(security, day) == data.count(security, day)
+            assert rebuilt.frame(security, day).equals(data.frame(security, day))
+            assert rebuilt.row(security, day) == data.row(security, day)
+
+
+def test_back_testing_data_heterogeneous_columns():
+    daily_data = __build_daily_data(4, 60)
+    for security in ['000000.SZSE', '000002.SZSE']:
+        df = daily_data[security]
+        df['lower_limit'] = (df['close'].shift(1) * 0.9).round(2)
+        df['upper_limit'] = (df['close'].shift(1) * 1.1).round(2)
+    daily_data['000001.SZSE']['deal'] = np.arange(len(daily_data['000001.SZSE']))
+    daily_data['000003.SZSE']['trade_date'] = daily_data['000003.SZSE'].index
+
+    data = BackTestingData(daily_data['000000.SZSE'].index, daily_data)
+    arrays = data.arrays()
+    assert {'lower_limit', 'upper_limit', 'deal', 'trade_date'}.issubset(arrays['columns'].keys())
+    assert arrays['absent']['lower_limit'] == ['000001.SZSE', '000003.SZSE']
+    # The missing values of the absent securities
+    mask, values = data.latest(59, 'lower_limit')
+    assert mask.all() and np.isnan(values[1]) and np.isnan(values[3]) and not np.isnan(values[2])
+
+    rebuilt = BackTestingData.from_arrays(arrays)
+    for day in range(60):
+        for security in data.securities():
+            frame, rebuilt_frame = data.frame(security, day), rebuilt.frame(security, day)
+            # The int column is float after concatenated with NaN
+            pd.testing.assert_frame_equal(rebuilt_frame, frame, check_dtype=False, check_freq=False)
+            assert rebuilt.value(security, day, 'upper_limit') == data.value(security, day, 'upper_limit') or \
+                np.isnan(data.value(security, day, 'upper_limit'))
+    assert data.frame('000001.SZSE', 59)['deal'].dtype.kind == 'i'
+    assert 'lower_limit' not in rebuilt.row('000001.SZSE', 59)
+
+    # The day limits are used in parallel sweep as well
+    grid = {'upper_pct': [5.0, 8.0], 'lower_pct': [5.0], 'trade_step': [2]}
+    sweep = ParameterSweep(GridTrader, grid, list(daily_data.keys()), process_count=1)
+    sweep.set_daily_data(daily_data)
+    serial = sweep.run()
+    sweep = ParameterSweep(GridTrader, grid, list(daily_data.keys()), process_count=2)
+    sweep.set_daily_data(daily_data)
+    parallel = sweep.run()
+    assert (serial['error'] == '').all()
+    assert parallel.equals(serial)
+
+
+def test_broker_quiet_statistics():
+    daily_data = __build_daily_data(1, 120)
+    market = MarketBackTesting(None, None, None, quiet=True)
+    market.add_back_testing_data('000000.SZSE', daily_data['000000.SZSE'], None, True)
+    broker = Broker(market, quiet=True)
+    market.watch_security('000000.SZSE', broker)
+    trader = GridTrader(market, broker, '000000.SZSE', 5.0, 5.0, 4)
+    market.watch_security('000000.SZSE', trader)
+    market.back_testing_entry()
+
+    statistics = broker.trade_statistics()
+    assert statistics['deal_count'] > 0
+    assert statistics['deal_count'] == statistics['buy_count'] + statistics['sell_count']
+    assert len(broker.get_daily_value()) == 119
+    assert statistics['final_value'] == broker.get_daily_value()[-1]
+    assert abs(statistics['pnl'] - (statistics['final_value'] - statistics['initial_value'])) < 1e-6
+    assert 0.0 <= statistics['max_drawdown_pct'] <= 100.0
+
+
+def test_parameter_sweep():
+    daily_data = __build_daily_data(4, 100)
+    grid = {'upper_pct': [5.0, 8.0], 'lower_pct': [5.0], 'trade_step': [2, 4]}
+
+    sweep = ParameterSweep(GridTrader, grid, list(daily_data.keys()), process_count=1)
+    assert len(sweep.parameter_sets()) == 4
+    assert sweep.set_daily_data(daily_data)
+    serial = sweep.run()
+    assert len(serial) == 16
+    assert (serial['error'] == '').all()
+    assert {'security', 'upper_pct', 'trade_step', 'pnl', 'max_drawdown_pct', 'deal_count'}.issubset(serial.columns)
+
+    sweep = ParameterSweep(GridTrader, grid, list(daily_data.keys()), process_count=2)
+    sweep.set_daily_data(daily_data)
+    parallel = sweep.run()
+    assert parallel.equals(serial)
+
+
+def test_entry():
+    test_back_testing_data_arrays()
+    test_back_testing_data_heterogeneous_columns()
+    test_broker_quiet_statistics()
+    test_parameter_sweep()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
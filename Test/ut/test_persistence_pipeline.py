@@ -0,0 +1,159 @@
+import time
+import threading
+import traceback
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.DataHub.PersistencePipeline import PersistencePipeline
+
+
+class FakeDataCenter:
+    """
+    Records the applied patches instead of writing to depot.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.__delay = delay
+        self.__lock = threading.Lock()
+        self.applied = []
+
+    def apply_local_data_patches(self, patches: [tuple]) -> [bool]:
+        if self.__delay > 0:
+            time.sleep(self.__delay)
+        with self.__lock:
+            self.applied.extend(patches)
+        return [True] * len(patches)
+
+    def applied_of(self, uri: str) -> [int]:
+        with self.__lock:
+            return [patch[2] for patch in self.applied if patch[1][0] == uri]
+
+
+def build_patch(uri: str, sequence: int) -> tuple:
+    # The same layout as UniversalDataCenter.build_local_data_patch(). Use the result slot for sequence.
+    return True, (uri, None, None, None, None), sequence
+
+
+class CallbackCounter:
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.count = 0
+        self.failed = 0
+
+    def __call__(self, patch: tuple, result: bool):
+        with self.__lock:
+            self.count += 1
+            if not result:
+                self.failed += 1
+
+
+def test_order_of_uri():
+    data_center = FakeDataCenter(0.001)
+    pipeline = PersistencePipeline(data_center, writer_count=3, queue_size=4, coalesce_limit=5)
+    callback = CallbackCounter()
+    uris = ['Finance.BalanceSheet', 'Finance.IncomeStatement', 'TradeData.Stock.Daily', 'Market.SecuritiesInfo']
+    for sequence in range(50):
+        for uri in uris:
+            pipeline.submit(build_patch(uri, sequence), callback)
+    pipeline.stop()
+
+    # The patches of the same uri are persisted in submitting order
+    for uri in uris:
+        assert data_center.applied_of(uri) == list(range(50))
+    assert callback.count == 200 and callback.failed == 0
+
+
+def test_stop_drain():
+    data_center = FakeDataCenter(0.01)
+    pipeline = PersistencePipeline(data_center, writer_count=2, queue_size=2, coalesce_limit=2)
+    callback = CallbackCounter()
+    for sequence in range(20):
+        pipeline.submit(build_patch('uri%d' % (sequence % 3), sequence), callback)
+    # stop() returns after all the queued patches persisted
+    pipeline.stop()
+    assert len(data_center.applied) == 20 and callback.count == 20
+
+    # Submit after stop starts the writers again
+    pipeline.submit(build_patch('uri0', 20), callback)
+    pipeline.stop()
+    assert len(data_center.applied) == 21 and callback.count == 21
+
+
+def test_submit_stop_race():
+    data_center = FakeDataCenter()
+    pipeline = PersistencePipeline(data_center, writer_count=3, queue_size=2, coalesce_limit=3)
+    callback = CallbackCounter()
+    errors = []
+    submitted = [0]
+    submitted_lock = threading.Lock()
+    submitting = [True]
+
+    def submit_entry(index: int):
+        try:
+            for sequence in range(300):
+                pipeline.submit(build_patch('uri%d' % ((index + sequence) % 5), sequence), callback)
+                with submitted_lock:
+                    submitted[0] += 1
+        except Exception as e:
+            errors.append(e)
+        finally:
+            pass
+
+    def stop_entry():
+        while submitting[0]:
+            pipeline.stop()
+
+    submitters = [threading.Thread(target=submit_entry, args=(index,), daemon=True) for index in range(4)]
+    stopper = threading.Thread(target=stop_entry, daemon=True)
+    stopper.start()
+    for thread in submitters:
+        thread.start()
+    # The submit() blocks forever if the patch is put on a queue that no writer drains
+    for thread in submitters:
+        thread.join(30)
+        assert not thread.is_alive()
+    submitting[0] = False
+    stopper.join(30)
+    assert not stopper.is_alive()
+    pipeline.stop()
+
+    # No patch is lost on the stopped queue
+    assert len(errors) == 0, errors
+    assert submitted[0] == 1200
+    assert len(data_center.applied) == 1200 and callback.count == 1200
+
+
+def test_entry():
+    test_order_of_uri()
+    test_stop_drain()
+    test_submit_stop_race()
+
+
+def main():
+    test_entry()
+    print('All Test Passed.')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
@@ -0,0 +1,184 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import traceback
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.Utility.plugin_manager import PluginManager, PLUGIN_INDEX_FILE
+
+
+PLUGIN_TEMPLATE = '''
+def plugin_prob() -> dict:
+    return {'plugin_name': '%(name)s', 'plugin_version': '0.0.0.1', 'tags': ['test']}
+
+
+def plugin_adapt(uri: str) -> bool:
+    return uri in plugin_capacities() or uri == '%(name)s.undeclared'
+
+
+def plugin_capacities() -> list:
+    return %(capacities)s
+
+
+def query(**kwargs):
+    return '%(name)s'
+'''
+
+FIELDS_TEMPLATE = '''
+
+def fields() -> dict:
+    return {'%(name)s.uri': {'%(name)s_field': '%(name)s readable'}}
+'''
+
+
+def write_plugin(plugin_path: str, name: str, capacities: [str], with_fields: bool = False):
+    with open(path.join(plugin_path, name + '.py'), 'wt') as f:
+        f.write(PLUGIN_TEMPLATE % {'name': name, 'capacities': repr(capacities)})
+        if with_fields:
+            f.write(FIELDS_TEMPLATE % {'name': name})
+
+
+def module_imported(name: str) -> bool:
+    return name in sys.modules.keys()
+
+
+def test_capacity_index():
+    plugin_path = tempfile.mkdtemp()
+    suffix = uuid.uuid4().hex[:8]
+    plugin_a = 'plugin_a_' + suffix
+    plugin_b = 'plugin_b_' + suffix
+    plugin_c = 'plugin_c_' + suffix
+    not_plugin = 'not_plugin_' + suffix
+
+    try:
+        write_plugin(plugin_path, plugin_a, ['Market.A', 'Market.Common'])
+        write_plugin(plugin_path, plugin_b, ['Finance.B', 'Market.Common'])
+        write_plugin(plugin_path, plugin_c, ['test.*'])
+        with open(path.join(plugin_path, not_plugin + '.py'), 'wt') as f:
+            f.write('VALUE = 1\n')
+
+        # The first refresh imports all plugins and builds the index
+        plugin_mgr = PluginManager(plugin_path)
+        plugin_mgr.refresh()
+        assert path.exists(path.join(plugin_path, '__pycache__', PLUGIN_INDEX_FILE))
+        assert module_imported(plugin_a) and module_imported(plugin_b) and module_imported(plugin_c)
+        assert len(plugin_mgr.all_modules()) == 3
+
+        for name in [plugin_a, plugin_b, plugin_c, not_plugin]:
+            del sys.modules[name]
+
+        # The second refresh imports nothing
+        plugin_mgr = PluginManager(plugin_path)
+        plugin_mgr.refresh()
+        assert not module_imported(plugin_a) and not module_imported(plugin_b)
+        assert not module_imported(plugin_c) and not module_imported(not_plugin)
+
+        # Only the plugin that has the capacity is imported
+        modules = plugin_mgr.find_module_has_capacity('Market.A')
+        assert [m.__name__ for m in modules] == [plugin_a]
+        assert module_imported(plugin_a) and not module_imported(plugin_b)
+
+        modules = plugin_mgr.find_module_has_capacity('Market.Common')
+        assert sorted([m.__name__ for m in modules]) == sorted([plugin_a, plugin_b])
+        modules = plugin_mgr.find_module_has_capacity('test.anything')
+        assert [m.__name__ for m in modules] == [plugin_c]
+        assert plugin_mgr.find_module_has_capacity('Nothing.Nothing') == []
+
+        # The capacity that is not declared is checked by plugin_adapt
+        modules = plugin_mgr.find_module_has_capacity(plugin_b + '.undeclared')
+        assert [m.__name__ for m in modules] == [plugin_b]
+
+        for name in [plugin_a, plugin_b, plugin_c]:
+            sys.modules.pop(name, None)
+
+        # Touched file without change is still indexed
+        os.utime(path.join(plugin_path, plugin_a + '.py'), (time.time() + 10, time.time() + 10))
+        # Updated file is imported again
+        write_plugin(plugin_path, plugin_b, ['Finance.B2'])
+        plugin_mgr = PluginManager(plugin_path)
+        plugin_mgr.refresh()
+        assert not module_imported(plugin_a)
+        assert module_imported(plugin_b)
+        assert plugin_mgr.find_module_has_capacity('Finance.B') == []
+        assert [m.__name__ for m in plugin_mgr.find_module_has_capacity('Finance.B2')] == [plugin_b]
+        assert plugin_mgr.execute_module_function(
+            plugin_mgr.find_module_has_capacity('Market.A'), 'query', {}) == [plugin_a]
+    finally:
+        for name in [plugin_a, plugin_b, plugin_c, not_plugin]:
+            sys.modules.pop(name, None)
+        if plugin_path in sys.path:
+            sys.path.remove(plugin_path)
+        shutil.rmtree(plugin_path, ignore_errors=True)
+
+
+def test_declaration_index():
+    plugin_path = tempfile.mkdtemp()
+    suffix = uuid.uuid4().hex[:8]
+    plugin_a = 'plugin_a_' + suffix
+    plugin_b = 'plugin_b_' + suffix
+
+    try:
+        write_plugin(plugin_path, plugin_a, ['Market.A'], with_fields=True)
+        write_plugin(plugin_path, plugin_b, ['Finance.B'])
+
+        plugin_mgr = PluginManager(plugin_path)
+        plugin_mgr.refresh()
+        expect = [{plugin_a + '.uri': {plugin_a + '_field': plugin_a + ' readable'}}]
+        assert plugin_mgr.get_declarations('fields') == expect
+
+        for name in [plugin_a, plugin_b]:
+            del sys.modules[name]
+
+        # The fields declaration is read from the index without importing
+        plugin_mgr = PluginManager(plugin_path)
+        plugin_mgr.refresh()
+        assert plugin_mgr.get_declarations('fields') == expect
+        assert not module_imported(plugin_a) and not module_imported(plugin_b)
+
+        # The function that is not kept in the index is executed
+        assert sorted(plugin_mgr.get_declarations('query')) == sorted([plugin_a, plugin_b])
+        assert module_imported(plugin_a) and module_imported(plugin_b)
+    finally:
+        for name in [plugin_a, plugin_b]:
+            sys.modules.pop(name, None)
+        if plugin_path in sys.path:
+            sys.path.remove(plugin_path)
+        shutil.rmtree(plugin_path, ignore_errors=True)
+
+
+def test_entry():
+    test_capacity_index()
+    test_declaration_index()
+
+
+def main():
+    test_entry()
+    print('All Test Passed.')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
@@ -0,0 +1,136 @@
+import time
+import traceback
+import pandas as pd
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.DataHub.QueryCache import QueryResultCache
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def __build_test_dataframe(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        'stock_identity': ['%06d.SSE' % i for i in range(rows)],
+        'value': [float(i) for i in range(rows)],
+    })
+
+
+def test_hit_and_miss():
+    cache = QueryResultCache()
+    key = QueryResultCache.make_key('Finance.BalanceSheet', ['000001.SZSE'], None, {'fields': ['period']})
+
+    assert cache.get(key) is None
+    assert cache.put('Finance.BalanceSheet', key, __build_test_dataframe(10))
+
+    df = cache.get(key)
+    assert df is not None and len(df) == 10
+
+    # Modify the returned result should not affect the cache
+    df['value'] = 0
+    assert cache.get(key)['value'].iloc[9] == 9.0
+
+    statistics = cache.statistics()
+    assert statistics['hit'] == 2
+    assert statistics['miss'] == 1
+    assert statistics['entry_count'] == 1
+
+
+def test_invalidate():
+    cache = QueryResultCache()
+    key1 = QueryResultCache.make_key('Finance.BalanceSheet', '000001.SZSE', None, {})
+    key2 = QueryResultCache.make_key('Finance.IncomeStatement', '000001.SZSE', None, {})
+
+    cache.put('Finance.BalanceSheet', key1, __build_test_dataframe(10))
+    cache.put('Finance.IncomeStatement', key2, __build_test_dataframe(10))
+
+    cache.invalidate('Finance.BalanceSheet')
+    assert cache.get(key1) is None
+    assert cache.get(key2) is not None
+
+    # The result that queried before invalidation should not be cached
+    generation = cache.generation('Finance.BalanceSheet')
+    cache.invalidate('Finance.BalanceSheet')
+    assert not cache.put('Finance.BalanceSheet', key1, __build_test_dataframe(10), generation)
+    assert cache.get(key1) is None
+
+
+def test_limit():
+    cache = QueryResultCache(entry_limit=2)
+    keys = [QueryResultCache.make_key('TradeData.Stock.Daily', str(i), None, {}) for i in range(3)]
+    for key in keys:
+        cache.put('TradeData.Stock.Daily', key, __build_test_dataframe(10))
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) is not None
+    assert cache.get(keys[2]) is not None
+    assert cache.statistics()['eviction'] == 1
+
+    memory = QueryResultCache.dataframe_memory(__build_test_dataframe(100))
+    cache = QueryResultCache(memory_limit=memory * 2)
+    keys = [QueryResultCache.make_key('TradeData.Stock.Daily', str(i), None, {}) for i in range(3)]
+    for key in keys:
+        cache.put('TradeData.Stock.Daily', key, __build_test_dataframe(100))
+    assert cache.get(keys[0]) is None
+    assert cache.statistics()['memory_usage'] <= memory * 2
+
+    cache.set_limit(memory_limit=0)
+    assert not cache.enabled()
+
+
+def test_entry_ttl():
+    cache = QueryResultCache(entry_ttl=0.2)
+    key = QueryResultCache.make_key('Finance.BalanceSheet', '000001.SZSE', None, {})
+    cache.put('Finance.BalanceSheet', key, __build_test_dataframe(10))
+    assert cache.get(key) is not None
+
+    # Expired: the data may be updated by other process
+    time.sleep(0.3)
+    assert cache.get(key) is None
+    assert cache.statistics()['expiration'] == 1
+    assert cache.statistics()['entry_count'] == 0 and cache.statistics()['memory_usage'] == 0
+
+    cache.set_entry_ttl(None)
+    cache.put('Finance.BalanceSheet', key, __build_test_dataframe(10))
+    time.sleep(0.3)
+    assert cache.get(key) is not None
+
+
+def test_entry():
+    test_hit_and_miss()
+    test_invalidate()
+    test_limit()
+    test_entry_ttl()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
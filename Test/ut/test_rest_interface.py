@@ -0,0 +1,224 @@
+import gzip
+import json
+import threading
+import traceback
+import numpy as np
+import pandas as pd
+import pytest
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.Utility.JsonSerializer import serialize, deserialize
+from StockAnalysisSystem.core.Utility.BinarySerializer import *
+from StockAnalysisSystem.core.Utility.HttpCompression import *
+from StockAnalysisSystem.interface.interface_rest import RestInterface
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# The service provider of WebApiInterface, the requests are recorded.
+
+class FakeServiceProvider:
+    def __init__(self):
+        self.calls = []
+
+    def interface_call(self, token: str, api: str, *args, **kwargs) -> any:
+        self.calls.append((token, api))
+        if api == 'echo':
+            return kwargs['value']
+        if api == 'sas_query':
+            count = kwargs['count']
+            return pd.DataFrame({'stock_identity': ['%06d.SZSE' % kwargs['index']] * count,
+                                 'close': np.arange(count, dtype=float)})
+        return None
+
+    def sys_call(self, token: str, api: str, *args, **kwargs) -> any:
+        return None
+
+
+def __import_webapi_if():
+    pytest.importorskip('flask')
+    sub_service_path = path.join(root_path, 'StockAnalysisSystem', 'plugin', 'SubService')
+    if sub_service_path not in sys.path:
+        sys.path.append(sub_service_path)
+    # The same module name as web_service imports
+    import WebServiceProvider.webapiIF as webapiIF
+    return webapiIF
+
+
+def __build_payload(api: str, **kwargs) -> dict:
+    return {'api': api, 'token': 'xxxxxx', 'args': serialize([]), 'kwargs': serialize(kwargs)}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def test_http_compression():
+    content = ('x' * 2000).encode('utf-8')
+    assert accept_encoding('gzip, deflate') == 'gzip'
+    assert accept_encoding('deflate;q=1.0, br') == 'deflate'
+    assert accept_encoding('br') == ''
+    assert accept_encoding(None) == ''
+    for encoding in ['gzip', 'deflate']:
+        compressed, used = compress_content(content, encoding)
+        assert used == encoding and len(compressed) < len(content)
+        assert decompress_content(compressed, used) == content
+    # Small content is not compressed
+    assert compress_content('small', 'gzip') == (b'small', '')
+
+
+def test_webapi_handlers():
+    webapiIF = __import_webapi_if()
+    from flask import Flask, request
+
+    provider = FakeServiceProvider()
+    webapiIF.webapi_interface = webapiIF.WebApiInterface(provider)
+
+    app = Flask(__name__)
+
+    @app.route('/api', methods=['POST'])
+    def webapi_entry():
+        return webapiIF.handle_request(request)
+
+    @app.route('/api/batch', methods=['POST'])
+    def webapi_batch_entry():
+        return webapiIF.handle_batch_request(request)
+
+    client = app.test_client()
+
+    # The gzip request is decompressed, and the large response is compressed if client accepts
+    large = 'y' * 5000
+    body = gzip.compress(json.dumps(__build_payload('echo', value=large)).encode('utf-8'))
+    resp = client.post('/api', data=body, headers={'Content-Encoding': 'gzip', 'Accept-Encoding': 'gzip',
+                                                   'Accept': JSON_CONTENT_TYPE})
+    assert resp.headers['Content-Encoding'] == 'gzip' and resp.headers['Vary'] == 'Accept-Encoding'
+    assert resp.mimetype == JSON_CONTENT_TYPE
+    assert deserialize(gzip.decompress(resp.data).decode('utf-8')) == large
+
+    # No compression if client does not accept it
+    resp = client.post('/api', data=json.dumps(__build_payload('echo', value=large)))
+    assert 'Content-Encoding' not in resp.headers
+    assert deserialize(resp.data.decode('utf-8')) == large
+
+    # Binary response
+    if binary_supported():
+        resp = client.post('/api', data=json.dumps(__build_payload('sas_query', index=1, count=100)),
+                           headers={'Accept': BINARY_CONTENT_TYPE})
+        assert resp.mimetype == BINARY_CONTENT_TYPE and is_binary(resp.data)
+        df = deserialize_binary(resp.data)
+        assert df['close'].tolist() == list(range(100))
+
+    # Batch: the results are in the order of calls, the failed call gets None
+    payload = {'token': 'xxxxxx', 'calls': [__build_payload('sas_query', index=i, count=10) for i in range(3)] +
+               [__build_payload('echo', value='end'), __build_payload('unknown'), {'api': 'echo', 'args': 1}]}
+    resp = client.post('/api/batch', data=json.dumps(payload), headers={'Accept': JSON_CONTENT_TYPE})
+    results = RestInterface.deserialize_response(resp.data)
+    assert len(results) == 6
+    for i in range(3):
+        assert results[i]['stock_identity'].tolist() == ['%06d.SZSE' % i] * 10
+    assert results[3:] == ['end', None, None]
+    assert [api for _, api in provider.calls[-5:]] == ['sas_query'] * 3 + ['echo', 'unknown']
+
+    # The request without calls gets empty response
+    resp = client.post('/api/batch', data=json.dumps({'token': 'xxxxxx'}))
+    assert resp.data == b''
+
+    with app.test_request_context('/api', method='POST', data=gzip.compress(b'{"api": "echo"}'),
+                                  headers={'Content-Encoding': 'gzip', 'Accept-Encoding': 'gzip'}):
+        assert webapiIF.parse_request_data(request) == {'api': 'echo'}
+        # Small content is not compressed
+        response = webapiIF.build_response(request, 'small', False)
+        assert response.get_data() == b'small' and 'Content-Encoding' not in response.headers
+
+
+def test_rest_interface():
+    webapiIF = __import_webapi_if()
+    pytest.importorskip('xmltodict')
+    from flask import Flask, request
+    from werkzeug.serving import make_server
+    from StockAnalysisSystem.plugin.SubService import web_service
+
+    # Serve the routes of web service
+    webapi_interface = webapiIF.webapi_interface
+    web_service.webapiIF.webapi_interface = webapiIF.WebApiInterface(FakeServiceProvider())
+    flask_app = web_service.flaskApp
+    web_service.flaskApp = Flask(__name__)
+    assert web_service.startup()
+    app = web_service.flaskApp
+
+    records = []
+
+    @app.after_request
+    def record_request(response):
+        records.append((request.path, request.environ.get('REMOTE_PORT'),
+                        request.headers.get('Content-Encoding', ''), response.headers.get('Content-Encoding', '')))
+        return response
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        caller = RestInterface()
+        caller.if_init(api_uri='http://127.0.0.1:%d/api' % server.port, token='xxxxxx', timeout=10)
+
+        df = caller.sas_query(index=1, count=5000)
+        assert len(df) == 5000 and df['close'].tolist() == list(range(5000))
+
+        # Large request is compressed
+        large = 'y' * 5000
+        assert caller.echo(value=large) == large
+
+        calls = [('sas_query', (), {'index': i, 'count': 10}) for i in range(5)] + \
+                [('echo', (), {'value': 'end'}), ('unknown', (), {})]
+        results = caller.rest_interface_batch(calls)
+        assert len(results) == 7
+        for i in range(5):
+            assert results[i]['stock_identity'].tolist() == ['%06d.SZSE' % i] * 10
+        assert results[5:] == ['end', None]
+    finally:
+        server.shutdown()
+        server.server_close()
+        web_service.flaskApp = flask_app
+        webapiIF.webapi_interface = webapi_interface
+
+    paths, _, request_encodings, response_encodings = zip(*records)
+    assert paths == ('/api', '/api', '/api/batch')
+    assert request_encodings == ('', 'gzip', '')
+    assert response_encodings[0] == 'gzip'
+
+
+def test_entry():
+    test_http_compression()
+    test_webapi_handlers()
+    test_rest_interface()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
@@ -1,9 +1,15 @@
+import os
+import uuid
+import datetime
+import shutil
+import tempfile
 import traceback
 from os import sys, path
 root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
 sys.path.append(root_path)
 
 from StockAnalysisSystem.core.DataHub.UniversalDataCenter import *
+from StockAnalysisSystem.core.UniversalDataDepot.DepotParquet import DepotParquet
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -34,18 +40,157 @@ def test_update():
     data_center.update_local_data('test.entry1', 'identity_test1')
 
 
+def test_data_agent_route():
+    data_center = UniversalDataCenter(None, PluginManager())
+
+    agent_a = DataAgent('Market.A', None)
+    agent_b = DataAgent('Market.B', None, adapt=['Market.B', 'Market.B2'])
+    agent_c = DataAgent('Market.C', None, adapt=re.compile(r'Market\.C\..*'))
+    agent_d = DataAgent('Market.D', None, adapt=lambda uri: uri.startswith('Market.'))
+    agent_e = DataAgent('Market.E', None)
+    agent_a2 = DataAgent('Market.A', None)
+
+    assert data_center.get_data_agent('Market.A') is None
+    for agent in [agent_a, agent_b, agent_c, agent_d, agent_e, agent_a2]:
+        data_center.register_data_agent(agent)
+
+    assert data_center.get_data_agent('Market.A') is agent_a
+    assert data_center.get_data_agent('market.a') is agent_a
+    assert data_center.get_data_agent('Market.B2') is agent_b
+    assert data_center.get_data_agent('market.b2') is None
+    assert data_center.get_data_agent('Market.C.Daily') is agent_c
+    # The agent that registered earlier goes first
+    assert data_center.get_data_agent('Market.E') is agent_d
+    assert data_center.get_data_agent('Finance.E') is None
+
+
+    # The routing result is cached and refreshed after the agent registered
+    agent_f = DataAgent('Finance.E', None)
+    data_center.register_data_agent(agent_f)
+    assert data_center.get_data_agent('Finance.E') is agent_f
+    assert data_center.get_data_agent(None) is None
+
+FIELDS_PLUGIN = '''
+def plugin_prob() -> dict:
+    return {'plugin_name': 'fields_plugin', 'plugin_version': '0.0.0.1', 'tags': ['test']}
+
+
+def plugin_capacities() -> list:
+    return list(fields().keys())
+
+
+def fields() -> dict:
+    return %s
+'''
+
+
+def __build_fields_data_center(plugin_path: str, plugin_name: str, fields: dict) -> UniversalDataCenter:
+    with open(path.join(plugin_path, plugin_name + '.py'), 'wt') as f:
+        f.write(FIELDS_PLUGIN % repr(fields))
+    collector_plugin = PluginManager(plugin_path)
+    collector_plugin.refresh()
+    return UniversalDataCenter(None, collector_plugin)
+
+
 def test_readable_to_fields():
-    pass
+    plugin_path = tempfile.mkdtemp()
+    plugin_name = 'fields_plugin_' + uuid.uuid4().hex[:8]
+    try:
+        data_center = __build_fields_data_center(plugin_path, plugin_name, {
+            'Finance.A': {'field_a1': 'Readable A1', 'field_a2': 'Readable A2'},
+            'Finance.B': {'field_b1': 'Readable B1'},
+        })
+        assert data_center.readable_to_fields(['Readable A1', 'Readable B1', 'Unknown']) == \
+            ['field_a1', 'field_b1', 'Unknown']
+        assert data_center.readable_to_uri(['Readable A2', 'Readable B1']) == \
+            {'Finance.A': ['Readable A2'], 'Finance.B': ['Readable B1']}
+        assert data_center.check_readable_name(['Readable A1', 'Readable A2'])
+        assert not data_center.check_readable_name('Unknown')
+    finally:
+        sys.modules.pop(plugin_name, None)
+        sys.path.remove(plugin_path)
+        shutil.rmtree(plugin_path, ignore_errors=True)
 
 
 def test_fields_to_readable():
-    pass
+    plugin_path = tempfile.mkdtemp()
+    plugin_name = 'fields_plugin_' + uuid.uuid4().hex[:8]
+    try:
+        data_center = __build_fields_data_center(plugin_path, plugin_name, {
+            'Finance.A': {'field_a1': 'Readable A1'},
+        })
+        assert data_center.fields_to_readable(['field_a1', 'field_x']) == ['Readable A1', 'field_x']
+        assert data_center.fields_to_uri(['field_a1']) == {'Finance.A': ['field_a1']}
+        assert data_center.check_fields_name('field_a1')
+
+        # The declaration is reloaded after the plugin updated
+        with open(path.join(plugin_path, plugin_name + '.py'), 'wt') as f:
+            f.write(FIELDS_PLUGIN % repr({'Finance.A': {'field_a1': 'Readable A1 New'}}))
+        sys.modules.pop(plugin_name, None)
+        data_center.get_plugin_manager().refresh()
+        assert data_center.fields_to_readable(['field_a1']) == ['Readable A1 New']
+    finally:
+        sys.modules.pop(plugin_name, None)
+        sys.path.remove(plugin_path)
+        shutil.rmtree(plugin_path, ignore_errors=True)
+
+
+class CountingDepot(DepotParquet):
+    def __init__(self, *args, **kwargs):
+        super(CountingDepot, self).__init__(*args, **kwargs)
+        self.query_count = 0
+
+    def query(self, *args, conditions: dict = None, fields: [str] or None = None, **kwargs) -> pd.DataFrame or None:
+        self.query_count += 1
+        return super(CountingDepot, self).query(*args, conditions=conditions, fields=fields, **kwargs)
+
+
+def test_query_batch():
+    depot_path = tempfile.mkdtemp()
+    batch_identity_limit = UniversalDataCenter.BATCH_IDENTITY_LIMIT
+    try:
+        depot = CountingDepot(['stock_identity', 'trade_date'], depot_path, 'TestDaily', 'stock_identity')
+        securities = ['00000%d.SZSE' % i for i in range(5)]
+        depot.insert(pd.DataFrame({
+            'stock_identity': [s for s in securities for _ in range(3)],
+            'trade_date': [datetime.datetime(2020, 1, d) for _ in securities for d in range(1, 4)],
+            'close': [float(i) for i in range(len(securities) * 3)],
+        }))
+
+        data_center = UniversalDataCenter(None, PluginManager())
+        data_center.register_data_agent(DataAgent('Test.Daily', depot, 'stock_identity', 'trade_date'))
+        time_serial = (datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 2))
+
+        # All securities are queried in one round trip
+        df = data_center.query_batch('Test.Daily', securities[:4] + ['999999.SSE'], time_serial)
+        assert depot.query_count == 1
+        assert len(df) == 8
+        assert set(df['stock_identity']) == set(securities[:4])
+
+        # The identity list is queried in chunks
+        UniversalDataCenter.BATCH_IDENTITY_LIMIT = 2
+        depot.query_count = 0
+        result = data_center.query_batch('Test.Daily', securities, time_serial,
+                                         group_by='identity', fields=['trade_date', 'close'])
+        assert depot.query_count == 3
+        assert sorted(result.keys()) == securities
+        assert list(result['000003.SZSE']['close']) == [9.0, 10.0]
+
+        result = data_center.query_batch(['Test.Daily', 'Test.Unknown'], securities[:1], time_serial)
+        assert len(result['Test.Daily']) == 2
+        assert result['Test.Unknown'] is None
+    finally:
+        UniversalDataCenter.BATCH_IDENTITY_LIMIT = batch_identity_limit
+        shutil.rmtree(depot_path, ignore_errors=True)
 
 
 def test_entry():
     # test_entry1()
     # test_update()
+    test_data_agent_route()
     test_readable_to_fields()
+    test_fields_to_readable()
+    test_query_batch()
 
 
 # ----------------------------------------------------- File Entry -----------------------------------------------------
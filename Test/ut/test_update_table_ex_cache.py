@@ -0,0 +1,242 @@
+import time
+import traceback
+from datetime import datetime
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.Database.UpdateTableEx import UpdateTableEx
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+#                                                   Fake Collection
+# ----------------------------------------------------------------------------------------------------------------------
+
+class FakeCollection:
+    """
+    Keeps the documents in memory and applies the $min / $max update operators like mongodb.
+    """
+
+    def __init__(self):
+        self.documents = {}         # tags: document
+        self.bulk_calls = []
+        self.fail_write = False
+        # Called when bulk_write starts, before the documents are updated
+        self.on_write = None
+
+    def create_index(self, index, background: bool = False):
+        pass
+
+    def find(self, spec: dict, projection: dict = None):
+        return [dict(document) for tags, document in self.documents.items()
+                if 'tags' not in spec or spec['tags'] == tags]
+
+    def bulk_write(self, operations: list, ordered: bool = True):
+        if self.on_write is not None:
+            self.on_write()
+        if self.fail_write:
+            raise Exception('Fake write fail')
+        self.bulk_calls.append(list(operations))
+        for operation in operations:
+            tags = operation._filter['tags']
+            document = self.documents.setdefault(tags, {'tags': tags})
+            for operator, fields in operation._doc.items():
+                for field, value in fields.items():
+                    old_value = document.get(field, None)
+                    if old_value is None or \
+                            (value < old_value if operator == '$min' else value > old_value):
+                        document[field] = value
+        return True
+
+    def delete_many(self, spec: dict):
+        self.documents.pop(spec.get('tags'), None)
+
+    def drop(self):
+        self.documents.clear()
+
+
+class FakeDatabase:
+    def __init__(self, collection: FakeCollection):
+        self.__collection = collection
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self.__collection
+
+
+class FakeClient:
+    def __init__(self, collection: FakeCollection):
+        self.__database = FakeDatabase(collection)
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        return self.__database
+
+
+def build_update_table(collection: FakeCollection = None, flush_threshold: int = 1000,
+                       record_ttl: float or None = None) -> (UpdateTableEx, FakeCollection):
+    collection = FakeCollection() if collection is None else collection
+    update_table = UpdateTableEx(FakeClient(collection), flush_threshold=flush_threshold, record_ttl=record_ttl)
+    return update_table, collection
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def test_min_max_in_memory():
+    update_table, collection = build_update_table()
+    tags = ['Finance', '000001.SZSE']
+
+    update_table.update_update_range(tags, datetime(2010, 1, 1), datetime(2020, 1, 1))
+    update_table.update_update_range(tags, datetime(2012, 1, 1), datetime(2018, 1, 1))
+    update_table.update_latest_update_time(tags, datetime(2021, 1, 1))
+    update_table.update_latest_update_time(tags, datetime(2019, 1, 1))
+
+    # The older since and newer until are kept, the same as $min and $max of flushing
+    assert update_table.get_all_time(tags) == (datetime(2010, 1, 1), datetime(2020, 1, 1), datetime(2021, 1, 1))
+    assert len(collection.bulk_calls) == 0
+
+    update_table.update_update_range(tags, datetime(2009, 1, 1), datetime(2022, 1, 1))
+    assert update_table.get_since_until(tags) == (datetime(2009, 1, 1), datetime(2022, 1, 1))
+
+
+def test_flush():
+    update_table, collection = build_update_table()
+    update_table.update_update_range('A', datetime(2010, 1, 1), datetime(2020, 1, 1))
+    update_table.update_update_range('B', datetime(2011, 1, 1), datetime(2021, 1, 1))
+    update_table.update_latest_update_time('B', datetime(2021, 1, 1))
+
+    # All dirty records are written in one bulk
+    assert update_table.flush()
+    assert len(collection.bulk_calls) == 1 and len(collection.bulk_calls[0]) == 2
+    assert collection.documents['A'] == {'tags': 'A', 'since': datetime(2010, 1, 1), 'until': datetime(2020, 1, 1)}
+    assert collection.documents['B']['last_update'] == datetime(2021, 1, 1)
+
+    # Nothing to flush
+    assert update_table.flush()
+    assert len(collection.bulk_calls) == 1
+
+    # The value that does not extend the range is not written
+    update_table.update_update_range('A', datetime(2012, 1, 1), datetime(2018, 1, 1))
+    assert update_table.flush()
+    assert len(collection.bulk_calls) == 1
+
+    # The flush of other process with wider range is not overwritten
+    collection.documents['A']['since'] = datetime(2000, 1, 1)
+    update_table.update_update_range('A', datetime(2005, 1, 1), datetime(2025, 1, 1))
+    assert update_table.flush()
+    assert collection.documents['A']['since'] == datetime(2000, 1, 1)
+    assert collection.documents['A']['until'] == datetime(2025, 1, 1)
+
+
+def test_flush_fail_and_threshold():
+    update_table, collection = build_update_table(flush_threshold=2)
+    collection.fail_write = True
+    update_table.update_since('A', datetime(2010, 1, 1))
+    update_table.update_since('B', datetime(2010, 1, 1))
+    # The threshold flush failed, the dirty records are kept
+    assert len(collection.documents) == 0
+
+    collection.fail_write = False
+    update_table.update_until('A', datetime(2020, 1, 1))
+    assert update_table.flush()
+    assert collection.documents['A'] == {'tags': 'A', 'since': datetime(2010, 1, 1), 'until': datetime(2020, 1, 1)}
+    assert collection.documents['B'] == {'tags': 'B', 'since': datetime(2010, 1, 1)}
+
+    update_table, collection = build_update_table(flush_threshold=2)
+    update_table.update_since('A', datetime(2010, 1, 1))
+    update_table.update_since('B', datetime(2010, 1, 1))
+    # Flushed by reaching the threshold
+    assert len(collection.bulk_calls) == 1 and len(collection.documents) == 2
+
+
+def test_record_ttl():
+    collection = FakeCollection()
+    update_table, _ = build_update_table(collection, record_ttl=0.2)
+    other_table, _ = build_update_table(collection, record_ttl=None)
+
+    update_table.update_update_range('A', datetime(2010, 1, 1), datetime(2020, 1, 1))
+    other_table.update_until('A', datetime(2022, 1, 1))
+    other_table.update_until('B', datetime(2022, 1, 1))
+    assert other_table.flush()
+
+    # Not expired: served from memory
+    assert update_table.get_until('A') == datetime(2020, 1, 1)
+    assert update_table.get_until('B') is None
+
+    time.sleep(0.3)
+    # Expired: reloaded from database, and the pending update of this process is kept
+    assert update_table.get_since_until('A') == (datetime(2010, 1, 1), datetime(2022, 1, 1))
+    assert update_table.get_until('B') == datetime(2022, 1, 1)
+    assert update_table.flush()
+    assert collection.documents['A']['since'] == datetime(2010, 1, 1)
+
+    # Without ttl the records are only re-read by reload()
+    collection.documents['C'] = {'tags': 'C', 'until': datetime(2023, 1, 1)}
+    assert other_table.get_until('C') is None
+    other_table.reload()
+    assert other_table.get_until('C') == datetime(2023, 1, 1)
+
+
+def test_reload_during_flush():
+    update_table, collection = build_update_table(record_ttl=0.01)
+    update_table.update_update_range('A', datetime(2010, 1, 1), datetime(2020, 1, 1))
+    update_table.update_latest_update_time('A', datetime(2020, 1, 2))
+
+    # The records expire and are re-read while the dirty records are being written
+    observed = []
+
+    def on_write():
+        time.sleep(0.02)
+        observed.append(update_table.get_all_time('A'))
+    collection.on_write = on_write
+
+    assert update_table.flush()
+    assert observed == [(datetime(2010, 1, 1), datetime(2020, 1, 1), datetime(2020, 1, 2))]
+    collection.on_write = None
+    time.sleep(0.02)
+    assert update_table.get_last_update_time('A') == datetime(2020, 1, 2)
+
+    # The failed flush keeps them too
+    collection.on_write = on_write
+    collection.fail_write = True
+    update_table.update_latest_update_time('A', datetime(2020, 1, 3))
+    assert not update_table.flush()
+    assert observed[-1][2] == datetime(2020, 1, 3)
+    collection.on_write = None
+    time.sleep(0.02)
+    assert update_table.get_last_update_time('A') == datetime(2020, 1, 3)
+
+
+def test_entry():
+    test_min_max_in_memory()
+    test_flush()
+    test_flush_fail_and_threshold()
+    test_record_ttl()
+    test_reload_during_flush()
+
+
+def main():
+    test_entry()
+    print('All Test Passed.')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
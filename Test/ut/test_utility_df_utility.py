@@ -1,10 +1,11 @@
 import traceback
+import numpy as np
 import pandas as pd
 from os import sys, path
 root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
 sys.path.append(root_path)
 
-from StockAnalysisSystem.core.Utility.df_utility import check_date_continuity
+from StockAnalysisSystem.core.Utility.df_utility import check_date_continuity, join_on_keys
 from StockAnalysisSystem.core.Utility.df_utility import test_entry as test_entry_df_utility
 
 
@@ -16,9 +17,46 @@ def test_check_date_continuity():
     print('max_date = ' + str(max_date))
 
 
+def test_join_on_keys():
+    keys = ['stock_identity', 'period']
+    periods = pd.to_datetime(['2018-12-31', '2019-12-31', '2020-12-31'])
+    df_balance = pd.DataFrame({'stock_identity': ['000002', '000001', '000001', '000002'],
+                               'period': [periods[1], periods[2], periods[1], periods[2]],
+                               'a': [1.0, 2.0, 3.0, 4.0]})
+    df_income = pd.DataFrame({'period': [periods[1], periods[0], periods[2]],
+                              'stock_identity': ['000001', '000001', '000002'],
+                              'b': [10.0, 20.0, 30.0]})
+    df_cash = pd.DataFrame({'stock_identity': ['000002', '000003'], 'period': [periods[1], periods[1]],
+                            'c': [100.0, 200.0]})
+
+    for how in ['left', 'inner', 'outer']:
+        expect = pd.merge(pd.merge(df_balance, df_income, how=how, on=keys), df_cash, how=how, on=keys)
+        result = join_on_keys([df_balance, None, df_income, df_cash], keys, how=how)
+        assert list(result.columns) == ['stock_identity', 'period', 'a', 'b', 'c']
+        assert result.equals(expect), how
+
+    # The int column is kept as int if all the rows of inner join are matched
+    df_count = pd.DataFrame({'stock_identity': ['000001', '000002', '000001'],
+                             'period': [periods[1], periods[2], periods[0]],
+                             'd': [1, 2, 3]})
+    expect = pd.merge(pd.merge(df_balance, df_income, how='inner', on=keys), df_count, how='inner', on=keys)
+    result = join_on_keys([df_balance, df_income, df_count], keys, how='inner')
+    assert result['d'].dtype == np.int64
+    assert result.equals(expect)
+
+    # Duplicated keys fall back to the chained merge
+    df_duplicated = pd.concat([df_income, df_income])
+    result = join_on_keys([df_balance, df_duplicated], keys)
+    assert len(result) == len(pd.merge(df_balance, df_duplicated, how='left', on=keys))
+
+    assert join_on_keys([None], keys) is None
+    assert join_on_keys([df_cash], keys) is df_cash
+
+
 def test_entry():
     test_entry_df_utility()
     test_check_date_continuity()
+    test_join_on_keys()
 
 
 def main():
@@ -0,0 +1,139 @@
+import time
+import threading
+import traceback
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.Utility.event_queue import *
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+class RecordHandler(EventHandler):
+    def __init__(self, delay: float = 0):
+        super(RecordHandler, self).__init__()
+        self.delay = delay
+        self.events = []
+
+    def identity(self) -> str:
+        return 'record'
+
+    def handle_event(self, event: Event, sync: bool):
+        if self.delay > 0:
+            time.sleep(self.delay)
+        self.events.append(event)
+
+
+def test_polling_time_budget():
+    event_queue = EventQueue()
+    handler = RecordHandler(0.01)
+    event_queue.add_event_handler(handler)
+    for i in range(50):
+        event_queue.post_event(Event(Event.EVENT_BROADCAST, None))
+
+    clock = time.monotonic()
+    remain = event_queue.polling(50)
+    elapsed = time.monotonic() - clock
+    assert 0.05 <= elapsed < 0.2
+    assert remain == 50 - len(handler.events)
+    assert 0 < len(handler.events) < 15
+
+    assert event_queue.polling(10000) == 0
+    assert len(handler.events) == 50
+
+
+def test_wait_event():
+    event_queue = EventQueue()
+
+    clock = time.monotonic()
+    assert not event_queue.wait_event(0.05)
+    assert time.monotonic() - clock >= 0.05
+
+    threading.Timer(0.05, event_queue.wake).start()
+    clock = time.monotonic()
+    assert not event_queue.wait_event(5)
+    assert time.monotonic() - clock < 1
+
+    threading.Timer(0.05, event_queue.post_event, args=(Event(Event.EVENT_BROADCAST, None), )).start()
+    assert event_queue.wait_event(5)
+
+
+def test_event_dispatcher():
+    dispatcher = EventDispatcher(in_private_thread=True, name='dispatcher')
+    invoked = []
+    finished = threading.Event()
+
+    def on_invoke(value: int) -> int:
+        invoked.append(value)
+        if len(invoked) == 100:
+            finished.set()
+        return value
+
+    dispatcher.register_invoke_handler('invoke', on_invoke)
+    for i in range(100):
+        event = EventInvoke('dispatcher')
+        event.invoke('invoke', i)
+        dispatcher.dispatch_event(event, False)
+    assert finished.wait(5)
+    assert invoked == list(range(100))
+
+    # Latency is not limited by polling interval
+    latency = []
+    for i in range(20):
+        finished.clear()
+        invoked.clear()
+        invoked.extend([0] * 99)
+        clock = time.monotonic()
+        event = EventInvoke('dispatcher')
+        event.invoke('invoke', i)
+        dispatcher.dispatch_event(event, False)
+        assert finished.wait(5)
+        latency.append(time.monotonic() - clock)
+    assert sorted(latency)[len(latency) // 2] < 0.02
+
+    clock = time.monotonic()
+    dispatcher.teardown()
+    assert time.monotonic() - clock < 1
+
+    # Dispatcher without private thread can be teardown
+    EventDispatcher(in_private_thread=False, name='sync').teardown()
+
+
+def test_entry():
+    test_polling_time_budget()
+    test_wait_event()
+    test_event_dispatcher()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
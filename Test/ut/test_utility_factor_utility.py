@@ -0,0 +1,77 @@
+import traceback
+import numpy as np
+import pandas as pd
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.Utility.FactorUtility import FactorEngine, FormulaGraph
+
+
+def test_formula_graph():
+    fe = FactorEngine('[A] = ([B] + [C]) / [D] ; [D] = [E] + [F] ; [F] = [G] * [H]; [X] = -([B] + [C]) ** 2 / 3', '')
+    assert sorted(fe.provides()) == ['A', 'D', 'F', 'X']
+    assert sorted(fe.depends()) == ['B', 'C', 'E', 'G', 'H']
+    assert sorted(fe.formula_graph().inputs()) == ['B', 'C', 'E', 'G', 'H']
+
+    df = pd.DataFrame({
+        'B': [1.0, 2.0, 0.0, -1.0],
+        'C': [1.0, 0.0, 0.0, 3.0],
+        'E': [1.0, 1.0, 0.0, 2.0],
+        'G': [2.0, 0.0, 0.0, 1.0],
+        'H': [3.0, 5.0, 1.0, 0.5],
+    })
+    result = fe.evaluate(df)
+    f = df['G'] * df['H']
+    d = df['E'] + f
+    assert np.array_equal(result['F'], f.to_numpy())
+    assert np.array_equal(result['D'], d.to_numpy())
+    assert np.array_equal(result['A'], ((df['B'] + df['C']) / d).to_numpy(), equal_nan=True)
+    assert np.array_equal(result['X'], (-(df['B'] + df['C']) ** 2 / 3).to_numpy())
+
+    # The same sub expression is shared
+    shared = FormulaGraph([('P', '[a] + [b]'), ('Q', '([a] + [b]) * 2')])
+    separated = FormulaGraph([('P', '[a] + [b]'), ('Q', '([a] + [c]) * 2')])
+    assert shared.node_count() == separated.node_count() - 2
+
+
+def test_formula_validation():
+    graph = FormulaGraph([('A', '__import__("os").getcwd()'), ('B', '[x] * 2'), ('C', '[y].sum()')])
+    assert graph.outputs() == ['B']
+
+    graph = FormulaGraph([('A', '[B] + 1'), ('B', '[A] + 1')])
+    assert graph.outputs() == []
+
+
+def test_entry():
+    test_formula_graph()
+    test_formula_validation()
+
+
+def main():
+    test_entry()
+    print('All Test Passed.')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass
@@ -0,0 +1,64 @@
+import time
+import threading
+import traceback
+from os import sys, path
+root_path = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.append(root_path)
+
+from StockAnalysisSystem.core.Utility.time_utility import TokenBucket, TokenBucketMinuteLimit
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+def test_token_bucket():
+    # 20 tokens per second, shared by 4 threads. The first token is in bucket.
+    bucket = TokenBucket(20, 1)
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    assert 0.9 <= elapsed < 2.0
+
+    # No limit
+    bucket = TokenBucketMinuteLimit(0)
+    assert bucket.acquire() == 0.0
+
+
+def test_entry():
+    test_token_bucket()
+
+
+# ----------------------------------------------------- File Entry -----------------------------------------------------
+
+def main():
+    test_entry()
+
+    # If program reaches here, all test passed.
+    print('All test passed.')
+
+
+# ------------------------------------------------- Exception Handling -------------------------------------------------
+
+def exception_hook(type, value, tback):
+    # log the exception here
+    print('Exception hook triggered.')
+    print(type)
+    print(value)
+    print(tback)
+    # then call the default handler
+    sys.__excepthook__(type, value, tback)
+
+
+if __name__ == "__main__":
+    sys.excepthook = exception_hook
+    try:
+        main()
+    except Exception as e:
+        print('Error =>', e)
+        print('Error =>', traceback.format_exc())
+        exit()
+    finally:
+        pass